@@ -1,25 +1,57 @@
-from flask import Flask, request, jsonify, current_app, send_from_directory
+from flask import Flask, Response, request, jsonify, current_app, send_from_directory, send_file, redirect, abort
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import validates
 from db import db
-from flask_cors import CORS
 from flask_mail import Message
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, timezone
-import jwt
+import hmac
+import json
+import logging
 import os
-import random
 import smtplib
 import re
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask_mail import Mail
+from pdf_derivatives import PdfDerivativeService, is_derivative
+from event_ingest import EventIngestor
+from security_monitor import SecurityMonitor
+from security_analytics import SecurityAnalytics, GRANULARITIES, retained_granularity, widen_window
+from json_provider import init_json_provider, json_list_response
+from compression import Compressor
+from cors import CorsPolicy
+from password_hashing import PasswordHasher, HashingBusy
+from tokens import TokenService, TokenUser, TokenError
+from quiz_cache import QuizCatalogue, QuizPayloadCache
+from quiz_shuffle import QuizShuffler
+from question_bank import QuestionBank
+from event_bus import EventBus
+from mail_queue import MailQueue
+from payment_batch import BULK_ACTIONS, MAX_BULK_PAYMENTS, PaymentBatch, parse_bulk_selection
+from mvola_reconcile import MvolaReconciler, normalize_reference, statement_rows
+from grading import AnswerKey, RegradeService, normalize
+from notification_reads import NotificationReads
+from stats_rollup import StatsRollup, parse_day
+from balance_ledger import BalanceLedger
+from result_browser import ResultBrowser
+from leaderboard import DEFAULT_TOP, Leaderboards
+from idempotency import IdempotencyError, IdempotencyStore, StoredResponse, request_fingerprint
+from student_home import DocumentListing, EncodedList, home_body, parse_known, section_version
+from auth_codes import normalize_code, code_digest, verify_code, generate_code, generate_student_code
 
 # Charger les variables d'environnement
 load_dotenv('config.env')
 
 app = Flask(__name__)
 
+# Sérialisation JSON rapide (orjson par défaut, 'std' ou 'flask' via JSON_PROVIDER)
+app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER')
+app.config['JSON_STREAM_ARRAYS'] = os.getenv('JSON_STREAM_ARRAYS', 'false').lower() == 'true'
+init_json_provider(app)
+
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -40,73 +72,28 @@ app.config.update(
         "https://quiz.local:30080",
         # ⭐⭐ AJOUTEZ L'IP EXTERNE ⭐⭐
     ],
-    CORS_HEADERS=['Content-Type', 'Authorization'],
+    CORS_HEADERS=['Content-Type', 'Authorization', 'Idempotency-Key'],
     CORS_METHODS=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'],
-    CORS_EXPOSE_HEADERS=['Content-Type', 'Authorization', 'X-Total-Count']
-)
-
-# Initialisation CORS avec configuration simplifiée
-cors = CORS(
-    app,
-    resources={
-        r"/api/*": {
-            "origins": app.config['CORS_ORIGINS'],
-            "methods": app.config['CORS_METHODS'],
-            "allow_headers": app.config['CORS_HEADERS'],
-            "supports_credentials": True,
-            "expose_headers": app.config['CORS_EXPOSE_HEADERS'],
-            "vary_header": True
-        }
-    }
+    CORS_EXPOSE_HEADERS=['Content-Type', 'Authorization', 'X-Total-Count', 'Idempotent-Replayed']
 )
 
-# Désactiver la gestion automatique des OPTIONS par Flask-CORS
-app.config['CORS_AUTOMATIC_OPTIONS'] = False
-
-# Gestion des requêtes OPTIONS (pré-vol CORS)
-@app.before_request
-def handle_preflight():
-    if request.method == 'OPTIONS':
-        response = jsonify({'status': 'success'})
-        response.headers.add('Access-Control-Allow-Origin', request.headers.get('Origin'))
-        response.headers.add('Access-Control-Allow-Headers', ', '.join(app.config['CORS_HEADERS']))
-        response.headers.add('Access-Control-Allow-Methods', ', '.join(app.config['CORS_METHODS']))
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        response.headers.add('Access-Control-Max-Age', '86400')
-        response.headers.add('Vary', 'Origin')
-        return response, 200
-
-# Nettoyage des en-têtes CORS en double
-@app.after_request
-def after_request(response):
-    # Supprimer les en-têtes CORS en double
-    response.headers.pop('Access-Control-Allow-Origin', None)
-    response.headers.pop('Access-Control-Allow-Headers', None)
-    response.headers.pop('Access-Control-Allow-Methods', None)
-    response.headers.pop('Access-Control-Allow-Credentials', None)
-    response.headers.pop('Access-Control-Expose-Headers', None)
-    response.headers.pop('Vary', None)
-    
-    # Si c'est une requête CORS, ajouter les en-têtes nécessaires
-    origin = request.headers.get('Origin')
-    if origin in app.config['CORS_ORIGINS']:
-        response.headers.add('Access-Control-Allow-Origin', origin)
-        response.headers.add('Access-Control-Allow-Headers', ', '.join(app.config['CORS_HEADERS']))
-        response.headers.add('Access-Control-Allow-Methods', ', '.join(app.config['CORS_METHODS']))
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        response.headers.add('Access-Control-Expose-Headers', ', '.join(app.config['CORS_EXPOSE_HEADERS']))
-        response.headers.add('Vary', 'Origin')
-    
-    return response
+# CORS: composant unique, en-têtes précalculés et pré-vol OPTIONS servi en premier
+cors = CorsPolicy(app)
 
 # Middleware pour logger les requêtes entrantes
 @app.before_request
 def log_request_info():
-    app.logger.debug('Headers: %s', request.headers)
-    app.logger.debug('Body: %s', request.get_data())
+    # Ne lit pas le corps de la requête si le niveau DEBUG est désactivé
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug('Headers: %s', request.headers)
+        app.logger.debug('Body: %s', request.get_data())
 
 # Configuration de l'application
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
+# Clé HMAC des codes d'authentification (la changer impose de relancer migrate_auth_codes.py)
+app.config['AUTH_CODE_HMAC_KEY'] = os.getenv('AUTH_CODE_HMAC_KEY') or app.config['SECRET_KEY']
+# Ordre des questions / options propre à chaque étudiant
+app.config['QUIZ_SHUFFLE'] = os.getenv('QUIZ_SHUFFLE', 'true').lower() == 'true'
 
 # Configuration Flask-Mail
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.sendgrid.net')
@@ -119,6 +106,8 @@ app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
 # Initialisation de Flask-Mail
 
 mail = Mail(app)
+# Emails envoyés par lots hors requête (traitement en masse des paiements)
+mail_queue = MailQueue(app, mail)
 
 # Utiliser SQLite par défaut pour les tests si MySQL n'est pas disponible
 try:
@@ -136,6 +125,9 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 ALLOWED_EXTENSIONS = { 'pdf', 'mp4', 'avi', 'mov', 'wmv', 'jpg', 'jpeg', 'png', 'gif' }
 
+# Dérivés PDF (pages, vignette, copie linéarisée) calculés hors du chemin des requêtes
+pdf_derivatives = PdfDerivativeService(UPLOAD_FOLDER)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -168,49 +160,64 @@ def test_email():
         }), 500
 
 
-# Assouplir CORS et autoriser l'intégration en iframe (dev)
+# Autoriser l'intégration en iframe (dev); les en-têtes CORS sont gérés par CorsPolicy
 @app.after_request
 def add_security_headers(response):
-    # CORS basique pour dev
-    response.headers.setdefault('Access-Control-Allow-Origin', '*')
-    response.headers.setdefault('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-    response.headers.setdefault('Access-Control-Allow-Methods', 'GET, HEAD, POST, PUT, PATCH, DELETE, OPTIONS')
     # Autoriser l'affichage dans des iframes (pour l'overlay front)
     response.headers['X-Frame-Options'] = 'ALLOWALL'  # non standard mais compris par certains navigateurs
     response.headers['Content-Security-Policy'] = "frame-ancestors *"
     return response
 
+# Compression br/gzip négociée des réponses + fichiers statiques précompressés
+compressor = Compressor(app)
+
+# Hachage des mots de passe / codes dans un pool de processus borné
+password_hasher = PasswordHasher()
+
+@app.errorhandler(HashingBusy)
+def handle_hashing_busy(error):
+    response = jsonify({'success': False, 'message': 'Serveur occupé, veuillez réessayer dans un instant'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
 # Fonctions utilitaires
-def generate_token(user_id):
-    payload = {
-        'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=24)
-    }
-    return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
+def set_auth_code(user, code):
+    """Enregistre le code d'authentification: clair pour l'affichage admin,
+    digest HMAC indexé pour la connexion"""
+    user.code_auth = normalize_code(code)
+    user.code_auth_hmac = code_digest(code, app.config['AUTH_CODE_HMAC_KEY'])
+
+def auth_email(recipient_email, student_name, auth_code):
+    """Message contenant le code d'authentification (envoi direct ou via mail_queue)"""
+    msg = Message(
+        "Votre code d'authentification Quiz Connect",
+        recipients=[recipient_email]
+    )
+
+    msg.html = f"""
+    <html>
+        <body>
+            <h2>Bienvenue sur Quiz Connect, {student_name} !</h2>
+            <p>Votre code d'authentification est :</p>
+            <div style="font-size: 24px; font-weight: bold; margin: 20px 0; padding: 10px; 
+                        background-color: #f5f5f5; border-radius: 5px; display: inline-block;">
+                {auth_code}
+            </div>
+            <p>Utilisez ce code pour vous connecter à votre espace étudiant.</p>
+            <p><strong>Ne partagez jamais ce code avec qui que ce soit.</strong></p>
+            <p>Cordialement,<br>L'équipe Quiz Connect</p>
+        </body>
+    </html>
+    """
+    return msg
+
+def student_display_name(user):
+    """Prénom Nom depuis le nom d'utilisateur (prenom.nom)"""
+    return ' '.join(part.capitalize() for part in user.username.split('.')[:2])
 
 def send_auth_email(recipient_email, student_name, auth_code):
     try:
-        msg = Message(
-            "Votre code d'authentification Quiz Connect",
-            recipients=[recipient_email]
-        )
-        
-        msg.html = f"""
-        <html>
-            <body>
-                <h2>Bienvenue sur Quiz Connect, {student_name} !</h2>
-                <p>Votre code d'authentification est :</p>
-                <div style="font-size: 24px; font-weight: bold; margin: 20px 0; padding: 10px; 
-                            background-color: #f5f5f5; border-radius: 5px; display: inline-block;">
-                    {auth_code}
-                </div>
-                <p>Utilisez ce code pour vous connecter à votre espace étudiant.</p>
-                <p><strong>Ne partagez jamais ce code avec qui que ce soit.</strong></p>
-                <p>Cordialement,<br>L'équipe Quiz Connect</p>
-            </body>
-        </html>
-        """
-        
+        msg = auth_email(recipient_email, student_name, auth_code)
         mail.send(msg)
         app.logger.info(f"Email d'authentification envoyé à {recipient_email}")
         return True
@@ -227,13 +234,46 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
         try:
             token = token.split()[1]  # Remove 'Bearer ' prefix
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = db.session.get(User, data['user_id'])
-        except:
+            data = token_service.decode_access(token)
+        except (IndexError, TokenError):
             return jsonify({'message': 'Token is invalid!'}), 401
+        if data.get('type') == 'access':
+            # Claims suffisants: aucune lecture en base
+            current_user = TokenUser(data)
+        else:
+            # Anciens jetons 24 h (user_id seul), acceptés jusqu'à leur expiration
+            current_user = db.session.get(User, data['user_id'])
+            if current_user is None:
+                return jsonify({'message': 'Token is invalid!'}), 401
         return f(current_user, *args, **kwargs)
     return decorated
 
+def idempotent(f):
+    """En-tête Idempotency-Key facultatif: un renvoi rejoue la réponse enregistrée (voir idempotency)"""
+    from functools import wraps
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        client_key = request.headers.get('Idempotency-Key')
+        if client_key is None:
+            return f(*args, **kwargs)
+        # Sous token_required, le premier argument est l'utilisateur: la clé lui est propre
+        principal = getattr(args[0], 'id', None) if args else None
+        fingerprint = request_fingerprint(request.method, request.path, request.get_data())
+        try:
+            result = idempotency.run(request.endpoint, principal, client_key.strip(), fingerprint,
+                                     lambda: app.make_response(f(*args, **kwargs)))
+        except IdempotencyError as e:
+            response = jsonify({'success': False, 'error': str(e)})
+            if e.status == 409:
+                response.headers['Retry-After'] = '1'
+            return response, e.status
+        if isinstance(result, StoredResponse):
+            replay = Response(result.body, status=result.status_code, content_type=result.content_type)
+            replay.headers['Idempotent-Replayed'] = 'true'
+            return replay
+        return result
+    return decorated
+
 def block_advanced_downloaders():
     """Détection avancée des téléchargeurs automatiques avec logging détaillé"""
     ua = request.headers.get('User-Agent', '').lower()
@@ -327,6 +367,7 @@ class User(db.Model):
     date_inscription = db.Column(db.DateTime, default=datetime.utcnow)
     telephone = db.Column(db.String(20))
     code_auth = db.Column(db.String(20), unique=True, nullable=True)  # Stockage du code d'authentification en clair
+    code_auth_hmac = db.Column(db.String(64), unique=True, nullable=True)  # HMAC-SHA256 du code (vérification)
     actif = db.Column(db.Boolean, default=False)
 
 class Quiz(db.Model):
@@ -350,7 +391,44 @@ class Question(db.Model):
     options = db.Column(db.JSON)
     points = db.Column(db.Integer, default=1)
 
+class QuestionPool(db.Model):
+    """Banque de questions réutilisable par plusieurs quiz (voir question_bank)"""
+    id = db.Column(db.Integer, primary_key=True)
+    nom = db.Column(db.String(100), nullable=False, unique=True)
+    description = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PoolQuestion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    pool_id = db.Column(db.Integer, db.ForeignKey('question_pool.id'), nullable=False, index=True)
+    # Strate du tirage (chapitre, difficulté...)
+    tag = db.Column(db.String(50), nullable=False, default='')
+    question = db.Column(db.Text, nullable=False)
+    type_question = db.Column(db.String(20), nullable=False)
+    reponse_correcte = db.Column(db.String(255), nullable=False)
+    options = db.Column(db.JSON)
+    points = db.Column(db.Integer, default=1)
+
+class QuizPoolRule(db.Model):
+    """Quiz banque: `count` questions tirées du pool (du tag `tag` s'il est renseigné)"""
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    pool_id = db.Column(db.Integer, db.ForeignKey('question_pool.id'), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    tag = db.Column(db.String(50), nullable=True)
+
 class Result(db.Model):
+    # Index de la consultation admin (result_browser): filtre éventuel, clé de tri, id
+    __table_args__ = (
+        db.Index('ix_result_date', 'date_passage', 'id'),
+        db.Index('ix_result_score', 'score', 'id'),
+        db.Index('ix_result_quiz_date', 'quiz_id', 'date_passage', 'id'),
+        db.Index('ix_result_quiz_score', 'quiz_id', 'score', 'id'),
+        db.Index('ix_result_user_date', 'user_id', 'date_passage', 'id'),
+        # Une seule soumission par étudiant et par quiz, même sous soumissions concurrentes
+        db.Index('uq_result_user_quiz', 'user_id', 'quiz_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
@@ -359,6 +437,12 @@ class Result(db.Model):
     temps_utilise = db.Column(db.Integer)  # en secondes
     statut = db.Column(db.String(20), default='en_cours')
 
+class ResultAnswers(db.Model):
+    """Réponses normalisées d'une tentative {question_id: réponse}, pour la re-correction"""
+    result_id = db.Column(db.Integer, db.ForeignKey('result.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    answers = db.Column(db.JSON, nullable=False)
+
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -368,6 +452,24 @@ class Payment(db.Model):
     statut = db.Column(db.String(20), nullable=False)
     tranche_restante = db.Column(db.Float, default=0)
     date_paiement = db.Column(db.DateTime, default=datetime.utcnow)
+    # Référence MVola normalisée, indexée pour le rapprochement des relevés (voir mvola_reconcile)
+    ref_mvola_norm = db.Column(db.String(50), index=True)
+
+    @validates('code_ref_mvola')
+    def sync_ref_mvola_norm(self, key, value):
+        self.ref_mvola_norm = normalize_reference(value)
+        return value
+
+# Lignes de relevés MVola importées (une par transaction opérateur)
+class MvolaTransaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    reference = db.Column(db.String(50), unique=True, nullable=False)  # normalisée
+    montant = db.Column(db.Float, nullable=False)
+    date_operation = db.Column(db.DateTime)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payment.id', ondelete='SET NULL'), index=True)
+    date_import = db.Column(db.DateTime, default=datetime.utcnow)
+
+mvola_reconciler = MvolaReconciler(db, Payment, MvolaTransaction)
 
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -387,6 +489,184 @@ class Notification(db.Model):
     id_etudiant = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     date_envoi = db.Column(db.DateTime, default=datetime.utcnow)
 
+# État de lecture des notifications: filigrane + exceptions (une ligne par étudiant, voir notification_reads)
+class NotificationReadState(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    read_upto = db.Column(db.Integer, nullable=False, default=0)
+    exceptions = db.Column(db.JSON, nullable=False, default=list)
+
+notification_reads = NotificationReads(db, Notification, NotificationReadState)
+
+# Jetons de rafraîchissement (seul le sha256 du jeton est stocké)
+class RefreshToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+# Révocations de jetons d'accès (désactivation / suppression), relues par chaque réplica
+class TokenRevocation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# Tickets à usage unique d'ouverture du flux SSE (voir tokens.TokenService.issue_ticket)
+class StreamTicket(db.Model):
+    ticket_hash = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    token_iat = db.Column(db.Float, nullable=False)
+    token_exp = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+token_service = TokenService(app, db, User, RefreshToken, TokenRevocation, StreamTicket)
+
+# Journal append-only des événements d'accès (alimenté par lots par event_ingestor)
+class AccessEvent(db.Model):
+    __table_args__ = (
+        db.Index('ix_access_event_filename_date', 'filename', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'access' | 'viewer'
+    ip = db.Column(db.String(45))
+    user_agent = db.Column(db.String(200))
+    filename = db.Column(db.String(255))
+    action = db.Column(db.String(50))
+    violations = db.Column(db.Integer, default=0)
+    details = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# Agrégats des événements d'accès par minute / heure / jour et par IP / UA / fichier
+class AccessRollup(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'dimension', 'key', 'bucket_start', name='uq_access_rollup'),
+        db.Index('ix_access_rollup_window', 'granularity', 'dimension', 'bucket_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # 'minute' | 'hour' | 'day'
+    dimension = db.Column(db.String(10), nullable=False)  # 'ip' | 'ua' | 'filename'
+    key = db.Column(db.String(255), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    violations = db.Column(db.Integer, nullable=False, default=0)
+
+security_analytics = SecurityAnalytics(db, AccessEvent, AccessRollup)
+
+# Cumuls journaliers des statistiques d'administration (voir stats_rollup)
+class StatsStudentDay(db.Model):
+    __table_args__ = (db.UniqueConstraint('jour', name='uq_stats_student_day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    jour = db.Column(db.Date, nullable=False)
+    inscriptions = db.Column(db.Integer, nullable=False, default=0)
+    premiers_quiz = db.Column(db.Integer, nullable=False, default=0)  # étudiants ayant soumis leur premier quiz
+
+class StatsPaymentDay(db.Model):
+    __table_args__ = (db.UniqueConstraint('jour', 'mode_paiement', 'statut', name='uq_stats_payment_day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    jour = db.Column(db.Date, nullable=False)
+    mode_paiement = db.Column(db.String(20), nullable=False)
+    statut = db.Column(db.String(20), nullable=False)
+    nombre = db.Column(db.Integer, nullable=False, default=0)
+    montant = db.Column(db.Float, nullable=False, default=0)
+
+class StatsQuizDay(db.Model):
+    __table_args__ = (db.UniqueConstraint('jour', 'quiz_id', name='uq_stats_quiz_day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    jour = db.Column(db.Date, nullable=False)
+    quiz_id = db.Column(db.Integer, nullable=False, index=True)
+    soumissions = db.Column(db.Integer, nullable=False, default=0)
+    total_score = db.Column(db.Float, nullable=False, default=0)
+
+stats_rollup = StatsRollup(db, User, Payment, Result, StatsStudentDay, StatsPaymentDay, StatsQuizDay)
+result_browser = ResultBrowser(db, Result, User, Quiz, StatsQuizDay)
+
+# Classements par quiz en mémoire (mis à jour à chaque soumission, voir leaderboard)
+leaderboards = Leaderboards(db, Result)
+
+# Journal des mouvements financiers par étudiant (voir balance_ledger)
+class LedgerEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    type = db.Column(db.String(20), nullable=False)  # 'frais' | 'paiement' | 'annulation'
+    montant = db.Column(db.Float, nullable=False)
+    payment_id = db.Column(db.Integer, index=True)  # sans clé étrangère: le paiement peut être supprimé
+    date_mouvement = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Solde matérialisé, une ligne par étudiant (reste indexé: "qui doit encore payer")
+class StudentBalance(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_du = db.Column(db.Float, nullable=False, default=0)
+    total_paye = db.Column(db.Float, nullable=False, default=0)
+    reste = db.Column(db.Float, nullable=False, default=0, index=True)
+    statut = db.Column(db.String(20), nullable=False, default='solde', index=True)  # 'solde' | 'partiel' | 'impaye'
+    date_maj = db.Column(db.DateTime, default=datetime.utcnow)
+
+balance_ledger = BalanceLedger(db, User, Payment, LedgerEntry, StudentBalance)
+
+# Validation / rejet de paiements en masse (deux requêtes de lecture, un commit)
+payment_batch = PaymentBatch(db, Payment, User, stats_rollup, balance_ledger, generate_code, set_auth_code,
+                             lambda code: code_digest(code, app.config['AUTH_CODE_HMAC_KEY']))
+
+# Clés d'idempotence des routes d'écriture (réponse enregistrée, expirée après IDEMPOTENCY_TTL)
+class IdempotencyKey(db.Model):
+    key_hash = db.Column(db.String(64), primary_key=True)  # sha256(route, utilisateur, clé du client)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256(méthode, chemin, corps)
+    statut = db.Column(db.String(20), nullable=False)  # 'en_cours' | 'termine'
+    status_code = db.Column(db.Integer)
+    content_type = db.Column(db.String(100))
+    body = db.Column(db.LargeBinary)
+    date_creation = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+idempotency = IdempotencyStore(db, IdempotencyKey)
+
+def persist_access_events(batch):
+    """Écrit un lot d'événements en un seul INSERT multi-lignes et un seul commit"""
+    with app.app_context():
+        try:
+            db.session.execute(AccessEvent.__table__.insert(), [
+                {
+                    'kind': e['kind'],
+                    'ip': e['ip'],
+                    'user_agent': e['user_agent'],
+                    'filename': e['filename'],
+                    'action': e['action'],
+                    'violations': e['violations'],
+                    'details': e.get('details'),
+                    'created_at': e['created_at']
+                } for e in batch
+            ])
+            # Agrégats mis à jour dans la même transaction que les événements bruts
+            security_analytics.apply_batch(batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+# Instance de monitoring vivante: reçoit le même flux que la base
+security_monitor = SecurityMonitor()
+event_ingestor = EventIngestor(persist_access_events, subscribers=[security_monitor.log_access_attempt])
+
+def build_access_event(kind, data):
+    """Normalise le corps d'un événement envoyé par le frontend ou pdf-viewer.html"""
+    try:
+        violations = int(data.get('violations') or 0)
+    except (TypeError, ValueError):
+        violations = 0
+    filename = data.get('filename') or data.get('file') or 'unknown'
+    extra = {k: v for k, v in data.items() if k not in ('filename', 'file', 'action', 'violations')}
+    return {
+        'kind': kind,
+        'ip': request.remote_addr,
+        'user_agent': request.headers.get('User-Agent', '')[:200],
+        'filename': str(filename)[:255],
+        'action': str(data.get('action') or data.get('type') or 'unknown')[:50],
+        'violations': violations,
+        'details': json.dumps(extra, ensure_ascii=False, default=str)[:2000] if extra else None,
+        'created_at': datetime.utcnow()
+    }
+
 # Routes d'authentification
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -398,7 +678,7 @@ def register():
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'message': 'Username already taken'}), 400
         
-    hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+    hashed_password = password_hasher.hash(data['password'])
     
     new_user = User(
         username=data['username'],
@@ -409,6 +689,8 @@ def register():
     )
     
     db.session.add(new_user)
+    stats_rollup.record_registration(new_user)
+    balance_ledger.charge_fee(new_user)
     db.session.commit()
     
     return jsonify({
@@ -437,23 +719,25 @@ def login_student():
     print(f"✅ Étudiant trouvé: {user.username}")
     
     # Vérifier le code d'authentification
-    code_auth = (data.get('code_auth') or '').strip().upper()
-    is_code_correct = False
+    code_auth = normalize_code(data.get('code_auth'))
     
-    # Vérifier d'abord si le code correspond au code d'authentification stocké en clair
-    if user.code_auth and user.code_auth.upper() == code_auth:
-        is_code_correct = True
-    # Vérifier aussi le mot de passe haché pour la rétrocompatibilité
-    elif check_password_hash(user.password, code_auth):
-        is_code_correct = True
-        # Mettre à jour le code d'authentification en clair pour les prochaines connexions
-        user.code_auth = code_auth
-        db.session.commit()
+    if user.code_auth_hmac:
+        # Comparaison HMAC à temps constant, aucune écriture en cas de succès
+        is_code_correct = verify_code(code_auth, user.code_auth_hmac, app.config['AUTH_CODE_HMAC_KEY'])
+    else:
+        # Ligne pas encore migrée (migrate_auth_codes.py): ancien contrôle puis
+        # enregistrement du digest, une seule fois
+        is_code_correct = bool(user.code_auth) and hmac.compare_digest(normalize_code(user.code_auth), code_auth)
+        if not is_code_correct:
+            is_code_correct = password_hasher.verify(user.password, code_auth)
+        if is_code_correct:
+            set_auth_code(user, code_auth)
+            db.session.commit()
     
     print(f"🔍 Vérification du code: {'✅ Réussi' if is_code_correct else '❌ Échec'}")
     
     if not is_code_correct:
-        print(f"❌ Échec de l'authentification: code incorrect (code fourni: {code_auth})")
+        print("❌ Échec de l'authentification: code incorrect")
         return jsonify({'success': False, 'message': 'Email ou code d\'authentification incorrect'}), 401
         
     # Vérifier si le compte est actif
@@ -462,7 +746,7 @@ def login_student():
         return jsonify({'success': False, 'message': 'Ce compte étudiant a été désactivé'}), 403
         
     print("✅ Authentification étudiant réussie")
-    token = generate_token(user.id)
+    tokens = token_service.issue_pair(user)
     
     # Adapter la structure pour correspondre aux attentes du frontend
     username_parts = user.username.split('.')
@@ -485,7 +769,7 @@ def login_student():
                 'date_inscription': user.date_inscription.isoformat() if user.date_inscription else None
             },
             'isAdmin': False,
-            'token': token
+            **tokens
         }
     })
 
@@ -502,18 +786,20 @@ def login():
         return jsonify({'success': False, 'message': 'Email ou mot de passe incorrect'}), 401
     
     print(f"✅ Utilisateur trouvé: {user.username}")
-    print(f"🔑 Mot de passe fourni: {data['password']}")
-    print(f"🔒 Hash stocké: {user.password}")
     print(f"👤 Actif: {'Oui' if user.actif else 'Non'}")
     print(f"👑 Rôle: {user.role}")
     
-    # Vérifier si le mot de passe est correct
-    is_password_correct = check_password_hash(user.password, data['password'])
+    # Vérifier si le mot de passe est correct (rehash si les paramètres de coût ont changé)
+    is_password_correct, new_hash = password_hasher.verify_and_update(user.password, data['password'])
     print(f"🔍 Vérification du mot de passe: {'✅ Réussi' if is_password_correct else '❌ Échec'}")
     
     if not is_password_correct:
         print("❌ Échec de l'authentification: mot de passe incorrect")
         return jsonify({'success': False, 'message': 'Email ou mot de passe incorrect'}), 401
+
+    if new_hash:
+        user.password = new_hash
+        db.session.commit()
         
     # Vérifier si le compte est actif
     if not user.actif:
@@ -521,7 +807,7 @@ def login():
         return jsonify({'success': False, 'message': 'Ce compte a été désactivé'}), 403
         
     print("✅ Authentification réussie")
-    token = generate_token(user.id)
+    tokens = token_service.issue_pair(user)
     
     return jsonify({
         'success': True,
@@ -533,16 +819,13 @@ def login():
                 'role': user.role
             },
             'isAdmin': user.role == 'admin',
-            'token': token
+            **tokens
         }
     })
 
 @app.route('/api/auth/login/admin', methods=['POST'])
 def login_admin():
     print("\n=== Début de la requête de connexion admin ===")
-    print(f"En-têtes de la requête: {request.headers}")
-    print(f"Données reçues: {request.json}")
-    
     data = request.json
     if not data or 'email' not in data or 'password' not in data:
         print("❌ Données de requête invalides")
@@ -560,18 +843,17 @@ def login_admin():
     
     print(f"✅ Administrateur trouvé: {user.username}")
     
-    # Vérifier si le mot de passe est correct
-    print(f"Mot de passe fourni (haché): {generate_password_hash(data['password'], method='pbkdf2:sha256')}")
-    print(f"Mot de passe stocké: {user.password}")
-    
-    is_password_correct = check_password_hash(user.password, data['password'])
+    # Vérifier si le mot de passe est correct (rehash si les paramètres de coût ont changé)
+    is_password_correct, new_hash = password_hasher.verify_and_update(user.password, data['password'])
     print(f"Résultat de la vérification du mot de passe: {is_password_correct}")
     
     if not is_password_correct:
         print("❌ Échec de l'authentification: mot de passe incorrect")
-        print(f"Mot de passe fourni: {data['password']}")
-        print(f"Hachage du mot de passe fourni: {generate_password_hash(data['password'], method='pbkdf2:sha256')}")
         return jsonify({'success': False, 'message': 'Identifiants invalides'}), 401
+
+    if new_hash:
+        user.password = new_hash
+        db.session.commit()
         
     # Vérifier si le compte est actif
     if not user.actif:
@@ -579,7 +861,7 @@ def login_admin():
         return jsonify({'success': False, 'message': 'Ce compte administrateur a été désactivé'}), 403
         
     print("✅ Authentification administrateur réussie")
-    token = generate_token(user.id)
+    tokens = token_service.issue_pair(user)
     
     return jsonify({
         'success': True,
@@ -591,7 +873,7 @@ def login_admin():
                 'role': user.role
             },
             'isAdmin': True,
-            'token': token
+            **tokens
         }
     })
 
@@ -629,12 +911,9 @@ def add_student(current_user):
         return jsonify({'message': 'Email already exists'}), 400
 
     # Génération du code d'authentification
-    year = datetime.utcnow().year
-    initials = (data['prenom'][0] + data['nom'][0]).upper()
-    random_num = ''.join([str(random.randint(0, 9)) for _ in range(3)])
-    auth_code = f"{initials}{year}{random_num}"
+    auth_code = generate_student_code(data['prenom'], data['nom'], datetime.utcnow().year)
 
-    hashed_password = generate_password_hash(auth_code, method='sha256')
+    hashed_password = password_hasher.hash(auth_code)
     
     new_student = User(
         username=f"{data['prenom'].lower()}.{data['nom'].lower()}",
@@ -642,11 +921,13 @@ def add_student(current_user):
         password=hashed_password,
         role='student',
         telephone=data.get('telephone'),
-        code_auth=auth_code,  # Stockage du code d'authentification en clair
         actif=False
     )
+    set_auth_code(new_student, auth_code)
     
     db.session.add(new_student)
+    stats_rollup.record_registration(new_student)
+    balance_ledger.charge_fee(new_student)
     db.session.commit()
     
     # Envoyer l'email avec le code d'authentification
@@ -719,11 +1000,10 @@ def add_student_public():
 
         # Utiliser le code d'authentification fourni
         auth_code = data['code_auth']
-        hashed_password = generate_password_hash(auth_code, method='sha256')
+        hashed_password = password_hasher.hash(auth_code)
         
-        # Déterminer si l'étudiant est actif
-        # Par défaut inactif, sauf si spécifié autrement
-        is_active = data.get('actif', False)
+        # Toujours inactif: le compte est activé à la validation du paiement (admin ou relevé MVola)
+        is_active = False
         
         # Générer un nom d'utilisateur unique
         base_username = f"{data['prenom'].lower()}.{data['nom'].lower()}"
@@ -742,12 +1022,14 @@ def add_student_public():
             password=hashed_password,
             role='student',
             telephone=data.get('telephone', ''),
-            code_auth=auth_code,
             actif=is_active,
             notes=data.get('notes', 'Inscription publique')
         )
+        set_auth_code(new_student, auth_code)
         
         db.session.add(new_student)
+        stats_rollup.record_registration(new_student)
+        balance_ledger.charge_fee(new_student)
         db.session.commit()
         
         print(f"Étudiant créé avec succès: {new_student.id} - {new_student.email}")
@@ -791,6 +1073,7 @@ def add_student_public():
 
 # Route pour créer un paiement public (sans authentification)
 @app.route('/api/payments/public', methods=['POST'])
+@idempotent
 def create_payment_public():
     try:
         data = request.get_json()
@@ -832,7 +1115,8 @@ def create_payment_public():
             'mode_paiement': data.get('mode_paiement', 'espece'),
             'code_ref_mvola': data.get('code_ref_mvola', ''),
             'montant': montant,
-            'statut': data.get('statut', 'en_attente'),
+            # Jamais encaissé à la création: validé par un admin ou par le rapprochement MVola
+            'statut': 'en_attente',
             'tranche_restante': data.get('tranche_restante', 0),
             'date_paiement': data.get('date_paiement') or datetime.utcnow().strftime('%Y-%m-%d'),
             'notes': f'Inscription publique - {data.get("mode_paiement", "espece")}'
@@ -843,13 +1127,12 @@ def create_payment_public():
         # Créer le paiement
         new_payment = Payment(**payment_data)
         db.session.add(new_payment)
-        
-        # Si le paiement est MVola et complet, activer l'étudiant
-        if data.get('mode_paiement') == 'mvola' and data.get('statut') == 'complet':
-            student.actif = True
-            print(f"Activation de l'étudiant {student.id} pour paiement MVola complet")
+        stats_rollup.record_payment(new_payment)
+        balance_ledger.record_payments([new_payment])
+        # L'étudiant est activé à la validation du paiement (admin ou relevé MVola)
         
         db.session.commit()
+        publish_payment(new_payment)
 
         print(f"Paiement créé avec succès: {new_payment.id}")
 
@@ -882,32 +1165,30 @@ def get_students():
     if request.method == 'OPTIONS':
         return jsonify({}), 200
 
-    students = User.query.filter_by(role='student').all()
+    students = User.query.filter_by(role='student').yield_per(1000)
     
     # Adapter la structure pour correspondre aux attentes du frontend
-    students_data = []
-    for student in students:
-        username_parts = student.username.split('.')
-        nom = username_parts[-1].capitalize() if len(username_parts) > 1 else student.username
-        prenom = username_parts[0].capitalize() if len(username_parts) > 1 else ''
-        
-        students_data.append({
-            'id_etudiant': student.id,
-            'id': student.id,
-            'nom': nom,
-            'prenom': prenom,
-            'username': student.username,
-            'email': student.email,
-            'actif': student.actif,
-            'telephone': student.telephone,
-            'date_inscription': student.date_inscription.isoformat() if student.date_inscription else None,
-            'code_auth': student.code_auth or ''
-        })
+    # (les datetimes sont sérialisées en ISO 8601 par le fournisseur JSON)
+    def students_data():
+        for student in students:
+            username_parts = student.username.split('.')
+            nom = username_parts[-1].capitalize() if len(username_parts) > 1 else student.username
+            prenom = username_parts[0].capitalize() if len(username_parts) > 1 else ''
+
+            yield {
+                'id_etudiant': student.id,
+                'id': student.id,
+                'nom': nom,
+                'prenom': prenom,
+                'username': student.username,
+                'email': student.email,
+                'actif': student.actif,
+                'telephone': student.telephone,
+                'date_inscription': student.date_inscription,
+                'code_auth': student.code_auth or ''
+            }
     
-    return jsonify({
-        'success': True,
-        'data': students_data
-    })
+    return json_list_response(students_data(), success=True)
 
     
 
@@ -917,8 +1198,17 @@ def bulk_delete_students(current_user):
     if current_user.role != 'admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     try:
-        deleted = User.query.filter_by(role='student').delete()
+        student_ids = [user_id for user_id, in db.session.query(User.id).filter(User.role == 'student')]
+        # Lignes qui référencent user.id: journal, solde et état de lecture d'abord
+        for model in (LedgerEntry, StudentBalance, NotificationReadState):
+            db.session.execute(model.__table__.delete().where(model.user_id.in_(student_ids)))
+        # Jetons d'accès sans état: révocation explicite, comme delete_student
+        for user_id in student_ids:
+            token_service.revoke_user(user_id)
+        deleted = User.query.filter(User.id.in_(student_ids)).delete(synchronize_session=False)
         db.session.commit()
+        for user_id in student_ids:
+            leaderboards.forget_user(user_id)
         return jsonify({'success': True, 'deleted': deleted})
     except Exception as e:
         db.session.rollback()
@@ -964,6 +1254,9 @@ def toggle_student(current_user, student_id):
         return jsonify({'message': 'Student not found'}), 404
 
     student.actif = not student.actif
+    if not student.actif:
+        # Jetons en cours invalidés (effectif sur tous les réplicas en quelques secondes)
+        token_service.revoke_user(student.id)
     db.session.commit()
 
     return jsonify({
@@ -986,15 +1279,12 @@ def resend_auth_code(current_user, student_id):
         return jsonify({'message': 'Student not found'}), 404
 
     # Générer un nouveau code d'authentification
-    year = datetime.utcnow().year
     username_parts = student.username.split('.')
-    initials = (username_parts[0][0] + username_parts[1][0]).upper()
-    random_num = ''.join([str(random.randint(0, 9)) for _ in range(3)])
-    auth_code = f"{initials}{year}{random_num}"
+    auth_code = generate_student_code(username_parts[0], username_parts[-1], datetime.utcnow().year)
 
-    # Mettre à jour le mot de passe et stocker le code en clair pour l'envoi et la connexion code
-    student.password = generate_password_hash(auth_code, method='sha256')
-    student.code_auth = auth_code
+    # Mettre à jour le mot de passe et le code (clair pour l'envoi, HMAC pour la connexion)
+    student.password = password_hasher.hash(auth_code)
+    set_auth_code(student, auth_code)
     db.session.commit()
 
     # Envoyer l'email avec le nouveau code d'authentification
@@ -1036,6 +1326,22 @@ def verify_token(current_user):
         }
     })
 
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh_token():
+    # Rotation du jeton de rafraîchissement: nouvelle paire de jetons
+    data = request.get_json(silent=True) or {}
+    try:
+        tokens = token_service.rotate(data.get('refresh_token'))
+    except TokenError as e:
+        return jsonify({'success': False, 'message': 'Session expirée, veuillez vous reconnecter', 'error': str(e)}), 401
+    return jsonify({'success': True, 'data': tokens})
+
+@app.route('/api/auth/logout', methods=['POST'])
+def logout():
+    data = request.get_json(silent=True) or {}
+    token_service.revoke_refresh(data.get('refresh_token'))
+    return jsonify({'success': True})
+
 @app.route('/api/admin/students/<int:student_id>', methods=['DELETE'])
 @token_required
 def delete_student(current_user, student_id):
@@ -1046,58 +1352,60 @@ def delete_student(current_user, student_id):
     if not student:
         return jsonify({'message': 'Student not found'}), 404
 
-    db.session.delete(student)
-    db.session.commit()
+    try:
+        token_service.revoke_user(student.id)
+        balance_ledger.forget(student.id)
+        notification_reads.forget(student.id)
+        db.session.delete(student)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Erreur lors de la suppression', 'details': str(e)}), 500
+    leaderboards.forget_user(student_id)
 
     return jsonify({'message': 'Student deleted successfully'})
 
 # Routes Quiz
 # Routes Quiz
+def quiz_summary(quiz):
+    return {
+        'id_quiz': quiz.id,
+        'id': quiz.id,
+        'titre': quiz.titre,
+        'type': quiz.type,
+        'total_points': quiz.total_points,
+        'date_debut': quiz.date_debut,
+        'date_fin': quiz.date_fin,
+        'duree': quiz.duree,
+        'statut': quiz.statut
+    }
+
+def load_student_catalogue(now):
+    """Quiz actifs non terminés (ouverts ou à venir) pour QuizCatalogue"""
+    quizzes = Quiz.query.filter(Quiz.statut == 'actif', Quiz.date_fin >= now).all()
+    return [(quiz_summary(quiz), quiz.date_debut, quiz.date_fin) for quiz in quizzes]
+
+# Utiliser l'heure locale pour éviter les écarts de fuseau liés aux dates saisies côté frontend
+quiz_catalogue = QuizCatalogue(load_student_catalogue, clock=datetime.now)
+
 @app.route('/api/quizzes', methods=['GET'])
 @token_required
 def get_quizzes(current_user):
     if current_user.role == 'admin':
-        quizzes = Quiz.query.all()
-    else:
-        # Utiliser l'heure locale pour éviter les écarts de fuseau liés aux dates saisies côté frontend
-        now = datetime.now()
-        quizzes = Quiz.query.filter(
-            Quiz.statut == 'actif',
-            Quiz.date_debut <= now,
-            Quiz.date_fin >= now
-        ).all()
-    
-    return jsonify({
-        'success': True,
-        'data': [{
-            'id_quiz': quiz.id,
-            'id': quiz.id,
-            'titre': quiz.titre,
-            'type': quiz.type,
-            'total_points': quiz.total_points,
-            'date_debut': quiz.date_debut.isoformat(),
-            'date_fin': quiz.date_fin.isoformat(),
-            'duree': quiz.duree,
-            'statut': quiz.statut
-        } for quiz in quizzes]
-    })
+        return json_list_response((quiz_summary(quiz) for quiz in Quiz.query.all()), success=True)
 
-@app.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
-@token_required
-def get_quiz_with_questions(current_user, quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    
-    # Vérifier si l'étudiant a accès à ce quiz
-    if current_user.role != 'admin':
-        now = datetime.now()
-        if (quiz.statut != 'actif' or 
-            quiz.date_debut > now or 
-            quiz.date_fin < now):
-            return jsonify({'message': 'Quiz not available'}), 403
+    # Aucune requête tant qu'aucun quiz n'ouvre ni ne ferme
+    return json_list_response(quiz_catalogue.get(), success=True)
 
+def load_quiz_payload(quiz_id):
+    """Quiz et questions tels que vus par l'étudiant (sans reponse_correcte)"""
+    quiz = db.session.get(Quiz, quiz_id)
+    if quiz is None:
+        return None
     questions = Question.query.filter_by(quiz_id=quiz_id).all()
-    
-    return jsonify({
+    rules = [(rule.pool_id, rule.count, rule.tag)
+             for rule in QuizPoolRule.query.filter_by(quiz_id=quiz_id).order_by(QuizPoolRule.id)]
+    payload = {
         'quiz': {
             'id': quiz.id,
             'titre': quiz.titre,
@@ -1115,7 +1423,186 @@ def get_quiz_with_questions(current_user, quiz_id):
             'options': q.options,
             'points': q.points
         } for q in questions]
-    })
+    }
+    if rules:
+        payload['quiz']['pools'] = [{'pool_id': pool_id, 'count': count, 'tag': tag} for pool_id, count, tag in rules]
+    return payload, quiz.statut, quiz.date_debut, quiz.date_fin, rules
+
+QUESTION_TYPES = ['choix_multiple', 'vrai_faux', 'texte_libre']
+
+def question_values(q, i):
+    """Colonnes d'une question soumise par l'admin (quiz ou pool); ValueError si invalide"""
+    question_text = (q.get('question') or '').strip()
+    type_question = q.get('type_question')
+    reponse_correcte = q.get('reponse_correcte')
+    options = q.get('options') or []
+    if not question_text:
+        raise ValueError(f'La question {i} est vide')
+    if type_question not in QUESTION_TYPES:
+        raise ValueError(f'Type de question invalide pour la question {i}')
+    if type_question == 'choix_multiple' and not options:
+        raise ValueError(f'Options manquantes pour la question {i}')
+    if type_question == 'choix_multiple' and not isinstance(options, list):
+        raise ValueError(f'Format des options invalide pour la question {i}')
+    if type_question in ['choix_multiple', 'vrai_faux'] and reponse_correcte is None:
+        raise ValueError(f'Réponse correcte manquante pour la question {i}')
+    try:
+        points = max(1, int(q.get('points', 1)))  # Au moins 1 point par question
+    except (TypeError, ValueError):
+        raise ValueError(f'Points invalides pour la question {i}')
+    return {
+        'question': question_text,
+        'type_question': type_question,
+        'reponse_correcte': str(reponse_correcte) if reponse_correcte is not None else '',
+        'options': options if type_question == 'choix_multiple' else [],
+        'points': points
+    }
+
+def question_field(question, field):
+    """Valeur stockée comparable à question_values (options absentes = [])"""
+    value = getattr(question, field)
+    return (value or []) if field == 'options' else value
+
+def submitted_question_id(q):
+    """Id d'une question existante (id, ou id_question côté éditeur), None pour une nouvelle"""
+    try:
+        return int(q.get('id') or q.get('id_question'))
+    except (TypeError, ValueError):
+        return None
+
+def parse_quiz_datetime(value):
+    """Date ISO envoyée par l'éditeur de quiz -> datetime UTC avec fuseau"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError as e:
+        try:
+            # Essayer sans les millisecondes si présentes
+            parsed = datetime.fromisoformat(value.split('.')[0] + '+00:00')
+        except ValueError:
+            try:
+                parsed = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+            except ValueError:
+                raise ValueError(f"Impossible de parser les dates: {e}")
+    # S'assurer que la date a bien un fuseau
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+def encode_json(obj):
+    provider = app.json
+    return provider.dumps_bytes(obj) if hasattr(provider, 'dumps_bytes') else provider.dumps(obj).encode('utf-8')
+
+quiz_payloads = QuizPayloadCache(load_quiz_payload, encode_json)
+event_bus = EventBus(encode_json)
+quiz_shuffler = QuizShuffler(app.config['SECRET_KEY'])
+
+def load_pool_questions(pool_id):
+    return PoolQuestion.query.filter_by(pool_id=pool_id).all()
+
+question_bank = QuestionBank(load_pool_questions, encode_json)
+
+def draw_rng(quiz_id, user_id):
+    """Générateur du tirage banque d'un étudiant (identique à l'affichage et à la correction)"""
+    return quiz_shuffler.rng(quiz_id, user_id, 'draw')
+
+def load_answer_key(quiz_id):
+    """Clé de correction depuis la base (questions du quiz ou de ses pools)"""
+    pool_ids = [rule.pool_id for rule in QuizPoolRule.query.filter_by(quiz_id=quiz_id)]
+    if pool_ids:
+        return AnswerKey(PoolQuestion.query.filter(PoolQuestion.pool_id.in_(pool_ids)).all())
+    return AnswerKey(Question.query.filter_by(quiz_id=quiz_id).all())
+
+def quiz_regraded(quiz_id):
+    stats_rollup.rebuild_quiz(quiz_id)
+    leaderboards.invalidate(quiz_id)
+
+regrader = RegradeService(app, db, Result, ResultAnswers, load_answer_key, on_finished=quiz_regraded)
+
+def schedule_pool_regrade(pool_id):
+    """Re-correction des quiz qui tirent dans ce pool"""
+    for (quiz_id,) in db.session.query(QuizPoolRule.quiz_id).filter_by(pool_id=pool_id).distinct():
+        regrader.schedule(quiz_id, reason='pool')
+
+def parse_pool_rules(raw_rules):
+    """[{pool_id, count, tag?}] -> [(pool_id, count, tag)]; ValueError si invalide"""
+    if not isinstance(raw_rules, list):
+        raise ValueError('Le format des pools est invalide')
+    rules = []
+    for i, rule in enumerate(raw_rules, 1):
+        try:
+            pool_id, count = int(rule['pool_id']), int(rule['count'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Règle de tirage {i} invalide: pool_id et count requis')
+        tag = rule.get('tag') or None
+        if db.session.get(QuestionPool, pool_id) is None:
+            raise ValueError(f'Pool {pool_id} introuvable')
+        available = question_bank.available(pool_id, tag)
+        if count < 1 or count > available:
+            scope = f" (tag {tag})" if tag else ''
+            raise ValueError(f'Règle de tirage {i}: entre 1 et {available} questions disponibles dans le pool {pool_id}{scope}')
+        rules.append((pool_id, count, tag))
+    return rules
+
+def set_pool_rules(quiz, rules):
+    """Remplace les règles de tirage du quiz (sans commit)"""
+    QuizPoolRule.query.filter_by(quiz_id=quiz.id).delete(synchronize_session=False)
+    for pool_id, count, tag in rules:
+        db.session.add(QuizPoolRule(quiz_id=quiz.id, pool_id=pool_id, count=count, tag=tag))
+    quiz.total_points = question_bank.expected_points(rules)
+
+def invalidate_quiz(quiz_id):
+    """Après le commit d'une modification de quiz: catalogue étudiant + payload"""
+    quiz_catalogue.invalidate()
+    quiz_payloads.invalidate(quiz_id)
+
+def cached_payload_response(payload, user_id=None):
+    """Réponse à partir des octets pré-encodés: ETag / 304, compression mémorisée.
+    Avec user_id: questions et options dans l'ordre propre à l'étudiant."""
+    if user_id is None:
+        body, etag, variants = payload.body, payload.etag, payload.variants
+    elif payload.rules:
+        drawn = question_bank.fragments(payload.rules, draw_rng(payload.quiz_id, user_id))
+        body = quiz_shuffler.render(payload, user_id, drawn)
+        etag, variants = f"{payload.etag}-{question_bank.digest(payload.rules)}-u{user_id}", None
+    else:
+        body, etag, variants = quiz_shuffler.render(payload, user_id), f"{payload.etag}-u{user_id}", None
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    # Compression d'abord: l'ETag comparé est celui de la représentation envoyée
+    response = compressor.after_request(response, variants)
+    return response.make_conditional(request)
+
+@app.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
+@token_required
+def get_quiz_with_questions(current_user, quiz_id):
+    payload = quiz_payloads.get(quiz_id)
+    if payload is None:
+        abort(404)
+
+    # Vérifier si l'étudiant a accès à ce quiz
+    if current_user.role != 'admin' and not payload.is_open(datetime.now()):
+        return jsonify({'message': 'Quiz not available'}), 403
+
+    # Quiz banque: tirage propre à chaque étudiant
+    if current_user.role != 'admin' and (app.config['QUIZ_SHUFFLE'] or payload.rules):
+        return cached_payload_response(payload, current_user.id)
+    return cached_payload_response(payload)
+
+def submitted_option(question, answer, quiz_id, user_id, shuffled):
+    """Réponse QCM donnée par indice (reponse_index uniquement; reponse reste le texte
+    de l'option, même numérique): indice dans l'ordre affiché à l'étudiant, ramené à
+    l'option d'origine. None sinon."""
+    shown = answer.get('reponse_index')
+    if shown is None or not isinstance(question.options, list):
+        return None
+    try:
+        shown = int(shown)
+    except (TypeError, ValueError):
+        return None
+    if shuffled:
+        index = quiz_shuffler.original_option_index(quiz_id, user_id, question.id, len(question.options), shown)
+    else:
+        index = shown if 0 <= shown < len(question.options) else None
+    return None if index is None else question.options[index]
 
 @app.route('/api/quizzes', methods=['POST'])
 @token_required
@@ -1137,6 +1624,14 @@ def create_quiz(current_user):
     db.session.add(new_quiz)
     db.session.flush()  # Obtenir new_quiz.id sans commit définitif
 
+    # Quiz banque: règles de tirage au lieu de questions propres
+    if data.get('pools'):
+        try:
+            set_pool_rules(new_quiz, parse_pool_rules(data['pools']))
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
+
     # Créer les questions si fournies
     questions = (data.get('questions') or [])
     for q in questions:
@@ -1166,6 +1661,7 @@ def create_quiz(current_user):
             pass
 
     db.session.commit()
+    quiz_catalogue.invalidate()
 
     return jsonify({
         'message': 'Quiz created successfully',
@@ -1192,6 +1688,7 @@ def add_question(current_user, quiz_id):
     
     db.session.add(new_question)
     db.session.commit()
+    invalidate_quiz(quiz_id)
     
     return jsonify({
         'message': 'Question added successfully',
@@ -1200,6 +1697,7 @@ def add_question(current_user, quiz_id):
 
 @app.route('/api/quizzes/<int:quiz_id>/submit', methods=['POST'])
 @token_required
+@idempotent
 def submit_quiz(current_user, quiz_id):
     try:
         app.logger.info("=== DÉBUT SOUMISSION QUIZ ===")
@@ -1207,18 +1705,23 @@ def submit_quiz(current_user, quiz_id):
         quiz = Quiz.query.get_or_404(quiz_id)
         data = request.json
         
-        # Vérifier si l'utilisateur a déjà soumis ce quiz
-        existing_result = Result.query.filter_by(
-            user_id=current_user.id,
-            quiz_id=quiz_id
-        ).first()
-        
-        if existing_result:
+        def already_submitted():
+            existing_result = Result.query.filter_by(
+                user_id=current_user.id,
+                quiz_id=quiz_id
+            ).first()
+            if existing_result is None:
+                return None
             return jsonify({
                 'success': False,
                 'message': 'Vous avez déjà soumis ce quiz',
                 'score': existing_result.score
             }), 400
+
+        # Vérifier si l'utilisateur a déjà soumis ce quiz
+        duplicate = already_submitted()
+        if duplicate:
+            return duplicate
         
         # Vérifier si le quiz est toujours disponible
         if datetime.utcnow() > quiz.date_fin:
@@ -1227,131 +1730,42 @@ def submit_quiz(current_user, quiz_id):
                 'message': 'Le délai pour ce quiz est dépassé'
             }), 400
             
-        # Calcul du score
-        total_score = 0
-        total_questions = len(quiz.questions)
-        
+        # Quiz banque: les questions sont celles du tirage de l'étudiant (données préchargées)
+        rules = quiz_payloads.get(quiz_id).rules
+        drawn = question_bank.questions(rules, draw_rng(quiz_id, current_user.id)) if rules else None
+        shuffled = app.config['QUIZ_SHUFFLE'] or bool(rules)
+
         if not data.get('answers') or not isinstance(data['answers'], list):
             return jsonify({
                 'success': False,
                 'message': 'Format des réponses invalide'
             }), 400
-            
-        # Vérifier chaque réponse
+
+        # Questions posées à l'étudiant et clé de correction compilée
+        questions = drawn if drawn is not None else {q.id: q for q in quiz.questions}
+        key = AnswerKey(questions.values())
+
+        # Réponses normalisées {question_id: texte}; une seule réponse retenue par question
+        answers = {}
         for answer in data['answers']:
-            question = db.session.get(Question, answer.get('question_id'))
-            if not question:
+            try:
+                question = questions.get(int(answer.get('question_id')))
+            except (TypeError, ValueError):
                 continue
-                
-            if question.quiz_id != quiz_id:
+            if not question or str(question.id) in answers:
                 continue
-                
-            # Debug: Log des détails de comparaison
-            app.logger.info(f"DEBUG: Question ID {question.id}")
-            app.logger.info(f"DEBUG: Type de question: {question.type_question}")
-            app.logger.info(f"DEBUG: Réponse correcte stockée: '{question.reponse_correcte}' (type: {type(question.reponse_correcte)})")
-            app.logger.info(f"DEBUG: Réponse étudiant: '{answer.get('reponse')}' (type: {type(answer.get('reponse'))})")
-            app.logger.info(f"DEBUG: Options disponibles: {question.options}")
-            
-            # Gestion différente selon le type de question
+            reponse = answer.get('reponse', '')
             if question.type_question == 'choix_multiple':
-                # Pour les questions à choix multiples, la réponse correcte peut être un indice ou le texte
-                app.logger.info(f"DEBUG: Traitement comme choix_multiple")
-                try:
-                    if question.options and isinstance(question.options, list):
-                        # Si options existe et que reponse_correcte est un indice numérique
-                        if str(question.reponse_correcte).isdigit():
-                            correct_index = int(question.reponse_correcte)
-                            if 0 <= correct_index < len(question.options):
-                                # Récupérer le texte de l'option et le nettoyer
-                                correct_answer = str(question.options[correct_index]).strip().lower()
-                                # Nettoyer l'encodage UTF-8
-                                correct_answer = correct_answer.encode('utf-8', errors='ignore').decode('utf-8')
-                                app.logger.info(f"DEBUG: Réponse correcte trouvée par indice {correct_index}: '{correct_answer}'")
-                            else:
-                                app.logger.info(f"DEBUG: Indice {correct_index} invalide pour options de longueur {len(question.options)}")
-                                correct_answer = str(question.reponse_correcte).strip().lower()
-                        else:
-                            # Si c'est directement le texte de l'option
-                            correct_answer = str(question.reponse_correcte).strip().lower()
-                            correct_answer = correct_answer.encode('utf-8', errors='ignore').decode('utf-8')
-                            app.logger.info(f"DEBUG: Réponse correcte directe: '{correct_answer}'")
-                    else:
-                        correct_answer = str(question.reponse_correcte).strip().lower()
-                        correct_answer = correct_answer.encode('utf-8', errors='ignore').decode('utf-8')
-                except Exception as e:
-                    app.logger.error(f"DEBUG: Erreur lors du traitement choix_multiple: {e}")
-                    correct_answer = str(question.reponse_correcte).strip().lower()
-            else:
-                # Pour les autres types (vrai_faux, texte_libre)
-                correct_answer = str(question.reponse_correcte).strip().lower()
-                # Nettoyer l'encodage UTF-8
-                correct_answer = correct_answer.encode('utf-8', errors='ignore').decode('utf-8')
-            
-            # Nettoyer la réponse de l'étudiant aussi
-            student_answer_raw = str(answer.get('reponse', '')).strip().lower()
-            student_answer = student_answer_raw.encode('utf-8', errors='ignore').decode('utf-8')
-            
-            app.logger.info(f"DEBUG: Réponse normalisée - correcte: '{correct_answer}', étudiant: '{student_answer}'")
-            app.logger.info(f"DEBUG: Réponse étudiant brute: '{student_answer_raw}'")
-            
-            # Gestion spéciale pour les questions vrai/faux avec conversion langue
-            if question.type_question == 'vrai_faux':
-                # Mapping des équivalences vrai/faux dans différentes langues
-                truthy_values = {
-                    'vrai': ['vrai', 'true', 'yes', 'oui', '1'],
-                    'faux': ['faux', 'false', 'no', 'non', '0']
-                }
-                
-                # Déterminer si la réponse correcte attend "vrai" ou "faux"
-                if correct_answer in truthy_values['vrai']:
-                    expected_is_true = True
-                elif correct_answer in truthy_values['faux']:
-                    expected_is_true = False
-                else:
-                    # Fallback à la comparaison directe
-                    expected_is_true = None
-                
-                # Vérifier si la réponse étudiant correspond
-                student_is_true = None
-                for true_val in truthy_values['vrai']:
-                    if student_answer == true_val:
-                        student_is_true = True
-                        break
-                for false_val in truthy_values['faux']:
-                    if student_answer == false_val:
-                        student_is_true = False
-                        break
-                
-                if expected_is_true is not None and student_is_true is not None:
-                    is_correct = expected_is_true == student_is_true
-                    app.logger.info(f"DEBUG: Question vrai/faux - Attendu: {'vrai' if expected_is_true else 'faux'}, Reçu: {'vrai' if student_is_true else 'faux'}")
-                else:
-                    # Fallback à la comparaison directe si pas de correspondance trouvée
-                    is_correct = correct_answer == student_answer
-                    app.logger.info(f"DEBUG: Fallback comparaison directe pour vrai/faux")
-            else:
-                # Comparaison normale pour les autres types
-                is_correct = correct_answer == student_answer
-            
-            # Comparaison avec gestion d'erreurs
-            try:
-                if is_correct:
-                    app.logger.info(f"DEBUG: ✅ Réponse correcte! Ajout de {question.points} points")
-                    total_score += question.points
-                else:
-                    app.logger.error(f"DEBUG: ❌ Réponse incorrecte - Attendu: '{correct_answer}', Reçu: '{student_answer}'")
-            except Exception as e:
-                app.logger.error(f"DEBUG: Erreur lors de la comparaison: {e}")
-                # Fallback: essayer une comparaison plus permissive
-                if correct_answer in student_answer or student_answer in correct_answer:
-                    app.logger.info(f"DEBUG: ⚠️ Correspondance partielle - Ajout de {question.points} points")
-                    total_score += question.points
-                else:
-                    app.logger.error(f"DEBUG: ❌ Aucune correspondance trouvée")
+                reponse = submitted_option(question, answer, quiz_id, current_user.id, shuffled) or reponse
+            answers[str(question.id)] = normalize(reponse)
+
+        total_score, correct_answers = key.score(answers)
+        total_questions = len(questions)
+        app.logger.debug(f"Soumission quiz {quiz_id} / utilisateur {current_user.id}: "
+                         f"{correct_answers}/{len(answers)} réponses correctes, score {total_score}")
                 
         # Calculer le pourcentage de réussite
-        max_score = sum(q.points for q in quiz.questions)
+        max_score = key.max_score()
         score_percentage = (total_score / max_score * 100) if max_score > 0 else 0
         
         # Enregistrer le résultat
@@ -1363,8 +1777,22 @@ def submit_quiz(current_user, quiz_id):
             statut='soumis'
         )
         
-        db.session.add(result)
-        db.session.commit()
+        first = db.session.query(Result.id).filter_by(user_id=current_user.id).first() is None
+        try:
+            db.session.add(result)
+            db.session.flush()
+            # Réponses conservées pour une éventuelle re-correction
+            db.session.add(ResultAnswers(result_id=result.id, quiz_id=quiz_id, answers=answers))
+            stats_rollup.record_result(result, first=first)
+            db.session.commit()
+        except IntegrityError:
+            # Soumission concurrente du même quiz: uq_result_user_quiz n'en garde qu'une
+            db.session.rollback()
+            duplicate = already_submitted()
+            if duplicate:
+                return duplicate
+            raise
+        leaderboards.record(result)
         
         return jsonify({
             'success': True,
@@ -1374,7 +1802,7 @@ def submit_quiz(current_user, quiz_id):
                 'max_score': max_score,
                 'percentage': score_percentage,
                 'total_questions': total_questions,
-                'correct_answers': total_score,  # Si chaque question vaut 1 point
+                'correct_answers': correct_answers,
                 'time_used': data.get('temps_utilise', 0)
             }
         })
@@ -1389,6 +1817,18 @@ def submit_quiz(current_user, quiz_id):
         }), 500
 
 # Résultats d'un étudiant
+def student_results(student_id):
+    rows = db.session.query(
+        Result.id, Result.quiz_id, Result.score, Result.temps_utilise, Result.date_passage
+    ).filter(Result.user_id == student_id).order_by(Result.date_passage.desc())
+    return [{
+        'id_resultat': r.id,
+        'id_quiz': r.quiz_id,
+        'score': r.score,
+        'temps_utilise': r.temps_utilise,
+        'date_passage': r.date_passage.isoformat() if r.date_passage else None
+    } for r in rows]
+
 @app.route('/api/student/<int:student_id>/results', methods=['GET'])
 @token_required
 def get_student_results(current_user, student_id):
@@ -1397,21 +1837,93 @@ def get_student_results(current_user, student_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
 
     try:
-        results = Result.query.filter_by(user_id=student_id).order_by(Result.date_passage.desc()).all()
+        return jsonify({
+            'success': True,
+            'data': student_results(student_id)
+        })
 
-        data = [{
-            'id_resultat': r.id,
-            'id_quiz': r.quiz_id,
-            'score': r.score,
-            'temps_utilise': r.temps_utilise,
-            'date_passage': r.date_passage.isoformat() if r.date_passage else None
-        } for r in results]
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la récupération des résultats',
+            'details': str(e)
+        }), 500
 
+@app.route('/api/quizzes/<int:quiz_id>/leaderboard', methods=['GET'])
+@token_required
+def get_quiz_leaderboard(current_user, quiz_id):
+    """Meilleurs étudiants du quiz (?limit=, 10 par défaut): score décroissant, puis temps croissant"""
+    try:
+        # Pas de classement (ni d'entrée en mémoire) pour un quiz inexistant
+        if db.session.get(Quiz, quiz_id) is None:
+            return jsonify({'success': False, 'error': 'Quiz non trouvé'}), 404
+        top, total = leaderboards.top(quiz_id, request.args.get('limit', DEFAULT_TOP, type=int))
+        names = dict(db.session.query(User.id, User.username).filter(
+            User.id.in_([user_id for _, user_id, _, _ in top]))) if top else {}
         return jsonify({
             'success': True,
-            'data': data
+            'data': [{
+                'rang': rank,
+                'id_etudiant': user_id,
+                'etudiant': names.get(user_id),
+                'score': score,
+                'temps_utilise': temps
+            } for rank, user_id, score, temps in top],
+            'total': total
         })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la récupération du classement',
+            'details': str(e)
+        }), 500
+
+@app.route('/api/quizzes/<int:quiz_id>/rank/<int:student_id>', methods=['GET'])
+@token_required
+def get_quiz_rank(current_user, quiz_id, student_id):
+    """Rang de l'étudiant sur le quiz (ex aequo: même rang)"""
+    if current_user.role != 'admin' and current_user.id != student_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        if db.session.get(Quiz, quiz_id) is None:
+            return jsonify({'success': False, 'error': 'Quiz non trouvé'}), 404
+        rank = leaderboards.rank(quiz_id, student_id)
+        if rank is None:
+            return jsonify({'success': False, 'error': 'Aucun résultat pour ce quiz'}), 404
+        return jsonify({'success': True, 'data': {'id_quiz': quiz_id, 'id_etudiant': student_id, **rank}})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la récupération du rang',
+            'details': str(e)
+        }), 500
 
+@app.route('/api/admin/results', methods=['GET'])
+@app.route('/api/admin/quiz/<int:quiz_id>/results', methods=['GET'])
+@token_required
+def get_admin_results(current_user, quiz_id=None):
+    """Résultats avec quiz et étudiant, ?quiz_id=&student_id=&sort=date|score&order=&cursor=&limit="""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        quiz_id = quiz_id or request.args.get('quiz_id', type=int)
+        student_id = request.args.get('student_id', type=int)
+        cursor = request.args.get('cursor')
+        page = result_browser.page(
+            quiz_id=quiz_id,
+            student_id=student_id,
+            sort=request.args.get('sort', 'date'),
+            order=request.args.get('order', 'desc'),
+            cursor=cursor,
+            limit=request.args.get('limit', type=int)
+        )
+        body = {'success': True, 'data': page['items'], 'next_cursor': page['next_cursor']}
+        # Résumé par quiz avec la première page seulement
+        if not cursor:
+            body['summary'] = result_browser.summary(quiz_id, student_id)
+        return jsonify(body)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1422,6 +1934,7 @@ def get_student_results(current_user, student_id):
 # Route pour créer un nouveau paiement
 @app.route('/api/payments', methods=['POST'])
 @token_required
+@idempotent
 def create_payment(current_user):
     try:
         data = request.get_json()
@@ -1469,7 +1982,8 @@ def create_payment(current_user):
             'mode_paiement': data.get('mode_paiement', 'espece'),
             'code_ref_mvola': data.get('code_ref_mvola', ''),
             'montant': montant,
-            'statut': data.get('statut', 'en_attente'),
+            # Seul un admin enregistre directement un paiement encaissé
+            'statut': data.get('statut', 'en_attente') if current_user.role == 'admin' else 'en_attente',
             'tranche_restante': data.get('tranche_restante', 0),
             'date_paiement': data.get('date_paiement') or datetime.utcnow().strftime('%Y-%m-%d')
         }
@@ -1477,7 +1991,10 @@ def create_payment(current_user):
         # Créer le paiement
         new_payment = Payment(**payment_data)
         db.session.add(new_payment)
+        stats_rollup.record_payment(new_payment)
+        balance_ledger.record_payments([new_payment])
         db.session.commit()
+        publish_payment(new_payment)
 
         return jsonify({
             'success': True,
@@ -1510,37 +2027,26 @@ def get_payments():
             User.email
         ).join(
             User, Payment.user_id == User.id
-        ).all()
-
-        print(f"Nombre de paiements trouvés: {len(payments)}")
+        ).yield_per(1000)
 
         # Préparer les données de réponse avec la structure attendue par le frontend
-        result = []
-        for p, username, email in payments:
-            payment_data = {
-                'id_paiement': p.id,  # Frontend attend id_paiement
-                'id_etudiant': p.user_id,  # Frontend attend id_etudiant
-                'user_id': p.user_id,
-                'mode_paiement': p.mode_paiement,
-                'code_ref_mvola': p.code_ref_mvola,
-                'montant': float(p.montant) if p.montant else 0,
-                'statut': p.statut,
-                'tranche_restante': float(p.tranche_restante) if p.tranche_restante else 0,
-                'date_paiement': p.date_paiement.isoformat() if p.date_paiement else None,
-                'reference': f"REF-{p.id}",
-                'commentaire': f"Paiement {p.mode_paiement} du {p.date_paiement.strftime('%d/%m/%Y') if p.date_paiement else 'date inconnue'}"
-            }
-            result.append(payment_data)
-
-        print("Données des paiements:", result)
-
-        response = jsonify({
-            'success': True,
-            'data': result
-        })
+        def payments_data():
+            for p, username, email in payments:
+                yield {
+                    'id_paiement': p.id,  # Frontend attend id_paiement
+                    'id_etudiant': p.user_id,  # Frontend attend id_etudiant
+                    'user_id': p.user_id,
+                    'mode_paiement': p.mode_paiement,
+                    'code_ref_mvola': p.code_ref_mvola,
+                    'montant': p.montant or 0,
+                    'statut': p.statut,
+                    'tranche_restante': p.tranche_restante or 0,
+                    'date_paiement': p.date_paiement,
+                    'reference': f"REF-{p.id}",
+                    'commentaire': f"Paiement {p.mode_paiement} du {p.date_paiement.strftime('%d/%m/%Y') if p.date_paiement else 'date inconnue'}"
+                }
 
-        print("Réponse envoyée avec succès")
-        return response
+        return json_list_response(payments_data(), success=True)
 
     except Exception as e:
         print(f"Erreur lors de la récupération des paiements: {str(e)}")
@@ -1574,19 +2080,20 @@ def validate_payment(payment_id):
             }), 404
         
         # Valider le paiement
+        stats_rollup.move_payment(payment, 'complet')
+        balance_ledger.move_payments([payment], 'complet')
         payment.statut = 'complet'
-        payment.tranche_restante = 0
+        payment.tranche_restante = balance_ledger.remaining(payment.user_id)
         
         # Activer l'utilisateur
         user.actif = True
         
         # Générer un nouveau code d'authentification
-        import random
-        import string
-        new_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        user.code_auth = new_code
+        new_code = generate_code()
+        set_auth_code(user, new_code)
         
         db.session.commit()
+        publish_payment(payment)
         
         print(f"Paiement {payment_id} validé pour l'utilisateur {user.email}")
         print(f"Nouveau code d'authentification: {new_code}")
@@ -1633,19 +2140,21 @@ def mark_partial_payment(payment_id):
             }), 404
         
         # Marquer comme paiement partiel
+        stats_rollup.move_payment(payment, 'par_tranche')
+        balance_ledger.move_payments([payment], 'par_tranche')
         payment.statut = 'par_tranche'
-        payment.tranche_restante = 25000  # Montant restant par défaut
+        # Reste dû d'après le journal (frais - paiements encaissés)
+        payment.tranche_restante = balance_ledger.remaining(payment.user_id)
         
         # Activer l'utilisateur avec accès partiel
         user.actif = True
         
         # Générer un nouveau code d'authentification
-        import random
-        import string
-        new_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        user.code_auth = new_code
+        new_code = generate_code()
+        set_auth_code(user, new_code)
         
         db.session.commit()
+        publish_payment(payment)
         
         print(f"Paiement {payment_id} marqué comme partiel pour l'utilisateur {user.email}")
         print(f"Nouveau code d'authentification: {new_code}")
@@ -1684,8 +2193,12 @@ def reject_payment(payment_id):
             }), 404
         
         # Supprimer le paiement
+        user_id = payment.user_id
+        stats_rollup.record_payment(payment, sign=-1)
+        balance_ledger.remove_payments([payment])
         db.session.delete(payment)
         db.session.commit()
+        event_bus.publish('payment_deleted', {'id_paiement': payment_id}, user_id=user_id)
         
         print(f"Paiement {payment_id} rejeté et supprimé")
         
@@ -1703,18 +2216,134 @@ def reject_payment(payment_id):
             'details': str(e)
         }), 500
 
-# Route pour lister les utilisateurs (à des fins de débogage uniquement)
-@app.route('/api/debug/users', methods=['GET'])
-def list_users():
+def commit_payment_batches(outcomes):
+    """Commit des lots (PaymentBatch), puis événements SSE et emails de code en un seul envoi groupé"""
+    # Construits avant le commit: évite un rechargement par objet après expiration
+    updated = [(payment.user_id, payment_item(payment)) for outcome in outcomes for payment in outcome.updated]
+    deleted = [entry for outcome in outcomes for entry in outcome.deleted]
+    messages = [auth_email(user.email, student_display_name(user), code)
+                for outcome in outcomes for user, code in outcome.emails]
+    db.session.commit()
+
+    for user_id, item in updated:
+        event_bus.publish('payment', item, user_id=user_id)
+    for payment_id, user_id in deleted:
+        event_bus.publish('payment_deleted', {'id_paiement': payment_id}, user_id=user_id)
+    return mail_queue.enqueue(messages)
+
+# Route pour traiter un lot de paiements (admin)
+@app.route('/api/admin/payments/bulk/<action>', methods=['POST'])
+@token_required
+def bulk_payments(current_user, action):
+    """Valide, marque partiels ou rejette les paiements {"ids": [...]} ou {"filter": {...}} en une transaction.
+
+    filter: statut, mode_paiement, start, end (AAAA-MM-JJ). Réponse: issue par paiement,
+    emails de code envoyés par lot après le commit."""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    if action not in BULK_ACTIONS:
+        return jsonify({'success': False, 'error': f'Action inconnue: {action}'}), 404
+
     try:
-        users = User.query.all()
-        users_list = [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'actif': user.actif
-        } for user in users]
+        ids, filters = parse_bulk_selection(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        outcome = payment_batch.apply(action, ids, filters)
+        emails_queued = commit_payment_batches([outcome])
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Erreur lors du traitement en masse des paiements ({action}): {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors du traitement en masse des paiements',
+            'details': str(e)
+        }), 500
+
+    summary = outcome.summary()
+    app.logger.info(f"Paiements en masse ({action}): {summary['succeeded']}/{summary['total']} traités, "
+                    f"{emails_queued} emails en file")
+    return jsonify({
+        'success': True,
+        'data': {**summary, 'emails_queued': emails_queued, 'items': outcome.items}
+    })
+
+# Route pour rapprocher un relevé MVola avec les paiements en attente (admin)
+@app.route('/api/admin/payments/mvola/reconcile', methods=['POST'])
+@token_required
+def reconcile_mvola_statement(current_user):
+    """Importe un relevé opérateur (CSV, champ file) et valide en masse les paiements rapprochés.
+
+    ?dry_run=true: rapport seul, ni transactions ni paiements enregistrés."""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'message': 'Aucun fichier fourni'}), 400
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+
+    try:
+        report = mvola_reconciler.reconcile(statement_rows(file.stream))
+        validated = emails_queued = 0
+        if dry_run:
+            db.session.rollback()
+        else:
+            ids = report.payment_ids
+            outcomes = [payment_batch.apply('validate', ids=ids[i:i + MAX_BULK_PAYMENTS])
+                        for i in range(0, len(ids), MAX_BULK_PAYMENTS)]
+            emails_queued = commit_payment_batches(outcomes)
+            validated = sum(outcome.summary()['succeeded'] for outcome in outcomes)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Erreur lors du rapprochement MVola: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors du rapprochement du relevé MVola',
+            'details': str(e)
+        }), 500
+
+    result = report.as_dict()
+    result['summary'].update(dry_run=dry_run, validated=validated, emails_queued=emails_queued)
+    app.logger.info(f"Relevé MVola {file.filename}: {result['summary']}")
+    return jsonify({'success': True, 'data': result})
+
+# Route pour vérifier une référence MVola (relevés importés)
+@app.route('/api/payments/verify-mvola', methods=['POST'])
+@token_required
+def verify_mvola(current_user):
+    data = request.get_json(silent=True) or {}
+    if current_user.role != 'admin':
+        # Un étudiant ne vérifie que les références de ses propres paiements
+        own = db.session.query(Payment.id).filter(
+            Payment.user_id == current_user.id,
+            Payment.ref_mvola_norm == normalize_reference(data.get('code'))
+        ).first()
+        if own is None:
+            return jsonify({'success': True, 'data': {'valid': False, 'amount': 0}})
+    found = mvola_reconciler.verify(data.get('code'))
+    if found is None:
+        return jsonify({'success': True, 'data': {'valid': False, 'amount': 0}})
+    amount, used = found
+    # Une transaction déjà rapprochée ne peut pas servir pour un second paiement
+    return jsonify({'success': True, 'data': {'valid': not used, 'amount': amount, 'already_used': used}})
+
+# Route pour lister les utilisateurs (à des fins de débogage uniquement)
+@app.route('/api/debug/users', methods=['GET'])
+def list_users():
+    try:
+        users = User.query.all()
+        users_list = [{
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': user.role,
+            'actif': user.actif
+        } for user in users]
         return jsonify({
             'status': 'success',
             'count': len(users_list),
@@ -1727,35 +2356,44 @@ def list_users():
         }), 500
 
 # Routes pour les documents
+def document_item(doc):
+    return {
+        'id_document': doc.id,
+        'id': doc.id,
+        'titre': doc.titre,
+        'type': doc.type,
+        'chemin': doc.chemin,
+        'telechargeable': doc.telechargeable,
+        'date_upload': doc.date_upload.isoformat(),
+        'file_exists': True,  # Tous ces documents existent physiquement
+        # Vignette et nombre de pages lus depuis le cache des dérivés, sans ouvrir le PDF
+        **(pdf_derivatives.describe(doc.chemin) if doc.chemin.lower().endswith('.pdf')
+           else {'page_count': None, 'thumbnail_url': None, 'derivatives_ready': False})
+    }
+
+def load_document_listing():
+    """Documents dont le fichier existe (pour DocumentListing) et dérivés PDF en attente"""
+    documents = []
+    for doc in Document.query.all():
+        # Construire le chemin complet du fichier
+        filepath = os.path.join(UPLOAD_FOLDER, os.path.basename(doc.chemin))
+        if os.path.exists(filepath):
+            documents.append(document_item(doc))
+        else:
+            app.logger.warning(f"Document {doc.id} ({doc.titre}) référencé en base mais fichier manquant: {filepath}")
+    pending = any(d['chemin'].lower().endswith('.pdf') and not d['derivatives_ready'] for d in documents)
+    return documents, pending
+
+document_listing = DocumentListing(load_document_listing)
+
 @app.route('/api/documents', methods=['GET'])
 @token_required
 def get_documents(current_user):
     """Liste les documents qui existent physiquement"""
     try:
-        documents = Document.query.all()
-
-        # Filtrer pour ne garder que les documents dont les fichiers existent
-        existing_documents = []
-        for doc in documents:
-            # Construire le chemin complet du fichier
-            filepath = os.path.join(UPLOAD_FOLDER, os.path.basename(doc.chemin))
-            if os.path.exists(filepath):
-                existing_documents.append(doc)
-            else:
-                app.logger.warning(f"Document {doc.id} ({doc.titre}) référencé en base mais fichier manquant: {filepath}")
-
         return jsonify({
             'success': True,
-            'data': [{
-                'id_document': doc.id,
-                'id': doc.id,
-                'titre': doc.titre,
-                'type': doc.type,
-                'chemin': doc.chemin,
-                'telechargeable': doc.telechargeable,
-                'date_upload': doc.date_upload.isoformat(),
-                'file_exists': True  # Tous ces documents existent physiquement
-            } for doc in existing_documents]
+            'data': document_listing.get()
         })
     except Exception as e:
         app.logger.error(f"Erreur lors de la récupération des documents: {str(e)}")
@@ -1806,8 +2444,10 @@ def preview_document(current_user, document_id):
         if current_user.role not in ['admin', 'student']:
             return jsonify({'success': False, 'error': 'Accès non autorisé'}), 403
 
-        # Servir le fichier pour prévisualisation (pas en téléchargement)
-        return send_from_directory(UPLOAD_FOLDER, os.path.basename(doc.chemin))
+        # Servir le fichier pour prévisualisation (pas en téléchargement),
+        # de préférence la copie linéarisée pour un affichage progressif dans PDF.js
+        filename = pdf_derivatives.linearized_name(doc.chemin) or os.path.basename(doc.chemin)
+        return send_from_directory(UPLOAD_FOLDER, filename, mimetype=('application/pdf' if filename.lower().endswith('.pdf') else None))
 
     except Exception as e:
         app.logger.error(f"Erreur lors de la prévisualisation du document {document_id}: {str(e)}")
@@ -1820,9 +2460,9 @@ def view_document(filename):
 
     app.logger.info(f"🔍 ACCÈS VISUALISATION: IP={client_ip}, UA='{user_agent[:100]}', FILE='{filename}'")
 
-    # Vérifier d'abord si le fichier existe
+    # Vérifier d'abord si le fichier existe (les dérivés ne sont pas des documents)
     filepath = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(filepath):
+    if is_derivative(filename) or not os.path.exists(filepath):
         app.logger.warning(f"❌ FICHIER NON TROUVÉ: IP={client_ip}, FILE='{filename}'")
         return jsonify({
             'success': False,
@@ -1848,10 +2488,15 @@ def serve_document_directly(filename):
     """Sert le PDF directement pour l'iframe"""
     filepath = os.path.join(UPLOAD_FOLDER, filename)
 
-    # Vérifier que le fichier existe
-    if not os.path.exists(filepath):
+    # Vérifier que le fichier existe (les dérivés ne sont servis qu'à la place de leur original)
+    if is_derivative(filename) or not os.path.exists(filepath):
         abort(404, "Fichier non trouvé")
 
+    # Copie linéarisée si disponible: PDF.js peut afficher la page 1 avant la fin du transfert
+    linear_name = pdf_derivatives.linearized_name(filename)
+    if linear_name:
+        filepath = os.path.join(UPLOAD_FOLDER, linear_name)
+
     response = send_file(
         filepath,
         mimetype='application/pdf',
@@ -1862,15 +2507,20 @@ def serve_document_directly(filename):
     response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
     response.headers['Cache-Control'] = 'public, max-age=3600'
     response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
 # Route de logging de sécurité
 @app.route('/api/log/access', methods=['POST'])
 def log_security_access():
     """Log les tentatives d'accès pour monitoring de sécurité"""
     try:
-        data = request.get_json() or {}
-        app.logger.warning(f"SECURITY_LOG: {request.remote_addr} - {request.headers.get('User-Agent', '')[:100]} - {data}")
+        # force=True: navigator.sendBeacon envoie du text/plain
+        data = request.get_json(force=True, silent=True) or {}
+        if not isinstance(data, dict):
+            data = {'details': data}
+        queued = event_ingestor.submit(build_access_event('access', data))
 
-        return jsonify({'success': True}), 200
+        return jsonify({'success': True, 'queued': queued}), 200
     except Exception as e:
         app.logger.error(f"Erreur lors du logging de sécurité: {str(e)}")
         return jsonify({'success': False}), 500
@@ -1879,28 +2529,184 @@ def log_security_access():
 def log_viewer_access():
     """Log spécifique pour le visualiseur PDF"""
     try:
-        data = request.get_json() or {}
-        log_entry = {
-            'ip': request.remote_addr,
-            'user_agent': request.headers.get('User-Agent', '')[:200],
-            'filename': data.get('filename', 'unknown'),
-            'action': data.get('action', 'unknown'),
-            'violations': data.get('violations', 0),
-            'timestamp': datetime.utcnow().isoformat()
-        }
-
-        app.logger.info(f"PDF_VIEWER_LOG: {log_entry}")
+        data = request.get_json(force=True, silent=True) or {}
+        if not isinstance(data, dict):
+            data = {'details': data}
 
-        # Ici vous pourriez sauvegarder dans une base de données
-        # ou envoyer vers un système de monitoring externe
+        # Dépôt dans la file en mémoire: persistance par lots et SecurityMonitor
+        # sont assurés par le thread d'écriture, sans commit par événement
+        queued = event_ingestor.submit(build_access_event('viewer', data))
 
-        return jsonify({'success': True}), 200
+        return jsonify({'success': True, 'queued': queued}), 200
     except Exception as e:
         app.logger.error(f"Erreur lors du logging viewer: {str(e)}")
         return jsonify({'success': False}), 500
 
+@app.route('/api/admin/security/ingestion', methods=['GET'])
+@token_required
+def get_ingestion_stats(current_user):
+    """État du pipeline d'ingestion et rapport du SecurityMonitor en direct"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    return jsonify({
+        'success': True,
+        'data': {
+            'ingestion': dict(event_ingestor.stats, queued=event_ingestor.pending()),
+            'monitor': security_monitor.generate_report()
+        }
+    })
+
+def parse_analytics_window(args):
+    """Fenêtre [start, end) depuis ?start=&end= (ISO) ou ?hours= (défaut 24h)"""
+    end = datetime.fromisoformat(args['end']) if args.get('end') else datetime.utcnow()
+    if args.get('start'):
+        start = datetime.fromisoformat(args['start'])
+    else:
+        start = end - timedelta(hours=float(args.get('hours', 24)))
+    if start >= end:
+        raise ValueError('start doit précéder end')
+    return start, end
+
+def default_granularity(start, end):
+    span = end - start
+    if span <= timedelta(hours=6):
+        return 'minute'
+    if span <= timedelta(days=14):
+        return 'hour'
+    return 'day'
+
+@app.route('/api/admin/security/analytics/top', methods=['GET'])
+@token_required
+def get_security_top(current_user):
+    """Top-k par IP, UA normalisé ou fichier sur une fenêtre arbitraire"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        start, end = parse_analytics_window(request.args)
+        dimension = request.args.get('dimension', 'ip')
+        metric = request.args.get('metric', 'violations')
+        k = min(int(request.args.get('k', 10)), 100)
+        # Fenêtre effective: bords élargis là où les agrégats fins sont purgés
+        start, end = widen_window(start, end)
+        return jsonify({
+            'success': True,
+            'data': {
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'totals': security_analytics.totals(start, end),
+                'top': security_analytics.top(dimension, start, end, metric, k)
+            }
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/admin/security/analytics/series', methods=['GET'])
+@token_required
+def get_security_series(current_user):
+    """Comptes par bucket de temps pour une dimension (et éventuellement une clé)"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        start, end = parse_analytics_window(request.args)
+        dimension = request.args.get('dimension', 'ip')
+        granularity = request.args.get('granularity') or default_granularity(start, end)
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularité inconnue: {granularity}")
+        granularity = retained_granularity(granularity, start)
+        return jsonify({
+            'success': True,
+            'data': {
+                'dimension': dimension,
+                'key': request.args.get('key'),
+                'granularity': granularity,
+                'series': security_analytics.series(dimension, start, end, granularity, request.args.get('key'))
+            }
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/admin/security/analytics/documents/<path:filename>', methods=['GET'])
+@token_required
+def get_security_document(current_user, filename):
+    """Détail des accès à un document"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        start, end = parse_analytics_window(request.args)
+        granularity = request.args.get('granularity') or default_granularity(start, end)
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularité inconnue: {granularity}")
+        return jsonify({
+            'success': True,
+            'data': security_analytics.document(filename, start, end, granularity)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+def parse_stats_period(args):
+    """Période [start, end] en jours depuis ?start=&end= (AAAA-MM-JJ), bornes facultatives"""
+    start, end = parse_day(args.get('start')), parse_day(args.get('end'))
+    if start and end and start > end:
+        raise ValueError('start doit précéder end')
+    return start, end
+
+def stats_period(start, end):
+    return {'start': start.isoformat() if start else None, 'end': end.isoformat() if end else None}
+
+@app.route('/api/admin/stats/general', methods=['GET'])
+@token_required
+def get_stats_general(current_user):
+    """Étudiants, recettes, paiements en attente, quiz soumis et score moyen"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        start, end = parse_stats_period(request.args)
+        return jsonify({
+            'success': True,
+            'data': {**stats_rollup.general(start, end), **stats_period(start, end)}
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/admin/stats/payments', methods=['GET'])
+@token_required
+def get_stats_payments(current_user):
+    """Paiements et montants par jour, par mois, par mode de paiement et par statut"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        start, end = parse_stats_period(request.args)
+        return jsonify({
+            'success': True,
+            'data': {**stats_rollup.payments(start, end), **stats_period(start, end)}
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/admin/stats/quizzes', methods=['GET'])
+@token_required
+def get_stats_quizzes(current_user):
+    """Soumissions par jour, score moyen par quiz et taux de participation"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        start, end = parse_stats_period(request.args)
+        data = stats_rollup.quizzes(start, end)
+        quiz_ids = [entry['quiz_id'] for entry in data['average_scores']]
+        titles = dict(db.session.query(Quiz.id, Quiz.titre).filter(Quiz.id.in_(quiz_ids))) if quiz_ids else {}
+        for entry in data['average_scores']:
+            entry['quiz_title'] = titles.get(entry['quiz_id'])
+        return jsonify({
+            'success': True,
+            'data': {**data, **stats_period(start, end)}
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @app.route('/api/documents/<filename>/download')
 def download_document_by_filename(filename):
+    if is_derivative(filename):
+        abort(404, "Fichier non trouvé")
     filepath = os.path.join(UPLOAD_FOLDER, filename)
 
     # ENVOYER EN MODE ATTACHMENT (téléchargement)
@@ -1909,6 +2715,25 @@ def download_document_by_filename(filename):
         as_attachment=True,   # ← Téléchargement forcé
         download_name=filename
     )
+def payment_item(payment):
+    return {
+        'id_paiement': payment.id,
+        'id': payment.id,
+        'mode_paiement': payment.mode_paiement,
+        'code_ref_mvola': payment.code_ref_mvola,
+        'montant': float(payment.montant) if payment.montant else 0,
+        'statut': payment.statut,
+        'tranche_restante': float(payment.tranche_restante) if payment.tranche_restante else 0,
+        'date_paiement': payment.date_paiement.isoformat() if payment.date_paiement else None
+    }
+
+def student_payments(student_id):
+    return [payment_item(payment) for payment in Payment.query.filter_by(user_id=student_id).all()]
+
+def publish_payment(payment):
+    """Pousse l'état d'un paiement à son étudiant (après commit)"""
+    event_bus.publish('payment', payment_item(payment), user_id=payment.user_id)
+
 @app.route('/api/student/<int:student_id>/payments', methods=['GET'])
 @token_required
 def get_student_payments(current_user, student_id):
@@ -1917,24 +2742,9 @@ def get_student_payments(current_user, student_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     try:
-        payments = Payment.query.filter_by(user_id=student_id).all()
-        
-        payments_data = []
-        for payment in payments:
-            payments_data.append({
-                'id_paiement': payment.id,
-                'id': payment.id,
-                'mode_paiement': payment.mode_paiement,
-                'code_ref_mvola': payment.code_ref_mvola,
-                'montant': float(payment.montant) if payment.montant else 0,
-                'statut': payment.statut,
-                'tranche_restante': float(payment.tranche_restante) if payment.tranche_restante else 0,
-                'date_paiement': payment.date_paiement.isoformat() if payment.date_paiement else None
-            })
-        
         return jsonify({
             'success': True,
-            'data': payments_data
+            'data': student_payments(student_id)
         })
         
     except Exception as e:
@@ -1944,7 +2754,79 @@ def get_student_payments(current_user, student_id):
             'details': str(e)
         }), 500
 
+# Soldes étudiants (journal des mouvements, voir balance_ledger)
+def balance_item(balance, user_id=None):
+    if balance is None:
+        return {'user_id': user_id, 'total_du': 0, 'total_paye': 0, 'reste': 0, 'statut': 'solde', 'date_maj': None}
+    return {
+        'user_id': balance.user_id,
+        'total_du': balance.total_du,
+        'total_paye': balance.total_paye,
+        'reste': max(0.0, balance.reste),
+        'statut': balance.statut,
+        'date_maj': balance.date_maj.isoformat() if balance.date_maj else None
+    }
+
+def student_balance(student_id):
+    return balance_item(db.session.get(StudentBalance, student_id), student_id)
+
+@app.route('/api/student/<int:student_id>/balance', methods=['GET'])
+@token_required
+def get_student_balance(current_user, student_id):
+    if current_user.role != 'admin' and current_user.id != student_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    return jsonify({'success': True, 'data': student_balance(student_id)})
+
+@app.route('/api/admin/balances', methods=['GET'])
+@token_required
+def get_balances(current_user):
+    """Totaux de la promotion et étudiants avec un reste dû (?statut=partiel|impaye|solde, ?limit=)"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    statut = request.args.get('statut')
+    if statut not in (None, 'solde', 'partiel', 'impaye'):
+        return jsonify({'success': False, 'error': f'Statut inconnu: {statut}'}), 400
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit doit être un entier'}), 400
+
+    try:
+        summary = balance_ledger.summary()
+        summary['paiements_en_attente'] = db.session.query(db.func.count(Payment.id)).filter(
+            Payment.statut == 'en_attente').scalar()
+        students = [{**balance_item(balance), 'username': username, 'email': email}
+                    for balance, username, email in balance_ledger.owing(statut, limit)]
+        return jsonify({'success': True, 'data': {'summary': summary, 'students': students}})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la récupération des soldes',
+            'details': str(e)
+        }), 500
+
 # Route pour les notifications d'un étudiant spécifique
+def notification_item(n, read=False):
+    return {
+        'id_notification': n.id,
+        'titre': n.titre,
+        'message': n.message,
+        'type_cible': n.type_cible,
+        'id_etudiant': n.id_etudiant,
+        'date_envoi': n.date_envoi.isoformat(),
+        'lu': read
+    }
+
+def student_notifications(student_id, since=None):
+    """Notifications visibles par l'étudiant (plus récentes d'abord), id > since si fourni"""
+    query = Notification.query.filter(notification_reads.visible(student_id))
+    if since:
+        query = query.filter(Notification.id > since)
+    notifications = query.order_by(Notification.date_envoi.desc(), Notification.id.desc()).all()
+    state = notification_reads.state(student_id)
+    return [notification_item(n, notification_reads.is_read(n.id, state)) for n in notifications]
+
 @app.route('/api/student/<int:student_id>/notifications', methods=['GET'])
 @token_required
 def get_student_notifications(current_user, student_id):
@@ -1953,25 +2835,14 @@ def get_student_notifications(current_user, student_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     try:
-        # Notifications destinées à tous + notifications ciblées à l'étudiant
-        notifications = Notification.query.filter(
-            (Notification.type_cible == 'tous') | (Notification.id_etudiant == student_id)
-        ).order_by(Notification.date_envoi.desc()).all()
-
-        notifications_data = [{
-            'id_notification': n.id,
-            'titre': n.titre,
-            'message': n.message,
-            'type_cible': n.type_cible,
-            'id_etudiant': n.id_etudiant,
-            'date_envoi': n.date_envoi.isoformat(),
-            # Placeholder: pas de suivi par étudiant pour "lu" côté backend pour l'instant
-            'lu': False
-        } for n in notifications]
-        
+        # ?since=<id>: seules les notifications plus récentes que la dernière reçue
+        since = request.args.get('since', type=int)
+        data = student_notifications(student_id, since)
         return jsonify({
             'success': True,
-            'data': notifications_data
+            'data': data,
+            'cursor': max([n['id_notification'] for n in data] + [since or 0]),
+            'unread_count': notification_reads.unread_count(student_id)
         })
         
     except Exception as e:
@@ -1981,6 +2852,84 @@ def get_student_notifications(current_user, student_id):
             'details': str(e)
         }), 500
 
+# Accueil étudiant: les cinq sections du tableau de bord en une requête
+shared_documents = EncodedList(encode_json)
+shared_quizzes = EncodedList(encode_json)
+
+def encoded_section(items):
+    body = encode_json(items)
+    return body, section_version(body)
+
+@app.route('/api/student/<int:student_id>/home', methods=['GET'])
+@token_required
+def get_student_home(current_user, student_id):
+    if current_user.role != 'admin' and current_user.id != student_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    try:
+        sections = {
+            # Listes communes: encodées une fois, aucune requête tant qu'elles sont en cache
+            'documents': shared_documents.get(document_listing.get()),
+            'quizzes': shared_quizzes.get(quiz_catalogue.get()),
+            'payments': encoded_section(student_payments(student_id)),
+            'notifications': encoded_section(student_notifications(student_id)),
+            'results': encoded_section(student_results(student_id)),
+            'balance': encoded_section(student_balance(student_id))
+        }
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la récupération de l\'accueil',
+            'details': str(e)
+        }), 500
+
+    known = parse_known(request.args.get('known'))
+    response = app.response_class(home_body(sections, known), mimetype='application/json')
+    response.set_etag('h-' + section_version(''.join(v for _, v in sections.values()).encode()))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response = compressor.after_request(response)
+    return response.make_conditional(request)
+
+# Événements poussés (SSE): notifications et changements de statut des paiements
+@app.route('/api/events/ticket', methods=['POST'])
+def issue_event_ticket():
+    """Échange le jeton d'accès (en-tête Authorization) contre un ticket d'ouverture du flux SSE"""
+    try:
+        claims = token_service.decode_access((request.headers.get('Authorization') or '').partition(' ')[2])
+    except TokenError:
+        return jsonify({'message': 'Token is invalid!'}), 401
+    try:
+        ticket = token_service.issue_ticket(claims)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Erreur lors de la création du ticket', 'details': str(e)}), 500
+    return jsonify({'success': True, 'data': {'ticket': ticket, 'expires_in': token_service.ticket_ttl}})
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """Flux SSE de l'utilisateur. EventSource n'envoie pas d'en-tête Authorization:
+    le client passe un ticket à usage unique en ?ticket= (POST /api/events/ticket),
+    jamais le jeton d'accès, qui finirait dans les journaux d'accès. Le flux se
+    ferme à l'expiration du jeton d'accès (événement "reauth")."""
+    try:
+        ticket = request.args.get('ticket')
+        if ticket:
+            claims = token_service.redeem_ticket(ticket)
+        else:
+            claims = token_service.decode_access((request.headers.get('Authorization') or '').partition(' ')[2])
+    except TokenError:
+        return jsonify({'message': 'Token is invalid!'}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = app.response_class(
+        event_bus.stream(claims['user_id'], last_event_id, until=claims.get('exp')),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Routes Admin pour notifications
 @app.route('/api/admin/notifications', methods=['GET'])
 @token_required
@@ -2030,6 +2979,8 @@ def create_notification(current_user):
         )
         db.session.add(notif)
         db.session.commit()
+        # Diffusion (tous) ou envoi ciblé aux connexions SSE ouvertes
+        event_bus.publish('notification', notification_item(notif), user_id=notif.id_etudiant)
 
         return jsonify({'success': True, 'data': {
             'id_notification': notif.id,
@@ -2039,17 +2990,46 @@ def create_notification(current_user):
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Erreur lors de la création', 'details': str(e)}), 500
 
-# Placeholder: marquer une notification comme lue (pas de persistance par étudiant pour l'instant)
+@app.route('/api/student/<int:student_id>/notifications/unread-count', methods=['GET'])
+@token_required
+def get_unread_notification_count(current_user, student_id):
+    """Compteur de non lues et id de la dernière notification (le client ne recharge que si elle change)"""
+    if current_user.role != 'admin' and current_user.id != student_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    return jsonify({
+        'success': True,
+        'data': {
+            'unread_count': notification_reads.unread_count(student_id),
+            'latest_id': notification_reads.latest_id(student_id)
+        }
+    })
+
 @app.route('/api/notifications/<int:notification_id>/read', methods=['PUT'])
 @token_required
 def mark_notification_read(current_user, notification_id):
     try:
-        exists = Notification.query.get(notification_id)
-        if not exists:
+        if not notification_reads.mark_read(current_user.id, notification_id):
             return jsonify({'success': False, 'error': 'Notification non trouvée'}), 404
-        # Rien à persister pour l'instant
-        return jsonify({'success': True})
+        db.session.commit()
+        return jsonify({'success': True, 'unread_count': notification_reads.unread_count(current_user.id)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Erreur lors du marquage', 'details': str(e)}), 500
+
+@app.route('/api/notifications/read-all', methods=['PUT'])
+@token_required
+def mark_all_notifications_read(current_user):
+    """Tout marquer comme lu (jusqu'à {"upto": id} si fourni, pour ne pas absorber une notification non affichée)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        upto = data.get('upto')
+        read_upto = notification_reads.mark_all_read(current_user.id, int(upto) if upto is not None else None)
+        db.session.commit()
+        return jsonify({'success': True, 'read_upto': read_upto, 'unread_count': notification_reads.unread_count(current_user.id)})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'upto invalide'}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': 'Erreur lors du marquage', 'details': str(e)}), 500
 
 @app.route('/api/documents', methods=['POST'])
@@ -2072,6 +3052,9 @@ def add_document(current_user):
 
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'message': 'Type de fichier non autorisé'}), 400
+        # Un tel nom écraserait les dérivés d'un autre document
+        if is_derivative(file.filename):
+            return jsonify({'success': False, 'message': 'Nom de fichier réservé'}), 400
 
         filename = file.filename
         save_path = os.path.join(UPLOAD_FOLDER, filename)
@@ -2087,12 +3070,17 @@ def add_document(current_user):
         )
         db.session.add(new_doc)
         db.session.commit()
+        document_listing.invalidate()
+
+        # Dérivés (pages, vignette, linéarisation) générés en arrière-plan
+        derivatives_scheduled = pdf_derivatives.schedule(filename)
 
         return jsonify({
             'success': True,
             'data': {
                 'id_document': new_doc.id,
-                'titre': new_doc.titre
+                'titre': new_doc.titre,
+                'derivatives_scheduled': derivatives_scheduled
             }
         }), 201
     except Exception as e:
@@ -2115,6 +3103,7 @@ def update_document(current_user, document_id):
             doc.telechargeable = bool(data['telechargeable'])
 
         db.session.commit()
+        document_listing.invalidate()
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -2146,9 +3135,13 @@ def delete_document_api(current_user, document_id):
         else:
             app.logger.warning(f"Fichier {filepath} déjà absent du disque")
 
+        # Supprimer les dérivés (vignette, copie linéarisée, métadonnées)
+        pdf_derivatives.remove(doc.chemin)
+
         # Supprimer l'entrée en base de données
         db.session.delete(doc)
         db.session.commit()
+        document_listing.invalidate()
 
         app.logger.info(f"Document {document_id} ({doc.titre}) supprimé complètement")
         return jsonify({
@@ -2188,6 +3181,7 @@ def cleanup_orphaned_documents(current_user):
                 cleaned_count += 1
 
         db.session.commit()
+        document_listing.invalidate()
 
         return jsonify({
             'success': True,
@@ -2204,7 +3198,9 @@ def cleanup_orphaned_documents(current_user):
             'details': str(e)
         }), 500
 
-# Route pour modifier un quiz existant (admin seulement, remplace complètement le quiz et ses questions existantes)
+# Route pour modifier un quiz existant (admin seulement). Les questions soumises sont
+# rapprochées des existantes par id: seules les lignes ajoutées / modifiées /
+# supprimées sont écrites (une requête groupée par catégorie).
 @app.route('/api/admin/quiz/<int:quiz_id>', methods=['PUT'])
 @token_required
 def update_quiz(current_user, quiz_id):
@@ -2214,79 +3210,24 @@ def update_quiz(current_user, quiz_id):
             
         quiz = Quiz.query.get_or_404(quiz_id)
         data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'Aucune donnée reçue'}), 400
 
-        print(f"\n{'='*50}")
-        print(f"DEBUG: MISE À JOUR DU QUIZ ID {quiz_id}")
-        print(f"{'='*50}")
-
-        print(f"DEBUG: DONNÉES COMPLÈTES REÇUES:")
-        print(f"DEBUG: {data}")
-
-        if data:
-            print(f"DEBUG: Champs reçus: {list(data.keys())}")
-            print(f"DEBUG: Questions reçues: {len(data.get('questions', []))}")
-
-            # Afficher chaque question en détail
-            for i, q in enumerate(data.get('questions', []), 1):
-                print(f"DEBUG: Question {i}:")
-                print(f"  - question: {q.get('question', 'N/A')}")
-                print(f"  - type_question: {q.get('type_question', 'N/A')}")
-                print(f"  - reponse_correcte: {q.get('reponse_correcte', 'N/A')}")
-                print(f"  - options: {q.get('options', 'N/A')}")
-                print(f"  - points: {q.get('points', 'N/A')}")
-        else:
-            print(f"DEBUG: AUCUNE DONNÉE REÇUE!")
-
-        print(f"{'='*50}\n")
+        app.logger.debug(f"Mise à jour du quiz {quiz_id}: champs {list(data.keys())}, "
+                         f"{len(data.get('questions') or [])} questions")
         
         # Validation des données requises
-        required_fields = ['titre', 'type', 'date_debut', 'date_fin', 'duree', 'questions']
+        required_fields = ['titre', 'type', 'date_debut', 'date_fin', 'duree']
+        if not data.get('pools'):
+            required_fields.append('questions')
         for field in required_fields:
             if field not in data:
                 return jsonify({'success': False, 'message': f'Champ manquant: {field}'}), 400
         
         # Validation des dates
         try:
-            print(f"DEBUG: Tentative de parsing des dates")
-            print(f"DEBUG: date_debut reçu: '{data['date_debut']}'")
-            print(f"DEBUG: date_fin reçu: '{data['date_fin']}'")
-
-            # Essayer de parser directement avec fromisoformat
-            try:
-                date_debut = datetime.fromisoformat(data['date_debut'].replace('Z', '+00:00'))
-                date_fin = datetime.fromisoformat(data['date_fin'].replace('Z', '+00:00'))
-                print(f"DEBUG: Parsing direct réussi - debut: {date_debut}, fin: {date_fin}")
-            except ValueError as e:
-                print(f"DEBUG: Parsing direct échoué: {e}")
-                # Essayer sans les millisecondes si présentes
-                try:
-                    date_debut_str = data['date_debut'].split('.')[0] + '+00:00'
-                    date_fin_str = data['date_fin'].split('.')[0] + '+00:00'
-                    date_debut = datetime.fromisoformat(date_debut_str)
-                    date_fin = datetime.fromisoformat(date_fin_str)
-                    print(f"DEBUG: Parsing sans millisecondes réussi - debut: {date_debut}, fin: {date_fin}")
-                except ValueError as e2:
-                    print(f"DEBUG: Parsing sans millisecondes échoué: {e2}")
-                    # Essayer avec format personnalisé
-                    try:
-                        # Format: YYYY-MM-DDTHH:MM:SS
-                        date_debut = datetime.strptime(data['date_debut'], '%Y-%m-%dT%H:%M:%S')
-                        date_fin = datetime.strptime(data['date_fin'], '%Y-%m-%dT%H:%M:%S')
-                        # Ajouter le timezone UTC pour éviter les problèmes de comparaison
-                        date_debut = date_debut.replace(tzinfo=timezone.utc)
-                        date_fin = date_fin.replace(tzinfo=timezone.utc)
-                        print(f"DEBUG: Parsing personnalisé réussi - debut: {date_debut}, fin: {date_fin}")
-                    except ValueError as e3:
-                        print(f"DEBUG: Parsing personnalisé échoué: {e3}")
-                        raise ValueError(f"Impossible de parser les dates: {e}")
-
-            # S'assurer que les dates ont bien un timezone
-            if date_debut.tzinfo is None:
-                date_debut = date_debut.replace(tzinfo=timezone.utc)
-            if date_fin.tzinfo is None:
-                date_fin = date_fin.replace(tzinfo=timezone.utc)
-
-            print(f"DEBUG: Dates finales avec timezone - debut: {date_debut}, fin: {date_fin}")
+            date_debut = parse_quiz_datetime(data['date_debut'])
+            date_fin = parse_quiz_datetime(data['date_fin'])
 
             if date_debut >= date_fin:
                 return jsonify({'success': False, 'message': 'La date de fin doit être postérieure à la date de début'}), 400
@@ -2295,7 +3236,7 @@ def update_quiz(current_user, quiz_id):
                 return jsonify({'success': False, 'message': 'La date de début ne peut pas être dans le passé'}), 400
 
         except Exception as e:
-            print(f"DEBUG: Erreur lors du parsing des dates: {e}")
+            app.logger.debug(f"Dates invalides pour le quiz {quiz_id}: {e}")
             return jsonify({'success': False, 'message': f'Format de date invalide: {str(e)}'}), 400
         
         # Mise à jour des informations du quiz
@@ -2305,88 +3246,99 @@ def update_quiz(current_user, quiz_id):
         quiz.date_fin = date_fin
         quiz.duree = int(data['duree'])
         quiz.statut = data.get('statut', 'brouillon')
+
+        # Validation du temps alloué
+        if quiz.duree < 1:
+            return jsonify({'success': False, 'message': 'La durée doit être d\'au moins 1 minute'}), 400
+
+        # Quiz banque: seules les règles de tirage changent, aucune question n'est recréée
+        if data.get('pools'):
+            try:
+                rules = parse_pool_rules(data['pools'])
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            set_pool_rules(quiz, rules)
+            db.session.commit()
+            invalidate_quiz(quiz_id)
+            return jsonify({
+                'success': True,
+                'message': 'Quiz mis à jour avec succès',
+                'quiz_id': quiz.id,
+                'total_questions': sum(count for _, count, _ in rules),
+                'total_points': quiz.total_points
+            })
         
-        # Supprimer les questions existantes
-        Question.query.filter_by(quiz_id=quiz_id).delete(synchronize_session=False)
-        
-        # Valider et créer les nouvelles questions
+        # Valider toutes les questions avant d'écrire quoi que ce soit
         questions = data.get('questions', [])
-        total_points = 0
-        
         if not isinstance(questions, list):
             return jsonify({'success': False, 'message': 'Le format des questions est invalide'}), 400
-            
-        for i, q in enumerate(questions, 1):
-            question_text = q.get('question', '').strip()
-            type_question = q.get('type_question')
-            reponse_correcte = q.get('reponse_correcte')
-            options = q.get('options', [])
-            points = max(1, int(q.get('points', 1)))  # Au moins 1 point par question
-
-            print(f"DEBUG: Question {i}:")
-            print(f"  - question_text: '{question_text}'")
-            print(f"  - type_question: {type_question}")
-            print(f"  - reponse_correcte: {reponse_correcte}")
-            print(f"  - options: {options}")
-            print(f"  - options type: {type(options)}")
-            print(f"  - options length: {len(options) if options else 0}")
-
-            # Validation des champs obligatoires
-            if not question_text:
-                return jsonify({'success': False, 'message': f'La question {i} est vide'}), 400
-
-            if not type_question or type_question not in ['choix_multiple', 'vrai_faux', 'texte_libre']:
-                return jsonify({'success': False, 'message': f'Type de question invalide pour la question {i}'}), 400
-
-            if type_question == 'choix_multiple' and not options:
-                print(f"DEBUG: Options manquantes pour question {i} de type {type_question}")
-                return jsonify({'success': False, 'message': f'Options manquantes pour la question {i}'}), 400
-
-            if type_question == 'choix_multiple' and not isinstance(options, list):
-                return jsonify({'success': False, 'message': f'Format des options invalide pour la question {i}'}), 400
-
-            if type_question in ['choix_multiple', 'vrai_faux'] and reponse_correcte is None:
-                return jsonify({'success': False, 'message': f'Réponse correcte manquante pour la question {i}'}), 400
-            
-            # Création de la question
-            new_q = Question(
-                quiz_id=quiz_id,
-                question=question_text,
-                type_question=type_question,
-                reponse_correcte=str(reponse_correcte) if reponse_correcte is not None else '',
-                options=options if isinstance(options, list) and type_question == 'choix_multiple' else [],
-                points=points
-            )
-            db.session.add(new_q)
-            total_points += points
-        
-        # Mise à jour du total des points
-        quiz.total_points = total_points
-        
+
         # Validation du nombre de questions
         if not questions:
             return jsonify({'success': False, 'message': 'Le quiz doit contenir au moins une question'}), 400
-        
-        # Validation du temps alloué
-        if quiz.duree < 1:
-            return jsonify({'success': False, 'message': 'La durée doit être d\'au moins 1 minute'}), 400
-            
+
         # Validation du nombre maximum de questions (optionnel)
         if len(questions) > 100:  # Limite arbitraire
             return jsonify({'success': False, 'message': 'Le nombre maximum de questions est de 100'}), 400
-        
+
+        try:
+            submitted = [(submitted_question_id(q), question_values(q, i)) for i, q in enumerate(questions, 1)]
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        total_points = sum(values['points'] for _, values in submitted)
+
         # Validation du nombre maximum de points (optionnel)
         if total_points > 1000:  # Limite arbitraire
             return jsonify({'success': False, 'message': 'Le nombre maximum de points est de 1000'}), 400
+
+        # Rapprochement avec les questions existantes (une seule lecture)
+        existing = {q.id: q for q in Question.query.filter_by(quiz_id=quiz_id)}
+        added, updated, seen = [], [], set()
+        for question_id, values in submitted:
+            current = existing.get(question_id)
+            if current is None or question_id in seen:
+                added.append({'quiz_id': quiz_id, **values})
+                continue
+            seen.add(question_id)
+            if any(question_field(current, field) != value for field, value in values.items()):
+                updated.append({'id': question_id, **values})
+        removed = [question_id for question_id in existing if question_id not in seen]
+
+        if removed:
+            Question.query.filter(Question.id.in_(removed)).delete(synchronize_session=False)
+        if updated:
+            db.session.execute(update(Question), updated)
+        if added:
+            db.session.execute(insert(Question), added)
+        # Un quiz repassé en questions propres n'a plus de règles de tirage
+        QuizPoolRule.query.filter_by(quiz_id=quiz_id).delete(synchronize_session=False)
+
+        # Mise à jour du total des points
+        quiz.total_points = total_points
         
         db.session.commit()
+        invalidate_quiz(quiz_id)
+        # Réponses correctes modifiées ou questions retirées: scores existants à recalculer
+        if updated or removed:
+            regrader.schedule(quiz_id, reason='edit')
+
+        app.logger.info(f"Quiz {quiz_id} mis à jour: {len(added)} ajoutées, {len(updated)} modifiées, "
+                        f"{len(removed)} supprimées")
         
         return jsonify({
             'success': True,
             'message': 'Quiz mis à jour avec succès',
             'quiz_id': quiz.id,
-            'total_questions': len(questions),
-            'total_points': total_points
+            'total_questions': len(submitted),
+            'total_points': total_points,
+            'delta': {
+                'added': len(added),
+                'updated': [q['id'] for q in updated],
+                'removed': removed,
+                'unchanged': len(seen) - len(updated)
+            },
+            'regrade_job': regrader.latest(quiz_id).id if (updated or removed) else None
         })
         
     except Exception as e:
@@ -2410,12 +3362,19 @@ def delete_quiz(current_user, quiz_id):
     # Supprimer les questions liées
     Question.query.filter_by(quiz_id=quiz_id).delete()
     
-    # Supprimer les résultats liés
+    # Supprimer les résultats liés (et leurs réponses conservées)
+    ResultAnswers.query.filter_by(quiz_id=quiz_id).delete()
     Result.query.filter_by(quiz_id=quiz_id).delete()
+    stats_rollup.rebuild_quiz(quiz_id)
+
+    # Supprimer les règles de tirage (quiz banque)
+    QuizPoolRule.query.filter_by(quiz_id=quiz_id).delete()
     
     # Supprimer le quiz
     db.session.delete(quiz)
     db.session.commit()
+    invalidate_quiz(quiz_id)
+    leaderboards.invalidate(quiz_id)
 
     return jsonify({
         'success': True,
@@ -2438,12 +3397,196 @@ def change_quiz_status(current_user, quiz_id):
         
     quiz.statut = new_status
     db.session.commit()
+    invalidate_quiz(quiz_id)
 
     return jsonify({
         'success': True,
         'message': f'Statut du quiz changé en {new_status}'
     })
 
+# ----- Banque de questions (admin) -----
+
+def pool_question_from_payload(q, i):
+    """Valeurs d'une question de pool; ValueError si invalide"""
+    return {**question_values(q, i), 'tag': (q.get('tag') or '').strip()[:50]}
+
+def pool_summary(pool, tags):
+    return {
+        'id': pool.id,
+        'nom': pool.nom,
+        'description': pool.description,
+        'created_at': pool.created_at,
+        'total_questions': sum(tags.values()),
+        'tags': tags
+    }
+
+def pool_tag_counts(pool_ids):
+    """{pool_id: {tag: nombre}} en une requête"""
+    counts = {pool_id: {} for pool_id in pool_ids}
+    rows = db.session.query(PoolQuestion.pool_id, PoolQuestion.tag, db.func.count(PoolQuestion.id)).filter(
+        PoolQuestion.pool_id.in_(pool_ids)
+    ).group_by(PoolQuestion.pool_id, PoolQuestion.tag).all() if pool_ids else []
+    for pool_id, tag, count in rows:
+        counts[pool_id][tag] = count
+    return counts
+
+@app.route('/api/admin/question-pools', methods=['GET'])
+@token_required
+def list_question_pools(current_user):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    pools = QuestionPool.query.order_by(QuestionPool.nom).all()
+    counts = pool_tag_counts([pool.id for pool in pools])
+    return jsonify({'success': True, 'data': [pool_summary(pool, counts[pool.id]) for pool in pools]})
+
+@app.route('/api/admin/question-pools', methods=['POST'])
+@token_required
+def create_question_pool(current_user):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    data = request.get_json() or {}
+    nom = (data.get('nom') or '').strip()
+    if not nom:
+        return jsonify({'success': False, 'message': 'Le nom du pool est requis'}), 400
+    if QuestionPool.query.filter_by(nom=nom).first():
+        return jsonify({'success': False, 'message': 'Un pool porte déjà ce nom'}), 409
+
+    try:
+        questions = [pool_question_from_payload(q, i) for i, q in enumerate(data.get('questions') or [], 1)]
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    pool = QuestionPool(nom=nom, description=data.get('description'), created_by=current_user.id)
+    db.session.add(pool)
+    db.session.flush()
+    db.session.add_all([PoolQuestion(pool_id=pool.id, **values) for values in questions])
+    db.session.commit()
+    question_bank.invalidate(pool.id)
+
+    return jsonify({'success': True, 'data': pool_summary(pool, pool_tag_counts([pool.id])[pool.id])}), 201
+
+@app.route('/api/admin/question-pools/<int:pool_id>', methods=['GET'])
+@token_required
+def get_question_pool(current_user, pool_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    pool = QuestionPool.query.get_or_404(pool_id)
+    questions = PoolQuestion.query.filter_by(pool_id=pool_id).order_by(PoolQuestion.tag, PoolQuestion.id).all()
+    data = pool_summary(pool, pool_tag_counts([pool_id])[pool_id])
+    data['questions'] = [{
+        'id': q.id,
+        'tag': q.tag,
+        'question': q.question,
+        'type_question': q.type_question,
+        'reponse_correcte': q.reponse_correcte,
+        'options': q.options,
+        'points': q.points
+    } for q in questions]
+    return jsonify({'success': True, 'data': data})
+
+@app.route('/api/admin/question-pools/<int:pool_id>', methods=['DELETE'])
+@token_required
+def delete_question_pool(current_user, pool_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    pool = QuestionPool.query.get_or_404(pool_id)
+    if QuizPoolRule.query.filter_by(pool_id=pool_id).first():
+        return jsonify({'success': False, 'message': 'Ce pool est utilisé par un quiz'}), 409
+    PoolQuestion.query.filter_by(pool_id=pool_id).delete()
+    db.session.delete(pool)
+    db.session.commit()
+    question_bank.invalidate(pool_id)
+    return jsonify({'success': True, 'message': 'Pool supprimé avec succès'})
+
+@app.route('/api/admin/question-pools/<int:pool_id>/questions', methods=['POST'])
+@token_required
+def add_pool_questions(current_user, pool_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    QuestionPool.query.get_or_404(pool_id)
+    data = request.get_json() or {}
+    try:
+        questions = [pool_question_from_payload(q, i) for i, q in enumerate(data.get('questions') or [], 1)]
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not questions:
+        return jsonify({'success': False, 'message': 'Aucune question fournie'}), 400
+
+    db.session.add_all([PoolQuestion(pool_id=pool_id, **values) for values in questions])
+    db.session.commit()
+    question_bank.invalidate(pool_id)
+    return jsonify({'success': True, 'message': f'{len(questions)} questions ajoutées'}), 201
+
+@app.route('/api/admin/question-pools/<int:pool_id>/questions/<int:question_id>', methods=['PUT'])
+@token_required
+def update_pool_question(current_user, pool_id, question_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    question = PoolQuestion.query.filter_by(id=question_id, pool_id=pool_id).first_or_404()
+    try:
+        values = pool_question_from_payload(request.get_json() or {}, 1)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    for field, value in values.items():
+        setattr(question, field, value)
+    db.session.commit()
+    question_bank.invalidate(pool_id)
+    schedule_pool_regrade(pool_id)
+    return jsonify({'success': True, 'message': 'Question mise à jour'})
+
+@app.route('/api/admin/question-pools/<int:pool_id>/questions/<int:question_id>', methods=['DELETE'])
+@token_required
+def delete_pool_question(current_user, pool_id, question_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    question = PoolQuestion.query.filter_by(id=question_id, pool_id=pool_id).first_or_404()
+    db.session.delete(question)
+    db.session.commit()
+    question_bank.invalidate(pool_id)
+    schedule_pool_regrade(pool_id)
+    return jsonify({'success': True, 'message': 'Question supprimée'})
+
+# ----- Re-correction (admin) -----
+
+@app.route('/api/admin/quiz/<int:quiz_id>/regrade', methods=['POST'])
+@token_required
+def regrade_quiz(current_user, quiz_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    Quiz.query.get_or_404(quiz_id)
+    job = regrader.schedule(quiz_id)
+    return jsonify({'success': True, 'data': job.to_dict()}), 202
+
+@app.route('/api/admin/quiz/<int:quiz_id>/regrade', methods=['GET'])
+@token_required
+def latest_regrade(current_user, quiz_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    job = regrader.latest(quiz_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Aucune re-correction pour ce quiz'}), 404
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+@app.route('/api/admin/regrade-jobs/<job_id>', methods=['GET'])
+@token_required
+def get_regrade_job(current_user, job_id):
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    job = regrader.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Tâche introuvable'}), 404
+    return jsonify({'success': True, 'data': job.to_dict()})
+
 # Point d'entrée principal pour démarrer le serveur
 # if __name__ == '__main__':
 #     with app.app_context():
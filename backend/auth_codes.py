@@ -0,0 +1,49 @@
+"""
+Codes d'authentification étudiants.
+
+La vérification ne compare plus le code en clair ni un hash pbkdf2: le code
+normalisé passe par un HMAC-SHA256 à clé secrète (AUTH_CODE_HMAC_KEY, à défaut
+SECRET_KEY), stocké dans une colonne indexée. Une connexion = une lecture
+indexée + une comparaison à temps constant, sans écriture.
+
+La colonne code_auth garde encore le code en clair (affiché aux admins dans
+la liste des étudiants): une fuite de la table user révèle donc les codes.
+Le HMAC sert à la vérification, pas à protéger les codes stockés.
+"""
+
+import hashlib
+import hmac
+import secrets
+import string
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+DIGEST_LENGTH = 64  # sha256 en hexadécimal
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def code_digest(code, key):
+    """HMAC-SHA256 (hex) du code normalisé"""
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return hmac.new(key, normalize_code(code).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def verify_code(code, stored_digest, key):
+    """Comparaison à temps constant avec le digest stocké"""
+    if not stored_digest:
+        return False
+    return hmac.compare_digest(code_digest(code, key), stored_digest)
+
+
+def generate_code(length=6):
+    """Code aléatoire (générateur cryptographique)"""
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def generate_student_code(prenom, nom, year):
+    """Format historique: initiales + année + 3 chiffres"""
+    initials = ((prenom or 'X')[0] + (nom or 'X')[0]).upper()
+    return f"{initials}{year}{secrets.randbelow(1000):03d}"
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Reconstruit les cumuls journaliers des statistiques d'administration
+(inscriptions, paiements par mode / statut, soumissions de quiz) depuis les
+tables users / payment / result.
+
+À lancer après le déploiement des tables de cumul, puis après tout import ou
+modification faite hors de l'application. Les écritures faites pendant la
+reconstruction peuvent être perdues: à lancer en période calme.
+
+Usage: python backfill_stats.py
+"""
+
+from app import app, db, stats_rollup
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        counts = stats_rollup.rebuild()
+        for table, count in counts.items():
+            print(f"✅ {table}: {count} lignes")
+
+
+if __name__ == '__main__':
+    main()
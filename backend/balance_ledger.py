@@ -0,0 +1,243 @@
+"""
+Solde des étudiants: journal des mouvements + solde matérialisé.
+
+Chaque événement financier ajoute une ligne au journal (LedgerEntry), dans la
+même transaction que la modification qui le provoque:
+  - frais: frais d'inscription dus (TUITION_FEE) à la création d'un étudiant
+  - paiement: paiement encaissé (statut complet ou par_tranche)
+  - annulation: paiement encaissé puis rejeté / remis en attente
+
+StudentBalance garde, une ligne par étudiant, le total dû, le total payé, le
+reste (indexé) et le statut (solde / partiel / impaye). La liste des
+étudiants qui doivent encore de l'argent est une lecture d'index
+(reste > 0), sans agrégation sur les paiements.
+
+Un paiement en attente de vérification n'est pas encaissé: il n'apparaît
+dans le journal qu'une fois validé. tranche_restante d'un paiement validé est
+le reste de l'étudiant après ce paiement.
+
+check() recalcule les soldes depuis le journal et signale (ou corrige) les
+écarts; backfill() ajoute au journal les étudiants et paiements encaissés qui
+n'y figurent pas encore (voir ledger_check.py), sans arrêter l'application.
+"""
+
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import case, func
+
+logger = logging.getLogger(__name__)
+
+TUITION_FEE = float(os.getenv('TUITION_FEE', '50000'))
+
+# Statuts de paiement encaissés (les autres sont en attente de vérification)
+PAID_STATUSES = ('complet', 'par_tranche')
+
+FEE, PAYMENT, REVERSAL = 'frais', 'paiement', 'annulation'
+
+
+def balance_status(du, paye):
+    if du - paye <= 0:
+        return 'solde'
+    return 'partiel' if paye > 0 else 'impaye'
+
+
+class BalanceLedger:
+    """Journal des mouvements et soldes matérialisés (sans commit)"""
+
+    def __init__(self, db, user_model, payment_model, entry_model, balance_model, fee=None):
+        self.db = db
+        self.User = user_model
+        self.Payment = payment_model
+        self.Entry = entry_model
+        self.Balance = balance_model
+        self.fee = TUITION_FEE if fee is None else fee
+
+    # ----- Écriture -----
+
+    def _balances(self, user_ids):
+        """Soldes verrouillés des étudiants (créés à zéro si absents)"""
+        Balance = self.Balance
+        user_ids = set(user_ids)
+        balances = {balance.user_id: balance for balance in self.db.session.query(Balance).filter(
+            Balance.user_id.in_(user_ids)).with_for_update()}
+        for user_id in user_ids - set(balances):
+            balances[user_id] = Balance(user_id=user_id, total_du=0, total_paye=0, reste=0, statut='solde')
+            self.db.session.add(balances[user_id])
+        return balances
+
+    def append(self, movements):
+        """Ajoute les mouvements [(user_id, type, montant, payment_id)] et met à jour les soldes"""
+        movements = [movement for movement in movements if movement[2]]
+        if not movements:
+            return
+        balances = self._balances(user_id for user_id, _, _, _ in movements)
+        now = datetime.utcnow()
+        self.db.session.add_all([
+            self.Entry(user_id=user_id, type=kind, montant=amount, payment_id=payment_id, date_mouvement=now)
+            for user_id, kind, amount, payment_id in movements
+        ])
+        self._apply(balances, movements, now)
+
+    @staticmethod
+    def _apply(balances, movements, now):
+        for user_id, kind, amount, *_ in movements:
+            balance = balances[user_id]
+            if kind == FEE:
+                balance.total_du += amount
+            else:
+                balance.total_paye += amount
+        for balance in balances.values():
+            balance.reste = balance.total_du - balance.total_paye
+            balance.statut = balance_status(balance.total_du, balance.total_paye)
+            balance.date_maj = now
+
+    def charge_fee(self, user, amount=None):
+        """Frais d'inscription d'un nouvel étudiant"""
+        if user.role != 'student':
+            return
+        if user.id is None:
+            self.db.session.flush()
+        self.append([(user.id, FEE, self.fee if amount is None else amount, None)])
+
+    def record_payments(self, payments):
+        """Nouveaux paiements: encaissés s'ils sont créés avec un statut payé"""
+        if any(payment.id is None for payment in payments):
+            self.db.session.flush()
+        self.append([(p.user_id, PAYMENT, float(p.montant or 0), p.id) for p in payments
+                     if p.statut in PAID_STATUSES])
+
+    def move_payments(self, payments, statut):
+        """Changement de statut (à appeler avant la modification)"""
+        paid = statut in PAID_STATUSES
+        self.append([
+            (p.user_id, PAYMENT if paid else REVERSAL, float(p.montant or 0) * (1 if paid else -1), p.id)
+            for p in payments if (p.statut in PAID_STATUSES) != paid
+        ])
+
+    def remove_payments(self, payments):
+        """Paiements supprimés (rejet): annulation de ceux qui étaient encaissés"""
+        self.append([(p.user_id, REVERSAL, -float(p.montant or 0), p.id) for p in payments
+                     if p.statut in PAID_STATUSES])
+
+    def remaining(self, user_id):
+        """Reste dû par l'étudiant (0 si soldé), soldes en attente d'écriture compris"""
+        balance = self.db.session.get(self.Balance, user_id)
+        return max(0.0, balance.reste) if balance is not None else 0.0
+
+    def forget(self, user_id):
+        """Suppression d'un étudiant: journal et solde"""
+        self.db.session.query(self.Entry).filter_by(user_id=user_id).delete(synchronize_session=False)
+        self.db.session.query(self.Balance).filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    # ----- Contrôle -----
+
+    def totals_from_entries(self):
+        """{user_id: (total dû, total payé)} recalculés depuis le journal"""
+        Entry = self.Entry
+        rows = self.db.session.query(
+            Entry.user_id,
+            func.sum(case((Entry.type == FEE, Entry.montant), else_=0)),
+            func.sum(case((Entry.type != FEE, Entry.montant), else_=0))
+        ).group_by(Entry.user_id)
+        return {user_id: (float(du or 0), float(paye or 0)) for user_id, du, paye in rows}
+
+    def check(self, repair=False, tolerance=0.005):
+        """Compare les soldes au journal; repair=True réécrit les soldes divergents (avec commit)"""
+        Balance = self.Balance
+        expected = self.totals_from_entries()
+        balances = {balance.user_id: balance for balance in self.db.session.query(Balance)}
+        mismatches = []
+        for user_id in set(expected) | set(balances):
+            du, paye = expected.get(user_id, (0.0, 0.0))
+            balance = balances.get(user_id)
+            stored = (balance.total_du, balance.total_paye) if balance is not None else (0.0, 0.0)
+            if abs(stored[0] - du) > tolerance or abs(stored[1] - paye) > tolerance or (
+                    balance is not None and balance.statut != balance_status(du, paye)):
+                mismatches.append({'user_id': user_id, 'stored': {'du': stored[0], 'paye': stored[1]},
+                                   'expected': {'du': du, 'paye': paye}})
+                if repair:
+                    if balance is None:
+                        balance = Balance(user_id=user_id)
+                        self.db.session.add(balance)
+                    balance.total_du, balance.total_paye = du, paye
+                    balance.reste = du - paye
+                    balance.statut = balance_status(du, paye)
+                    balance.date_maj = datetime.utcnow()
+        if repair and mismatches:
+            self.db.session.commit()
+            logger.info(f"{len(mismatches)} soldes étudiants corrigés depuis le journal")
+        return {'balances': len(balances), 'mismatches': mismatches, 'repaired': repair and bool(mismatches)}
+
+    def _missing(self, user_ids=None):
+        """Mouvements absents du journal [(user_id, type, montant, payment_id, date)]:
+        frais des étudiants sans frais, paiements encaissés sans aucun mouvement"""
+        User, Payment, Entry, session = self.User, self.Payment, self.Entry, self.db.session
+        fees = session.query(User.id, User.date_inscription).filter(
+            User.role == 'student',
+            ~session.query(Entry.id).filter(Entry.user_id == User.id, Entry.type == FEE).exists())
+        payments = session.query(Payment.id, Payment.user_id, Payment.montant, Payment.date_paiement).filter(
+            Payment.statut.in_(PAID_STATUSES),
+            ~session.query(Entry.id).filter(Entry.payment_id == Payment.id).exists())
+        if user_ids is not None:
+            fees = fees.filter(User.id.in_(user_ids))
+            payments = payments.filter(Payment.user_id.in_(user_ids))
+        now = datetime.utcnow()
+        movements = [(user_id, FEE, self.fee, None, date_inscription or now) for user_id, date_inscription in fees]
+        movements += [(user_id, PAYMENT, float(montant or 0), payment_id, date_paiement or now)
+                      for payment_id, user_id, montant, date_paiement in payments if montant]
+        return movements
+
+    def backfill(self, chunk_size=500):
+        """Ajoute au journal les frais et paiements encaissés manquants (avec commit)
+
+        Relançable, y compris pendant que l'application écrit: les soldes d'un
+        lot d'étudiants sont verrouillés (comme par append) avant de relire ce
+        qui manque pour eux, puis mis à jour par incrément.
+        """
+        candidates = sorted({movement[0] for movement in self._missing()})
+        # Fin de la transaction de lecture: la relecture sous verrou voit les écritures récentes
+        self.db.session.rollback()
+        entries, balances_count = 0, 0
+        for start in range(0, len(candidates), chunk_size):
+            user_ids = candidates[start:start + chunk_size]
+            balances = self._balances(user_ids)
+            movements = self._missing(user_ids)
+            if movements:
+                self.db.session.execute(self.Entry.__table__.insert(), [
+                    {'user_id': user_id, 'type': kind, 'montant': amount, 'payment_id': payment_id,
+                     'date_mouvement': date}
+                    for user_id, kind, amount, payment_id, date in movements
+                ])
+                self._apply(balances, movements, datetime.utcnow())
+            self.db.session.commit()
+            entries += len(movements)
+            balances_count += len({movement[0] for movement in movements})
+        logger.info(f"Journal des soldes complété: {entries} mouvements pour {balances_count} étudiants")
+        return {'entries': entries, 'balances': balances_count}
+
+    # ----- Lecture -----
+
+    def owing(self, statut=None, limit=None):
+        """Étudiants ayant un reste dû, du plus grand au plus petit (index sur reste)"""
+        Balance, User = self.Balance, self.User
+        query = self.db.session.query(Balance, User.username, User.email).join(User, User.id == Balance.user_id)
+        query = query.filter(Balance.statut == statut) if statut else query.filter(Balance.reste > 0)
+        query = query.order_by(Balance.reste.desc(), Balance.user_id)
+        return query.limit(limit).all() if limit else query.all()
+
+    def summary(self):
+        """Totaux de la promotion (une agrégation sur la table des soldes)"""
+        Balance = self.Balance
+        du, paye, reste = self.db.session.query(
+            func.sum(Balance.total_du), func.sum(Balance.total_paye),
+            func.sum(case((Balance.reste > 0, Balance.reste), else_=0))
+        ).one()
+        counts = dict(self.db.session.query(Balance.statut, func.count(Balance.user_id)).group_by(Balance.statut))
+        return {
+            'total_du': float(du or 0),
+            'total_paye': float(paye or 0),
+            'total_restant': float(reste or 0),
+            'etudiants': {statut: counts.get(statut, 0) for statut in ('solde', 'partiel', 'impaye')}
+        }
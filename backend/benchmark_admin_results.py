@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Consultation admin des résultats: pagination par curseur vs OFFSET.
+
+Crée --results résultats (étudiants @bench.invalid, --quizzes quiz de test,
+insertion groupée) puis mesure, pour chaque tri et filtre:
+  - la première page
+  - une page profonde atteinte par curseur (valeur de tri + id)
+  - la même page avec OFFSET (ce que ferait une pagination classique)
+  - le résumé par quiz
+
+Les données temporaires sont supprimées à la fin.
+
+Usage: python benchmark_admin_results.py [--results 500000] [--quizzes 20] [--depth 0.9]
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import app, db, User, Quiz, Result, result_browser
+from result_browser import DEFAULT_PAGE_SIZE, encode_cursor
+
+EMAIL_DOMAIN = 'bench.invalid'
+TITLE = 'BENCH résultats'
+
+
+def cleanup():
+    quiz_ids = [quiz_id for quiz_id, in db.session.query(Quiz.id).filter(Quiz.titre.like(f"{TITLE}%"))]
+    if quiz_ids:
+        Result.query.filter(Result.quiz_id.in_(quiz_ids)).delete(synchronize_session=False)
+        Quiz.query.filter(Quiz.id.in_(quiz_ids)).delete(synchronize_session=False)
+    User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def seed(results, quizzes):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    # Une soumission par étudiant et par quiz (uq_result_user_quiz): chaque étudiant passe tous les quiz
+    students = -(-results // quizzes)
+    for start in range(0, students, 10000):
+        db.session.execute(insert(User), [
+            {'id': first_user + i, 'username': f"bench.result{i}", 'email': f"result{i}@{EMAIL_DOMAIN}",
+             'password': '-', 'role': 'student', 'actif': False, 'date_inscription': now}
+            for i in range(start, min(students, start + 10000))
+        ])
+    quiz_ids = []
+    for q in range(quizzes):
+        quiz = Quiz(titre=f"{TITLE} {q}", type='qcm', total_points=20, date_debut=now - timedelta(days=365),
+                    date_fin=now, duree=30, statut='termine', created_by=first_user)
+        db.session.add(quiz)
+        db.session.flush()
+        quiz_ids.append(quiz.id)
+    for start in range(0, results, 10000):
+        db.session.execute(insert(Result), [
+            {'user_id': first_user + i // quizzes, 'quiz_id': quiz_ids[i % quizzes],
+             'score': rng.randrange(21), 'temps_utilise': rng.randrange(60, 1800), 'statut': 'soumis',
+             'date_passage': now - timedelta(seconds=rng.randrange(365 * 86400))}
+            for i in range(start, min(results, start + 10000))
+        ])
+        db.session.commit()
+    return quiz_ids, first_user
+
+
+def timed(label, fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<34} {best * 1000:>9.1f} ms")
+    return result
+
+
+def offset_page(quiz_id, sort, offset):
+    column = Result.date_passage if sort == 'date' else Result.score
+    query = db.session.query(Result.id, Result.score, Result.date_passage, User.username, Quiz.titre).join(
+        User, User.id == Result.user_id).join(Quiz, Quiz.id == Result.quiz_id)
+    if quiz_id:
+        query = query.filter(Result.quiz_id == quiz_id)
+    return query.order_by(column.desc(), Result.id.desc()).offset(offset).limit(DEFAULT_PAGE_SIZE).all()
+
+
+def deep_cursor(quiz_id, sort, offset):
+    """Curseur équivalent à OFFSET offset (calculé hors mesure)"""
+    column = Result.date_passage if sort == 'date' else Result.score
+    query = db.session.query(column, Result.id)
+    if quiz_id:
+        query = query.filter(Result.quiz_id == quiz_id)
+    value, result_id = query.order_by(column.desc(), Result.id.desc()).offset(offset - 1).limit(1).one()
+    return encode_cursor(value, result_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--results', type=int, default=500000)
+    parser.add_argument('--quizzes', type=int, default=20)
+    parser.add_argument('--depth', type=float, default=0.9, help='Position de la page profonde (fraction)')
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        cleanup()
+        try:
+            start = time.perf_counter()
+            quiz_ids, first_user = seed(args.results, args.quizzes)
+            print(f"Résultats admin - {args.results} résultats, {args.quizzes} quiz "
+                  f"(insertion {time.perf_counter() - start:.1f} s)")
+
+            for sort, quiz_id in (('date', None), ('score', None), ('date', quiz_ids[0]), ('score', quiz_ids[0])):
+                total = Result.query.filter(Result.quiz_id == quiz_id).count() if quiz_id else args.results
+                offset = max(1, int(total * args.depth))
+                print(f"tri {sort}{f', quiz {quiz_id}' if quiz_id else ''} ({total} résultats)")
+                timed('première page', lambda: result_browser.page(quiz_id=quiz_id, sort=sort))
+                cursor = deep_cursor(quiz_id, sort, offset)
+                timed(f'page à {offset} (curseur)', lambda: result_browser.page(quiz_id=quiz_id, sort=sort, cursor=cursor))
+                timed(f'page à {offset} (OFFSET)', lambda: offset_page(quiz_id, sort, offset), repeat=2)
+
+            print("résumé par quiz")
+            timed('tous les quiz (agrégats journaliers)', lambda: result_browser.summary())
+            timed('un étudiant', lambda: result_browser.summary(student_id=first_user))
+        finally:
+            db.session.rollback()
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Coût CPU de la compression par Ko comparé à la bande passante économisée.
+
+Charges mesurées: listes admin JSON (formes get_students / get_payments /
+get_quizzes) et static/pdf-viewer.html. Pour chaque encodeur on affiche le
+ratio, le temps CPU par Ko d'entrée et le temps de transfert économisé sur un
+lien au débit donné: la compression est rentable tant que le CPU dépensé reste
+très inférieur au temps de transfert gagné.
+
+Usage: python benchmark_compression.py [--rows 2000] [--mbps 10] [--repeat 5]
+"""
+
+import argparse
+import gzip
+import os
+import time
+
+from flask import Flask
+
+from benchmark_json import build_rows
+from compression import brotli
+from json_provider import OrjsonProvider, StdJSONProvider, orjson
+
+
+def encoders():
+    result = [(f"gzip-{level}", lambda d, l=level: gzip.compress(d, compresslevel=l, mtime=0)) for level in (1, 6, 9)]
+    if brotli is not None:
+        result += [(f"br-{q}", lambda d, q=q: brotli.compress(d, quality=q)) for q in (1, 4, 6, 11)]
+    return result
+
+
+def payloads(rows):
+    app = Flask(__name__)
+    provider = OrjsonProvider(app) if orjson is not None else StdJSONProvider(app)
+    data = {
+        f"{endpoint} ({rows})": provider.dumps_bytes({'success': True, 'data': items})
+        for endpoint, items in build_rows(rows).items()
+    }
+    viewer = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'pdf-viewer.html')
+    with open(viewer, 'rb') as f:
+        data['pdf-viewer.html'] = f.read()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--mbps', type=float, default=10.0, help='Débit du lien client (Mbit/s)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    bytes_per_ms = args.mbps * 1_000_000 / 8 / 1000
+
+    print(f"Compression - lien à {args.mbps} Mbit/s, meilleur de {args.repeat} essais")
+    header = f"{'charge':<24} {'encodeur':<8} {'entrée Ko':>9} {'sortie Ko':>9} {'ratio':>6} {'CPU ms':>7} {'µs/Ko':>6} {'transfert gagné ms':>19} {'gain net ms':>11}"
+    print(header)
+    print('-' * len(header))
+
+    for name, data in payloads(args.rows).items():
+        size_kb = len(data) / 1024
+        for encoder_name, encode in encoders():
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                compressed = encode(data)
+                best = min(best, time.perf_counter() - start)
+            cpu_ms = best * 1000
+            saved_ms = (len(data) - len(compressed)) / bytes_per_ms
+            print(f"{name:<24} {encoder_name:<8} {size_kb:>9.1f} {len(compressed) / 1024:>9.1f} "
+                  f"{len(data) / len(compressed):>5.1f}x {cpu_ms:>7.2f} {cpu_ms * 1000 / size_kb:>6.1f} "
+                  f"{saved_ms:>19.1f} {saved_ms - cpu_ms:>11.1f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
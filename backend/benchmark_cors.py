@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark du coût CORS par requête.
+
+Compare, sur une vue triviale (full_dispatch_request dans un contexte de
+requête, sans serveur HTTP):
+  - legacy: Flask-CORS + hooks historiques (pré-vol reconstruit à chaque appel,
+            pop / ré-ajout des en-têtes, valeurs par défaut '*' de
+            add_security_headers)
+  - policy: cors.CorsPolicy (en-têtes précalculés, frozenset, pré-vol en cache)
+  - none  : aucune gestion CORS (plancher de Flask)
+
+Usage: python benchmark_cors.py [--requests 5000] [--repeat 5]
+"""
+
+import argparse
+import time
+
+from flask import Flask, jsonify, request
+
+from cors import CorsPolicy
+
+ORIGINS = [
+    "http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:8080", "http://127.0.0.1:8080",
+    "http://quiz.local", "https://quiz.local", "http://quiz.local:30080", "https://quiz.local:30080",
+]
+CONFIG = dict(
+    CORS_SUPPORTS_CREDENTIALS=True,
+    CORS_ORIGINS=ORIGINS,
+    CORS_HEADERS=['Content-Type', 'Authorization'],
+    CORS_METHODS=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'],
+    CORS_EXPOSE_HEADERS=['Content-Type', 'Authorization', 'X-Total-Count'],
+)
+
+
+def add_view(app):
+    @app.route('/api/ping', methods=['GET', 'POST'])
+    def ping():
+        return jsonify({'ok': True})
+    return app
+
+
+def legacy_app():
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    app.config.update(CONFIG)
+    CORS(app, resources={r"/api/*": {
+        "origins": ORIGINS, "methods": CONFIG['CORS_METHODS'], "allow_headers": CONFIG['CORS_HEADERS'],
+        "supports_credentials": True, "expose_headers": CONFIG['CORS_EXPOSE_HEADERS'], "vary_header": True,
+    }})
+
+    @app.before_request
+    def handle_preflight():
+        if request.method == 'OPTIONS':
+            response = jsonify({'status': 'success'})
+            response.headers.add('Access-Control-Allow-Origin', request.headers.get('Origin'))
+            response.headers.add('Access-Control-Allow-Headers', ', '.join(app.config['CORS_HEADERS']))
+            response.headers.add('Access-Control-Allow-Methods', ', '.join(app.config['CORS_METHODS']))
+            response.headers.add('Access-Control-Allow-Credentials', 'true')
+            response.headers.add('Access-Control-Max-Age', '86400')
+            response.headers.add('Vary', 'Origin')
+            return response, 200
+
+    @app.after_request
+    def after_request(response):
+        for name in ('Access-Control-Allow-Origin', 'Access-Control-Allow-Headers', 'Access-Control-Allow-Methods',
+                     'Access-Control-Allow-Credentials', 'Access-Control-Expose-Headers', 'Vary'):
+            response.headers.pop(name, None)
+        origin = request.headers.get('Origin')
+        if origin in app.config['CORS_ORIGINS']:
+            response.headers.add('Access-Control-Allow-Origin', origin)
+            response.headers.add('Access-Control-Allow-Headers', ', '.join(app.config['CORS_HEADERS']))
+            response.headers.add('Access-Control-Allow-Methods', ', '.join(app.config['CORS_METHODS']))
+            response.headers.add('Access-Control-Allow-Credentials', 'true')
+            response.headers.add('Access-Control-Expose-Headers', ', '.join(app.config['CORS_EXPOSE_HEADERS']))
+            response.headers.add('Vary', 'Origin')
+        return response
+
+    @app.after_request
+    def add_security_headers(response):
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        response.headers.setdefault('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        response.headers.setdefault('Access-Control-Allow-Methods', 'GET, HEAD, POST, PUT, PATCH, DELETE, OPTIONS')
+        return response
+
+    return add_view(app)
+
+
+def policy_app():
+    app = Flask(__name__)
+    app.config.update(CONFIG)
+    CorsPolicy(app)
+    return add_view(app)
+
+
+def bare_app():
+    return add_view(Flask(__name__))
+
+
+SCENARIOS = [
+    ('GET origine autorisée', 'GET', {'Origin': 'https://quiz.local:30080'}),
+    ('GET origine refusée', 'GET', {'Origin': 'http://evil.example'}),
+    ('GET sans Origin', 'GET', {}),
+    ('OPTIONS pré-vol', 'OPTIONS', {'Origin': 'https://quiz.local:30080', 'Access-Control-Request-Method': 'POST',
+                                    'Access-Control-Request-Headers': 'content-type, authorization'}),
+]
+
+
+def run_batch(app, method, headers, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        with app.test_request_context('/api/ping', method=method, headers=headers):
+            app.full_dispatch_request()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def measure(apps, method, headers, n, repeat):
+    """Meilleur temps moyen par requête (µs) de chaque cas; les cas sont
+    alternés à chaque série pour subir les mêmes conditions machine"""
+    best = {name: float('inf') for name in apps}
+    for _ in range(repeat):
+        for name, app in apps.items():
+            best[name] = min(best[name], run_batch(app, method, headers, n))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    apps = {'none': bare_app()}
+    try:
+        apps['legacy'] = legacy_app()
+    except ImportError:
+        print("⚠️ Flask-CORS non installé: cas 'legacy' ignoré")
+    apps['policy'] = policy_app()
+
+    print(f"CORS - {args.requests} requêtes x {args.repeat} séries par scénario (meilleure série, µs par requête, surcoût = écart avec 'none')")
+    print(f"{'scénario':<24} {'cas':<8} {'µs/req':>8} {'surcoût µs':>11}")
+    for label, method, headers in SCENARIOS:
+        results = measure(apps, method, headers, args.requests, args.repeat)
+        for name, elapsed in results.items():
+            print(f"{label:<24} {name:<8} {elapsed:>8.1f} {elapsed - results['none']:>11.1f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
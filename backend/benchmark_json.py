@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark de sérialisation JSON sur les formes de réponse de get_students,
+get_payments et get_quizzes (10 000 lignes par défaut).
+
+Compare:
+  - flask        : chemin historique (conversions .isoformat()/float() dans les
+                   compréhensions + fournisseur Flask par défaut, sort_keys)
+  - flask-debug  : idem avec indentation (mode debug)
+  - std          : StdJSONProvider (datetimes natives, sortie compacte)
+  - orjson       : OrjsonProvider
+  - orjson-stream: stream_json_list (réponse consommée morceau par morceau)
+
+Usage: python benchmark_json.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import random
+import string
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import OrjsonProvider, StdJSONProvider, orjson, stream_json_list
+
+
+def random_word(n=8):
+    return ''.join(random.choices(string.ascii_lowercase, k=n))
+
+
+def build_rows(n):
+    """Lignes brutes telles que lues en base (datetimes, floats)"""
+    now = datetime.utcnow()
+    students, payments, quizzes = [], [], []
+    for i in range(n):
+        students.append({
+            'id_etudiant': i, 'id': i,
+            'nom': random_word().capitalize(), 'prenom': random_word().capitalize(),
+            'username': f"{random_word()}.{random_word()}", 'email': f"{random_word()}@example.com",
+            'actif': bool(i % 2), 'telephone': f"034{random.randint(1000000, 9999999)}",
+            'date_inscription': now - timedelta(minutes=i), 'code_auth': random_word(6).upper()
+        })
+        date_paiement = now - timedelta(hours=i)
+        payments.append({
+            'id_paiement': i, 'id_etudiant': i, 'user_id': i,
+            'mode_paiement': 'mvola' if i % 3 else 'espece', 'code_ref_mvola': f"MV{random.randint(100000, 999999)}",
+            'montant': float(random.choice([25000, 50000, 75000])), 'statut': 'en_attente',
+            'tranche_restante': 0.0, 'date_paiement': date_paiement,
+            'reference': f"REF-{i}", 'commentaire': f"Paiement mvola du {date_paiement.strftime('%d/%m/%Y')}"
+        })
+        quizzes.append({
+            'id_quiz': i, 'id': i, 'titre': f"Quiz {random_word()}", 'type': 'quiz',
+            'total_points': 20, 'date_debut': now, 'date_fin': now + timedelta(days=1),
+            'duree': 30, 'statut': 'actif'
+        })
+    return {'get_students': students, 'get_payments': payments, 'get_quizzes': quizzes}
+
+
+def legacy_convert(rows):
+    """Conversions faites historiquement dans les endpoints avant jsonify"""
+    converted = []
+    for row in rows:
+        row = dict(row)
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+            elif isinstance(value, float):
+                row[key] = float(value) if value else 0
+        converted.append(row)
+    return converted
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {
+        'flask': DefaultJSONProvider(app),
+        'std': StdJSONProvider(app),
+    }
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    payloads = build_rows(args.rows)
+
+    print(f"Sérialisation JSON - {args.rows} lignes, meilleur de {args.repeat} essais")
+    print(f"{'endpoint':<14} {'fournisseur':<14} {'temps (ms)':>11} {'taille (Ko)':>12} {'accélération':>13}")
+
+    with app.test_request_context():
+        for endpoint, rows in payloads.items():
+            baseline = None
+
+            def run_flask(debug=False):
+                app.json = providers['flask']
+                app.debug = debug
+                response = app.json.response({'success': True, 'data': legacy_convert(rows)})
+                return len(response.get_data())
+
+            cases = [('flask', lambda: run_flask(False)), ('flask-debug', lambda: run_flask(True))]
+            for name in ('std', 'orjson'):
+                if name in providers:
+                    provider = providers[name]
+                    cases.append((name, lambda p=provider: len(p.response({'success': True, 'data': rows}).get_data())))
+            if 'orjson' in providers:
+                def run_stream():
+                    app.json = providers['orjson']
+                    response = stream_json_list(iter(rows), success=True)
+                    return sum(len(chunk) for chunk in response.response)
+                cases.append(('orjson-stream', run_stream))
+
+            for name, fn in cases:
+                elapsed, size = timed(fn, args.repeat)
+                baseline = baseline or elapsed
+                print(f"{endpoint:<14} {name:<14} {elapsed * 1000:>11.1f} {size / 1024:>12.0f} {baseline / elapsed:>12.1f}x")
+            app.debug = False
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Classement d'un quiz: index en mémoire vs tri des résultats à chaque requête.
+
+Crée un quiz de test et --submissions résultats (un par étudiant
+@bench.invalid, scores et temps aléatoires, insertion groupée), puis mesure:
+  - la reconstruction du classement depuis Result (démarrage)
+  - l'enregistrement des soumissions une à une (QuizBoard.add, comme record)
+  - top-N et rang d'un étudiant: index en mémoire, requête SQL (COUNT des
+    meilleurs), tri en Python de tous les résultats du quiz
+
+Les rangs de l'index sont vérifiés contre la requête SQL. Les données
+temporaires sont supprimées à la fin.
+
+Usage: python benchmark_leaderboard.py [--submissions 100000] [--queries 1000]
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, insert, or_
+
+from app import app, db, User, Quiz, Result
+from leaderboard import Leaderboards, QuizBoard
+
+EMAIL_DOMAIN = 'bench.invalid'
+TITLE = 'BENCH classement'
+
+
+def cleanup():
+    quiz_ids = [quiz_id for quiz_id, in db.session.query(Quiz.id).filter(Quiz.titre == TITLE)]
+    if quiz_ids:
+        Result.query.filter(Result.quiz_id.in_(quiz_ids)).delete(synchronize_session=False)
+        Quiz.query.filter(Quiz.id.in_(quiz_ids)).delete(synchronize_session=False)
+    User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def seed(count):
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    first_user = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    quiz = Quiz(titre=TITLE, type='qcm', total_points=100, date_debut=now - timedelta(days=1), date_fin=now,
+                duree=60, statut='termine', created_by=first_user)
+    for start in range(0, count, 10000):
+        batch = range(start, min(count, start + 10000))
+        db.session.execute(insert(User), [
+            {'id': first_user + i, 'username': f"bench.rank{i}", 'email': f"rank{i}@{EMAIL_DOMAIN}",
+             'password': '-', 'role': 'student', 'actif': False, 'date_inscription': now}
+            for i in batch
+        ])
+        if start == 0:
+            db.session.add(quiz)
+            db.session.flush()
+        db.session.execute(insert(Result), [
+            {'user_id': first_user + i, 'quiz_id': quiz.id, 'score': rng.randrange(101),
+             'temps_utilise': rng.randrange(300, 3600), 'statut': 'soumis', 'date_passage': now}
+            for i in batch
+        ])
+        db.session.commit()
+    return quiz.id
+
+
+def timed(label, fn, count=1):
+    start = time.perf_counter()
+    for _ in range(count):
+        result = fn()
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / count * 1e6
+    print(f"  {label:<40} {elapsed:>8.3f} s  ({per_call:,.1f} µs/appel)")
+    return result
+
+
+def sql_rank(quiz_id, score, temps):
+    better = db.session.query(func.count(Result.id)).filter(
+        Result.quiz_id == quiz_id,
+        or_(Result.score > score, and_(Result.score == score, Result.temps_utilise < temps))
+    ).scalar()
+    return better + 1
+
+
+def sorted_rank(quiz_id, user_id):
+    rows = db.session.query(Result.user_id, Result.score, Result.temps_utilise).filter(
+        Result.quiz_id == quiz_id).all()
+    rows.sort(key=lambda row: (-row.score, row.temps_utilise))
+    keys = [(-row.score, row.temps_utilise) for row in rows]
+    own = next(key for row, key in zip(rows, keys) if row.user_id == user_id)
+    return keys.index(own) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submissions', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        cleanup()
+        try:
+            quiz_id = seed(args.submissions)
+            rows = db.session.query(Result.id, Result.user_id, Result.score, Result.temps_utilise).filter(
+                Result.quiz_id == quiz_id).all()
+            print(f"Classement - {len(rows)} soumissions sur un quiz")
+
+            boards = Leaderboards(db, Result, sync_interval=3600)
+            print("construction")
+            timed('reconstruction depuis Result', lambda: boards.build(quiz_id))
+
+            # Classement vide alimenté soumission par soumission (comme submit_quiz)
+            incremental = QuizBoard([])
+            submissions = iter(rows)
+            timed('soumissions une à une (add)', lambda: incremental.add(*next(submissions)), len(rows))
+
+            rng = random.Random(5)
+            sample = [rng.choice(rows) for _ in range(args.queries)]
+            queries = iter(sample * 2)
+            print(f"requêtes ({args.queries} étudiants au hasard)")
+            timed('top 10 (index)', lambda: boards.top(quiz_id, 10), args.queries)
+            timed('rang (index incrémental)', lambda: incremental.rank_of(incremental.by_user[next(queries).user_id]),
+                  args.queries)
+            timed('rang (index reconstruit)', lambda: boards.rank(quiz_id, next(queries).user_id), args.queries)
+            few = iter(sample)
+            timed('rang (SQL COUNT)', lambda: sql_rank(quiz_id, *next(few)[2:]), max(1, args.queries // 100))
+            timed('rang (tri Python complet)', lambda: sorted_rank(quiz_id, next(few).user_id), 3)
+
+            mismatches = sum(
+                boards.rank(quiz_id, row.user_id)['rang'] != sql_rank(quiz_id, row.score, row.temps_utilise)
+                for row in sample[:200]
+            )
+            same = incremental.index.first(len(rows)) == boards.board(quiz_id).index.first(len(rows))
+            print(f"  vérification: {mismatches} rang(s) divergent(s) du SQL sur 200; "
+                  f"index incrémental {'identique' if same else 'DIFFÉRENT'} de l'index reconstruit")
+            print(f"  {boards.describe()}")
+        finally:
+            db.session.rollback()
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test de charge "tempête de connexions" (début d'examen).
+
+Lance N connexions simultanées contre un serveur en cours d'exécution et mesure
+en parallèle la latence de /health, pour vérifier que le hachage des mots de
+passe n'affame plus les autres requêtes.
+
+Affiche la répartition des statuts (200 / 401 / 503 contre-pression), les
+percentiles de latence des connexions et ceux de /health pendant la tempête.
+
+Usage: python benchmark_login_storm.py [--url http://localhost:5000] [--logins 200]
+       [--concurrency 50] [--email admin@example.com] [--password admin123]
+       [--endpoint /api/auth/login/admin]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def login_once(session, url, payload, retry_503):
+    start = time.perf_counter()
+    response = session.post(url, json=payload, timeout=30)
+    attempts = 1
+    while response.status_code == 503 and attempts <= retry_503:
+        time.sleep(float(response.headers.get('Retry-After', '1')))
+        response = session.post(url, json=payload, timeout=30)
+        attempts += 1
+    return response.status_code, (time.perf_counter() - start) * 1000, attempts
+
+
+def probe_health(base_url, stop, latencies, interval):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            session.get(f"{base_url}/health", timeout=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+        except requests.RequestException:
+            latencies.append(10000.0)
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--endpoint', default='/api/auth/login/admin')
+    parser.add_argument('--email', default='admin@example.com')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--retry-503', type=int, default=0, help='Nouvelles tentatives après un 503 (Retry-After)')
+    parser.add_argument('--probe-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    payload = {'email': args.email, 'password': args.password, 'code_auth': args.password}
+
+    # Latence de référence de /health hors charge
+    idle = []
+    for _ in range(20):
+        start = time.perf_counter()
+        requests.get(f"{base_url}/health", timeout=10)
+        idle.append((time.perf_counter() - start) * 1000)
+
+    stop = threading.Event()
+    health = []
+    prober = threading.Thread(target=probe_health, args=(base_url, stop, health, args.probe_interval), daemon=True)
+    prober.start()
+
+    local = threading.local()
+
+    def task(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        try:
+            return login_once(local.session, base_url + args.endpoint, payload, args.retry_503)
+        except requests.RequestException:
+            return 'erreur', 0.0, 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(task, range(args.logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    statuses = Counter(status for status, _, _ in results)
+    ok_latencies = [latency for status, latency, _ in results if status == 200]
+    attempts = sum(a for _, _, a in results)
+
+    print(f"Tempête de connexions: {args.logins} connexions, {args.concurrency} simultanées -> {base_url + args.endpoint}")
+    print(f"Durée totale: {elapsed:.2f} s, débit: {statuses.get(200, 0) / elapsed:.1f} connexions réussies/s, tentatives: {attempts}")
+    print("Statuts: " + ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    if ok_latencies:
+        print(f"Connexion (200) ms: p50={percentile(ok_latencies, 50):.0f} p95={percentile(ok_latencies, 95):.0f} "
+              f"p99={percentile(ok_latencies, 99):.0f} max={max(ok_latencies):.0f}")
+    print(f"/health au repos ms: p50={statistics.median(idle):.1f} p95={percentile(idle, 95):.1f}")
+    if health:
+        print(f"/health pendant la tempête ms ({len(health)} sondes): p50={percentile(health, 50):.1f} "
+              f"p95={percentile(health, 95):.1f} max={max(health):.1f}")
+
+
+if __name__ == '__main__':
+    main()
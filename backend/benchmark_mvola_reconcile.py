@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Débit du rapprochement des relevés MVola.
+
+Crée --payments paiements MVola en attente (étudiants @bench.invalid,
+insertion groupée) puis un relevé CSV en mémoire de --lines lignes:
+références des paiements (montant exact, montant différent, date hors
+tolérance), références inconnues et doublons. Mesure:
+  - la lecture seule du CSV (statement_rows)
+  - le rapprochement complet (MvolaReconciler.reconcile)
+  - la validation en masse des paiements rapprochés (PaymentBatch, sans commit)
+
+Rien n'est enregistré: la transaction est annulée, les données temporaires
+supprimées à la fin.
+
+Usage: python benchmark_mvola_reconcile.py [--lines 50000] [--payments 30000]
+"""
+
+import argparse
+import io
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import app, db, User, Payment, MvolaTransaction, mvola_reconciler, payment_batch
+from mvola_reconcile import statement_rows
+from payment_batch import MAX_BULK_PAYMENTS
+
+EMAIL_DOMAIN = 'bench.invalid'
+PREFIX = 'BENCHMV'
+
+
+def cleanup():
+    MvolaTransaction.query.filter(MvolaTransaction.reference.like(f"{PREFIX}%")).delete(synchronize_session=False)
+    Payment.query.filter(Payment.ref_mvola_norm.like(f"{PREFIX}%")).delete(synchronize_session=False)
+    User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def reference(n):
+    return f"{PREFIX}.{n:08d}"
+
+
+def seed(count):
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    now = datetime.utcnow()
+    for start in range(0, count, 5000):
+        batch = range(start, min(count, start + 5000))
+        db.session.execute(insert(User), [
+            {'id': first_user + i, 'username': f"bench.mvola{i}", 'email': f"mvola{i}@{EMAIL_DOMAIN}",
+             'password': '-', 'role': 'student', 'actif': False, 'date_inscription': now}
+            for i in batch
+        ])
+        db.session.execute(insert(Payment), [
+            {'user_id': first_user + i, 'mode_paiement': 'mvola', 'code_ref_mvola': reference(i),
+             'ref_mvola_norm': reference(i).replace('.', ''), 'montant': 50000, 'statut': 'en_attente',
+             'tranche_restante': 0, 'date_paiement': now}
+            for i in batch
+        ])
+        db.session.commit()
+
+
+def statement(lines, payments):
+    """CSV d'opérateur: 70 % de références connues, dont quelques anomalies"""
+    rng = random.Random(42)
+    today = datetime.utcnow()
+    out = io.StringIO()
+    out.write("Date;Référence;Montant;Numéro\n")
+    known = rng.sample(range(payments), min(payments, int(lines * 0.7)))
+    for n in range(lines):
+        date, amount = today, '50 000,00'
+        if n < len(known):
+            ref = reference(known[n]).lower()
+            roll = rng.random()
+            if roll < 0.05:
+                amount = '45 000,00'
+            elif roll < 0.08:
+                date = today - timedelta(days=30)
+        elif rng.random() < 0.1 and known:
+            ref = reference(known[0])  # doublon
+        else:
+            ref = f"MP{rng.randrange(10 ** 12):012d}"
+        out.write(f"{date.strftime('%d/%m/%Y %H:%M:%S')};{ref};{amount};034{rng.randrange(10 ** 7):07d}\n")
+    return out.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=50000)
+    parser.add_argument('--payments', type=int, default=30000)
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        cleanup()
+        try:
+            seed(args.payments)
+            data = statement(args.lines, args.payments)
+            print(f"Rapprochement MVola - relevé de {args.lines} lignes ({len(data) / 1024:.0f} Ko), "
+                  f"{args.payments} paiements en attente")
+
+            start = time.perf_counter()
+            rows = sum(1 for _ in statement_rows(io.BytesIO(data)))
+            elapsed = time.perf_counter() - start
+            print(f"{'lecture CSV':<22} {elapsed:>7.2f} s  ({rows / elapsed:.0f} lignes/s)")
+
+            start = time.perf_counter()
+            report = mvola_reconciler.reconcile(statement_rows(io.BytesIO(data)))
+            db.session.flush()
+            elapsed = time.perf_counter() - start
+            print(f"{'rapprochement':<22} {elapsed:>7.2f} s  ({args.lines / elapsed:.0f} lignes/s)")
+            print(f"  {report.as_dict()['summary']}")
+
+            ids = report.payment_ids
+            start = time.perf_counter()
+            validated = 0
+            for i in range(0, len(ids), MAX_BULK_PAYMENTS):
+                validated += payment_batch.apply('validate', ids=ids[i:i + MAX_BULK_PAYMENTS]).summary()['succeeded']
+            db.session.flush()
+            elapsed = time.perf_counter() - start
+            print(f"{'validation en masse':<22} {elapsed:>7.2f} s  ({validated} paiements validés)")
+            db.session.rollback()
+        finally:
+            db.session.rollback()
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
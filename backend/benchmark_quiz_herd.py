@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Ruée sur un quiz à l'ouverture d'un examen (thundering herd).
+
+Crée un quiz temporaire ouvert (titre "bench-herd", créateur @bench.invalid)
+avec --questions questions, puis lance des vagues de --concurrency requêtes
+simultanées (barrière) sur le quiz, cache vidé avant chaque vague:
+  - avant: chemin historique (get_or_404 + requête des questions + jsonify
+           à chaque requête)
+  - après: /api/quizzes/<id> (payload pré-encodé, chargement single-flight)
+
+Affiche par chemin le nombre de requêtes SQL par vague, les percentiles de
+latence et le débit. Les données temporaires sont supprimées à la fin.
+
+Usage: python benchmark_quiz_herd.py [--concurrency 200] [--waves 5] [--questions 40]
+"""
+
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+from sqlalchemy import event
+
+from app import app, db, User, Quiz, Question, quiz_payloads, token_service
+
+EMAIL_DOMAIN = 'bench.invalid'
+TITLE = 'bench-herd'
+
+
+def legacy_get_quiz(quiz_id):
+    """Copie du chemin historique de get_quiz_with_questions (sans contrôle d'accès)"""
+    quiz = Quiz.query.get_or_404(quiz_id)
+    questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    return jsonify({
+        'quiz': {
+            'id': quiz.id,
+            'titre': quiz.titre,
+            'type': quiz.type,
+            'total_points': quiz.total_points,
+            'date_debut': quiz.date_debut.isoformat(),
+            'date_fin': quiz.date_fin.isoformat(),
+            'duree': quiz.duree,
+            'statut': quiz.statut
+        },
+        'questions': [{
+            'id': q.id,
+            'question': q.question,
+            'type_question': q.type_question,
+            'options': q.options,
+            'points': q.points
+        } for q in questions]
+    })
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def cleanup():
+    for quiz in Quiz.query.filter_by(titre=TITLE).all():
+        Question.query.filter_by(quiz_id=quiz.id).delete(synchronize_session=False)
+        db.session.delete(quiz)
+    User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def create_quiz(question_count):
+    user = User(username='bench.herd', email=f"herd@{EMAIL_DOMAIN}", password='-', role='student', actif=True)
+    db.session.add(user)
+    db.session.flush()
+    now = datetime.now()
+    quiz = Quiz(titre=TITLE, type='qcm', total_points=question_count, date_debut=now - timedelta(hours=1),
+                date_fin=now + timedelta(hours=2), duree=60, statut='actif', created_by=user.id)
+    db.session.add(quiz)
+    db.session.flush()
+    for i in range(question_count):
+        db.session.add(Question(
+            quiz_id=quiz.id, question=f"Question {i} : quelle est la bonne réponse parmi les suivantes ?",
+            type_question='choix_unique', reponse_correcte='B',
+            options=[f"Réponse {c} de la question {i}" for c in 'ABCD'], points=1
+        ))
+    db.session.commit()
+    return quiz.id, token_service.issue_access(user)
+
+
+def wave(client, url, headers, concurrency):
+    barrier = threading.Barrier(concurrency)
+    latencies = []
+    statuses = {}
+
+    def fetch():
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=fetch) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--waves', type=int, default=5)
+    parser.add_argument('--questions', type=int, default=40)
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.WARNING)
+    app.add_url_rule('/bench/legacy-quiz/<int:quiz_id>', 'bench_legacy_get_quiz', legacy_get_quiz)
+
+    with app.app_context():
+        cleanup()
+        quiz_id, token = create_quiz(args.questions)
+        queries = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    cases = [('avant', f'/bench/legacy-quiz/{quiz_id}'), ('après', f'/api/quizzes/{quiz_id}')]
+    print(f"Ruée sur un quiz - {args.waves} vagues de {args.concurrency} requêtes, {args.questions} questions")
+    print(f"{'chemin':<8} {'SQL/vague':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'req/s':>8}  statuts")
+    try:
+        for name, url in cases:
+            elapsed, latencies, statuses = 0.0, [], {}
+            queries[0] = 0
+            for _ in range(args.waves):
+                quiz_payloads.invalidate(quiz_id)
+                wave_elapsed, wave_latencies, wave_statuses = wave(client, url, headers, args.concurrency)
+                elapsed += wave_elapsed
+                latencies += wave_latencies
+                for status, count in wave_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+            print(f"{name:<8} {queries[0] / args.waves:>10.1f} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 95):>8.1f} {max(latencies):>8.1f} "
+                  f"{len(latencies) / elapsed:>8.0f}  {statuses}")
+        print(f"cache: {quiz_payloads.describe()}")
+    finally:
+        with app.app_context():
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Débit de la re-correction en masse.
+
+Crée un quiz temporaire (titre "bench-regrade", créateur @bench.invalid) avec
+--questions questions et --attempts tentatives aux réponses aléatoires
+(une par étudiant @bench.invalid, insertion groupée), modifie la réponse correcte d'une question puis mesure:
+  - la correction seule (AnswerKey.score_many sur les lignes en mémoire)
+  - une passe complète RegradeService.regrade (lecture par lots, correction,
+    UPDATE groupé par lot, commit)
+
+Les données temporaires sont supprimées à la fin.
+
+Usage: python benchmark_regrade.py [--attempts 20000] [--questions 20] [--chunk-size 2000]
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import app, db, User, Quiz, Question, Result, ResultAnswers, regrader, load_answer_key
+from grading import RegradeJob
+
+EMAIL_DOMAIN = 'bench.invalid'
+TITLE = 'bench-regrade'
+
+
+def cleanup():
+    for quiz in Quiz.query.filter_by(titre=TITLE).all():
+        ResultAnswers.query.filter_by(quiz_id=quiz.id).delete(synchronize_session=False)
+        Result.query.filter_by(quiz_id=quiz.id).delete(synchronize_session=False)
+        Question.query.filter_by(quiz_id=quiz.id).delete(synchronize_session=False)
+        db.session.delete(quiz)
+    User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def seed(attempts, question_count):
+    user = User(username='bench.regrade', email=f"regrade@{EMAIL_DOMAIN}", password='-', role='student', actif=True)
+    db.session.add(user)
+    db.session.flush()
+    now = datetime.now()
+    quiz = Quiz(titre=TITLE, type='qcm', total_points=question_count, date_debut=now - timedelta(hours=2),
+                date_fin=now - timedelta(hours=1), duree=60, statut='clos', created_by=user.id)
+    db.session.add(quiz)
+    db.session.flush()
+    questions = [Question(quiz_id=quiz.id, question=f"Question {i}", type_question='choix_multiple',
+                          reponse_correcte='0', options=['a', 'b', 'c', 'd'], points=1)
+                 for i in range(question_count)]
+    db.session.add_all(questions)
+    db.session.flush()
+
+    key = load_answer_key(quiz.id)
+    rng = random.Random(42)
+    for start in range(0, attempts, 5000):
+        batch = range(start, min(attempts, start + 5000))
+        answers = [{str(q.id): rng.choice('abcd') for q in questions} for _ in batch]
+        # Une tentative par étudiant (uq_result_user_quiz)
+        first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        db.session.execute(insert(User), [
+            {'id': first_user + i, 'username': f"bench.regrade{start + i}", 'email': f"regrade{start + i}@{EMAIL_DOMAIN}",
+             'password': '-', 'role': 'student', 'actif': False}
+            for i in range(len(batch))
+        ])
+        first_id = (db.session.query(db.func.max(Result.id)).scalar() or 0) + 1
+        db.session.execute(insert(Result), [
+            {'id': first_id + i, 'user_id': first_user + i, 'quiz_id': quiz.id, 'score': key.score(a)[0],
+             'statut': 'soumis'}
+            for i, a in enumerate(answers)
+        ])
+        db.session.execute(insert(ResultAnswers), [
+            {'result_id': first_id + i, 'quiz_id': quiz.id, 'answers': a} for i, a in enumerate(answers)
+        ])
+        db.session.commit()
+
+    # Correction après l'examen: la bonne réponse de la première question était "b"
+    questions[0].reponse_correcte = '1'
+    db.session.commit()
+    return quiz.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=20000)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.WARNING)
+    regrader.chunk_size = args.chunk_size
+    with app.app_context():
+        cleanup()
+        try:
+            quiz_id = seed(args.attempts, args.questions)
+            print(f"Re-correction - {args.attempts} tentatives, {args.questions} questions, lots de {args.chunk_size}")
+
+            rows = db.session.query(Result.id, Result.score, ResultAnswers.answers).join(
+                ResultAnswers, ResultAnswers.result_id == Result.id
+            ).filter(ResultAnswers.quiz_id == quiz_id).all()
+            key = load_answer_key(quiz_id)
+            start = time.perf_counter()
+            changed = key.score_many(rows)
+            elapsed = time.perf_counter() - start
+            print(f"{'correction seule':<20} {len(rows) / elapsed:>12.0f} tentatives/s  ({len(changed)} scores modifiés)")
+
+            job = RegradeJob(quiz_id, 'benchmark')
+            start = time.perf_counter()
+            regrader.regrade(job)
+            elapsed = time.perf_counter() - start
+            print(f"{'passe complète':<20} {job.processed / elapsed:>12.0f} tentatives/s  "
+                  f"({job.changed} scores modifiés, {elapsed:.2f} s)")
+        finally:
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
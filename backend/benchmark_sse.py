@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Charge du canal SSE (/api/events) avec --subscribers connexions simultanées.
+
+Démarre l'application sur un serveur gevent (comme main.py) dans ce processus,
+ouvre une connexion SSE par étudiant fictif (jetons signés, aucune écriture en
+base) puis mesure:
+  - mémoire résidente et threads ajoutés par les connexions inactives
+    (client et serveur sont dans le même processus: borne haute)
+  - latence d'une diffusion "tous" jusqu'au dernier abonné
+  - latence d'un événement ciblé
+  - reprise avec Last-Event-ID après déconnexion
+
+Usage: python benchmark_sse.py [--subscribers 5000] [--broadcasts 5]
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import logging
+import resource
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import gevent
+from gevent.event import Event
+from gevent.pywsgi import WSGIServer
+
+from app import app, event_bus, token_service
+
+USER_ID_BASE = 10_000_000
+
+
+def status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Client:
+    """Connexion SSE brute: enregistre l'instant de réception de chaque marqueur attendu"""
+
+    def __init__(self, port, user_id, token, last_event_id=None):
+        self.user_id = user_id
+        self.received = {}
+        self.buffer = b''
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        # Client brut: le jeton passe en en-tête (sans ticket, aucune écriture en base)
+        headers = f"GET /api/events HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {token}\r\n"
+        if last_event_id:
+            headers += f"Last-Event-ID: {last_event_id}\r\n"
+        self.sock.sendall((headers + "\r\n").encode())
+        self.ready = Event()
+        self.expected = set()
+
+    def run(self):
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    return
+                self.buffer += data
+                if b'retry:' in self.buffer:
+                    self.ready.set()
+                for marker in list(self.expected):
+                    if marker in self.buffer:
+                        self.received[marker] = time.perf_counter()
+                        self.expected.discard(marker)
+                if not self.expected:
+                    self.buffer = self.buffer[-256:]
+        except OSError:
+            return
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--broadcasts', type=int, default=5)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 2 * args.subscribers + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+        if hard < needed:
+            print(f"⚠️  Limite de descripteurs {hard} < {needed}: réduire --subscribers")
+
+    app.logger.setLevel(logging.WARNING)
+    server = WSGIServer(('127.0.0.1', 0), app, log=None, backlog=4096)
+    server.start()
+    port = server.server_port
+
+    rss_before, threads_before = status('VmRSS'), threading.active_count()
+    clients = []
+    for i in range(args.subscribers):
+        user = SimpleNamespace(id=USER_ID_BASE + i, role='student', actif=True, username=f'sse{i}', email=f'sse{i}@bench.invalid')
+        clients.append(Client(port, user.id, token_service.issue_access(user)))
+    readers = [gevent.spawn(client.run) for client in clients]
+    start = time.perf_counter()
+    for client in clients:
+        client.ready.wait(30)
+    connected = sum(client.ready.is_set() for client in clients)
+    print(f"SSE - {connected}/{args.subscribers} abonnés connectés en {time.perf_counter() - start:.1f} s")
+    gevent.sleep(1)
+    rss_after, threads_after = status('VmRSS'), threading.active_count()
+    print(f"mémoire: +{(rss_after - rss_before) / 1024:.1f} Mo "
+          f"({(rss_after - rss_before) / max(connected, 1):.1f} Ko par connexion, client + serveur), "
+          f"threads: {threads_before} -> {threads_after}")
+
+    print(f"{'événement':<10} {'abonnés':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for n in range(args.broadcasts):
+        marker = f'bench-broadcast-{n}'.encode()
+        for client in clients:
+            client.expected.add(marker)
+        sent = time.perf_counter()
+        event_bus.publish('notification', {'titre': marker.decode()})
+        deadline = time.time() + 30
+        while any(marker in client.expected for client in clients) and time.time() < deadline:
+            gevent.sleep(0.005)
+        latencies = [(c.received[marker] - sent) * 1000 for c in clients if marker in c.received]
+        print(f"{'tous':<10} {len(latencies):>8} {percentile(latencies, 50):>8.1f} "
+              f"{percentile(latencies, 95):>8.1f} {max(latencies):>8.1f}")
+
+    target = clients[len(clients) // 2]
+    marker = b'bench-targeted'
+    target.expected.add(marker)
+    sent = time.perf_counter()
+    event_bus.publish('payment', {'statut': marker.decode()}, user_id=target.user_id)
+    while marker in target.expected:
+        gevent.sleep(0.001)
+    print(f"{'ciblé':<10} {1:>8} {(target.received[marker] - sent) * 1000:>8.1f}")
+
+    # Reprise: déconnexion, deux événements manqués, reconnexion avec Last-Event-ID
+    last_event_id = f"{event_bus.epoch}-{event_bus.publish('payment', {'statut': 'avant'}, user_id=target.user_id)}"
+    gevent.sleep(0.1)
+    target.close()
+    gevent.sleep(0.1)
+    event_bus.publish('payment', {'statut': 'manque-1'}, user_id=target.user_id)
+    event_bus.publish('payment', {'statut': 'manque-2'}, user_id=target.user_id)
+    user = SimpleNamespace(id=target.user_id, role='student', actif=True, username='sse', email='sse@bench.invalid')
+    resumed = Client(port, target.user_id, token_service.issue_access(user), last_event_id)
+    resumed.expected.update([b'manque-1', b'manque-2'])
+    reader = gevent.spawn(resumed.run)
+    resumed.ready.wait(5)
+    gevent.sleep(0.2)
+    print(f"reprise Last-Event-ID: {2 - len(resumed.expected)}/2 événements rejoués")
+
+    print(f"bus: {event_bus.describe()}")
+    for client in clients + [resumed]:
+        client.close()
+    gevent.killall(readers + [reader])
+    server.stop(timeout=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Débit de connexion étudiant avant / après le digest HMAC indexé.
+
+Crée des étudiants temporaires (emails @bench.invalid) dans la base configurée,
+puis mesure les connexions par seconde via le client de test Flask:
+  - avant: chemin historique (code en clair, repli check_password_hash inline
+           avec écriture du code en clair)
+  - après: route /api/auth/login/student (HMAC + compare_digest, sans écriture)
+
+Chaque chemin est mesuré avec un code correct et un code erroné (le repli
+pbkdf2 rendait chaque échec coûteux). Les étudiants temporaires sont supprimés
+à la fin.
+
+Usage: python benchmark_student_login.py [--students 50] [--logins 300]
+"""
+
+import argparse
+import logging
+import time
+
+from flask import jsonify, request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import app, db, User, set_auth_code
+from auth_codes import generate_code
+
+EMAIL_DOMAIN = 'bench.invalid'
+
+
+def legacy_login_student():
+    """Copie du chemin de vérification historique de login_student"""
+    data = request.json
+    user = User.query.filter_by(email=data['email'], role='student').first()
+    if not user:
+        return jsonify({'success': False}), 401
+    code_auth = (data.get('code_auth') or '').strip().upper()
+    is_code_correct = False
+    if user.code_auth and user.code_auth.upper() == code_auth:
+        is_code_correct = True
+    elif check_password_hash(user.password, code_auth):
+        is_code_correct = True
+        user.code_auth = code_auth
+        db.session.commit()
+    if not is_code_correct:
+        return jsonify({'success': False}), 401
+    return jsonify({'success': True})
+
+
+def create_students(count):
+    students = []
+    for i in range(count):
+        code = generate_code()
+        user = User(
+            username=f"bench.login{i}", email=f"bench-login-{i}@{EMAIL_DOMAIN}",
+            password=generate_password_hash(code, method='pbkdf2:sha256'), role='student', actif=True
+        )
+        set_auth_code(user, code)
+        db.session.add(user)
+        students.append((user.email, code))
+    db.session.commit()
+    return students
+
+
+def cleanup():
+    User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def run(client, url, students, logins, wrong_code):
+    statuses = {}
+    start = time.perf_counter()
+    for i in range(logins):
+        email, code = students[i % len(students)]
+        response = client.post(url, json={'email': email, 'code_auth': 'XXXXXX' if wrong_code else code})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    elapsed = time.perf_counter() - start
+    return logins / elapsed, elapsed / logins * 1000, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--logins', type=int, default=300)
+    args = parser.parse_args()
+
+    app.logger.setLevel(logging.WARNING)
+    app.add_url_rule('/bench/legacy-login/student', 'bench_legacy_login_student', legacy_login_student, methods=['POST'])
+
+    with app.app_context():
+        cleanup()
+        students = create_students(args.students)
+
+    client = app.test_client()
+    cases = [
+        ('avant', '/bench/legacy-login/student', False),
+        ('après', '/api/auth/login/student', False),
+        ('avant', '/bench/legacy-login/student', True),
+        ('après', '/api/auth/login/student', True),
+    ]
+    print(f"Connexion étudiant - {args.logins} connexions sur {args.students} étudiants")
+    print(f"{'chemin':<8} {'code':<8} {'connexions/s':>13} {'ms/connexion':>13}  statuts")
+    try:
+        for name, url, wrong_code in cases:
+            # Les connexions invalides pbkdf2 sont lentes: échantillon réduit
+            logins = max(10, args.logins // 10) if (wrong_code and name == 'avant') else args.logins
+            rate, latency, statuses = run(client, url, students, logins, wrong_code)
+            print(f"{name:<8} {'erroné' if wrong_code else 'correct':<8} {rate:>13.0f} {latency:>13.2f}  {statuses}")
+    finally:
+        with app.app_context():
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
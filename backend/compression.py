@@ -0,0 +1,192 @@
+"""
+Compression des réponses HTTP avec négociation Accept-Encoding (br / gzip).
+
+- Réponses dynamiques: compressées si le type est dans la liste autorisée et la
+  taille dépasse le seuil; les réponses streamées sont compressées à la volée.
+- Formats déjà compressés (mp4, png, jpg, pdf, ...) et fichiers servis en
+  passthrough (send_file) ne sont jamais recompressés.
+- Fichiers statiques: les versions .br / .gz précompressées au build de l'image
+  (precompress_static.py) sont servies directement, sans coût CPU par requête.
+"""
+
+import gzip
+import mimetypes
+import os
+import zlib
+
+from flask import abort, request, send_file
+
+try:
+    import brotli
+except ImportError:  # Brotli absent: seul gzip est proposé
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset([
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'text/xml',
+    'text/csv',
+    'text/event-stream',
+])
+
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def parse_accept_encoding(header):
+    """Retourne {encodage: q} depuis l'en-tête Accept-Encoding"""
+    accepted = {}
+    for part in (header or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header, available=('br', 'gzip')):
+    """Meilleur encodage supporté (à q égal, br est préféré à gzip)"""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in available:
+        if encoding == 'br' and brotli is None:
+            continue
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class Compressor:
+    """Middleware after_request de compression"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', int(os.getenv('COMPRESS_MIN_SIZE', '1024')))
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', int(os.getenv('COMPRESS_GZIP_LEVEL', '6')))
+        # Qualité brotli modérée: les niveaux élevés sont réservés au précompressé
+        app.config.setdefault('COMPRESS_BR_QUALITY', int(os.getenv('COMPRESS_BR_QUALITY', '4')))
+        app.config.setdefault('COMPRESS_ENABLED', os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true')
+        self.app = app
+        app.after_request(self.after_request)
+        app.extensions['compressor'] = self
+
+        # Les fichiers statiques passent par la version précompressée si elle existe
+        if app.static_folder and 'static' in app.view_functions:
+            app.view_functions['static'] = self.static_view
+
+    # ----- Compression dynamique -----
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.app.config['COMPRESS_BR_QUALITY'])
+        return gzip.compress(data, compresslevel=self.app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+    def _stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.app.config['COMPRESS_BR_QUALITY'])
+            for chunk in chunks:
+                out = compressor.process(chunk) + compressor.flush()
+                if out:
+                    yield out
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(self.app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if out:
+                    yield out
+            yield compressor.flush()
+
+    def should_compress(self, response):
+        if not self.app.config['COMPRESS_ENABLED']:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if request.method == 'HEAD':
+            return False
+        return response.mimetype in COMPRESSIBLE_TYPES
+
+    def after_request(self, response, variants=None):
+        """Compresse la réponse. `variants` (dict encodage -> octets) mémorise le
+        corps compressé d'un contenu figé (ex: payload de quiz en cache)."""
+        if not self.should_compress(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            chunks = response.response
+            response.response = self._stream((c if isinstance(c, bytes) else c.encode('utf-8') for c in chunks), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.app.config['COMPRESS_MIN_SIZE']:
+                return response
+            body = variants.get(encoding) if variants is not None else None
+            if body is None:
+                body = self.compress(data, encoding)
+                if variants is not None:
+                    variants[encoding] = body
+            response.set_data(body)
+
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # ETag faible: la représentation compressée diffère octet par octet
+            etag, weak = response.get_etag()
+            if etag:
+                response.set_etag(f"{etag}-{encoding}", weak=True)
+        return response
+
+    # ----- Fichiers statiques précompressés -----
+
+    def send_precompressed(self, directory, filename, max_age=None):
+        """Sert filename.br / filename.gz si présent et accepté, sinon l'original"""
+        path = os.path.realpath(os.path.join(directory, filename))
+        if not path.startswith(os.path.realpath(directory) + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        available = [enc for enc, suffix in PRECOMPRESSED_SUFFIXES.items() if os.path.isfile(path + suffix)]
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'), available) if available else None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if encoding is None:
+            response = send_file(path, mimetype=mimetype, conditional=True, max_age=max_age)
+        else:
+            stat = os.stat(path)
+            response = send_file(path + PRECOMPRESSED_SUFFIXES[encoding], mimetype=mimetype,
+                                 download_name=os.path.basename(path),
+                                 conditional=False, max_age=max_age, etag=False)
+            response.headers['Content-Encoding'] = encoding
+            # Validateurs calculés sur l'original pour rester stables entre variantes
+            response.last_modified = stat.st_mtime
+            response.set_etag(f"{int(stat.st_mtime)}-{stat.st_size}-{encoding}")
+            response.make_conditional(request, accept_ranges=False)
+        if available:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def static_view(self, filename):
+        app = self.app
+        return self.send_precompressed(app.static_folder, filename, max_age=app.get_send_file_max_age(filename))
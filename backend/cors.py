@@ -0,0 +1,86 @@
+"""
+Gestion CORS centralisée.
+
+Un seul composant remplace Flask-CORS et les hooks de nettoyage d'en-têtes:
+- valeurs d'en-têtes calculées une fois à l'initialisation (pas de ', '.join
+  par requête);
+- origine vérifiée par une recherche O(1) dans un frozenset;
+- réponses de pré-vol (OPTIONS) mises en cache par origine et renvoyées avant
+  tout autre before_request (journalisation du corps, authentification...).
+
+Configuration lue dans app.config: CORS_ORIGINS, CORS_HEADERS, CORS_METHODS,
+CORS_EXPOSE_HEADERS, CORS_SUPPORTS_CREDENTIALS, CORS_MAX_AGE.
+"""
+
+import os
+
+from flask import request
+
+PREFLIGHT_BODY = b'{"status":"success"}'
+
+
+class CorsPolicy:
+    """Politique CORS précalculée (pré-vol + en-têtes des réponses simples)"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CORS_MAX_AGE', int(os.getenv('CORS_MAX_AGE', '86400')))
+        app.config.setdefault('CORS_SUPPORTS_CREDENTIALS', True)
+        self.app = app
+        self.configure(app.config)
+
+        # Le pré-vol passe avant tous les autres before_request déjà enregistrés
+        app.before_request_funcs.setdefault(None, []).insert(0, self.preflight)
+        app.after_request(self.after_request)
+        app.extensions['cors'] = self
+
+    def configure(self, config):
+        """(Re)calcule les valeurs d'en-têtes depuis la configuration"""
+        self.origins = frozenset(config.get('CORS_ORIGINS', ()))
+        credentials = [('Access-Control-Allow-Credentials', 'true')] if config.get('CORS_SUPPORTS_CREDENTIALS') else []
+
+        self.simple_headers = tuple(credentials + [
+            ('Access-Control-Expose-Headers', ', '.join(config.get('CORS_EXPOSE_HEADERS', ()))),
+        ])
+        self.preflight_headers = tuple(credentials + [
+            ('Access-Control-Allow-Headers', ', '.join(config.get('CORS_HEADERS', ()))),
+            ('Access-Control-Allow-Methods', ', '.join(config.get('CORS_METHODS', ()))),
+            ('Access-Control-Max-Age', str(config.get('CORS_MAX_AGE', 86400))),
+        ])
+        # origine -> en-têtes complets du pré-vol (borné par la liste des origines)
+        self._preflight_cache = {}
+
+    def is_allowed(self, origin):
+        return origin in self.origins
+
+    def _preflight_headers_for(self, origin):
+        headers = self._preflight_cache.get(origin)
+        if headers is None:
+            headers = [('Content-Type', 'application/json'), ('Vary', 'Origin')]
+            if origin in self.origins:
+                headers += [('Access-Control-Allow-Origin', origin), *self.preflight_headers]
+                self._preflight_cache[origin] = headers
+        return headers
+
+    def preflight(self):
+        """Répond directement aux requêtes OPTIONS"""
+        if request.method != 'OPTIONS':
+            return None
+        origin = request.headers.get('Origin')
+        # Origine non autorisée: 200 sans en-têtes CORS, le navigateur bloque
+        return self.app.response_class(PREFLIGHT_BODY, status=200, headers=self._preflight_headers_for(origin))
+
+    def after_request(self, response):
+        origin = request.headers.get('Origin')
+        if origin is None or 'Access-Control-Allow-Origin' in response.headers:
+            return response
+        if origin in self.origins:
+            headers = response.headers
+            headers['Access-Control-Allow-Origin'] = origin
+            headers.extend(self.simple_headers)
+        # Fusion avec un Vary existant (ex: Accept-Encoding posé par la compression)
+        response.vary.add('Origin')
+        return response
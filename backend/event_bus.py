@@ -0,0 +1,176 @@
+"""
+Canal de notifications poussées (Server-Sent Events).
+
+Les routes d'écriture (notification créée, paiement validé, ...) publient un
+événement après leur commit; EventBus l'encode une fois en trame SSE et la
+dépose dans la file de chaque abonné concerné (l'utilisateur ciblé, ou tous
+les abonnés pour une diffusion). Chaque connexion /api/events attend sur son
+propre signal et n'écrit que ses trames, avec un commentaire de maintien
+(heartbeat) pendant les périodes calmes.
+
+Les ids d'événement sont "<époque>-<séquence>"; un historique borné des
+dernières trames permet la reprise après reconnexion (en-tête Last-Event-ID).
+Si l'historique ne couvre plus la reprise (redémarrage, trop d'événements,
+client trop lent), le client reçoit un événement "reset" et recharge son
+tableau de bord.
+
+Le bus est en mémoire du processus: il suppose un seul processus serveur
+(python main.py). Avec gevent (voir main.py), chaque connexion inactive est
+une greenlet en attente: quelques Ko, aucun thread.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """Une connexion SSE: file de trames à envoyer et signal de réveil"""
+
+    __slots__ = ('user_id', 'queue', 'wakeup', 'lagged')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = deque()
+        self.wakeup = threading.Event()
+        self.lagged = False
+
+
+class EventBus:
+    """Registre des abonnés par utilisateur et diffusion des événements"""
+
+    def __init__(self, encode, history=None, queue_size=None, heartbeat=None, retry_ms=None):
+        self.encode = encode
+        self.epoch = format(int(time.time()), 'x')
+        self.history_size = history or int(os.getenv('SSE_HISTORY', '2000'))
+        self.queue_size = queue_size or int(os.getenv('SSE_QUEUE_SIZE', '256'))
+        self.heartbeat = heartbeat or int(os.getenv('SSE_HEARTBEAT', '25'))
+        self.retry_ms = retry_ms or int(os.getenv('SSE_RETRY_MS', '5000'))
+        self._seq = 0
+        # (séquence, user_id ou None pour tous, trame)
+        self._history = deque(maxlen=self.history_size)
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'delivered': 0, 'lagged': 0, 'resets': 0}
+
+    def frame(self, seq, event, data):
+        return b'id: %s-%d\nevent: %s\ndata: %s\n\n' % (self.epoch.encode(), seq, event.encode(), self.encode(data))
+
+    # ----- Publication -----
+
+    def publish(self, event, data, user_id=None):
+        """Publie un événement pour user_id, ou pour tous les abonnés si user_id est None"""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            frame = self.frame(seq, event, data)
+            self._history.append((seq, user_id, frame))
+            if user_id is None:
+                targets = [sub for subs in self._subscribers.values() for sub in subs]
+            else:
+                targets = list(self._subscribers.get(user_id, ()))
+        for sub in targets:
+            self._push(sub, frame)
+        self.stats['published'] += 1
+        self.stats['delivered'] += len(targets)
+        return seq
+
+    def _push(self, sub, frame):
+        if len(sub.queue) >= self.queue_size:
+            # Client trop lent: on cesse de remplir sa file, il sera invité à recharger
+            if not sub.lagged:
+                sub.lagged = True
+                self.stats['lagged'] += 1
+        else:
+            sub.queue.append(frame)
+        sub.wakeup.set()
+
+    # ----- Abonnements -----
+
+    def subscribe(self, user_id, last_event_id=None):
+        """(abonné, trames à rejouer) ou (abonné, None) si la reprise est impossible"""
+        sub = Subscriber(user_id)
+        with self._lock:
+            backlog = self._backlog(user_id, last_event_id)
+            self._subscribers.setdefault(user_id, set()).add(sub)
+            self._count += 1
+        return sub, backlog
+
+    def _backlog(self, user_id, last_event_id):
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq:
+            return None
+        # La séquence suivante doit encore être dans l'historique
+        if seq < self._seq and (not self._history or self._history[0][0] > seq + 1):
+            return None
+        return [frame for s, target, frame in self._history if s > seq and target in (None, user_id)]
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs is not None and sub in subs:
+                subs.discard(sub)
+                self._count -= 1
+                if not subs:
+                    del self._subscribers[sub.user_id]
+
+    # ----- Flux -----
+
+    def control(self, event, reason):
+        """Trame sans id (ne déplace pas le point de reprise du client)"""
+        return b'event: %s\ndata: %s\n\n' % (event.encode(), self.encode({'reason': reason}))
+
+    def stream(self, user_id, last_event_id=None, until=None):
+        """Générateur de la réponse SSE; until: horodatage de fin (expiration du jeton).
+        L'abonnement n'est créé qu'à la première itération: un générateur jamais
+        démarré (client parti avant la réponse) ne laisse pas d'abonné orphelin."""
+        sub, backlog = self.subscribe(user_id, last_event_id)
+        try:
+            yield b'retry: %d\n\n' % self.retry_ms
+            if backlog is None:
+                self.stats['resets'] += 1
+                yield self.control('reset', 'resume')
+            elif backlog:
+                yield b''.join(backlog)
+            while True:
+                timeout = self.heartbeat
+                if until is not None:
+                    timeout = min(timeout, until - time.time())
+                    if timeout <= 0:
+                        # Le client se reconnecte avec un jeton rafraîchi
+                        yield self.control('reauth', 'token')
+                        return
+                woke = sub.wakeup.wait(timeout)
+                sub.wakeup.clear()
+                frames = []
+                while sub.queue:
+                    frames.append(sub.queue.popleft())
+                if frames:
+                    yield b''.join(frames)
+                elif not woke:
+                    yield b': ping\n\n'
+                if sub.lagged:
+                    self.stats['resets'] += 1
+                    yield self.control('reset', 'lagged')
+                    return
+        finally:
+            self.unsubscribe(sub)
+
+    def describe(self):
+        return {
+            **self.stats,
+            'subscribers': self._count,
+            'users': len(self._subscribers),
+            'sequence': self._seq,
+            'history': len(self._history)
+        }
@@ -0,0 +1,126 @@
+"""
+Pipeline d'ingestion des événements d'accès (/api/log/access, /api/log/viewer-access).
+
+Les endpoints déposent les événements dans une file bornée en mémoire et rendent
+la main immédiatement. Un thread d'écriture vide la file par lots: chaque lot est
+persisté en une seule transaction (sink) puis diffusé aux abonnés (SecurityMonitor).
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EventIngestor:
+    """File bornée + thread d'écriture par lots"""
+
+    def __init__(self, sink, subscribers=None, max_queue=None, batch_size=None, flush_interval=None):
+        self.sink = sink
+        self.subscribers = list(subscribers or [])
+        self.batch_size = batch_size or int(os.getenv('EVENT_BATCH_SIZE', '500'))
+        self.flush_interval = flush_interval or float(os.getenv('EVENT_FLUSH_INTERVAL', '1.0'))
+        self._queue = queue.Queue(maxsize=max_queue or int(os.getenv('EVENT_QUEUE_SIZE', '50000')))
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._registered = False
+        self._stats_lock = threading.Lock()
+        self.stats = {'accepted': 0, 'dropped': 0, 'written': 0, 'batches': 0, 'errors': 0}
+
+    def subscribe(self, callback):
+        """Ajoute un abonné appelé pour chaque événement après persistance"""
+        self.subscribers.append(callback)
+
+    def _ensure_started(self):
+        # Démarrage paresseux du writer pour ne pas créer de thread à l'import (scripts)
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+                self._thread.start()
+                if not self._registered:
+                    # Une seule inscription, même si le writer est redémarré
+                    atexit.register(self.stop)
+                    self._registered = True
+
+    def _count(self, name, amount=1):
+        # Compteurs modifiés par les threads de requête et par le writer
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def submit(self, event):
+        """Dépose un événement sans bloquer; False si la file est pleine"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('accepted')
+        return True
+
+    def pending(self):
+        """Nombre d'événements en attente d'écriture"""
+        return self._queue.qsize()
+
+    def _drain(self):
+        """Attend le premier événement puis remplit un lot jusqu'à batch_size ou flush_interval"""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            batch = self._drain()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            self.sink(batch)
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Erreur lors de l'écriture d'un lot de {len(batch)} événements: {e}")
+
+        for callback in self.subscribers:
+            for event in batch:
+                try:
+                    callback(event)
+                except Exception as e:
+                    # Un événement en erreur ne prive pas l'abonné du reste du lot
+                    logger.error(f"Erreur dans un abonné aux événements: {e}")
+                    continue
+
+        for _ in batch:
+            self._queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """Attend que tous les événements déposés soient écrits (tests, arrêt propre)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stop(self, timeout=5.0):
+        """Vide la file puis arrête le writer"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
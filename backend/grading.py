@@ -0,0 +1,242 @@
+"""
+Correction des quiz: clé de réponses compilée et re-correction en masse.
+
+AnswerKey compile chaque question une fois en (ensemble des réponses
+normalisées acceptées, points): corriger une tentative revient à un test
+d'appartenance par réponse. Les règles sont celles de la soumission historique:
+  - choix_multiple: reponse_correcte est l'indice de l'option ou son texte
+  - vrai_faux: vrai/true/yes/oui/1 et faux/false/no/non/0 sont équivalents
+  - autres: comparaison du texte normalisé (strip + minuscules)
+
+Les réponses soumises sont conservées par tentative ({question_id: réponse
+normalisée}, options QCM déjà ramenées à leur texte d'origine). Quand une
+réponse correcte est corrigée après l'examen, RegradeService recalcule les
+scores du quiz en tâche de fond: lecture des tentatives par lots (pagination
+par clé), correction du lot contre la clé compilée, une seule requête UPDATE
+groupée par lot pour les scores modifiés.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import update
+
+logger = logging.getLogger(__name__)
+
+TRUE_VALUES = frozenset(['vrai', 'true', 'yes', 'oui', '1'])
+FALSE_VALUES = frozenset(['faux', 'false', 'no', 'non', '0'])
+NOTHING = frozenset()
+
+
+def normalize(value):
+    """Texte comparable: strip + minuscules (caractères non encodables ignorés)"""
+    return str(value).strip().lower().encode('utf-8', errors='ignore').decode('utf-8')
+
+
+def accepted_answers(question):
+    """Réponses normalisées acceptées pour une question (Question ou BankQuestion)"""
+    correct = question.reponse_correcte
+    options = question.options
+    if question.type_question == 'choix_multiple' and isinstance(options, list) and str(correct).isdigit():
+        index = int(correct)
+        if 0 <= index < len(options):
+            correct = options[index]
+    correct = normalize(correct)
+    if question.type_question == 'vrai_faux':
+        if correct in TRUE_VALUES:
+            return TRUE_VALUES
+        if correct in FALSE_VALUES:
+            return FALSE_VALUES
+    return frozenset([correct])
+
+
+class AnswerKey:
+    """question_id (str, comme les clés JSON stockées) -> (réponses acceptées, points)"""
+
+    __slots__ = ('entries',)
+
+    def __init__(self, questions):
+        self.entries = {str(q.id): (accepted_answers(q), q.points or 0) for q in questions}
+
+    def __contains__(self, question_id):
+        return str(question_id) in self.entries
+
+    def max_score(self, question_ids=None):
+        if question_ids is None:
+            return sum(points for _, points in self.entries.values())
+        return sum(self.entries[str(q)][1] for q in question_ids if str(q) in self.entries)
+
+    def score(self, answers):
+        """(score, nombre de bonnes réponses) pour {question_id: réponse normalisée}"""
+        entries = self.entries
+        score = 0
+        correct = 0
+        for question_id, answer in answers.items():
+            accepted, points = entries.get(question_id, (NOTHING, 0))
+            if answer in accepted:
+                score += points
+                correct += 1
+        return score, correct
+
+    def score_many(self, rows):
+        """[(id, ancien score, réponses)] -> [{'id', 'score'}] des scores modifiés"""
+        entries = self.entries
+        changed = []
+        for result_id, old_score, answers in rows:
+            score = 0
+            for question_id, answer in (answers or {}).items():
+                accepted, points = entries.get(question_id, (NOTHING, 0))
+                if answer in accepted:
+                    score += points
+            if score != old_score:
+                changed.append({'id': result_id, 'score': score})
+        return changed
+
+
+class RegradeJob:
+    """Progression d'une re-correction"""
+
+    def __init__(self, quiz_id, reason):
+        self.id = uuid.uuid4().hex[:12]
+        self.quiz_id = quiz_id
+        self.reason = reason
+        self.status = 'en_attente'
+        self.total = 0
+        self.processed = 0
+        self.changed = 0
+        self.skipped = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Nouvelle modification pendant l'exécution: relancer une passe
+        self.rerun = False
+
+    def to_dict(self):
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0
+        return {
+            'job_id': self.id,
+            'quiz_id': self.quiz_id,
+            'reason': self.reason,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'changed': self.changed,
+            'skipped': self.skipped,
+            'progress': round(self.processed / self.total * 100, 1) if self.total else (100.0 if self.finished_at else 0.0),
+            'per_second': round(self.processed / elapsed) if elapsed > 0 else None,
+            'error': self.error
+        }
+
+
+class RegradeService:
+    """Re-correction des tentatives d'un quiz en tâche de fond (un seul worker)"""
+
+    def __init__(self, app, db, result_model, answers_model, key_loader, chunk_size=None, keep_jobs=50,
+                 on_finished=None):
+        self.app = app
+        self.db = db
+        self.Result = result_model
+        self.Answers = answers_model
+        # key_loader(quiz_id) -> AnswerKey construite depuis la base
+        self.key_loader = key_loader
+        # on_finished(quiz_id): appelé après la dernière passe (ex: cumuls statistiques), puis commit
+        self.on_finished = on_finished
+        self.chunk_size = chunk_size or int(os.getenv('REGRADE_CHUNK_SIZE', '2000'))
+        self.keep_jobs = keep_jobs
+        self._executor = None
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='regrade')
+            return self._executor
+
+    def schedule(self, quiz_id, reason='manual'):
+        """Planifie la re-correction du quiz; réutilise le job en attente / en cours"""
+        with self._lock:
+            job = self._active.get(quiz_id)
+            if job is not None:
+                if job.status == 'en_cours':
+                    job.rerun = True
+                return job
+            job = RegradeJob(quiz_id, reason)
+            self._active[quiz_id] = job
+            self._jobs[job.id] = job
+            for old_id in list(self._jobs)[:-self.keep_jobs]:
+                if self._jobs[old_id].finished_at:
+                    del self._jobs[old_id]
+        self._get_executor().submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def latest(self, quiz_id):
+        jobs = [job for job in self._jobs.values() if job.quiz_id == quiz_id]
+        return max(jobs, key=lambda job: job.created_at) if jobs else None
+
+    def _run(self, job):
+        with self.app.app_context():
+            try:
+                job.status = 'en_cours'
+                job.started_at = time.time()
+                while True:
+                    self.regrade(job)
+                    with self._lock:
+                        if not job.rerun:
+                            self._active.pop(job.quiz_id, None)
+                            break
+                        job.rerun = False
+                if self.on_finished is not None:
+                    self.on_finished(job.quiz_id)
+                    self.db.session.commit()
+                job.status = 'termine'
+            except Exception as e:
+                self.db.session.rollback()
+                job.status = 'echec'
+                job.error = str(e)
+                logger.error(f"Re-correction du quiz {job.quiz_id} échouée: {e}")
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._active.pop(job.quiz_id, None)
+                self.db.session.remove()
+
+    def regrade(self, job):
+        """Une passe complète sur les tentatives du quiz (appelable sans thread)"""
+        Result, Answers, session = self.Result, self.Answers, self.db.session
+        key = self.key_loader(job.quiz_id)
+        job.total = session.query(Answers.result_id).filter(Answers.quiz_id == job.quiz_id).count()
+        job.skipped = session.query(Result.id).filter(Result.quiz_id == job.quiz_id).count() - job.total
+        job.processed = 0
+        job.changed = 0
+
+        last_id = 0
+        while True:
+            rows = session.query(Result.id, Result.score, Answers.answers).join(
+                Answers, Answers.result_id == Result.id
+            ).filter(
+                Answers.quiz_id == job.quiz_id, Answers.result_id > last_id
+            ).order_by(Answers.result_id).limit(self.chunk_size).all()
+            if not rows:
+                break
+            changed = key.score_many(rows)
+            if changed:
+                session.execute(update(Result), changed)
+            session.commit()
+            last_id = rows[-1][0]
+            job.processed += len(rows)
+            job.changed += len(changed)
+        logger.info(f"Re-correction du quiz {job.quiz_id}: {job.processed} tentatives, {job.changed} scores modifiés")
+        return job
+
+    def describe(self):
+        return {'active': len(self._active), 'jobs': len(self._jobs), 'chunk_size': self.chunk_size}
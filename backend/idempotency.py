@@ -0,0 +1,256 @@
+"""
+Clés d'idempotence des routes d'écriture (en-tête Idempotency-Key).
+
+Le client envoie la même clé à chaque renvoi d'une même opération (réseau
+mobile instable, renvois en rafale pendant un examen). La première requête
+réserve la clé en base (statut en_cours), exécute la route puis enregistre la
+réponse avec l'empreinte de la requête (méthode, chemin, corps). Un renvoi
+reçoit la réponse enregistrée sans que la route soit ré-exécutée.
+
+Les réponses enregistrées sont gardées dans un cache mémoire (LRU) devant la
+table: sur le réplica qui a traité la requête, un renvoi ne touche pas la
+base. Les renvois concurrents d'une requête en cours sur le même processus
+attendent son résultat (single-flight); sur un autre réplica ils reçoivent
+409 jusqu'à la fin du traitement.
+
+Une clé réutilisée avec une requête différente est refusée (422). Une erreur
+serveur (5xx) libère la clé: le renvoi ré-exécute la route. Les clés expirent
+après IDEMPOTENCY_TTL secondes; une réservation restée en_cours plus de
+IDEMPOTENCY_LOCK_TIMEOUT secondes (processus arrêté) peut être reprise.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+PRUNE_INTERVAL = 3600
+
+IN_PROGRESS, DONE = 'en_cours', 'termine'
+
+
+class IdempotencyError(Exception):
+    """Clé invalide, réutilisée pour une autre requête ou en cours de traitement"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def request_fingerprint(method, path, body):
+    """Empreinte de la requête (sha256 hexadécimal)"""
+    digest = hashlib.sha256(f"{method} {path}\n".encode('utf-8'))
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+
+class StoredResponse:
+    """Réponse enregistrée, rejouée à l'identique"""
+
+    __slots__ = ('fingerprint', 'status_code', 'content_type', 'body', 'expires')
+
+    def __init__(self, fingerprint, status_code, content_type, body, expires):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.content_type = content_type
+        self.body = body
+        self.expires = expires
+
+
+class _Flight:
+    """Requête en cours pour une clé, partagée par les renvois concurrents"""
+
+    __slots__ = ('done', 'fingerprint', 'stored')
+
+    def __init__(self, fingerprint):
+        self.done = threading.Event()
+        self.fingerprint = fingerprint
+        self.stored = None
+
+
+class IdempotencyStore:
+    """Réservation des clés en base, réponses enregistrées en cache mémoire"""
+
+    def __init__(self, db, model, ttl=None, lock_timeout=None, max_entries=None, wait_timeout=None):
+        self.db = db
+        self.Key = model
+        self.ttl = ttl or int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+        self.lock_timeout = lock_timeout or int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '60'))
+        self.max_entries = max_entries or int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+        self.wait_timeout = wait_timeout or float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '30'))
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.stats = {'executed': 0, 'replays': 0, 'db_replays': 0, 'waits': 0, 'conflicts': 0}
+
+    @staticmethod
+    def key_hash(scope, principal, client_key):
+        """Clé stockée: route + utilisateur + clé du client (une clé n'est valable que pour son auteur)"""
+        return hashlib.sha256(f"{scope}\0{principal or ''}\0{client_key}".encode('utf-8')).hexdigest()
+
+    def run(self, scope, principal, client_key, fingerprint, handler):
+        """Réponse de handler() (objet réponse Flask), exécuté au plus une fois par clé"""
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(f"Idempotency-Key invalide (1 à {MAX_KEY_LENGTH} caractères)", 400)
+        key = self.key_hash(scope, principal, client_key)
+
+        stored = self._cached(key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        with self._lock:
+            stored = self._cached(key)
+            flight = self._flights.get(key) if stored is None else None
+            leader = stored is None and flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(fingerprint)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        if not leader:
+            self.stats['waits'] += 1
+            if flight.fingerprint != fingerprint:
+                self.stats['conflicts'] += 1
+                raise IdempotencyError("Idempotency-Key déjà utilisée pour une autre requête", 422)
+            if not flight.done.wait(self.wait_timeout) or flight.stored is None:
+                raise IdempotencyError("Requête en cours de traitement, réessayez", 409)
+            return self._replay(flight.stored, fingerprint)
+
+        try:
+            stored = self._claim(key, fingerprint)
+            if stored is not None:
+                self.stats['db_replays'] += 1
+                self._remember(key, stored)
+                flight.stored = stored
+                return self._replay(stored, fingerprint)
+
+            try:
+                response = handler()
+            except Exception:
+                self._release(key)
+                raise
+            self.stats['executed'] += 1
+            if response.status_code >= 500:
+                self._release(key)
+                return response
+            flight.stored = self._complete(key, fingerprint, response)
+            return response
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    # ----- Cache mémoire -----
+
+    def _cached(self, key):
+        stored = self._entries.get(key)
+        if stored is not None and time.monotonic() >= stored.expires:
+            return None
+        return stored
+
+    def _remember(self, key, stored):
+        with self._lock:
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _replay(self, stored, fingerprint):
+        if stored.fingerprint != fingerprint:
+            self.stats['conflicts'] += 1
+            raise IdempotencyError("Idempotency-Key déjà utilisée pour une autre requête", 422)
+        self.stats['replays'] += 1
+        return stored
+
+    # ----- Table des clés -----
+
+    def _stored(self, row):
+        remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+        return StoredResponse(row.fingerprint, row.status_code, row.content_type, row.body,
+                              time.monotonic() + max(0.0, remaining))
+
+    def _claim(self, key, fingerprint):
+        """Réserve la clé (commit); réponse enregistrée si la clé a déjà été traitée"""
+        session, Key = self.db.session, self.Key
+        now = datetime.utcnow()
+        self._maybe_prune(now)
+        session.add(Key(key_hash=key, fingerprint=fingerprint, statut=IN_PROGRESS,
+                        date_creation=now, expires_at=now + timedelta(seconds=self.ttl)))
+        try:
+            session.commit()
+            return None
+        except IntegrityError:
+            session.rollback()
+
+        row = session.get(Key, key, populate_existing=True)
+        if row is None:
+            raise IdempotencyError("Requête en cours de traitement, réessayez", 409)
+        if row.statut == DONE and row.expires_at > now:
+            stored = self._stored(row)
+            session.rollback()
+            return stored
+        statut, date_creation, same_request = row.statut, row.date_creation, row.fingerprint == fingerprint
+        session.rollback()
+        if statut == IN_PROGRESS and date_creation > now - timedelta(seconds=self.lock_timeout):
+            if not same_request:
+                self.stats['conflicts'] += 1
+                raise IdempotencyError("Idempotency-Key déjà utilisée pour une autre requête", 422)
+            raise IdempotencyError("Requête en cours de traitement, réessayez", 409)
+
+        # Clé expirée ou réservation abandonnée: reprise conditionnelle (un seul gagnant)
+        taken = session.query(Key).filter(Key.key_hash == key, Key.date_creation == date_creation).update({
+            'fingerprint': fingerprint, 'statut': IN_PROGRESS, 'status_code': None, 'content_type': None,
+            'body': None, 'date_creation': now, 'expires_at': now + timedelta(seconds=self.ttl)
+        }, synchronize_session=False)
+        session.commit()
+        if not taken:
+            raise IdempotencyError("Requête en cours de traitement, réessayez", 409)
+        logger.info(f"Clé d'idempotence reprise ({'expirée' if statut == DONE else 'abandonnée'})")
+        return None
+
+    def _complete(self, key, fingerprint, response):
+        """Enregistre la réponse de la route (après son propre commit)"""
+        session, Key = self.db.session, self.Key
+        body = response.get_data()
+        session.rollback()
+        session.query(Key).filter(Key.key_hash == key).update({
+            'statut': DONE, 'status_code': response.status_code,
+            'content_type': response.content_type, 'body': body
+        }, synchronize_session=False)
+        session.commit()
+        stored = StoredResponse(fingerprint, response.status_code, response.content_type, body,
+                                time.monotonic() + self.ttl)
+        self._remember(key, stored)
+        return stored
+
+    def _release(self, key):
+        """Libère la clé après une erreur serveur: le renvoi ré-exécute la route"""
+        session = self.db.session
+        try:
+            session.rollback()
+            session.query(self.Key).filter(self.Key.key_hash == key).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Libération de la clé d'idempotence impossible: {e}")
+
+    def _maybe_prune(self, now):
+        if time.monotonic() - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = time.monotonic()
+        deleted = self.db.session.query(self.Key).filter(self.Key.expires_at < now).delete(
+            synchronize_session=False)
+        if deleted:
+            logger.info(f"{deleted} clés d'idempotence expirées supprimées")
+
+    def describe(self):
+        return {**self.stats, 'entries': len(self._entries), 'max_entries': self.max_entries}
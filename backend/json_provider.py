@@ -0,0 +1,155 @@
+"""
+Fournisseur JSON rapide pour Flask.
+
+- Sérialise nativement datetime/date (ISO 8601, comme .isoformat()), Decimal et
+  les Row SQLAlchemy, sans conversion préalable dans les compréhensions de liste.
+- Utilise orjson s'il est installé, sinon la bibliothèque standard avec les mêmes
+  conversions.
+- Permet de streamer de grands tableaux sans construire la réponse en mémoire.
+
+Sélection par configuration (variable d'environnement JSON_PROVIDER):
+    'orjson'  -> OrjsonProvider (défaut si orjson est disponible)
+    'std'     -> StdJSONProvider (json standard, compact)
+    'flask'   -> FlaskJSONProvider (encodeur de Flask: clés triées, ASCII,
+                 indentation en debug), avec les mêmes conversions
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+
+from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson absent: repli sur json standard
+    orjson = None
+
+try:
+    from sqlalchemy.engine import Row
+except ImportError:
+    Row = None
+
+
+def json_default(obj):
+    """Conversion des types non natifs (partagée par tous les fournisseurs)"""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if Row is not None and isinstance(obj, Row):
+        return obj._asdict()
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FlaskJSONProvider(DefaultJSONProvider):
+    """Encodeur par défaut de Flask, dates en ISO 8601 (et non RFC 822) via json_default"""
+
+    default = staticmethod(json_default)
+
+
+class StdJSONProvider(DefaultJSONProvider):
+    """json standard, compact, avec les conversions de json_default"""
+
+    default = staticmethod(json_default)
+    sort_keys = False
+    compact = True
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', json_default)
+        kwargs.setdefault('ensure_ascii', False)
+        kwargs.setdefault('sort_keys', False)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def dumps_bytes(self, obj):
+        return self.dumps(obj).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+class OrjsonProvider(StdJSONProvider):
+    """orjson: encodage en C directement en bytes"""
+
+    option = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=json_default, option=self.option)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+PROVIDERS = {
+    'orjson': OrjsonProvider,
+    'std': StdJSONProvider,
+    'flask': FlaskJSONProvider,
+}
+
+
+def init_json_provider(app, name=None):
+    """Installe le fournisseur choisi par JSON_PROVIDER sur l'application"""
+    name = (name or app.config.get('JSON_PROVIDER') or ('orjson' if orjson else 'std')).lower()
+    if name == 'orjson' and orjson is None:
+        app.logger.warning("JSON_PROVIDER=orjson mais orjson n'est pas installé: repli sur 'std'")
+        name = 'std'
+    provider_class = PROVIDERS.get(name, StdJSONProvider)
+    app.json_provider_class = provider_class
+    app.json = provider_class(app)
+    return app.json
+
+
+def stream_json_list(items, chunk_size=500, **envelope):
+    """Réponse {**envelope, "data": [...]} streamée élément par élément.
+
+    `items` peut être un générateur (ex: requête SQLAlchemy avec yield_per):
+    la liste complète n'est jamais matérialisée en mémoire.
+    """
+    from flask import current_app
+    provider = current_app.json
+    dumps = provider.dumps_bytes if hasattr(provider, 'dumps_bytes') else (lambda o: provider.dumps(o).encode('utf-8'))
+
+    head = dumps(envelope)[:-1] if envelope else b'{'
+    head += (b',' if envelope else b'') + b'"data":['
+
+    def generate():
+        yield head
+        buffer = []
+        first = True
+        for item in items:
+            encoded = dumps(item)
+            buffer.append(encoded if first else b',' + encoded)
+            first = False
+            if len(buffer) >= chunk_size:
+                yield b''.join(buffer)
+                buffer = []
+        if buffer:
+            yield b''.join(buffer)
+        yield b']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def json_list_response(items, **envelope):
+    """Liste JSON streamée si JSON_STREAM_ARRAYS est activé, sinon réponse classique"""
+    from flask import current_app
+    if current_app.config.get('JSON_STREAM_ARRAYS'):
+        return stream_json_list(items, **envelope)
+    return current_app.json.response({**envelope, 'data': list(items)})
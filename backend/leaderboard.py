@@ -0,0 +1,299 @@
+"""
+Classements par quiz, tenus en mémoire et mis à jour à chaque soumission.
+
+Chaque quiz a un index ordonné des meilleurs résultats (un par étudiant):
+clé (-score, temps_utilise, id du résultat), le meilleur en tête; à score
+égal, le plus rapide passe devant. L'index est une skip list indexable (une
+largeur par lien): insertion, suppression et rang d'une clé en O(log n),
+top-N en O(log n + N). Le rang suit la règle de compétition (1, 2, 2, 4):
+deux étudiants à égalité de score et de temps partagent le même rang.
+
+Le classement d'un quiz est construit depuis Result au premier accès (ou au
+démarrage, warm()), en O(n) à partir des clés triées. Ensuite:
+  - submit_quiz appelle record() après le commit;
+  - les résultats écrits par un autre réplica sont rattrapés au plus toutes les
+    RANKING_SYNC_INTERVAL secondes (id > dernier id chargé);
+  - le classement est reconstruit après RANKING_MAX_AGE secondes, après une
+    re-correction du quiz (invalidate) ou la suppression d'un étudiant.
+Au plus RANKING_MAX_QUIZZES classements restent en mémoire (les moins
+récemment consultés sont libérés, puis reconstruits au besoin).
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_LEVEL = 24  # 2^24 résultats par quiz avec p = 1/2
+NO_TIME = 2 ** 31  # temps inconnu: derrière tous les temps connus à score égal
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+
+def ranking_key(result_id, score, temps_utilise):
+    return (-(score or 0.0), NO_TIME if temps_utilise is None else temps_utilise, result_id)
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class RankIndex:
+    """Skip list indexable: clés uniques triées, rang en O(log n)"""
+
+    def __init__(self, rng=None):
+        self.head = _Node(None, MAX_LEVEL)
+        self.size = 0
+        self._random = rng or random.Random()
+
+    def __len__(self):
+        return self.size
+
+    def _level(self):
+        level = 1
+        while level < MAX_LEVEL and self._random.getrandbits(1):
+            level += 1
+        return level
+
+    @classmethod
+    def from_sorted(cls, keys, rng=None):
+        """Construction en O(n) depuis des clés déjà triées"""
+        index = cls(rng)
+        last = [index.head] * MAX_LEVEL
+        last_pos = [0] * MAX_LEVEL
+        pos = 0
+        for key in keys:
+            pos += 1
+            node = _Node(key, index._level())
+            for lvl in range(len(node.next)):
+                last[lvl].next[lvl] = node
+                last[lvl].width[lvl] = pos - last_pos[lvl]
+                last[lvl], last_pos[lvl] = node, pos
+        for lvl in range(MAX_LEVEL):
+            last[lvl].width[lvl] = pos + 1 - last_pos[lvl]
+        index.size = pos
+        return index
+
+    def _path(self, key):
+        """Derniers nœuds < key à chaque niveau, et leur position"""
+        update, positions = [None] * MAX_LEVEL, [0] * MAX_LEVEL
+        node, pos = self.head, 0
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            following = node.next[lvl]
+            while following is not None and following.key < key:
+                pos += node.width[lvl]
+                node, following = following, following.next[lvl]
+            update[lvl], positions[lvl] = node, pos
+        return update, positions
+
+    def insert(self, key):
+        update, positions = self._path(key)
+        pos = positions[0] + 1
+        node = _Node(key, self._level())
+        for lvl in range(len(node.next)):
+            previous = update[lvl]
+            node.next[lvl] = previous.next[lvl]
+            previous.next[lvl] = node
+            node.width[lvl] = previous.width[lvl] - (pos - 1 - positions[lvl])
+            previous.width[lvl] = pos - positions[lvl]
+        for lvl in range(len(node.next), MAX_LEVEL):
+            update[lvl].width[lvl] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for lvl in range(MAX_LEVEL):
+            previous = update[lvl]
+            if previous.next[lvl] is node:
+                previous.width[lvl] += node.width[lvl] - 1
+                previous.next[lvl] = node.next[lvl]
+            else:
+                previous.width[lvl] -= 1
+        self.size -= 1
+
+    def count_below(self, key):
+        """Nombre de clés strictement inférieures à key"""
+        node, pos = self.head, 0
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            following = node.next[lvl]
+            while following is not None and following.key < key:
+                pos += node.width[lvl]
+                node, following = following, following.next[lvl]
+        return pos
+
+    def first(self, count):
+        """Les count premières clés"""
+        keys, node = [], self.head.next[0]
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class QuizBoard:
+    """Classement d'un quiz: index ordonné + meilleur résultat de chaque étudiant"""
+
+    def __init__(self, rows):
+        # rows: [(id, user_id, score, temps_utilise)]
+        best = {}
+        for result_id, user_id, score, temps in rows:
+            key = ranking_key(result_id, score, temps)
+            if user_id not in best or key < best[user_id]:
+                best[user_id] = key
+        self.by_user = best
+        self.users = {key[2]: user_id for user_id, key in best.items()}
+        self.index = RankIndex.from_sorted(sorted(best.values()))
+        self.last_id = max((row[0] for row in rows), default=0)
+        self.built_at = self.synced_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, result_id, user_id, score, temps):
+        """Nouveau résultat (ignoré s'il est déjà classé ou moins bon que celui de l'étudiant)"""
+        if result_id in self.users:
+            return False
+        key = ranking_key(result_id, score, temps)
+        previous = self.by_user.get(user_id)
+        if previous is not None:
+            if previous <= key:
+                return False
+            self.index.remove(previous)
+            del self.users[previous[2]]
+        self.index.insert(key)
+        self.by_user[user_id] = key
+        self.users[result_id] = user_id
+        return True
+
+    def remove_user(self, user_id):
+        key = self.by_user.pop(user_id, None)
+        if key is not None:
+            self.index.remove(key)
+            del self.users[key[2]]
+
+    def rank_of(self, key):
+        # (-score, temps) précède toutes les clés de même score et temps: rang partagé
+        return self.index.count_below(key[:2]) + 1
+
+
+class Leaderboards:
+    """Classements de tous les quiz (construits à la demande)"""
+
+    def __init__(self, db, result_model, max_age=None, sync_interval=None, max_boards=None):
+        self.db = db
+        self.Result = result_model
+        self.max_age = max_age or int(os.getenv('RANKING_MAX_AGE', '600'))
+        self.sync_interval = sync_interval if sync_interval is not None else float(
+            os.getenv('RANKING_SYNC_INTERVAL', '2'))
+        self.max_boards = max_boards or int(os.getenv('RANKING_MAX_QUIZZES', '64'))
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'builds': 0, 'records': 0, 'synced': 0, 'invalidations': 0, 'evictions': 0}
+
+    def _load(self, quiz_id, after_id=0):
+        Result = self.Result
+        query = self.db.session.query(Result.id, Result.user_id, Result.score, Result.temps_utilise).filter(
+            Result.quiz_id == quiz_id)
+        if after_id:
+            query = query.filter(Result.id > after_id)
+        return query.all()
+
+    def build(self, quiz_id):
+        """Reconstruit le classement du quiz depuis Result"""
+        board = QuizBoard(self._load(quiz_id))
+        with self._lock:
+            self._boards[quiz_id] = board
+            self._boards.move_to_end(quiz_id)
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+                self.stats['evictions'] += 1
+        self.stats['builds'] += 1
+        return board
+
+    def board(self, quiz_id):
+        with self._lock:
+            board = self._boards.get(quiz_id)
+            if board is not None:
+                self._boards.move_to_end(quiz_id)
+        now = time.monotonic()
+        if board is None or now - board.built_at >= self.max_age:
+            return self.build(quiz_id)
+        if now - board.synced_at >= self.sync_interval:
+            # Résultats enregistrés par un autre réplica depuis le dernier chargement
+            rows = self._load(quiz_id, board.last_id)
+            with board.lock:
+                for row in rows:
+                    self.stats['synced'] += board.add(*row)
+                board.last_id = max([board.last_id] + [row[0] for row in rows])
+                board.synced_at = now
+        return board
+
+    def warm(self, quiz_ids):
+        """Construction au démarrage (quiz ouverts)"""
+        for quiz_id in quiz_ids:
+            self.build(quiz_id)
+        logger.info(f"Classements construits pour {len(quiz_ids)} quiz")
+
+    def record(self, result):
+        """Soumission enregistrée (après commit): O(log n) si le classement est chargé"""
+        board = self._boards.get(result.quiz_id)
+        if board is None:
+            return
+        with board.lock:
+            board.add(result.id, result.user_id, result.score, result.temps_utilise)
+        self.stats['records'] += 1
+
+    def top(self, quiz_id, limit=DEFAULT_TOP):
+        """([(rang, user_id, score, temps_utilise)] des meilleurs étudiants, nombre d'étudiants classés)"""
+        board = self.board(quiz_id)
+        limit = min(max(1, limit or DEFAULT_TOP), MAX_TOP)
+        with board.lock:
+            keys = board.index.first(limit)
+            entries = [(key, board.users[key[2]]) for key in keys]
+            total = len(board.index)
+        ranked, previous, rank = [], None, 0
+        for position, (key, user_id) in enumerate(entries, start=1):
+            if key[:2] != previous:
+                rank, previous = position, key[:2]
+            ranked.append((rank, user_id, -key[0], None if key[1] == NO_TIME else key[1]))
+        return ranked, total
+
+    def rank(self, quiz_id, user_id):
+        """{'rang', 'total', 'score', 'temps_utilise'} de l'étudiant, None s'il n'a pas soumis le quiz"""
+        board = self.board(quiz_id)
+        with board.lock:
+            key = board.by_user.get(user_id)
+            if key is None:
+                return None
+            rank, total = board.rank_of(key), len(board.index)
+        return {
+            'rang': rank,
+            'total': total,
+            'score': -key[0],
+            'temps_utilise': None if key[1] == NO_TIME else key[1]
+        }
+
+    def invalidate(self, quiz_id):
+        """Scores modifiés (re-correction) ou quiz supprimé: reconstruction au prochain accès"""
+        with self._lock:
+            self._boards.pop(quiz_id, None)
+        self.stats['invalidations'] += 1
+
+    def forget_user(self, user_id):
+        for board in list(self._boards.values()):
+            with board.lock:
+                board.remove_user(user_id)
+
+    def describe(self):
+        return {**self.stats, 'quizzes': len(self._boards),
+                'entries': sum(len(board.index) for board in list(self._boards.values()))}
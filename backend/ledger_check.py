@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Contrôle de cohérence des soldes étudiants.
+
+Recalcule dû / payé de chaque étudiant depuis le journal des mouvements
+(ledger_entry) et les compare aux soldes matérialisés (student_balance).
+Sans option, liste les écarts; --repair réécrit les soldes divergents.
+
+--backfill complète le journal (à l'installation, ou après une reprise de
+données): frais d'inscription des étudiants qui n'en ont pas + paiements
+encaissés (complet, par_tranche) sans mouvement, soldes mis à jour en
+conséquence. Relançable sans arrêter l'application.
+
+Usage: python ledger_check.py [--repair] [--backfill]
+"""
+
+import argparse
+import sys
+
+from app import app, db, balance_ledger
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repair', action='store_true', help='Réécrit les soldes divergents depuis le journal')
+    parser.add_argument('--backfill', action='store_true', help='Ajoute au journal les frais et paiements manquants')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        if args.backfill:
+            counts = balance_ledger.backfill()
+            print(f"✅ Journal complété: {counts['entries']} mouvements, {counts['balances']} soldes")
+            return 0
+
+        result = balance_ledger.check(repair=args.repair)
+        for mismatch in result['mismatches'][:50]:
+            print(f"  étudiant {mismatch['user_id']}: enregistré {mismatch['stored']}, journal {mismatch['expected']}")
+        if len(result['mismatches']) > 50:
+            print(f"  ... {len(result['mismatches']) - 50} autres")
+        if not result['mismatches']:
+            print(f"✅ {result['balances']} soldes cohérents avec le journal")
+        elif result['repaired']:
+            print(f"✅ {len(result['mismatches'])} soldes corrigés")
+        else:
+            print(f"⚠️ {len(result['mismatches'])} soldes divergents (relancer avec --repair)")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
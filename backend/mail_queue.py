@@ -0,0 +1,58 @@
+"""
+Envoi des emails hors de la requête, par lots.
+
+Les routes construisent les messages (flask_mail.Message) puis les déposent
+en une fois avec enqueue(); un thread unique les envoie sur une seule
+connexion SMTP par lot. Un échec d'envoi est journalisé et n'interrompt pas
+le reste du lot. Les messages sont perdus si le processus s'arrête avant
+l'envoi: l'administrateur peut régénérer un code depuis l'interface.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    """Lots de messages envoyés par un thread dédié"""
+
+    def __init__(self, app, mail):
+        self.app = app
+        self.mail = mail
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'queued': 0, 'sent': 0, 'errors': 0}
+
+    def _get_executor(self):
+        # Démarrage paresseux pour ne pas créer de thread à l'import (scripts)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mail')
+            return self._executor
+
+    def enqueue(self, messages):
+        """Dépose un lot de messages; renvoie le nombre de messages mis en file"""
+        messages = list(messages)
+        if messages:
+            self.stats['batches'] += 1
+            self.stats['queued'] += len(messages)
+            self._get_executor().submit(self._send, messages)
+        return len(messages)
+
+    def _send(self, messages):
+        with self.app.app_context():
+            try:
+                with self.mail.connect() as connection:
+                    for msg in messages:
+                        try:
+                            connection.send(msg)
+                            self.stats['sent'] += 1
+                        except Exception as e:
+                            self.stats['errors'] += 1
+                            logger.error(f"Erreur lors de l'envoi de l'email à {msg.recipients}: {e}")
+            except Exception as e:
+                # Connexion SMTP impossible: tout le lot est perdu
+                self.stats['errors'] += len(messages)
+                logger.error(f"Connexion SMTP impossible, {len(messages)} emails non envoyés: {e}")
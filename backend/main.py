@@ -11,7 +11,20 @@
 #     app.run(host="0.0.0.0", port=5000)
 
 # ********* main.py modifié *********************
-from app import app
+import os
+
+# Serveur gevent si disponible (USE_GEVENT=false pour le serveur Flask classique):
+# les connexions SSE inactives (/api/events) sont des greenlets en attente, sans
+# thread ni pile dédiés. Le patch doit précéder tous les autres imports.
+USE_GEVENT = os.getenv('USE_GEVENT', 'true').lower() == 'true'
+if USE_GEVENT:
+    try:
+        from gevent import monkey
+        monkey.patch_all()
+    except ImportError:
+        USE_GEVENT = False
+
+from app import app, Quiz, leaderboards
 from db import db
 from startup import wait_for_mysql
 from init_db import init_db  # <--- Importez votre fonction d'initialisation
@@ -25,7 +38,15 @@ if __name__ == "__main__":
     # 2. On crée les tables et l'admin (contexte Flask requis)
     print("🔧 Initialisation de la base de données...")
     init_db() 
+
+    # 3. Classements des quiz actifs reconstruits depuis les résultats
+    with app.app_context():
+        leaderboards.warm([quiz_id for quiz_id, in db.session.query(Quiz.id).filter(Quiz.statut == 'actif')])
     
-    # 3. On lance l'application
+    # 4. On lance l'application
     print("🚀 Démarrage de l'application...")
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    if USE_GEVENT:
+        from gevent.pywsgi import WSGIServer
+        WSGIServer(("0.0.0.0", 5000), app).serve_forever()
+    else:
+        app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
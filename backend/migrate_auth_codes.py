@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Migration des codes d'authentification vers le digest HMAC indexé.
+
+1. Ajoute la colonne user.code_auth_hmac (+ index unique) si elle n'existe pas
+   (db.create_all ne modifie pas les tables existantes).
+2. Calcule le digest de chaque code en clair existant, par lots.
+
+Les étudiants sans code en clair (seul le hash pbkdf2 est connu) sont migrés
+à leur prochaine connexion réussie. À relancer avec --rehash-all après un
+changement de AUTH_CODE_HMAC_KEY.
+
+Usage: python migrate_auth_codes.py [--batch-size 500] [--rehash-all] [--dry-run]
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import inspect, text
+
+from app import app, db, User
+from auth_codes import code_digest
+
+
+def column_exists():
+    columns = inspect(db.engine).get_columns(User.__table__.name)
+    return any(column['name'] == 'code_auth_hmac' for column in columns)
+
+
+def ensure_column():
+    """Ajoute code_auth_hmac et son index unique; retourne True si modifié"""
+    if column_exists():
+        return False
+
+    table = User.__table__.name
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN code_auth_hmac VARCHAR(64) NULL"))
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX ix_{table}_code_auth_hmac ON {quote(table)} (code_auth_hmac)"
+        ))
+    return True
+
+
+def backfill(batch_size=500, rehash_all=False, dry_run=False):
+    key = app.config['AUTH_CODE_HMAC_KEY']
+    query = User.query.filter(User.code_auth.isnot(None))
+    if not rehash_all:
+        query = query.filter(User.code_auth_hmac.is_(None))
+
+    updated = 0
+    last_id = 0
+    while True:
+        users = query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            user.code_auth_hmac = code_digest(user.code_auth, key)
+        last_id = users[-1].id
+        updated += len(users)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        print(f"  ... {updated} codes traités")
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--rehash-all', action='store_true', help='Recalcule tous les digests (changement de clé)')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        if args.dry_run:
+            print("Mode simulation: aucune modification enregistrée")
+            if not column_exists():
+                pending = User.query.with_entities(User.id).filter(User.code_auth.isnot(None)).count()
+                print(f"ℹ️ Colonne code_auth_hmac absente: elle serait ajoutée, {pending} codes à migrer")
+                return 0
+        elif ensure_column():
+            print("✅ Colonne code_auth_hmac ajoutée")
+
+        updated = backfill(args.batch_size, args.rehash_all, args.dry_run)
+        remaining = User.query.filter(User.role == 'student', User.code_auth_hmac.is_(None)).count()
+        print(f"✅ {updated} codes migrés")
+        if remaining:
+            print(f"ℹ️ {remaining} étudiants sans digest: migrés à leur prochaine connexion")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
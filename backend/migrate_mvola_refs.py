@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Migration des références MVola vers la colonne normalisée indexée.
+
+1. Ajoute la colonne payment.ref_mvola_norm (+ index) si elle n'existe pas
+   (db.create_all ne modifie pas les tables existantes; il crée en revanche
+   la table mvola_transaction).
+2. Calcule la référence normalisée de chaque paiement existant, par lots.
+
+Les nouveaux paiements sont normalisés à l'écriture (Payment.code_ref_mvola).
+
+Usage: python migrate_mvola_refs.py [--batch-size 1000] [--dry-run]
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import inspect, text
+
+from app import app, db, Payment
+from mvola_reconcile import normalize_reference
+
+
+def column_exists():
+    columns = inspect(db.engine).get_columns(Payment.__table__.name)
+    return any(column['name'] == 'ref_mvola_norm' for column in columns)
+
+
+def ensure_column():
+    """Ajoute ref_mvola_norm et son index; retourne True si modifié"""
+    if column_exists():
+        return False
+
+    table = Payment.__table__.name
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN ref_mvola_norm VARCHAR(50) NULL"))
+        connection.execute(text(f"CREATE INDEX ix_{table}_ref_mvola_norm ON {quote(table)} (ref_mvola_norm)"))
+    return True
+
+
+def backfill(batch_size=1000, dry_run=False):
+    query = Payment.query.filter(Payment.code_ref_mvola.isnot(None), Payment.code_ref_mvola != '')
+
+    updated = 0
+    last_id = 0
+    while True:
+        payments = query.filter(Payment.id > last_id).order_by(Payment.id).limit(batch_size).all()
+        if not payments:
+            break
+        for payment in payments:
+            payment.ref_mvola_norm = normalize_reference(payment.code_ref_mvola)
+        last_id = payments[-1].id
+        updated += len(payments)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        print(f"  ... {updated} références traitées")
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        if args.dry_run:
+            print("Mode simulation: aucune modification enregistrée")
+            if not column_exists():
+                pending = Payment.query.with_entities(Payment.id).filter(Payment.code_ref_mvola.isnot(None)).count()
+                print(f"ℹ️ Colonne ref_mvola_norm absente: elle serait ajoutée, {pending} références à normaliser")
+                return 0
+        else:
+            if ensure_column():
+                print("✅ Colonne ref_mvola_norm ajoutée")
+            db.create_all()
+
+        updated = backfill(args.batch_size, args.dry_run)
+        print(f"✅ {updated} références normalisées")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
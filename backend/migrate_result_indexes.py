@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Migration: index de la table result (consultation admin paginée, unicité).
+
+db.create_all ne crée pas les index d'une table existante. Ce script crée
+ceux déclarés sur Result (ix_result_date, ix_result_score, ix_result_quiz_*,
+ix_result_user_date, uq_result_user_quiz) qui manquent encore. Sur une table
+de plusieurs millions de lignes, la création peut prendre quelques minutes
+(InnoDB la fait en ligne, sans bloquer les écritures).
+
+L'index unique uq_result_user_quiz (une soumission par étudiant et par quiz)
+n'est pas créé tant que la table contient des doublons: ils sont listés et
+doivent être résolus à la main.
+
+Usage: python migrate_result_indexes.py [--dry-run]
+"""
+
+import argparse
+import sys
+import time
+
+from sqlalchemy import func, inspect
+
+from app import app, db, Result
+
+
+def missing_indexes():
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(Result.__table__.name)}
+    return [index for index in sorted(Result.__table__.indexes, key=lambda i: i.name) if index.name not in existing]
+
+
+def duplicates(index, limit=20):
+    """Combinaisons en double qui empêchent la création d'un index unique"""
+    columns = list(index.columns)
+    return db.session.query(*columns, func.count()).group_by(*columns).having(func.count() > 1).limit(limit).all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        missing = missing_indexes()
+        if not missing:
+            print("✅ Index de la table result déjà présents")
+            return 0
+        status = 0
+        for index in missing:
+            columns = ', '.join(column.name for column in index.columns)
+            if index.unique:
+                rows = duplicates(index)
+                if rows:
+                    print(f"❌ {index.name} ({columns}) non créé: valeurs en double, par exemple")
+                    for *values, count in rows:
+                        print(f"   {tuple(values)}: {count} lignes")
+                    status = 1
+                    continue
+            if args.dry_run:
+                print(f"ℹ️ {index.name} ({columns}) serait créé")
+                continue
+            start = time.perf_counter()
+            index.create(bind=db.engine)
+            print(f"✅ {index.name} ({columns}) créé en {time.perf_counter() - start:.1f} s")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
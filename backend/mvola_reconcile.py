@@ -0,0 +1,305 @@
+"""
+Rapprochement des relevés MVola avec les paiements en attente.
+
+Le relevé exporté par l'opérateur (CSV) est lu en flux, par paquets de
+CHUNK_SIZE lignes. Pour chaque paquet, deux requêtes indexées:
+  - les transactions déjà importées (MvolaTransaction.reference, unique):
+    un relevé qui chevauche un import précédent n'est pas compté deux fois
+  - les paiements dont la référence normalisée (Payment.ref_mvola_norm) figure
+    dans le paquet
+
+Une ligne est rapprochée si exactement un paiement en attente porte la même
+référence, avec un montant à MVOLA_AMOUNT_TOLERANCE près et une date à
+MVOLA_DATE_TOLERANCE_DAYS jours près. Les paiements rapprochés sont ensuite
+validés en masse (PaymentBatch). Les autres lignes vont au rapport:
+  - ambiguous: plusieurs paiements candidats, montant ou date hors tolérance
+  - unmatched: référence inconnue, ou paiement déjà traité
+  - already: transaction déjà rapprochée lors d'un import précédent
+  - invalid: ligne illisible (référence absente, montant invalide)
+
+Les références sont normalisées (majuscules, caractères alphanumériques
+seulement): "mp230915.1234.a12" et "MP2309151234A12" sont identiques.
+"""
+
+import csv
+import io
+import logging
+import os
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+from sqlalchemy import insert, update
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+AMOUNT_TOLERANCE = float(os.getenv('MVOLA_AMOUNT_TOLERANCE', '0'))
+DATE_TOLERANCE = timedelta(days=float(os.getenv('MVOLA_DATE_TOLERANCE_DAYS', '3')))
+
+PENDING_STATUS = 'en_attente'
+
+# En-têtes reconnus (minuscules, sans accents)
+REFERENCE_COLUMNS = ('reference', 'ref', 'code ref', 'code_ref_mvola', 'id transaction', 'transaction id',
+                     'numero transaction', 'transaction')
+AMOUNT_COLUMNS = ('montant', 'amount', 'credit', 'montant credit')
+DATE_COLUMNS = ('date', 'date transaction', 'date operation', 'date_operation', 'date et heure')
+
+DATE_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M',
+                '%Y-%m-%d', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y')
+
+_NOT_ALNUM = re.compile(r'[^0-9A-Z]')
+# Espaces (y compris insécables), devise, ...
+_NOT_NUMERIC = re.compile(r'[^0-9,.\-]')
+
+
+def normalize_reference(value):
+    """Référence comparable: majuscules, alphanumérique; None si vide"""
+    return _NOT_ALNUM.sub('', (value or '').upper())[:50] or None
+
+
+def parse_amount(value):
+    """'50 000,00' / '50,000.00' / '50000' -> 50000.0; ValueError si invalide"""
+    text = _NOT_NUMERIC.sub('', value or '')
+    if ',' in text and '.' in text:
+        text = text.replace(',', '')
+    return float(text.replace(',', '.'))
+
+
+def parse_operation_date(value, formats=DATE_FORMATS):
+    """Date d'opération du relevé; None si absente ou dans un format inconnu.
+
+    formats: liste modifiable pour un même relevé; le format reconnu passe en
+    tête et les lignes suivantes l'essaient en premier."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    for index, fmt in enumerate(formats):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if index and isinstance(formats, list):
+            formats.insert(0, formats.pop(index))
+        return parsed
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _header_key(name):
+    name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return ' '.join(name.lower().replace('_', ' ').split())
+
+
+def _find_column(header, candidates):
+    keys = [_header_key(name) for name in header]
+    for candidate in candidates:
+        candidate = _header_key(candidate)
+        if candidate in keys:
+            return keys.index(candidate)
+    return None
+
+
+class StatementRow:
+    __slots__ = ('line', 'raw_reference', 'reference', 'amount', 'date', 'error')
+
+    def __init__(self, line, raw_reference, reference=None, amount=None, date=None, error=None):
+        self.line = line
+        self.raw_reference = raw_reference
+        self.reference = reference
+        self.amount = amount
+        self.date = date
+        self.error = error
+
+    def describe(self, **extra):
+        return {
+            'line': self.line,
+            'reference': self.raw_reference,
+            'montant': self.amount,
+            'date': self.date.isoformat() if self.date else None,
+            **extra
+        }
+
+
+def statement_rows(stream, encoding='utf-8-sig'):
+    """Lignes d'un relevé CSV (flux binaire), séparateur ; , ou tabulation détecté sur l'en-tête.
+    ValueError si les colonnes référence / montant sont introuvables."""
+    text = io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+    first = text.readline()
+    delimiter = max(';,\t', key=first.count)
+    reader = csv.reader(chain([first], text), delimiter=delimiter)
+    header = next(reader, None) or []
+    reference_col = _find_column(header, REFERENCE_COLUMNS)
+    amount_col = _find_column(header, AMOUNT_COLUMNS)
+    date_col = _find_column(header, DATE_COLUMNS)
+    if reference_col is None or amount_col is None:
+        raise ValueError(f"Colonnes référence / montant introuvables dans l'en-tête: {header}")
+    date_formats = list(DATE_FORMATS)
+
+    for line, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        get = lambda col: values[col].strip() if col is not None and col < len(values) else ''
+        raw_reference = get(reference_col)
+        reference = normalize_reference(raw_reference)
+        if reference is None:
+            yield StatementRow(line, raw_reference, error='Référence absente')
+            continue
+        try:
+            amount = parse_amount(get(amount_col))
+        except ValueError:
+            yield StatementRow(line, raw_reference, reference, error=f"Montant invalide: {get(amount_col)!r}")
+            continue
+        yield StatementRow(line, raw_reference, reference, amount, parse_operation_date(get(date_col), date_formats))
+
+
+class ReconciliationReport:
+    """Résultat d'un import: lignes rapprochées et rapport des autres"""
+
+    CATEGORIES = ('matched', 'ambiguous', 'unmatched', 'already', 'invalid')
+
+    def __init__(self):
+        self.lines = 0
+        self.imported = 0
+        self.duplicates = 0
+        for category in self.CATEGORIES:
+            setattr(self, category, [])
+        # ids des paiements à valider
+        self.payment_ids = []
+
+    def as_dict(self):
+        return {
+            'summary': {
+                'lines': self.lines,
+                'imported': self.imported,
+                'duplicates': self.duplicates,
+                **{category: len(getattr(self, category)) for category in self.CATEGORIES}
+            },
+            **{category: getattr(self, category) for category in self.CATEGORIES}
+        }
+
+
+class MvolaReconciler:
+    """Import des relevés et rapprochement par référence normalisée (sans commit)"""
+
+    def __init__(self, db, payment_model, transaction_model, amount_tolerance=None, date_tolerance=None):
+        self.db = db
+        self.Payment = payment_model
+        self.Transaction = transaction_model
+        self.amount_tolerance = AMOUNT_TOLERANCE if amount_tolerance is None else amount_tolerance
+        self.date_tolerance = DATE_TOLERANCE if date_tolerance is None else date_tolerance
+
+    def reconcile(self, rows):
+        """Rapproche les lignes (itérable de StatementRow); renvoie un ReconciliationReport.
+        Les transactions sont écrites dans la transaction en cours, les paiements ne sont pas modifiés."""
+        report = ReconciliationReport()
+        seen = set()
+        claimed = set()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            self._reconcile_chunk(chunk, report, seen, claimed)
+        return report
+
+    def _reconcile_chunk(self, chunk, report, seen, claimed):
+        # Colonnes seules et écritures groupées: pas d'objet ORM par ligne de relevé
+        Payment, Transaction, session = self.Payment, self.Transaction, self.db.session
+        report.lines += len(chunk)
+        references = {row.reference for row in chunk if row.error is None}
+        known = {}
+        candidates = {}
+        if references:
+            known = {reference: (tx_id, payment_id) for tx_id, reference, payment_id in session.query(
+                Transaction.id, Transaction.reference, Transaction.payment_id
+            ).filter(Transaction.reference.in_(references))}
+            for payment in session.query(
+                Payment.id, Payment.user_id, Payment.ref_mvola_norm, Payment.montant, Payment.statut,
+                Payment.date_paiement
+            ).filter(Payment.ref_mvola_norm.in_(references)):
+                candidates.setdefault(payment.ref_mvola_norm, []).append(payment)
+
+        inserts = []
+        updates = []
+        for row in chunk:
+            if row.error is not None:
+                report.invalid.append({'line': row.line, 'reference': row.raw_reference, 'error': row.error})
+                continue
+            if row.reference in seen:
+                # Même transaction listée deux fois (relevés concaténés)
+                report.duplicates += 1
+                continue
+            seen.add(row.reference)
+
+            tx_id, payment_id = known.get(row.reference, (None, None))
+            if payment_id is not None:
+                report.already.append(row.describe(id_paiement=payment_id))
+                continue
+
+            payment, outcome = self._match(row, candidates.get(row.reference, ()), claimed)
+            if payment is not None:
+                claimed.add(payment.id)
+                payment_id = payment.id
+                report.payment_ids.append(payment.id)
+                report.matched.append(row.describe(id_paiement=payment.id, user_id=payment.user_id))
+            else:
+                category, entry = outcome
+                getattr(report, category).append(entry)
+
+            if tx_id is None:
+                inserts.append({'reference': row.reference, 'montant': row.amount, 'date_operation': row.date,
+                                'payment_id': payment_id})
+            elif payment_id is not None:
+                updates.append({'id': tx_id, 'payment_id': payment_id})
+
+        if inserts:
+            session.execute(insert(Transaction.__table__), inserts)
+            report.imported += len(inserts)
+        if updates:
+            session.execute(update(Transaction), updates)
+
+    def _match(self, row, payments, claimed):
+        """(paiement, None) si rapprochement certain, sinon (None, (catégorie, entrée du rapport))"""
+        if not payments:
+            return None, ('unmatched', row.describe(reason='reference_inconnue'))
+        pending = [p for p in payments if p.statut == PENDING_STATUS and p.id not in claimed]
+        if not pending:
+            return None, ('unmatched', row.describe(reason='paiement_deja_traite',
+                                                    candidates=self._candidates(payments)))
+        amount_ok = [p for p in pending if abs((p.montant or 0) - row.amount) <= self.amount_tolerance]
+        if not amount_ok:
+            return None, ('ambiguous', row.describe(reason='montant_different', candidates=self._candidates(pending)))
+        date_ok = [p for p in amount_ok if row.date is None or p.date_paiement is None
+                   or abs(p.date_paiement - row.date) <= self.date_tolerance]
+        if not date_ok:
+            return None, ('ambiguous', row.describe(reason='date_hors_tolerance',
+                                                    candidates=self._candidates(amount_ok)))
+        if len(date_ok) > 1:
+            return None, ('ambiguous', row.describe(reason='plusieurs_paiements',
+                                                    candidates=self._candidates(date_ok)))
+        return date_ok[0], None
+
+    @staticmethod
+    def _candidates(payments):
+        return [{
+            'id_paiement': p.id,
+            'user_id': p.user_id,
+            'montant': p.montant,
+            'statut': p.statut,
+            'date_paiement': p.date_paiement.isoformat() if p.date_paiement else None
+        } for p in payments]
+
+    def verify(self, code):
+        """Transaction importée pour cette référence: (montant, déjà rapprochée) ou None"""
+        reference = normalize_reference(code)
+        if reference is None:
+            return None
+        tx = self.db.session.query(self.Transaction).filter_by(reference=reference).first()
+        if tx is None:
+            return None
+        return tx.montant, tx.payment_id is not None
@@ -0,0 +1,120 @@
+"""
+État de lecture des notifications, une ligne par étudiant.
+
+Une notification est lue si son id est <= read_upto (filigrane) ou s'il figure
+dans exceptions (ids > read_upto lus individuellement). Les ids croissent avec
+date_envoi: le filigrane avance dès que toutes les notifications visibles
+jusqu'à un id sont lues, et les exceptions correspondantes disparaissent.
+Diffuser une notification "tous" à 10 000 étudiants n'écrit donc rien: elle
+est non lue pour chacun tant que son id dépasse leur filigrane.
+
+Le nombre de non lues est un COUNT sur la plage d'ids au-delà du filigrane,
+moins la taille des exceptions.
+"""
+
+import logging
+
+from sqlalchemy import func, or_
+
+logger = logging.getLogger(__name__)
+
+# Au-delà, les exceptions les plus anciennes sont absorbées en avançant le filigrane
+MAX_EXCEPTIONS = 200
+
+
+class NotificationReads:
+    """Filigrane + exceptions par étudiant"""
+
+    def __init__(self, db, notification_model, state_model):
+        self.db = db
+        self.Notification = notification_model
+        self.State = state_model
+
+    def visible(self, user_id):
+        """Condition: notifications destinées à tous + notifications ciblées à l'étudiant"""
+        Notification = self.Notification
+        return or_(Notification.type_cible == 'tous', Notification.id_etudiant == user_id)
+
+    def state(self, user_id):
+        """(read_upto, exceptions) sans créer de ligne"""
+        row = self.db.session.get(self.State, user_id)
+        if row is None:
+            return 0, frozenset()
+        return row.read_upto or 0, frozenset(row.exceptions or ())
+
+    @staticmethod
+    def is_read(notification_id, state):
+        read_upto, exceptions = state
+        return notification_id <= read_upto or notification_id in exceptions
+
+    def unread_count(self, user_id):
+        read_upto, exceptions = self.state(user_id)
+        Notification = self.Notification
+        after = self.db.session.query(func.count(Notification.id)).filter(
+            Notification.id > read_upto, self.visible(user_id)
+        ).scalar()
+        return max(0, after - len(exceptions))
+
+    def latest_id(self, user_id):
+        Notification = self.Notification
+        return self.db.session.query(func.max(Notification.id)).filter(self.visible(user_id)).scalar() or 0
+
+    def _row(self, user_id):
+        # Verrou de ligne: deux marquages simultanés ne perdent pas d'exception
+        row = self.db.session.get(self.State, user_id, with_for_update=True)
+        if row is None:
+            row = self.State(user_id=user_id, read_upto=0, exceptions=[])
+            self.db.session.add(row)
+        return row
+
+    def mark_read(self, user_id, notification_id):
+        """Marque une notification visible comme lue (sans commit); False si elle n'est pas visible"""
+        Notification = self.Notification
+        visible = self.db.session.query(Notification.id).filter(
+            Notification.id == notification_id, self.visible(user_id)
+        ).first()
+        if visible is None:
+            return False
+        row = self._row(user_id)
+        read_upto = row.read_upto or 0
+        if notification_id <= read_upto or notification_id in (row.exceptions or ()):
+            return True
+        exceptions = set(row.exceptions or ())
+        exceptions.add(notification_id)
+        row.read_upto, row.exceptions = self._compact(user_id, read_upto, exceptions)
+        return True
+
+    def mark_all_read(self, user_id, upto=None):
+        """Tout marquer comme lu jusqu'à upto (par défaut la dernière notification visible)"""
+        latest = self.latest_id(user_id)
+        # Borné à la dernière notification visible: un upto futur absorberait les prochains envois
+        upto = latest if upto is None else min(upto, latest)
+        row = self._row(user_id)
+        if upto > (row.read_upto or 0):
+            row.read_upto = upto
+            row.exceptions = sorted(i for i in (row.exceptions or ()) if i > upto)
+        return row.read_upto
+
+    def forget(self, user_id):
+        """Suppression d'un étudiant: état de lecture (sans commit)"""
+        self.db.session.query(self.State).filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    def _compact(self, user_id, read_upto, exceptions):
+        """Avance le filigrane sur les ids visibles consécutifs déjà lus"""
+        Notification = self.Notification
+        # Ids visibles suivant le filigrane, jusqu'à la plus grande exception
+        following = [i for (i,) in self.db.session.query(Notification.id).filter(
+            Notification.id > read_upto, Notification.id <= max(exceptions), self.visible(user_id)
+        ).order_by(Notification.id).limit(len(exceptions) + 1)]
+        for notification_id in following:
+            if notification_id not in exceptions:
+                break
+            read_upto = notification_id
+        exceptions = {i for i in exceptions if i > read_upto}
+        if len(exceptions) > MAX_EXCEPTIONS:
+            # Cas extrême (lectures très dispersées): les plus anciennes non lues sont considérées lues
+            overflow = sorted(exceptions)[:len(exceptions) - MAX_EXCEPTIONS]
+            read_upto = overflow[-1]
+            exceptions = {i for i in exceptions if i > read_upto}
+            logger.info(f"Filigrane de lecture avancé à {read_upto} pour l'utilisateur {user_id}")
+        return read_upto, sorted(exceptions)
@@ -0,0 +1,177 @@
+"""
+Hachage des mots de passe et codes d'authentification hors du thread de requête.
+
+Les dérivations de clé (pbkdf2) coûtent des dizaines de millisecondes de CPU et
+gardent le GIL: elles sont exécutées dans un pool de processus dimensionné sur
+la limite CPU du conteneur. Le thread de requête attend le résultat sans tenir
+le GIL.
+
+- Contre-pression: au-delà de `workers * HASH_QUEUE_PER_WORKER` opérations en
+  cours, HashingBusy est levée (traduite en 503 + Retry-After par l'application).
+- Coût configurable (HASH_ALGORITHM, HASH_ITERATIONS): un hash stocké avec
+  d'anciens paramètres est recalculé de façon transparente à la connexion
+  (verify_and_update).
+
+Les processus sont créés par fork (HASH_MP_CONTEXT) et n'exécutent que le code
+de ce module (werkzeug.security / hashlib).
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ITERATIONS = 260000
+
+
+class HashingBusy(Exception):
+    """Pool de hachage saturé: la requête doit être réessayée plus tard"""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Hashing pool saturated")
+        self.retry_after = retry_after
+
+
+def cpu_limit():
+    """Nombre de CPU disponibles selon le quota cgroup (v2 puis v1), sinon cpu_count"""
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            max_value, period = f.read().split()
+            if max_value != 'max':
+                quota = int(max_value) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                max_value = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if max_value > 0:
+                quota = max_value / period
+        except (OSError, ValueError):
+            pass
+    count = os.cpu_count() or 1
+    if quota is not None:
+        count = min(count, math.ceil(quota))
+    return max(1, count)
+
+
+# ----- Fonctions exécutées dans les processus du pool -----
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(stored_hash, password, method, salt_length, rehash):
+    """Vérifie et, si demandé et valide, recalcule le hash avec les paramètres courants"""
+    if not stored_hash or not check_password_hash(stored_hash, password):
+        return False, None
+    return True, (_hash(password, method, salt_length) if rehash else None)
+
+
+class PasswordHasher:
+    """Service de hachage (pool de processus borné)"""
+
+    def __init__(self, workers=None, queue_per_worker=None, algorithm=None, iterations=None,
+                 salt_length=16, timeout=None, mp_context=None):
+        self.workers = workers or int(os.getenv('HASH_WORKERS', '0')) or cpu_limit()
+        queue_per_worker = queue_per_worker or int(os.getenv('HASH_QUEUE_PER_WORKER', '8'))
+        self.algorithm = algorithm or os.getenv('HASH_ALGORITHM', 'sha256')
+        self.iterations = iterations or int(os.getenv('HASH_ITERATIONS', str(DEFAULT_ITERATIONS)))
+        self.salt_length = salt_length
+        self.timeout = timeout or float(os.getenv('HASH_TIMEOUT', '10'))
+        self.method = f"pbkdf2:{self.algorithm}:{self.iterations}"
+        self.capacity = self.workers * queue_per_worker
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._mp_context = mp_context or os.getenv('HASH_MP_CONTEXT', 'fork')
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0}
+
+    # ----- Pool -----
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    context = multiprocessing.get_context(self._mp_context)
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise HashingBusy()
+        try:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # Le créneau est libéré quand le calcul se termine réellement: une tâche
+            # abandonnée après timeout occupe encore un processus du pool
+            future.add_done_callback(lambda _: self._slots.release())
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.stats['rejected'] += 1
+            raise HashingBusy()
+        except BrokenProcessPool:
+            # Processus tué (OOM...): le pool est recréé au prochain appel
+            logger.warning("Pool de hachage cassé, recréation")
+            with self._lock:
+                self._executor = None
+            self.stats['rejected'] += 1
+            raise HashingBusy()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def in_flight(self):
+        return self.capacity - self._slots._value
+
+    # ----- API -----
+
+    def hash(self, password):
+        """Hash pbkdf2 avec les paramètres de coût courants"""
+        result = self._run(_hash, password, self.method, self.salt_length)
+        self.stats['hashed'] += 1
+        return result
+
+    def needs_rehash(self, stored_hash):
+        """Vrai si le hash stocké n'utilise pas la méthode/le coût courants"""
+        if not stored_hash or '$' not in stored_hash:
+            return True
+        return stored_hash.split('$', 1)[0] != self.method
+
+    def verify(self, stored_hash, password):
+        ok, _ = self.verify_and_update(stored_hash, password, rehash=False)
+        return ok
+
+    def verify_and_update(self, stored_hash, password, rehash=True):
+        """(valide, nouveau_hash|None): le nouveau hash est calculé dans la même
+        tâche que la vérification quand les paramètres de coût ont changé"""
+        rehash = rehash and self.needs_rehash(stored_hash)
+        ok, new_hash = self._run(_verify, stored_hash, password, self.method, self.salt_length, rehash)
+        self.stats['verified'] += 1
+        if new_hash:
+            self.stats['rehashed'] += 1
+        return ok, new_hash
+
+    def describe(self):
+        return {
+            'workers': self.workers,
+            'capacity': self.capacity,
+            'in_flight': self.in_flight(),
+            'method': self.method,
+            **self.stats
+        }
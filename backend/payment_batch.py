@@ -0,0 +1,195 @@
+"""
+Traitement en masse des paiements (validation, paiement partiel, rejet).
+
+Après une vague d'inscriptions, l'administration traite des centaines de
+paiements MVola. Au lieu d'un appel HTTP par paiement (lecture du paiement,
+lecture de l'utilisateur, commit), PaymentBatch:
+  - charge les paiements sélectionnés (liste d'ids ou filtre) en une requête,
+    puis leurs étudiants en une seconde
+  - applique statut, activation et nouveaux codes en mémoire
+  - met à jour les cumuls statistiques groupés par (jour, mode, statut) et
+    le journal des soldes étudiants (tranche_restante = reste dû)
+  - laisse l'appelant valider le tout en un seul commit
+
+Un étudiant présent plusieurs fois dans le lot ne reçoit qu'un code (et donc
+un seul email). Le résultat donne l'issue de chaque id demandé.
+"""
+
+import logging
+import os
+from datetime import datetime, time, timedelta
+
+from stats_rollup import parse_day
+
+logger = logging.getLogger(__name__)
+
+# action -> nouveau statut; None pour un rejet (suppression)
+BULK_ACTIONS = {
+    'validate': 'complet',
+    'partial': 'par_tranche',
+    'reject': None
+}
+
+MAX_BULK_PAYMENTS = int(os.getenv('MAX_BULK_PAYMENTS', '1000'))
+
+FILTER_FIELDS = ('statut', 'mode_paiement', 'start', 'end')
+
+
+def parse_bulk_selection(data):
+    """(ids, filtre) depuis {"ids": [...]} ou {"filter": {...}}; ValueError si invalide"""
+    ids = data.get('ids')
+    filters = data.get('filter')
+    if (ids is None) == (filters is None):
+        raise ValueError('Fournir soit ids, soit filter')
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise ValueError('ids doit être une liste non vide')
+        try:
+            ids = list(dict.fromkeys(int(i) for i in ids))
+        except (TypeError, ValueError):
+            raise ValueError('ids doit contenir des entiers')
+        if len(ids) > MAX_BULK_PAYMENTS:
+            raise ValueError(f'Au plus {MAX_BULK_PAYMENTS} paiements par lot')
+        return ids, None
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError('filter doit contenir au moins un critère')
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Critères inconnus: {', '.join(sorted(unknown))}")
+    filters = dict(filters)
+    filters['start'], filters['end'] = parse_day(filters.get('start')), parse_day(filters.get('end'))
+    return None, filters
+
+
+class BulkOutcome:
+    """Issue d'un lot: résultats par id, emails à envoyer, événements à publier après commit"""
+
+    __slots__ = ('items', 'emails', 'updated', 'deleted', 'truncated')
+
+    def __init__(self):
+        self.items = []
+        # (utilisateur, code) pour chaque étudiant ayant reçu un nouveau code
+        self.emails = []
+        self.updated = []
+        # (id_paiement, user_id)
+        self.deleted = []
+        self.truncated = False
+
+    def summary(self):
+        succeeded = sum(1 for item in self.items if item['success'])
+        return {'total': len(self.items), 'succeeded': succeeded, 'failed': len(self.items) - succeeded,
+                'truncated': self.truncated}
+
+
+class PaymentBatch:
+    """Sélection et application d'une action sur un lot de paiements (sans commit)"""
+
+    def __init__(self, db, payment_model, user_model, rollup, ledger, new_code, set_code, digest):
+        self.db = db
+        self.Payment = payment_model
+        self.User = user_model
+        self.rollup = rollup
+        self.ledger = ledger
+        # new_code() -> code en clair; set_code(user, code) l'enregistre (clair + HMAC);
+        # digest(code) -> HMAC stocké dans la colonne unique code_auth_hmac
+        self.new_code = new_code
+        self.set_code = set_code
+        self.digest = digest
+
+    def select(self, ids=None, filters=None):
+        """(paiements, tronqué): une requête, au plus MAX_BULK_PAYMENTS paiements"""
+        Payment = self.Payment
+        query = self.db.session.query(Payment)
+        if ids is not None:
+            return query.filter(Payment.id.in_(ids)).all(), False
+        if filters.get('statut'):
+            query = query.filter(Payment.statut == filters['statut'])
+        if filters.get('mode_paiement'):
+            query = query.filter(Payment.mode_paiement == filters['mode_paiement'])
+        if filters.get('start'):
+            query = query.filter(Payment.date_paiement >= datetime.combine(filters['start'], time.min))
+        if filters.get('end'):
+            # Borne de fin incluse (jour entier)
+            query = query.filter(Payment.date_paiement < datetime.combine(filters['end'] + timedelta(days=1), time.min))
+        payments = query.order_by(Payment.id).limit(MAX_BULK_PAYMENTS + 1).all()
+        return payments[:MAX_BULK_PAYMENTS], len(payments) > MAX_BULK_PAYMENTS
+
+    def apply(self, action, ids=None, filters=None):
+        if action not in BULK_ACTIONS:
+            raise ValueError(f'Action inconnue: {action}')
+        outcome = BulkOutcome()
+        payments, outcome.truncated = self.select(ids, filters)
+        found = {payment.id: payment for payment in payments}
+        for payment_id in ids or ():
+            if payment_id not in found:
+                outcome.items.append({'id_paiement': payment_id, 'success': False, 'error': 'Paiement non trouvé'})
+        if not payments:
+            return outcome
+
+        if BULK_ACTIONS[action] is None:
+            self._reject(payments, outcome)
+        else:
+            self._update(payments, BULK_ACTIONS[action], outcome)
+        return outcome
+
+    def _reject(self, payments, outcome):
+        Payment = self.Payment
+        self.rollup.record_payments(payments, sign=-1)
+        self.ledger.remove_payments(payments)
+        self.db.session.query(Payment).filter(Payment.id.in_([p.id for p in payments])).delete(
+            synchronize_session=False)
+        for payment in payments:
+            outcome.deleted.append((payment.id, payment.user_id))
+            outcome.items.append({'id_paiement': payment.id, 'success': True})
+
+    def _update(self, payments, statut, outcome):
+        User = self.User
+        user_ids = {payment.user_id for payment in payments}
+        users = {user.id: user for user in self.db.session.query(User).filter(User.id.in_(user_ids))}
+
+        valid = []
+        for payment in payments:
+            if payment.user_id not in users:
+                outcome.items.append({'id_paiement': payment.id, 'success': False, 'error': 'Utilisateur non trouvé'})
+            else:
+                valid.append(payment)
+        self.rollup.move_payments(valid, statut)
+        self.ledger.move_payments(valid, statut)
+
+        codes = self._unique_codes(list(dict.fromkeys(payment.user_id for payment in valid)))
+        for user_id, code in codes.items():
+            self.set_code(users[user_id], code)
+            outcome.emails.append((users[user_id], code))
+        for payment in valid:
+            user = users[payment.user_id]
+            payment.statut = statut
+            payment.tranche_restante = self.ledger.remaining(payment.user_id)
+            user.actif = True
+            outcome.updated.append(payment)
+            outcome.items.append({'id_paiement': payment.id, 'success': True, 'user_email': user.email,
+                                  'code_auth': codes[user.id]})
+
+    def _unique_codes(self, user_ids):
+        """Un nouveau code par étudiant, distincts entre eux et des codes existants (colonne unique).
+
+        Des milliers de codes aléatoires de 6 caractères ont une probabilité non
+        négligeable de collision: une requête vérifie tout le lot, seuls les
+        doublons sont retirés."""
+        User = self.User
+        codes = {}
+        used = set()
+        missing = list(user_ids)
+        while missing:
+            drawn = {}
+            for user_id in missing:
+                code = self.new_code()
+                if code not in used:
+                    used.add(code)
+                    drawn[self.digest(code)] = (user_id, code)
+            taken = {digest for (digest,) in self.db.session.query(User.code_auth_hmac).filter(
+                User.code_auth_hmac.in_(list(drawn)))} if drawn else set()
+            for digest, (user_id, code) in drawn.items():
+                if digest not in taken:
+                    codes[user_id] = code
+            missing = [user_id for user_id in missing if user_id not in codes]
+        return codes
@@ -0,0 +1,244 @@
+"""
+Génération en arrière-plan des dérivés PDF (nombre de pages, métadonnées,
+vignette de la première page, copie linéarisée "fast web view").
+
+Les dérivés sont écrits à côté du fichier original dans le dossier uploads :
+    cours.pdf            -> original
+    cours.pdf.meta.json  -> nombre de pages + métadonnées
+    cours.pdf.thumb.png  -> vignette de la première page
+    cours.pdf.linear.pdf -> copie linéarisée pour PDF.js
+
+Outils optionnels (installés dans l'image Docker) :
+    - pypdf   : nombre de pages et métadonnées (sinon lecture brute du fichier)
+    - pdftoppm (poppler-utils) : vignette
+    - qpdf    : linéarisation
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pypdf absent: on se rabat sur un comptage brut des pages
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+META_SUFFIX = '.meta.json'
+THUMB_SUFFIX = '.thumb.png'
+LINEAR_SUFFIX = '.linear.pdf'
+DERIVATIVE_SUFFIXES = (META_SUFFIX, THUMB_SUFFIX, LINEAR_SUFFIX)
+
+THUMB_WIDTH = int(os.getenv('PDF_THUMB_WIDTH', '240'))
+SUBPROCESS_TIMEOUT = int(os.getenv('PDF_DERIVATIVE_TIMEOUT', '60'))
+
+_PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![s\w])')
+
+
+def is_derivative(filename):
+    """Indique si un nom de fichier correspond à un dérivé généré"""
+    return filename.endswith(DERIVATIVE_SUFFIXES)
+
+
+def _count_pages_raw(path):
+    """Comptage approximatif des pages sans bibliothèque PDF"""
+    with open(path, 'rb') as f:
+        return len(_PAGE_PATTERN.findall(f.read()))
+
+
+def extract_metadata(path):
+    """Extrait le nombre de pages et les métadonnées d'un PDF"""
+    meta = {'page_count': None, 'title': None, 'author': None, 'producer': None}
+
+    if PdfReader is not None:
+        try:
+            reader = PdfReader(path)
+            meta['page_count'] = len(reader.pages)
+            info = reader.metadata or {}
+            meta['title'] = info.get('/Title')
+            meta['author'] = info.get('/Author')
+            meta['producer'] = info.get('/Producer')
+            return meta
+        except Exception as e:
+            logger.warning(f"pypdf n'a pas pu lire {path}: {e}")
+
+    try:
+        meta['page_count'] = _count_pages_raw(path) or None
+    except OSError as e:
+        logger.warning(f"Lecture impossible de {path}: {e}")
+    return meta
+
+
+def render_thumbnail(path, thumb_path):
+    """Rend la première page en PNG via pdftoppm (poppler-utils)"""
+    if not shutil.which('pdftoppm'):
+        return False
+
+    # pdftoppm ajoute lui-même l'extension .png au préfixe de sortie
+    prefix = thumb_path[:-len('.png')]
+    try:
+        subprocess.run(
+            ['pdftoppm', '-png', '-f', '1', '-l', '1', '-singlefile',
+             '-scale-to', str(THUMB_WIDTH), path, prefix],
+            check=True, capture_output=True, timeout=SUBPROCESS_TIMEOUT
+        )
+        return os.path.exists(thumb_path)
+    except (subprocess.SubprocessError, OSError) as e:
+        logger.warning(f"Échec de la vignette pour {path}: {e}")
+        return False
+
+
+def linearize(path, linear_path):
+    """Produit une copie linéarisée ("fast web view") via qpdf"""
+    if not shutil.which('qpdf'):
+        return False
+
+    tmp_path = linear_path + '.tmp'
+    try:
+        result = subprocess.run(
+            ['qpdf', '--linearize', path, tmp_path],
+            capture_output=True, timeout=SUBPROCESS_TIMEOUT
+        )
+        # qpdf renvoie 3 pour de simples avertissements: la sortie reste valide
+        if result.returncode not in (0, 3) or not os.path.exists(tmp_path):
+            raise subprocess.SubprocessError(result.stderr.decode(errors='ignore')[:200])
+        os.replace(tmp_path, linear_path)
+        return True
+    except (subprocess.SubprocessError, OSError) as e:
+        logger.warning(f"Échec de la linéarisation pour {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+class PdfDerivativeService:
+    """Pool de workers qui calcule et met en cache les dérivés PDF sur disque"""
+
+    def __init__(self, upload_folder, max_workers=None):
+        self.upload_folder = upload_folder
+        self.max_workers = max_workers or int(os.getenv('PDF_DERIVATIVE_WORKERS', '2'))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        # Cache mémoire des fichiers .meta.json: filename -> (mtime, meta)
+        self._meta_cache = {}
+
+    def _path(self, filename, suffix=''):
+        return os.path.join(self.upload_folder, os.path.basename(filename) + suffix)
+
+    def _get_executor(self):
+        # Création paresseuse pour ne pas lancer de threads à l'import (scripts, init_db)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='pdf-derivatives'
+            )
+        return self._executor
+
+    def schedule(self, filename):
+        """Planifie la génération des dérivés hors du chemin de la requête"""
+        filename = os.path.basename(filename)
+        # cours.pdf.linear.pdf se termine aussi par .pdf: pas de dérivés de dérivés
+        if not filename.lower().endswith('.pdf') or is_derivative(filename):
+            return False
+
+        with self._lock:
+            if filename in self._pending:
+                return False
+            self._pending.add(filename)
+
+        self._get_executor().submit(self._run, filename)
+        return True
+
+    def _run(self, filename):
+        try:
+            self.build(filename)
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération des dérivés de {filename}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(filename)
+
+    def build(self, filename):
+        """Calcule tous les dérivés d'un PDF (exécuté dans le pool)"""
+        source = self._path(filename)
+        if not os.path.exists(source):
+            return None
+
+        meta = extract_metadata(source)
+        meta['thumbnail'] = render_thumbnail(source, self._path(filename, THUMB_SUFFIX))
+        meta['linearized'] = linearize(source, self._path(filename, LINEAR_SUFFIX))
+        meta['source_mtime'] = os.path.getmtime(source)
+        meta['source_size'] = os.path.getsize(source)
+
+        # Écriture atomique: le .meta.json n'apparaît que lorsque tout est prêt
+        meta_path = self._path(filename, META_SUFFIX)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+        logger.info(f"Dérivés PDF générés pour {filename}: {meta['page_count']} pages")
+        return meta
+
+    def get_meta(self, filename):
+        """Retourne les métadonnées en cache, ou None si pas encore générées"""
+        filename = os.path.basename(filename)
+        meta_path = self._path(filename, META_SUFFIX)
+        try:
+            mtime = os.path.getmtime(meta_path)
+        except OSError:
+            return None
+
+        cached = self._meta_cache.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._meta_cache[filename] = (mtime, meta)
+        return meta
+
+    def describe(self, filename):
+        """Champs exposés dans la liste des documents (thumbnail_url, page_count)"""
+        filename = os.path.basename(filename)
+        meta = self.get_meta(filename)
+        if meta is None:
+            # Document antérieur au pipeline: on génère ses dérivés en tâche de fond
+            self.schedule(filename)
+            return {'page_count': None, 'thumbnail_url': None, 'derivatives_ready': False}
+
+        return {
+            'page_count': meta.get('page_count'),
+            'thumbnail_url': f"/uploads/{filename}{THUMB_SUFFIX}" if meta.get('thumbnail') else None,
+            'derivatives_ready': True
+        }
+
+    def linearized_name(self, filename):
+        """Nom de la copie linéarisée si elle existe, sinon None"""
+        filename = os.path.basename(filename)
+        meta = self.get_meta(filename)
+        if meta and meta.get('linearized') and os.path.exists(self._path(filename, LINEAR_SUFFIX)):
+            return filename + LINEAR_SUFFIX
+        return None
+
+    def remove(self, filename):
+        """Supprime les dérivés d'un document"""
+        filename = os.path.basename(filename)
+        self._meta_cache.pop(filename, None)
+        for suffix in DERIVATIVE_SUFFIXES:
+            path = self._path(filename, suffix)
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.error(f"Erreur lors de la suppression du dérivé {path}: {e}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Précompresse les fichiers statiques (.gz et .br à côté de chaque fichier).
+Exécuté au build de l'image Docker: les fichiers sont ensuite servis tels quels
+par compression.Compressor, sans compression à chaque requête.
+
+Usage: python precompress_static.py [dossier ...]   (défaut: static)
+"""
+
+import gzip
+import mimetypes
+import os
+import sys
+
+from compression import COMPRESSIBLE_TYPES, PRECOMPRESSED_SUFFIXES, brotli
+
+MIN_SIZE = 512
+
+
+def precompress_file(path):
+    """Écrit path.gz (et path.br) si le gain est réel; retourne les tailles"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    sizes = {'original': len(data)}
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+
+    for encoding, compressed in variants.items():
+        target = path + PRECOMPRESSED_SUFFIXES[encoding]
+        if len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        # Même mtime que l'original pour des validateurs HTTP cohérents
+        stat = os.stat(path)
+        os.utime(target, (stat.st_atime, stat.st_mtime))
+        sizes[encoding] = len(compressed)
+    return sizes
+
+
+def precompress_directory(directory):
+    results = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(tuple(PRECOMPRESSED_SUFFIXES.values())):
+                continue
+            path = os.path.join(root, name)
+            mimetype = mimetypes.guess_type(name)[0]
+            if mimetype not in COMPRESSIBLE_TYPES or os.path.getsize(path) < MIN_SIZE:
+                continue
+            results.append((path, precompress_file(path)))
+    return results
+
+
+def main(argv):
+    directories = argv or [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')]
+    for directory in directories:
+        for path, sizes in precompress_directory(directory):
+            details = ', '.join(
+                f"{encoding}: {size} o ({100 * size / sizes['original']:.0f}%)"
+                for encoding, size in sizes.items() if encoding != 'original'
+            )
+            print(f"✅ {path}: {sizes['original']} o -> {details}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,183 @@
+"""
+Banque de questions: pools étiquetés et tirage par étudiant.
+
+Un quiz "banque" est défini par des règles (pool_id, nombre, tag facultatif):
+"N questions tirées du pool X" (stratifié proportionnellement sur les tags du
+pool) ou "N questions du tag T du pool X".
+
+Chaque pool est chargé une fois en mémoire (PoolIndex): tableaux compacts des
+ids et des points triés par tag (chaque strate est une tranche contiguë), les
+fragments JSON déjà encodés pour la réponse étudiant et les données de
+correction. Le tirage d'un étudiant est déterministe (générateur initialisé par
+quiz_id / user_id, voir QuizShuffler.rng) et coûte O(N) sans requête: la
+soumission refait le même tirage et corrige avec les mêmes données.
+
+Modifier un pool pendant un examen change les tirages: les pools d'un quiz
+ouvert ne doivent pas être modifiés.
+"""
+
+import hashlib
+import logging
+import threading
+from array import array
+
+from quiz_shuffle import QuestionFragment
+
+logger = logging.getLogger(__name__)
+
+
+class BankQuestion:
+    """Données de correction d'une question du pool (mêmes attributs que Question)"""
+
+    __slots__ = ('id', 'pool_id', 'tag', 'type_question', 'reponse_correcte', 'options', 'points')
+
+    def __init__(self, id, pool_id, tag, type_question, reponse_correcte, options, points):
+        self.id = id
+        self.pool_id = pool_id
+        self.tag = tag
+        self.type_question = type_question
+        self.reponse_correcte = reponse_correcte
+        self.options = options
+        self.points = points
+
+
+class PoolIndex:
+    """Pool chargé: tableaux alignés triés par (tag, id)"""
+
+    __slots__ = ('pool_id', 'ids', 'points', 'strata', 'questions', 'fragments', 'digest')
+
+    def __init__(self, pool_id, rows, encode):
+        rows = sorted(rows, key=lambda row: (row.tag or '', row.id))
+        self.pool_id = pool_id
+        self.ids = array('l', (row.id for row in rows))
+        self.points = array('l', (row.points or 0 for row in rows))
+        self.questions = [
+            BankQuestion(row.id, pool_id, row.tag or '', row.type_question, row.reponse_correcte, row.options,
+                         row.points or 0)
+            for row in rows
+        ]
+        self.fragments = [
+            QuestionFragment({
+                'id': row.id,
+                'question': row.question,
+                'type_question': row.type_question,
+                'options': row.options,
+                'points': row.points
+            }, encode)
+            for row in rows
+        ]
+        # tag -> (début, fin) dans les tableaux
+        self.strata = {}
+        for index, question in enumerate(self.questions):
+            start, _ = self.strata.get(question.tag, (index, index))
+            self.strata[question.tag] = (start, index + 1)
+        # Empreinte du contenu (ETag des réponses étudiantes)
+        sha = hashlib.sha1()
+        for fragment in self.fragments:
+            sha.update(fragment.head)
+            sha.update(fragment.tail)
+            sha.update(b''.join(fragment.options) if fragment.options is not None else fragment.raw_options)
+        for question in self.questions:
+            sha.update(str(question.reponse_correcte).encode('utf-8'))
+        self.digest = sha.hexdigest()[:12]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def stratum_sizes(self, tag=None):
+        if tag is not None:
+            start, end = self.strata.get(tag, (0, 0))
+            return [(start, end)]
+        return [self.strata[t] for t in sorted(self.strata)]
+
+
+def allocate(count, sizes):
+    """Répartit count proportionnellement à sizes (plus forts restes, plafonné à chaque taille)"""
+    total = sum(sizes)
+    count = min(count, total)
+    if not count:
+        return [0] * len(sizes)
+    quotas = [count * size / total for size in sizes]
+    allocation = [min(int(quota), size) for quota, size in zip(quotas, sizes)]
+    by_remainder = sorted(range(len(sizes)), key=lambda i: (allocation[i] - quotas[i], i))
+    while sum(allocation) < count:
+        for i in by_remainder:
+            if sum(allocation) >= count:
+                break
+            if allocation[i] < sizes[i]:
+                allocation[i] += 1
+    return allocation
+
+
+class QuestionBank:
+    """Pools en mémoire, rechargés après invalidation"""
+
+    def __init__(self, loader, encode):
+        # loader(pool_id) -> lignes (id, tag, question, type_question, reponse_correcte, options, points)
+        self.loader = loader
+        self.encode = encode
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.stats = {'loads': 0, 'invalidations': 0}
+
+    def pool(self, pool_id):
+        index = self._pools.get(pool_id)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._pools.get(pool_id)
+            if index is None:
+                index = PoolIndex(pool_id, self.loader(pool_id), self.encode)
+                self._pools[pool_id] = index
+                self.stats['loads'] += 1
+            return index
+
+    def invalidate(self, pool_id):
+        """À appeler après le commit d'une modification du pool"""
+        self._pools.pop(pool_id, None)
+        self.stats['invalidations'] += 1
+
+    def draw(self, rules, rng):
+        """Positions tirées [(PoolIndex, indice)] pour les règles, dans l'ordre des règles.
+
+        Un seul générateur pour tout le tirage; les doublons entre règles qui
+        se recouvrent sont ignorés."""
+        drawn = []
+        seen = set()
+        for pool_id, count, tag in rules:
+            index = self.pool(pool_id)
+            strata = index.stratum_sizes(tag)
+            for (start, end), k in zip(strata, allocate(count, [end - start for start, end in strata])):
+                for offset in rng.sample(range(end - start), k):
+                    position = start + offset
+                    if index.ids[position] not in seen:
+                        seen.add(index.ids[position])
+                        drawn.append((index, position))
+        return drawn
+
+    def questions(self, rules, rng):
+        """Questions tirées (données de correction), indexées par id"""
+        return {index.ids[position]: index.questions[position] for index, position in self.draw(rules, rng)}
+
+    def fragments(self, rules, rng):
+        return [index.fragments[position] for index, position in self.draw(rules, rng)]
+
+    def expected_points(self, rules):
+        """Total de points attendu (moyenne des points de chaque strate tirée)"""
+        total = 0.0
+        for pool_id, count, tag in rules:
+            index = self.pool(pool_id)
+            strata = index.stratum_sizes(tag)
+            for (start, end), k in zip(strata, allocate(count, [end - start for start, end in strata])):
+                if k:
+                    total += k * sum(index.points[start:end]) / (end - start)
+        return round(total)
+
+    def available(self, pool_id, tag=None):
+        return sum(end - start for start, end in self.pool(pool_id).stratum_sizes(tag))
+
+    def digest(self, rules):
+        return '-'.join(self.pool(pool_id).digest for pool_id in sorted({rule[0] for rule in rules}))
+
+    def describe(self):
+        return {**self.stats, 'pools': {pool_id: len(index) for pool_id, index in self._pools.items()}}
@@ -0,0 +1,242 @@
+"""
+Caches des quiz côté étudiant.
+
+QuizCatalogue: ensemble des quiz visibles (statut 'actif' et date_debut <= now
+<= date_fin). Une seule requête charge les quiz actifs non terminés; l'entrée
+reste valide jusqu'à la prochaine borne (début d'un quiz à venir ou fin d'un
+quiz ouvert) et est invalidée explicitement par les routes d'administration.
+Entre deux bornes, le tableau de bord étudiant ne coûte aucune requête.
+QUIZ_CATALOGUE_MAX_TTL borne la durée de vie (modifications faites par un autre
+réplica).
+
+QuizPayloadCache: réponse de /api/quizzes/<id> déjà encodée en JSON (sans
+reponse_correcte), avec numéro de version et ETag. À l'ouverture d'un examen,
+des centaines d'étudiants demandent le même quiz dans la même seconde: un seul
+chargement en base a lieu (single-flight), les autres requêtes attendent son
+résultat. Les modifications (update_quiz, add_question, ...) incrémentent la
+version du quiz, ce qui invalide l'entrée.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from quiz_shuffle import encode_fragments
+
+logger = logging.getLogger(__name__)
+
+# date_fin est inclusive: le quiz disparaît juste après
+END_EPSILON = timedelta(microseconds=1)
+
+
+def naive(dt):
+    """Datetime sans fuseau (comme relu depuis une colonne DATETIME MySQL)"""
+    return dt.replace(tzinfo=None) if dt is not None and dt.tzinfo is not None else dt
+
+
+class _CatalogueEntry:
+    __slots__ = ('items', 'expires_at', 'generation', 'loaded_at')
+
+    def __init__(self, items, expires_at, generation, loaded_at):
+        self.items = items
+        self.expires_at = expires_at
+        self.generation = generation
+        self.loaded_at = loaded_at
+
+
+class QuizCatalogue:
+    """Quiz ouverts aux étudiants, valides jusqu'à la prochaine borne de date"""
+
+    def __init__(self, loader, clock=datetime.now, max_ttl=None):
+        # loader(now) -> [(élément, date_debut, date_fin)] pour les quiz actifs non terminés
+        self.loader = loader
+        self.clock = clock
+        self.max_ttl = timedelta(seconds=max_ttl or int(os.getenv('QUIZ_CATALOGUE_MAX_TTL', '300')))
+        self._entry = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+
+    def _valid(self, entry, now):
+        return entry is not None and entry.generation == self._generation and now < entry.expires_at
+
+    def get(self):
+        """Liste des éléments visibles maintenant"""
+        now = self.clock()
+        entry = self._entry
+        if self._valid(entry, now):
+            self.stats['hits'] += 1
+            return entry.items
+
+        with self._lock:
+            now = self.clock()
+            entry = self._entry
+            if self._valid(entry, now):
+                self.stats['hits'] += 1
+                return entry.items
+            generation = self._generation
+            entry = self._build(self.loader(now), now, generation)
+            self._entry = entry
+            self.stats['loads'] += 1
+            return entry.items
+
+    def _build(self, rows, now, generation):
+        items = []
+        boundary = now + self.max_ttl
+        for item, date_debut, date_fin in rows:
+            date_debut, date_fin = naive(date_debut), naive(date_fin)
+            if date_fin is None or date_fin < now:
+                continue
+            if date_debut is not None and date_debut > now:
+                boundary = min(boundary, date_debut)
+                continue
+            items.append(item)
+            boundary = min(boundary, date_fin + END_EPSILON)
+        return _CatalogueEntry(items, boundary, generation, now)
+
+    def invalidate(self):
+        """À appeler après le commit d'une création / modification / suppression de quiz"""
+        self._generation += 1
+        self._entry = None
+        self.stats['invalidations'] += 1
+
+    def describe(self):
+        entry = self._entry
+        return {
+            **self.stats,
+            'cached': entry is not None,
+            'visible': len(entry.items) if entry else None,
+            'expires_at': entry.expires_at if entry else None
+        }
+
+
+class QuizPayload:
+    """Réponse encodée d'un quiz + métadonnées de contrôle d'accès"""
+
+    __slots__ = ('quiz_id', 'version', 'body', 'fragments', 'etag', 'statut', 'date_debut', 'date_fin',
+                 'rules', 'expires', 'variants')
+
+    def __init__(self, quiz_id, version, payload, encode, statut, date_debut, date_fin, rules, expires):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.body = encode(payload)
+        # Fragments pour l'ordre propre à chaque étudiant (quiz_shuffle)
+        self.fragments = encode_fragments(payload, encode)
+        self.etag = f"q{quiz_id}-{hashlib.sha1(self.body).hexdigest()[:20]}"
+        self.statut = statut
+        self.date_debut = naive(date_debut)
+        self.date_fin = naive(date_fin)
+        # Règles de tirage [(pool_id, nombre, tag)] d'un quiz banque, () sinon
+        self.rules = tuple(rules)
+        self.expires = expires
+        # Corps compressés mémorisés par encodage (voir Compressor.after_request)
+        self.variants = {}
+
+    def is_open(self, now):
+        return self.statut == 'actif' and self.date_debut <= now <= self.date_fin
+
+
+class _Flight:
+    """Chargement en cours d'un quiz, partagé par les requêtes concurrentes"""
+
+    __slots__ = ('done', 'payload', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None
+        self.error = None
+
+
+class QuizPayloadCache:
+    """Payloads de quiz pré-sérialisés, versionnés, chargés en single-flight"""
+
+    def __init__(self, loader, encode, max_entries=None, max_ttl=None, wait_timeout=None):
+        # loader(quiz_id) -> (payload dict, statut, date_debut, date_fin, règles) ou None si inexistant
+        self.loader = loader
+        self.encode = encode
+        self.max_entries = max_entries or int(os.getenv('QUIZ_PAYLOAD_CACHE_SIZE', '128'))
+        self.max_ttl = max_ttl or int(os.getenv('QUIZ_PAYLOAD_MAX_TTL', '300'))
+        self.wait_timeout = wait_timeout or float(os.getenv('QUIZ_PAYLOAD_WAIT_TIMEOUT', '10'))
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'waits': 0, 'invalidations': 0}
+
+    def version(self, quiz_id):
+        return self._versions.get(quiz_id, 0)
+
+    def _fresh(self, quiz_id):
+        entry = self._entries.get(quiz_id)
+        if entry is not None and entry.version == self.version(quiz_id) and time.monotonic() < entry.expires:
+            return entry
+        return None
+
+    def get(self, quiz_id):
+        """Payload du quiz, ou None s'il n'existe pas"""
+        entry = self._fresh(quiz_id)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry
+
+        with self._lock:
+            entry = self._fresh(quiz_id)
+            if entry is not None:
+                self._entries.move_to_end(quiz_id)
+                self.stats['hits'] += 1
+                return entry
+            flight = self._flights.get(quiz_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[quiz_id] = _Flight()
+
+        if not leader:
+            self.stats['waits'] += 1
+            if not flight.done.wait(self.wait_timeout):
+                logger.warning(f"Chargement du quiz {quiz_id} trop long: lecture directe")
+                return self._load(quiz_id, self.version(quiz_id))
+            if flight.error is not None:
+                raise flight.error
+            return flight.payload
+
+        try:
+            version = self.version(quiz_id)
+            flight.payload = self._load(quiz_id, version)
+            with self._lock:
+                # Modifié pendant le chargement: l'entrée servira cette vague mais pas la suivante
+                if flight.payload is not None and version == self.version(quiz_id):
+                    self._entries[quiz_id] = flight.payload
+                    self._entries.move_to_end(quiz_id)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return flight.payload
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(quiz_id, None)
+            flight.done.set()
+
+    def _load(self, quiz_id, version):
+        loaded = self.loader(quiz_id)
+        self.stats['loads'] += 1
+        if loaded is None:
+            return None
+        payload, statut, date_debut, date_fin, rules = loaded
+        return QuizPayload(quiz_id, version, payload, self.encode, statut, date_debut, date_fin, rules,
+                           time.monotonic() + self.max_ttl)
+
+    def invalidate(self, quiz_id):
+        """Nouvelle version du quiz (à appeler après le commit de la modification)"""
+        with self._lock:
+            self._versions[quiz_id] = self.version(quiz_id) + 1
+            self._entries.pop(quiz_id, None)
+        self.stats['invalidations'] += 1
+
+    def describe(self):
+        return {**self.stats, 'entries': len(self._entries), 'max_entries': self.max_entries}
@@ -0,0 +1,104 @@
+"""
+Ordre des questions et des options propre à chaque étudiant.
+
+L'ordre est déterministe: il dépend uniquement de (quiz_id, user_id) et, pour
+les options, de l'id de la question. Rien n'est stocké en base; la soumission
+recalcule la même permutation pour retrouver l'option choisie.
+
+Le payload partagé (voir quiz_cache.QuizPayload) est découpé une fois en
+fragments JSON déjà encodés; la réponse d'un étudiant est obtenue en
+concaténant ces fragments dans son ordre, sans réencoder le quiz.
+"""
+
+import hashlib
+import random
+
+# Seules les options des QCM sont mélangées (vrai_faux / texte_libre: sans objet)
+SHUFFLED_OPTION_TYPES = ('choix_multiple',)
+
+# Au-delà, le digest (64 octets) ne suffit plus: repli sur random.Random
+SMALL_ORDER_MAX = 33
+
+
+class QuestionFragment:
+    """Question encodée: début jusqu'à "options", options une à une, fin"""
+
+    __slots__ = ('id', 'head', 'options', 'raw_options', 'tail')
+
+    def __init__(self, question, encode):
+        self.id = question['id']
+        fields = {k: v for k, v in question.items() if k not in ('options', 'points')}
+        self.head = encode(fields)[:-1] + b',"options":'
+        options = question.get('options')
+        if isinstance(options, list) and question.get('type_question') in SHUFFLED_OPTION_TYPES:
+            self.options = [encode(option) for option in options]
+            self.raw_options = None
+        else:
+            self.options = None
+            self.raw_options = encode(options)
+        self.tail = b',"points":' + encode(question.get('points')) + b'}'
+
+
+def encode_fragments(payload, encode):
+    """(début du document jusqu'au tableau des questions, [QuestionFragment])"""
+    head = encode({'quiz': payload['quiz']})[:-1] + b',"questions":['
+    return head, [QuestionFragment(question, encode) for question in payload['questions']]
+
+
+class QuizShuffler:
+    """Permutations déterministes par (quiz, étudiant)"""
+
+    def __init__(self, key):
+        # Clé secrète: un étudiant ne peut pas calculer l'ordre d'un autre
+        key = key.encode('utf-8') if isinstance(key, str) else key
+        self._key = hashlib.sha256(key).digest()
+
+    def _digest(self, quiz_id, user_id, *scope):
+        message = ':'.join(str(part) for part in (quiz_id, user_id) + scope).encode('utf-8')
+        return hashlib.blake2b(message, key=self._key, digest_size=64).digest()
+
+    def rng(self, quiz_id, user_id, *scope):
+        """Générateur déterministe (tirage des questions d'un quiz banque)"""
+        return random.Random(self._digest(quiz_id, user_id, *scope))
+
+    def order(self, n, quiz_id, user_id, *scope):
+        """Permutation de range(n): la position i affiche l'élément order[i]"""
+        digest = self._digest(quiz_id, user_id, *scope)
+        order = list(range(n))
+        if n > SMALL_ORDER_MAX:
+            random.Random(digest).shuffle(order)
+            return order
+        # Fisher-Yates avec 2 octets du digest par échange (un Random par question coûte trop cher)
+        for step, i in enumerate(range(n - 1, 0, -1)):
+            j = int.from_bytes(digest[2 * step:2 * step + 2], 'big') % (i + 1)
+            order[i], order[j] = order[j], order[i]
+        return order
+
+    def option_order(self, quiz_id, user_id, question_id, n):
+        return self.order(n, quiz_id, user_id, 'options', question_id)
+
+    def original_option_index(self, quiz_id, user_id, question_id, n, shown_index):
+        """Indice d'origine de l'option affichée en position shown_index (None si hors bornes)"""
+        if not 0 <= shown_index < n:
+            return None
+        return self.option_order(quiz_id, user_id, question_id, n)[shown_index]
+
+    def render(self, payload, user_id, questions=None):
+        """Payload encodé avec l'ordre des questions et des options de cet étudiant.
+        `questions`: fragments à servir à la place de ceux du payload (tirage banque)."""
+        head, own = payload.fragments
+        questions = own if questions is None else questions
+        parts = [head]
+        for position, index in enumerate(self.order(len(questions), payload.quiz_id, user_id)):
+            fragment = questions[index]
+            if position:
+                parts.append(b',')
+            parts.append(fragment.head)
+            if fragment.options is None:
+                parts.append(fragment.raw_options)
+            else:
+                order = self.option_order(payload.quiz_id, user_id, fragment.id, len(fragment.options))
+                parts.append(b'[' + b','.join(fragment.options[i] for i in order) + b']')
+            parts.append(fragment.tail)
+        parts.append(b']}')
+        return b''.join(parts)
@@ -0,0 +1,153 @@
+"""
+Consultation des résultats de quiz par l'administration (/api/admin/results).
+
+Une page est une seule requête: Result joint à User et Quiz (titre du quiz,
+nom de l'étudiant), filtrée par quiz et/ou étudiant, triée par date ou par
+score. La pagination se fait par curseur (keyset): le curseur porte la valeur
+de tri et l'id du dernier résultat de la page; la page suivante reprend
+strictement après ce couple, sans OFFSET. Le coût d'une page ne dépend donc
+pas de sa position, même avec des millions de résultats.
+
+Chaque combinaison filtre + tri a son index composite (colonne filtrée, clé
+de tri, id) sur result (voir Result dans app.py et migrate_result_indexes.py):
+la base parcourt l'index dans l'ordre demandé et s'arrête après limit + 1
+lignes. Un étudiant a peu de résultats: ils sont lus par (user_id,
+date_passage) puis triés.
+
+Résumé par quiz (première page seulement): sans filtre étudiant il est lu dans
+les agrégats journaliers (StatsQuizDay); pour un étudiant, agrégé sur ses
+seuls résultats (index user_id).
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import func, or_
+
+SORTS = ('date', 'score')
+ORDERS = ('asc', 'desc')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(value, result_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, result_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """(valeur de tri, id) depuis le curseur; ValueError s'il est invalide"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, result_id = json.loads(raw)
+        if sort == 'date':
+            value = datetime.fromisoformat(value)
+        else:
+            value = float(value)
+        return value, int(result_id)
+    except (TypeError, ValueError, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError('Curseur invalide')
+
+
+class ResultBrowser:
+    """Pages de résultats (jointures en SQL) et résumé par quiz"""
+
+    def __init__(self, db, result_model, user_model, quiz_model, quiz_day):
+        self.db = db
+        self.Result = result_model
+        self.User = user_model
+        self.Quiz = quiz_model
+        self.QuizDay = quiz_day
+
+    def _sort_column(self, sort):
+        if sort not in SORTS:
+            raise ValueError(f"Tri inconnu: {sort} (attendu: {', '.join(SORTS)})")
+        return self.Result.date_passage if sort == 'date' else self.Result.score
+
+    def page(self, quiz_id=None, student_id=None, sort='date', order='desc', cursor=None, limit=None):
+        """{'items': [...], 'next_cursor': str | None}"""
+        Result, User, Quiz = self.Result, self.User, self.Quiz
+        column = self._sort_column(sort)
+        if order not in ORDERS:
+            raise ValueError(f"Ordre inconnu: {order} (attendu: asc, desc)")
+        limit = min(max(1, limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+
+        query = self.db.session.query(
+            Result.id, Result.user_id, Result.quiz_id, Result.score, Result.temps_utilise,
+            Result.date_passage, Result.statut, User.username, User.email, Quiz.titre, Quiz.total_points
+        ).join(User, User.id == Result.user_id).join(Quiz, Quiz.id == Result.quiz_id)
+        if quiz_id:
+            query = query.filter(Result.quiz_id == quiz_id)
+        if student_id:
+            query = query.filter(Result.user_id == student_id)
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort)
+            # Forme "col <= v AND (col < v OR id < dernier)": la première condition borne le parcours d'index
+            if order == 'desc':
+                query = query.filter(column <= value, or_(column < value, Result.id < last_id))
+            else:
+                query = query.filter(column >= value, or_(column > value, Result.id > last_id))
+        if order == 'desc':
+            query = query.order_by(column.desc(), Result.id.desc())
+        else:
+            query = query.order_by(column.asc(), Result.id.asc())
+
+        rows = query.limit(limit + 1).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1] if more else None
+        return {
+            'items': [self.item(row) for row in rows],
+            'next_cursor': encode_cursor(last.date_passage if sort == 'date' else last.score, last.id) if last else None
+        }
+
+    @staticmethod
+    def item(row):
+        return {
+            'id_resultat': row.id,
+            'id_quiz': row.quiz_id,
+            'id_etudiant': row.user_id,
+            'quiz_titre': row.titre,
+            'etudiant': row.username,
+            'email': row.email,
+            'score': row.score,
+            'total_points': row.total_points,
+            'pourcentage': round(row.score / row.total_points * 100, 1) if row.total_points else None,
+            'temps_utilise': row.temps_utilise,
+            'date_passage': row.date_passage.isoformat() if row.date_passage else None,
+            'statut': row.statut
+        }
+
+    def summary(self, quiz_id=None, student_id=None):
+        """Soumissions et score moyen par quiz"""
+        Quiz = self.Quiz
+        if student_id:
+            Result = self.Result
+            totals = self.db.session.query(
+                Result.quiz_id, func.count(Result.id), func.sum(Result.score)
+            ).filter(Result.user_id == student_id)
+            if quiz_id:
+                totals = totals.filter(Result.quiz_id == quiz_id)
+            totals = totals.group_by(Result.quiz_id)
+        else:
+            QuizDay = self.QuizDay
+            totals = self.db.session.query(
+                QuizDay.quiz_id, func.sum(QuizDay.soumissions), func.sum(QuizDay.total_score)
+            )
+            if quiz_id:
+                totals = totals.filter(QuizDay.quiz_id == quiz_id)
+            totals = totals.group_by(QuizDay.quiz_id)
+        totals = {quiz: (int(count or 0), float(score or 0)) for quiz, count, score in totals}
+        if not totals:
+            return []
+        quizzes = self.db.session.query(Quiz.id, Quiz.titre, Quiz.total_points).filter(Quiz.id.in_(totals))
+        return [{
+            'id_quiz': quiz.id,
+            'quiz_titre': quiz.titre,
+            'total_points': quiz.total_points,
+            'soumissions': totals[quiz.id][0],
+            'score_moyen': round(totals[quiz.id][1] / totals[quiz.id][0], 2) if totals[quiz.id][0] else None
+        } for quiz in quizzes.order_by(Quiz.id)]
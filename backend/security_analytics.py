@@ -0,0 +1,418 @@
+"""
+Analytique de sécurité sur l'historique des événements d'accès.
+
+Les agrégats (rollups) sont maintenus à trois granularités - minute, heure, jour -
+pour trois dimensions - IP, User-Agent normalisé, nom de fichier. Ils sont mis à
+jour dans la même transaction que l'écriture des lots d'événements bruts.
+
+Une fenêtre arbitraire [start, end) est découpée en jours entiers, puis en heures
+entières sur les bords, puis en minutes: une requête sur plusieurs mois ne lit que
+quelques centaines de lignes d'agrégats. Les minutes et les heures ne sont conservées
+que MINUTE_RETENTION / HOUR_RETENTION: au-delà, les bords de la fenêtre sont
+élargis à l'heure ou au jour entier (widen_window), seule granularité encore
+disponible.
+"""
+
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_
+
+GRANULARITIES = ('minute', 'hour', 'day')
+DIMENSIONS = ('ip', 'ua', 'filename')
+
+# Rétention des agrégats fins (les jours sont conservés indéfiniment)
+MINUTE_RETENTION = timedelta(days=int(os.getenv('ROLLUP_MINUTE_RETENTION_DAYS', '14')))
+HOUR_RETENTION = timedelta(days=int(os.getenv('ROLLUP_HOUR_RETENTION_DAYS', '400')))
+PRUNE_INTERVAL = 3600
+# Les événements arrivent avec created_at = maintenant (à flush_interval près):
+# une reconstruction s'arrête au début du jour en cours, moins cette marge
+REBUILD_FENCE = timedelta(minutes=5)
+
+# Familles d'outils reconnues, testées dans l'ordre (les plus spécifiques d'abord)
+_UA_FAMILIES = [
+    ('idm', re.compile(r'\bidm\b|internet download manager|idman')),
+    ('jdownloader', re.compile(r'jdownloader')),
+    ('wget', re.compile(r'wget')),
+    ('curl', re.compile(r'curl')),
+    ('aria2', re.compile(r'aria2')),
+    ('python-requests', re.compile(r'python-requests|python-urllib|aiohttp')),
+    ('scrapy', re.compile(r'scrapy')),
+    ('headless', re.compile(r'headless|phantomjs|selenium')),
+    ('scanner', re.compile(r'sqlmap|nikto|nessus|openvas|nmap|masscan|zgrab|gobuster|dirbuster')),
+    ('bot', re.compile(r'bot|spider|crawler|scraper')),
+    ('edge', re.compile(r'edg/')),
+    ('opera', re.compile(r'opr/|opera')),
+    ('chrome', re.compile(r'chrome/|crios/')),
+    ('firefox', re.compile(r'firefox/|fxios/')),
+    ('safari', re.compile(r'safari/')),
+]
+
+
+def normalize_user_agent(ua):
+    """Réduit un User-Agent à une famille stable (outil ou navigateur)"""
+    ua_lower = (ua or '').lower()
+    if not ua_lower:
+        return 'empty'
+    for family, pattern in _UA_FAMILIES:
+        if pattern.search(ua_lower):
+            return family
+    return 'other'
+
+
+def floor_time(dt, granularity):
+    """Début du bucket contenant dt"""
+    if granularity == 'minute':
+        return dt.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_time(dt, granularity):
+    floored = floor_time(dt, granularity)
+    if floored == dt:
+        return dt
+    step = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}[granularity]
+    return floored + step
+
+
+def widen_window(start, end, now=None):
+    """[start, end) aligné sur les buckets encore conservés
+
+    Un bord dont les minutes sont purgées est élargi à l'heure entière, un bord
+    dont les heures sont purgées au jour entier.
+    """
+    now = now or datetime.utcnow()
+    start, end = floor_time(start, 'minute'), ceil_time(end, 'minute')
+    for granularity, coarser, retention in (('minute', 'hour', MINUTE_RETENTION), ('hour', 'day', HOUR_RETENTION)):
+        cutoff = now - retention
+        if start < cutoff:
+            start = floor_time(start, coarser)
+        # Morceau de bord [floor(end), end) lu à la granularité fine
+        if floor_time(end, coarser) < cutoff:
+            end = ceil_time(end, coarser)
+    return start, end
+
+
+def retained_granularity(granularity, start, now=None):
+    """Granularité la plus fine encore conservée à partir de start (au moins celle demandée)"""
+    now = now or datetime.utcnow()
+    if granularity == 'minute' and start < now - MINUTE_RETENTION:
+        granularity = 'hour'
+    if granularity == 'hour' and start < now - HOUR_RETENTION:
+        granularity = 'day'
+    return granularity
+
+
+def cover_window(start, end, now=None):
+    """Découpe [start, end) en plages (granularité, début, fin) alignées sur les buckets"""
+    start, end = widen_window(start, end, now)
+    if start >= end:
+        return []
+
+    ranges = []
+
+    def split_hours(a, b):
+        hs, he = ceil_time(a, 'hour'), floor_time(b, 'hour')
+        if hs < he:
+            if a < hs:
+                ranges.append(('minute', a, hs))
+            ranges.append(('hour', hs, he))
+            if he < b:
+                ranges.append(('minute', he, b))
+        else:
+            ranges.append(('minute', a, b))
+
+    ds, de = ceil_time(start, 'day'), floor_time(end, 'day')
+    if ds < de:
+        if start < ds:
+            split_hours(start, ds)
+        ranges.append(('day', ds, de))
+        if de < end:
+            split_hours(de, end)
+    else:
+        split_hours(start, end)
+    return ranges
+
+
+def aggregate_batch(batch):
+    """Agrège un lot d'événements en deltas {(granularité, dimension, clé, bucket): [events, violations]}"""
+    deltas = defaultdict(lambda: [0, 0])
+    for event in batch:
+        created_at = event['created_at']
+        keys = (
+            ('ip', event.get('ip') or 'unknown'),
+            ('ua', normalize_user_agent(event.get('user_agent'))),
+            ('filename', event.get('filename') or 'unknown'),
+        )
+        violations = event.get('violations') or 0
+        for granularity in GRANULARITIES:
+            bucket = floor_time(created_at, granularity)
+            for dimension, key in keys:
+                delta = deltas[(granularity, dimension, key[:255], bucket)]
+                delta[0] += 1
+                delta[1] += violations
+    return deltas
+
+
+class SecurityAnalytics:
+    """Maintenance des agrégats et requêtes analytiques"""
+
+    def __init__(self, db, event_model, rollup_model):
+        self.db = db
+        self.Event = event_model
+        self.Rollup = rollup_model
+        self._last_prune = 0.0
+
+    # ----- Écriture -----
+
+    def apply_batch(self, batch):
+        """Ajoute un lot aux agrégats (dans la transaction en cours, sans commit)"""
+        deltas = aggregate_batch(batch)
+        if not deltas:
+            return 0
+
+        rows = [{
+            'granularity': granularity,
+            'dimension': dimension,
+            'key': key,
+            'bucket_start': bucket,
+            'events': counts[0],
+            'violations': counts[1]
+        } for (granularity, dimension, key, bucket), counts in deltas.items()]
+        self._upsert(rows)
+
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
+        return len(rows)
+
+    def _upsert(self, rows):
+        session = self.db.session
+        table = self.Rollup.__table__
+        dialect = session.get_bind().dialect.name
+
+        # Upsert natif en une instruction executemany quand le SGBD le permet
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table)
+            stmt = stmt.on_duplicate_key_update(
+                events=table.c.events + stmt.inserted.events,
+                violations=table.c.violations + stmt.inserted.violations
+            )
+            session.execute(stmt, rows)
+            return
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['granularity', 'dimension', 'key', 'bucket_start'],
+                set_={
+                    'events': table.c.events + stmt.excluded.events,
+                    'violations': table.c.violations + stmt.excluded.violations
+                }
+            )
+            session.execute(stmt, rows)
+            return
+
+        # Repli générique: UPDATE puis INSERT des lignes absentes
+        missing = []
+        for row in rows:
+            result = session.execute(
+                table.update()
+                .where(and_(
+                    table.c.granularity == row['granularity'],
+                    table.c.dimension == row['dimension'],
+                    table.c.key == row['key'],
+                    table.c.bucket_start == row['bucket_start']
+                ))
+                .values(events=table.c.events + row['events'],
+                        violations=table.c.violations + row['violations'])
+            )
+            if result.rowcount == 0:
+                missing.append(row)
+        if missing:
+            session.execute(table.insert(), missing)
+
+    def prune(self, now=None):
+        """Supprime les agrégats minute/heure au-delà de leur rétention"""
+        now = now or datetime.utcnow()
+        self._last_prune = time.monotonic()
+        Rollup = self.Rollup
+        deleted = Rollup.query.filter(
+            or_(
+                and_(Rollup.granularity == 'minute', Rollup.bucket_start < now - MINUTE_RETENTION),
+                and_(Rollup.granularity == 'hour', Rollup.bucket_start < now - HOUR_RETENTION)
+            )
+        ).delete(synchronize_session=False)
+        return deleted
+
+    def rebuild(self, start=None, end=None, chunk_size=5000, now=None):
+        """Reconstruit les agrégats depuis la table d'événements bruts (backfill)
+
+        Limité aux jours révolus: le writer en ligne ne met à jour que les
+        buckets du jour en cours, qu'une reconstruction concurrente compterait
+        deux fois (ou effacerait).
+        """
+        Event, Rollup = self.Event, self.Rollup
+        session = self.db.session
+
+        # Les agrégats sont reconstruits par jours entiers pour rester cohérents
+        fence = floor_time((now or datetime.utcnow()) - REBUILD_FENCE, 'day')
+        start = floor_time(start, 'day') if start else None
+        end = min(ceil_time(end, 'day'), fence) if end else fence
+        if start and start >= end:
+            return 0
+
+        purge = Rollup.query.filter(Rollup.bucket_start < end)
+        if start:
+            purge = purge.filter(Rollup.bucket_start >= start)
+        purge.delete(synchronize_session=False)
+
+        query = session.query(
+            Event.id, Event.ip, Event.user_agent, Event.filename, Event.violations, Event.created_at
+        ).filter(Event.created_at < end).order_by(Event.id)
+        if start:
+            query = query.filter(Event.created_at >= start)
+
+        total = 0
+        last_id = 0
+        while True:
+            chunk = query.filter(Event.id > last_id).limit(chunk_size).all()
+            if not chunk:
+                break
+            self.apply_batch([{
+                'ip': e.ip, 'user_agent': e.user_agent, 'filename': e.filename,
+                'violations': e.violations, 'created_at': e.created_at
+            } for e in chunk])
+            session.commit()
+            total += len(chunk)
+            last_id = chunk[-1].id
+        return total
+
+    # ----- Lecture -----
+
+    def _window_filter(self, start, end):
+        Rollup = self.Rollup
+        return or_(*[
+            and_(Rollup.granularity == granularity,
+                 Rollup.bucket_start >= range_start,
+                 Rollup.bucket_start < range_end)
+            for granularity, range_start, range_end in cover_window(start, end)
+        ])
+
+    def totals(self, start, end):
+        """Nombre total d'événements et de violations sur la fenêtre"""
+        Rollup = self.Rollup
+        events, violations = self.db.session.query(
+            func.coalesce(func.sum(Rollup.events), 0),
+            func.coalesce(func.sum(Rollup.violations), 0)
+        ).filter(Rollup.dimension == 'ip', self._window_filter(start, end)).one()
+        return {'events': int(events), 'violations': int(violations)}
+
+    def top(self, dimension, start, end, metric='violations', k=10):
+        """Top-k des clés d'une dimension sur une fenêtre arbitraire"""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {dimension}")
+        if metric not in ('events', 'violations'):
+            raise ValueError(f"Métrique inconnue: {metric}")
+        if not cover_window(start, end):
+            return []
+
+        Rollup = self.Rollup
+        events = func.sum(Rollup.events).label('events')
+        violations = func.sum(Rollup.violations).label('violations')
+        rows = self.db.session.query(Rollup.key, events, violations) \
+            .filter(Rollup.dimension == dimension, self._window_filter(start, end)) \
+            .group_by(Rollup.key) \
+            .order_by((violations if metric == 'violations' else events).desc()) \
+            .limit(k).all()
+        return [{'key': key, 'events': int(ev), 'violations': int(vi)} for key, ev, vi in rows]
+
+    def top_violators(self, start, end, k=10):
+        return [row for row in self.top('ip', start, end, 'violations', k) if row['violations'] > 0]
+
+    def series(self, dimension, start, end, granularity, key=None):
+        """Série temporelle par bucket (d'une clé, ou totale sur la dimension)
+
+        Granularité relevée si ses buckets sont purgés au début de la fenêtre
+        (voir retained_granularity).
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {dimension}")
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularité inconnue: {granularity}")
+        granularity = retained_granularity(granularity, start)
+
+        Rollup = self.Rollup
+        query = self.db.session.query(
+            Rollup.bucket_start,
+            func.sum(Rollup.events),
+            func.sum(Rollup.violations)
+        ).filter(
+            Rollup.granularity == granularity,
+            Rollup.dimension == dimension,
+            Rollup.bucket_start >= floor_time(start, granularity),
+            Rollup.bucket_start < end
+        )
+        if key is not None:
+            query = query.filter(Rollup.key == key)
+        rows = query.group_by(Rollup.bucket_start).order_by(Rollup.bucket_start).all()
+        return [{
+            'bucket': bucket.isoformat(),
+            'events': int(ev),
+            'violations': int(vi)
+        } for bucket, ev, vi in rows]
+
+    def document(self, filename, start, end, granularity='hour', recent=50):
+        """Vue détaillée d'un document: série, totaux, IP et UA les plus actifs"""
+        Event = self.Event
+        session = self.db.session
+
+        # Les croisements document x IP / UA viennent des événements bruts,
+        # bornés par l'index (filename, created_at)
+        base = session.query(Event).filter(
+            Event.filename == filename,
+            Event.created_at >= start,
+            Event.created_at < end
+        )
+
+        def breakdown(column, normalize=None):
+            rows = base.with_entities(column, func.count(), func.coalesce(func.sum(Event.violations), 0)) \
+                .group_by(column).all()
+            merged = defaultdict(lambda: [0, 0])
+            for value, count, violations in rows:
+                key = normalize(value) if normalize else (value or 'unknown')
+                merged[key][0] += count
+                merged[key][1] += int(violations)
+            ranked = sorted(merged.items(), key=lambda item: (item[1][1], item[1][0]), reverse=True)
+            return [{'key': key, 'events': ev, 'violations': vi} for key, (ev, vi) in ranked[:10]]
+
+        recent_events = base.order_by(Event.created_at.desc()).limit(recent).all()
+        granularity = retained_granularity(granularity, start)
+        # Totaux sur la fenêtre (bords à la minute quand elle est conservée), pas sur les buckets de la série
+        Rollup = self.Rollup
+        events, violations = session.query(
+            func.coalesce(func.sum(Rollup.events), 0),
+            func.coalesce(func.sum(Rollup.violations), 0)
+        ).filter(Rollup.dimension == 'filename', Rollup.key == filename, self._window_filter(start, end)).one()
+        return {
+            'filename': filename,
+            'granularity': granularity,
+            'events': int(events),
+            'violations': int(violations),
+            'series': self.series('filename', start, end, granularity, key=filename),
+            'top_ips': breakdown(Event.ip),
+            'top_user_agents': breakdown(Event.user_agent, normalize_user_agent),
+            'recent_events': [{
+                'kind': e.kind,
+                'ip': e.ip,
+                'user_agent': e.user_agent,
+                'action': e.action,
+                'violations': e.violations,
+                'created_at': e.created_at.isoformat()
+            } for e in recent_events]
+        }
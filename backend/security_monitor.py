@@ -1,32 +1,29 @@
 #!/usr/bin/env python3
 """
 Script de monitoring de sécurité pour détecter les téléchargeurs automatiques
-Usage: python security_monitor.py [options]
+Usage: python security_monitor.py {report,top,series,document,backfill,prune} [options]
 """
 
 import json
 import sys
 import time
 import logging
-from collections import defaultdict, deque
+import threading
+from collections import Counter, defaultdict, deque
 from datetime import datetime, timedelta
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('security_monitor.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
 class SecurityMonitor:
+    # Intervalle minimal entre deux nettoyages complets (secondes)
+    CLEANUP_INTERVAL = 10
+
     def __init__(self):
         self.alerts = deque(maxlen=1000)  # Dernières 1000 alertes
-        self.ip_tracking = defaultdict(list)  # Suivi par IP
-        self.ua_tracking = defaultdict(list)  # Suivi par User-Agent
-        self.violation_counts = defaultdict(int)  # Compteur de violations
+        self.ip_tracking = defaultdict(deque)  # Suivi par IP (horodatages croissants)
+        self.ua_tracking = defaultdict(deque)  # Suivi par User-Agent
+        self.violation_counts = Counter()  # Compteur de violations
+        # Instance partagée entre le writer d'événements et les requêtes admin
+        self._lock = threading.RLock()
+        self._last_cleanup = 0.0
 
         # Seuils d'alerte
         self.THRESHOLDS = {
@@ -40,29 +37,34 @@ class SecurityMonitor:
         ip = log_entry.get('ip', 'unknown')
         user_agent = log_entry.get('user_agent', '')
         filename = log_entry.get('filename', 'unknown')
-        violations = log_entry.get('violations', 0)
+        violations = log_entry.get('violations', 0) or 0
 
-        # Tracker l'IP
-        self.ip_tracking[ip].append(datetime.utcnow())
+        with self._lock:
+            now = datetime.utcnow()
 
-        # Tracker l'User-Agent
-        ua_key = self._normalize_user_agent(user_agent)
-        if ua_key:
-            self.ua_tracking[ua_key].append(datetime.utcnow())
+            # Tracker l'IP
+            self.ip_tracking[ip].append(now)
 
-        # Compter les violations
-        if violations > 0:
-            self.violation_counts[ip] += violations
+            # Tracker l'User-Agent
+            ua_key = self._normalize_user_agent(user_agent)
+            if ua_key:
+                self.ua_tracking[ua_key].append(now)
 
-        # Nettoyer les anciennes entrées (plus vieilles que 1 heure)
-        self._cleanup_old_entries()
+            # Compter les violations
+            if violations > 0:
+                self.violation_counts[ip] += violations
 
-        # Analyser et générer des alertes
-        self._analyze_and_alert(log_entry)
+            # Nettoyer les anciennes entrées (plus vieilles que 1 heure), au plus
+            # une fois par CLEANUP_INTERVAL pour tenir des milliers d'événements/s
+            if time.monotonic() - self._last_cleanup >= self.CLEANUP_INTERVAL:
+                self._cleanup_old_entries()
+
+            # Analyser et générer des alertes
+            self._analyze_and_alert(log_entry)
 
     def _normalize_user_agent(self, ua):
         """Normalise l'User-Agent pour le tracking"""
-        ua_lower = ua.lower()
+        ua_lower = (ua or '').lower()
         if any(blocked in ua_lower for blocked in [
             'bot', 'spider', 'crawler', 'scraper',
             'wget', 'curl', 'aria2', 'axel'
@@ -73,28 +75,22 @@ class SecurityMonitor:
     def _cleanup_old_entries(self):
         """Nettoie les entrées plus vieilles que 1 heure"""
         cutoff_time = datetime.utcnow() - timedelta(hours=1)
+        self._last_cleanup = time.monotonic()
 
-        for ip in list(self.ip_tracking.keys()):
-            self.ip_tracking[ip] = [
-                timestamp for timestamp in self.ip_tracking[ip]
-                if timestamp > cutoff_time
-            ]
-            if not self.ip_tracking[ip]:
-                del self.ip_tracking[ip]
-
-        for ua in list(self.ua_tracking.keys()):
-            self.ua_tracking[ua] = [
-                timestamp for timestamp in self.ua_tracking[ua]
-                if timestamp > cutoff_time
-            ]
-            if not self.ua_tracking[ua]:
-                del self.ua_tracking[ua]
+        # Les horodatages sont ajoutés dans l'ordre: on retire uniquement par la gauche
+        for tracking in (self.ip_tracking, self.ua_tracking):
+            for key in list(tracking.keys()):
+                timestamps = tracking[key]
+                while timestamps and timestamps[0] <= cutoff_time:
+                    timestamps.popleft()
+                if not timestamps:
+                    del tracking[key]
 
     def _analyze_and_alert(self, log_entry):
         """Analyse les patterns suspects et génère des alertes"""
         ip = log_entry.get('ip', 'unknown')
         user_agent = log_entry.get('user_agent', '')
-        violations = log_entry.get('violations', 0)
+        violations = log_entry.get('violations', 0) or 0
 
         alerts = []
 
@@ -122,8 +118,13 @@ class SecurityMonitor:
             }
             alerts.append(alert)
 
-        # 3. Vérifier les pics de trafic suspects
-        recent_requests = len([t for t in self.ip_tracking[ip] if t > datetime.utcnow() - timedelta(minutes=1)])
+        # 3. Vérifier les pics de trafic suspects (parcours depuis les plus récents)
+        minute_ago = datetime.utcnow() - timedelta(minutes=1)
+        recent_requests = 0
+        for t in reversed(self.ip_tracking[ip]):
+            if t <= minute_ago:
+                break
+            recent_requests += 1
         if recent_requests > self.THRESHOLDS['max_requests_per_minute']:
             alert = {
                 'type': 'TRAFFIC_SPIKE',
@@ -165,6 +166,10 @@ class SecurityMonitor:
 
     def generate_report(self):
         """Génère un rapport de sécurité"""
+        with self._lock:
+            return self._build_report()
+
+    def _build_report(self):
         report = {
             'timestamp': datetime.utcnow().isoformat(),
             'total_alerts': len(self.alerts),
@@ -213,42 +218,100 @@ class SecurityMonitor:
         except Exception as e:
             logging.error(f"Erreur lors de la sauvegarde du rapport: {e}")
 
-# Exemple d'utilisation
-if __name__ == "__main__":
-    monitor = SecurityMonitor()
-
-    # Exemple de données de test
-    test_logs = [
-        {
-            'ip': '192.168.1.100',
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'filename': 'document.pdf',
-            'violations': 0
-        },
-        {
-            'ip': '192.168.1.101',
-            'user_agent': 'IDM/6.41 Build 2',
-            'filename': 'document.pdf',
-            'violations': 3
-        },
-        {
-            'ip': '192.168.1.100',
-            'user_agent': 'wget/1.21.3',
-            'filename': 'document.pdf',
-            'violations': 1
-        }
-    ]
-
-    # Analyser les logs de test
-    for log_entry in test_logs:
-        monitor.log_access_attempt(log_entry)
-
-    # Générer et afficher le rapport
-    report = monitor.generate_report()
-    print("\n" + "="*50)
-    print("RAPPORT DE SÉCURITÉ")
-    print("="*50)
-    print(json.dumps(report, indent=2, ensure_ascii=False))
+def _parse_window(args):
+    end = datetime.fromisoformat(args.end) if args.end else datetime.utcnow()
+    start = datetime.fromisoformat(args.start) if args.start else end - timedelta(hours=args.hours)
+    return start, end
+
+def main(argv=None):
+    """Interface en ligne de commande sur les événements d'accès historisés"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analytique de sécurité sur les accès aux documents")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_window(p):
+        p.add_argument('--start', help='Début de fenêtre (ISO 8601, UTC)')
+        p.add_argument('--end', help='Fin de fenêtre (ISO 8601, UTC, défaut: maintenant)')
+        p.add_argument('--hours', type=float, default=24, help='Taille de fenêtre si --start absent (défaut: 24)')
+
+    p = sub.add_parser('report', help='Rapport de synthèse (totaux et tops)')
+    add_window(p)
+    p.add_argument('-k', type=int, default=10)
+    p.add_argument('--output', help='Sauvegarder le rapport JSON dans ce fichier')
+
+    p = sub.add_parser('top', help='Top-k par IP, UA normalisé ou fichier')
+    add_window(p)
+    p.add_argument('--dimension', choices=['ip', 'ua', 'filename'], default='ip')
+    p.add_argument('--metric', choices=['events', 'violations'], default='violations')
+    p.add_argument('-k', type=int, default=10)
+
+    p = sub.add_parser('series', help='Série temporelle par bucket')
+    add_window(p)
+    p.add_argument('--dimension', choices=['ip', 'ua', 'filename'], default='ip')
+    p.add_argument('--key', help='Restreindre à une IP / famille UA / fichier')
+    p.add_argument('--granularity', choices=['minute', 'hour', 'day'], default='hour')
+
+    p = sub.add_parser('document', help='Détail des accès à un document')
+    add_window(p)
+    p.add_argument('filename')
+    p.add_argument('--granularity', choices=['minute', 'hour', 'day'], default='hour')
+
+    p = sub.add_parser('backfill', help='Reconstruire les agrégats des jours révolus depuis les événements bruts')
+    p.add_argument('--start', help='Début (ISO 8601), défaut: tout l\'historique')
+    p.add_argument('--end', help='Fin (ISO 8601)')
+
+    sub.add_parser('prune', help='Appliquer la rétention des agrégats minute/heure')
+
+    args = parser.parse_args(argv)
+
+    # Import tardif: app importe ce module au démarrage
+    from app import app, db, security_analytics
+    from security_analytics import widen_window
+
+    with app.app_context():
+        db.create_all()
+
+        if args.command == 'backfill':
+            start = datetime.fromisoformat(args.start) if args.start else None
+            end = datetime.fromisoformat(args.end) if args.end else None
+            total = security_analytics.rebuild(start, end)
+            print(f"✅ Agrégats reconstruits à partir de {total} événements")
+            return 0
+
+        if args.command == 'prune':
+            deleted = security_analytics.prune()
+            db.session.commit()
+            print(f"✅ {deleted} agrégats supprimés")
+            return 0
+
+        start, end = _parse_window(args)
+        if args.command == 'report':
+            start, end = widen_window(start, end)
+            result = {
+                'timestamp': datetime.utcnow().isoformat(),
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'totals': security_analytics.totals(start, end),
+                'top_violators': security_analytics.top_violators(start, end, args.k),
+                'top_user_agents': security_analytics.top('ua', start, end, 'events', args.k),
+                'top_documents': security_analytics.top('filename', start, end, 'events', args.k),
+            }
+        elif args.command == 'top':
+            result = security_analytics.top(args.dimension, start, end, args.metric, args.k)
+        elif args.command == 'series':
+            result = security_analytics.series(args.dimension, start, end, args.granularity, args.key)
+        else:
+            result = security_analytics.document(args.filename, start, end, args.granularity)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if getattr(args, 'output', None):
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"Rapport de sécurité sauvegardé dans {args.output}")
+    else:
+        print(output)
+    return 0
 
-    # Sauvegarder le rapport
-    monitor.save_report()
+if __name__ == "__main__":
+    sys.exit(main())
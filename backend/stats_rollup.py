@@ -0,0 +1,263 @@
+"""
+Statistiques d'administration sur des tables de cumul journalier.
+
+Trois tables, une ligne par jour (et par clé):
+  - StatsStudentDay (jour): inscriptions d'étudiants, étudiants ayant soumis
+    leur premier quiz ce jour-là
+  - StatsPaymentDay (jour, mode_paiement, statut): nombre et montant
+  - StatsQuizDay (jour, quiz_id): soumissions et somme des scores
+
+Les routes qui écrivent (inscription, paiement, soumission, ...) mettent à
+jour le cumul dans la même transaction, par un upsert additif (pas de lecture
+préalable). /api/admin/stats/* ne lit que ces tables: une période d'un an
+représente quelques centaines de lignes, quel que soit le nombre de paiements
+ou de tentatives.
+
+rebuild() reconstruit tout depuis les tables sources (GROUP BY par jour):
+à lancer une fois à l'installation, puis après un import ou une modification
+faite hors de l'application (voir backfill_stats.py). Pendant la
+reconstruction, les écritures concurrentes peuvent être perdues: à lancer en
+période calme.
+"""
+
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import and_, case, func
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUS = 'en_attente'
+
+
+def stat_day(value):
+    """Jour d'un horodatage (datetime, date, chaîne ISO); aujourd'hui (UTC) si absent"""
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def parse_day(value):
+    """Borne de période ?start= / ?end= (AAAA-MM-JJ), None si absente; ValueError si invalide"""
+    if not value:
+        return None
+    return date.fromisoformat(value)
+
+
+class StatsRollup:
+    """Mise à jour incrémentale et lecture des cumuls journaliers"""
+
+    def __init__(self, db, user_model, payment_model, result_model, student_day, payment_day, quiz_day):
+        self.db = db
+        self.User = user_model
+        self.Payment = payment_model
+        self.Result = result_model
+        self.StudentDay = student_day
+        self.PaymentDay = payment_day
+        self.QuizDay = quiz_day
+
+    # ----- Écriture -----
+
+    def increment(self, model, keys, deltas):
+        """Ajoute deltas à la ligne de clé keys (dans la transaction en cours, sans commit)"""
+        session = self.db.session
+        table = model.__table__
+        dialect = session.get_bind().dialect.name
+
+        # Upsert natif en une instruction quand le SGBD le permet
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(**keys, **deltas)
+            stmt = stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in deltas})
+            session.execute(stmt)
+            return
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(**keys, **deltas)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+            )
+            session.execute(stmt)
+            return
+
+        # Repli générique: UPDATE puis INSERT si la ligne est absente
+        result = session.execute(
+            table.update()
+            .where(and_(*(table.c[name] == value for name, value in keys.items())))
+            .values({name: table.c[name] + value for name, value in deltas.items()})
+        )
+        if result.rowcount == 0:
+            session.execute(table.insert().values(**keys, **deltas))
+
+    def record_registration(self, user, sign=1):
+        if user.role == 'student':
+            self.increment(self.StudentDay, {'jour': stat_day(user.date_inscription)},
+                           {'inscriptions': sign, 'premiers_quiz': 0})
+
+    def record_payment(self, payment, sign=1, statut=None):
+        """sign=-1 pour retirer un paiement (suppression, ancien statut)"""
+        self.increment(self.PaymentDay, {
+            'jour': stat_day(payment.date_paiement),
+            'mode_paiement': payment.mode_paiement or '',
+            'statut': statut or payment.statut or ''
+        }, {'nombre': sign, 'montant': sign * float(payment.montant or 0)})
+
+    def move_payment(self, payment, statut):
+        """Changement de statut d'un paiement existant (à appeler avant la modification)"""
+        if statut != payment.statut:
+            self.record_payment(payment, sign=-1)
+            self.record_payment(payment, statut=statut)
+
+    def record_payments(self, payments, sign=1, statut=None):
+        """record_payment pour un lot: un upsert par (jour, mode, statut) et non par paiement"""
+        totals = {}
+        for payment in payments:
+            key = (stat_day(payment.date_paiement), payment.mode_paiement or '', statut or payment.statut or '')
+            entry = totals.setdefault(key, [0, 0.0])
+            entry[0] += sign
+            entry[1] += sign * float(payment.montant or 0)
+        for (jour, mode, key_statut), (count, amount) in totals.items():
+            self.increment(self.PaymentDay, {'jour': jour, 'mode_paiement': mode, 'statut': key_statut},
+                           {'nombre': count, 'montant': amount})
+
+    def move_payments(self, payments, statut):
+        """move_payment pour un lot (à appeler avant la modification)"""
+        moved = [payment for payment in payments if payment.statut != statut]
+        self.record_payments(moved, sign=-1)
+        self.record_payments(moved, statut=statut)
+
+    def record_result(self, result, first=False):
+        """Soumission d'un quiz; first: première soumission de cet étudiant"""
+        day = stat_day(result.date_passage)
+        self.increment(self.QuizDay, {'jour': day, 'quiz_id': result.quiz_id},
+                       {'soumissions': 1, 'total_score': float(result.score or 0)})
+        if first:
+            self.increment(self.StudentDay, {'jour': day}, {'inscriptions': 0, 'premiers_quiz': 1})
+
+    def rebuild_quiz(self, quiz_id):
+        """Recalcule les cumuls d'un quiz (après une re-correction en masse ou une suppression)"""
+        Result, QuizDay, session = self.Result, self.QuizDay, self.db.session
+        session.query(QuizDay).filter(QuizDay.quiz_id == quiz_id).delete(synchronize_session=False)
+        day = func.date(Result.date_passage)
+        rows = session.query(day, func.count(Result.id), func.sum(Result.score)).filter(
+            Result.quiz_id == quiz_id
+        ).group_by(day).all()
+        if rows:
+            session.execute(QuizDay.__table__.insert(), [
+                {'jour': stat_day(jour), 'quiz_id': quiz_id, 'soumissions': count, 'total_score': float(total or 0)}
+                for jour, count, total in rows if jour is not None
+            ])
+
+    def rebuild(self):
+        """Reconstruit les trois tables depuis users / payment / result; renvoie le nombre de lignes"""
+        User, Payment, Result, session = self.User, self.Payment, self.Result, self.db.session
+        for model in (self.StudentDay, self.PaymentDay, self.QuizDay):
+            session.query(model).delete(synchronize_session=False)
+
+        students = {}
+        day = func.date(User.date_inscription)
+        for jour, count in session.query(day, func.count(User.id)).filter(User.role == 'student').group_by(day):
+            students[stat_day(jour)] = {'inscriptions': count, 'premiers_quiz': 0}
+        first = session.query(func.min(Result.date_passage)).group_by(Result.user_id)
+        for (passage,) in first:
+            entry = students.setdefault(stat_day(passage), {'inscriptions': 0, 'premiers_quiz': 0})
+            entry['premiers_quiz'] += 1
+
+        day = func.date(Payment.date_paiement)
+        payments = session.query(day, Payment.mode_paiement, Payment.statut, func.count(Payment.id),
+                                 func.sum(Payment.montant)).group_by(day, Payment.mode_paiement, Payment.statut).all()
+
+        day = func.date(Result.date_passage)
+        quizzes = session.query(day, Result.quiz_id, func.count(Result.id), func.sum(Result.score)).group_by(
+            day, Result.quiz_id).all()
+
+        rows = {
+            self.StudentDay: [{'jour': jour, **values} for jour, values in students.items()],
+            self.PaymentDay: [
+                {'jour': stat_day(jour), 'mode_paiement': mode or '', 'statut': statut or '', 'nombre': count,
+                 'montant': float(total or 0)}
+                for jour, mode, statut, count, total in payments
+            ],
+            self.QuizDay: [
+                {'jour': stat_day(jour), 'quiz_id': quiz_id, 'soumissions': count, 'total_score': float(total or 0)}
+                for jour, quiz_id, count, total in quizzes
+            ]
+        }
+        for model, values in rows.items():
+            if values:
+                session.execute(model.__table__.insert(), values)
+        session.commit()
+        counts = {model.__tablename__: len(values) for model, values in rows.items()}
+        logger.info(f"Cumuls statistiques reconstruits: {counts}")
+        return counts
+
+    # ----- Lecture -----
+
+    def _rows(self, model, start, end):
+        query = self.db.session.query(model)
+        if start is not None:
+            query = query.filter(model.jour >= start)
+        if end is not None:
+            query = query.filter(model.jour <= end)
+        return query.order_by(model.jour).all()
+
+    def general(self, start=None, end=None):
+        User = self.User
+        total, active = self.db.session.query(
+            func.count(User.id), func.sum(case((User.actif.is_(True), 1), else_=0))
+        ).filter(User.role == 'student').one()
+        payments = self._rows(self.PaymentDay, start, end)
+        quizzes = self._rows(self.QuizDay, start, end)
+        submissions = sum(row.soumissions for row in quizzes)
+        return {
+            'total_students': total,
+            'active_students': int(active or 0),
+            'new_students': sum(row.inscriptions for row in self._rows(self.StudentDay, start, end)),
+            'total_revenue': round(sum(row.montant for row in payments), 2),
+            'pending_payments': sum(row.nombre for row in payments if row.statut == PENDING_STATUS),
+            'completed_quizzes': submissions,
+            'average_score': round(sum(row.total_score for row in quizzes) / submissions, 2) if submissions else 0
+        }
+
+    def payments(self, start=None, end=None):
+        by_day, by_month, by_method, by_status = {}, {}, {}, {}
+        for row in self._rows(self.PaymentDay, start, end):
+            for groups, key in ((by_day, row.jour.isoformat()), (by_month, row.jour.strftime('%Y-%m')),
+                                (by_method, row.mode_paiement), (by_status, row.statut)):
+                entry = groups.setdefault(key, [0.0, 0])
+                entry[0] += row.montant
+                entry[1] += row.nombre
+        return {
+            # Les lignes à zéro (paiements supprimés ou changés de statut) sont omises
+            'by_day': [{'date': k, 'amount': round(a, 2), 'count': n} for k, (a, n) in by_day.items() if n],
+            'by_month': [{'month': k, 'amount': round(a, 2), 'count': n} for k, (a, n) in by_month.items() if n],
+            'by_method': [{'method': k, 'amount': round(a, 2), 'count': n}
+                          for k, (a, n) in sorted(by_method.items()) if n],
+            'by_status': [{'status': k, 'count': n} for k, (_, n) in sorted(by_status.items()) if n]
+        }
+
+    def quizzes(self, start=None, end=None):
+        """Participation par jour, moyenne par quiz, taux de participation des étudiants"""
+        by_day, by_quiz = {}, {}
+        for row in self._rows(self.QuizDay, start, end):
+            day = row.jour.isoformat()
+            by_day[day] = by_day.get(day, 0) + row.soumissions
+            entry = by_quiz.setdefault(row.quiz_id, [0.0, 0])
+            entry[0] += row.total_score
+            entry[1] += row.soumissions
+        # Étudiants ayant soumis au moins un quiz (cumul des premières soumissions jusqu'à la fin de période)
+        participants = sum(row.premiers_quiz for row in self._rows(self.StudentDay, None, end))
+        total = self.db.session.query(func.count(self.User.id)).filter(self.User.role == 'student').scalar()
+        return {
+            'completion_rate': round(min(participants, total) / total * 100, 1) if total else 0,
+            'average_scores': [
+                {'quiz_id': quiz_id, 'average': round(score / count, 2), 'count': count}
+                for quiz_id, (score, count) in by_quiz.items() if count
+            ],
+            'participation': [{'date': day, 'count': count} for day, count in by_day.items()]
+        }
@@ -0,0 +1,130 @@
+"""
+Accueil étudiant: les sections du tableau de bord en une requête.
+
+/api/student/<id>/home renvoie documents, quiz, paiements, notifications,
+résultats et solde avec une empreinte (version) par section. Le client renvoie les
+versions qu'il connaît (?known=documents:<v>,quizzes:<v>,...): une section
+inchangée n'est pas réencodée dans la réponse, seule sa version est rappelée.
+
+Documents et quiz sont communs à tous les étudiants: leur liste est encodée
+une fois et réutilisée tant qu'elle n'est pas invalidée (DocumentListing,
+QuizCatalogue). Les sections propres à l'étudiant coûtent une requête
+chacune.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('documents', 'quizzes', 'payments', 'notifications', 'results', 'balance')
+
+
+def section_version(body):
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+def parse_known(value):
+    """'documents:abc,quizzes:def' -> {'documents': 'abc', 'quizzes': 'def'}"""
+    known = {}
+    for part in (value or '').split(','):
+        section, _, version = part.strip().partition(':')
+        if section in SECTIONS and version:
+            known[section] = version
+    return known
+
+
+class EncodedList:
+    """Dernier encodage d'une liste partagée, réutilisé tant que l'objet liste est le même"""
+
+    __slots__ = ('encode', '_entry')
+
+    def __init__(self, encode):
+        self.encode = encode
+        self._entry = None
+
+    def get(self, items):
+        """(octets JSON, version)"""
+        entry = self._entry
+        if entry is not None and entry[0] is items:
+            return entry[1], entry[2]
+        body = self.encode(items)
+        version = section_version(body)
+        self._entry = (items, body, version)
+        return body, version
+
+
+class DocumentListing:
+    """Documents dont le fichier existe, rechargés après invalidation ou expiration.
+
+    Le contrôle d'existence des fichiers (un stat par document) n'est fait qu'au
+    chargement. DOCUMENT_LIST_TTL borne la durée de vie (fichier supprimé hors de
+    l'application, modification faite par un autre réplica); tant que des
+    dérivés PDF sont en cours de génération, l'entrée expire après
+    DOCUMENT_PENDING_TTL pour afficher les vignettes dès qu'elles sont prêtes."""
+
+    def __init__(self, loader, clock=time.monotonic, ttl=None, pending_ttl=None):
+        # loader() -> (documents, dérivés en attente)
+        self.loader = loader
+        self.clock = clock
+        self.ttl = ttl or int(os.getenv('DOCUMENT_LIST_TTL', '60'))
+        self.pending_ttl = pending_ttl or int(os.getenv('DOCUMENT_PENDING_TTL', '5'))
+        self._entry = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+
+    def _valid(self, entry, now):
+        return entry is not None and entry[2] == self._generation and now < entry[1]
+
+    def get(self):
+        now = self.clock()
+        entry = self._entry
+        if self._valid(entry, now):
+            self.stats['hits'] += 1
+            return entry[0]
+
+        with self._lock:
+            now = self.clock()
+            entry = self._entry
+            if self._valid(entry, now):
+                self.stats['hits'] += 1
+                return entry[0]
+            generation = self._generation
+            documents, pending = self.loader()
+            entry = (documents, now + (self.pending_ttl if pending else self.ttl), generation)
+            self._entry = entry
+            self.stats['loads'] += 1
+            return documents
+
+    def invalidate(self):
+        """À appeler après le commit d'un ajout / modification / suppression de document"""
+        self._generation += 1
+        self._entry = None
+        self.stats['invalidations'] += 1
+
+    def describe(self):
+        entry = self._entry
+        return {**self.stats, 'cached': entry is not None, 'documents': len(entry[0]) if entry else None}
+
+
+def home_body(sections, known):
+    """Document JSON de l'accueil à partir des sections encodées {nom: (octets, version)}.
+
+    Les sections dont la version est connue du client sont listées dans
+    "unchanged" et absentes de "data"."""
+    data = []
+    versions = []
+    unchanged = []
+    for name in SECTIONS:
+        body, version = sections[name]
+        versions.append(b'"%s":"%s"' % (name.encode(), version.encode()))
+        if known.get(name) == version:
+            unchanged.append(b'"%s"' % name.encode())
+        else:
+            data.append(b'"%s":%s' % (name.encode(), body))
+    return (b'{"success":true,"data":{' + b','.join(data) + b'},"versions":{' + b','.join(versions)
+            + b'},"unchanged":[' + b','.join(unchanged) + b']}')
@@ -0,0 +1,310 @@
+"""
+Jetons d'authentification: accès courte durée + rafraîchissement côté serveur.
+
+- Jeton d'accès (JWT HS256, ACCESS_TOKEN_TTL, 15 min par défaut): porte les
+  claims user_id, role, actif, username, email. token_required le vérifie sans
+  aucune lecture en base.
+- Jeton de rafraîchissement: valeur opaque aléatoire, seul son sha256 est
+  stocké (table refresh_token). Rotation à chaque utilisation; la réutilisation
+  d'un jeton déjà consommé révoque toutes les sessions de l'utilisateur.
+- Révocations (désactivation / suppression d'un étudiant): enregistrées en base
+  (table token_revocation) et gardées en mémoire dans un dict
+  user_id -> instant de révocation. Chaque réplica relit les nouvelles lignes au
+  plus toutes les REVOCATION_SYNC_INTERVAL secondes: une désactivation prend
+  effet en quelques secondes partout. Une entrée n'est conservée que le temps de
+  vie d'un jeton d'accès (au-delà, les jetons antérieurs ont expiré).
+- Tickets de flux (/api/events): EventSource ne peut pas envoyer d'en-tête
+  Authorization et une URL finit dans les journaux d'accès. Le client échange
+  son jeton d'accès contre un ticket opaque à usage unique (STREAM_TICKET_TTL,
+  30 s par défaut, sha256 stocké en table stream_ticket), consommé par une
+  suppression atomique à l'ouverture du flux.
+"""
+
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+
+class TokenError(Exception):
+    """Jeton absent, invalide, expiré ou révoqué"""
+
+
+class TokenUser:
+    """Utilisateur reconstruit depuis les claims du jeton d'accès (sans base)"""
+
+    __slots__ = ('id', 'role', 'actif', 'username', 'email')
+
+    def __init__(self, claims):
+        self.id = claims['user_id']
+        self.role = claims.get('role')
+        self.actif = claims.get('actif', False)
+        self.username = claims.get('username')
+        self.email = claims.get('email')
+
+    def __repr__(self):
+        return f"<TokenUser {self.id} {self.role}>"
+
+
+def hash_refresh_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class RevocationSet:
+    """user_id -> instant de révocation (epoch), synchronisé depuis la base"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._revoked = {}
+        self._synced_until = time.time() - ttl
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, user_id, revoked_at):
+        current = self._revoked.get(user_id, 0)
+        self._revoked[user_id] = max(current, revoked_at)
+
+    def is_revoked(self, user_id, issued_at):
+        revoked_at = self._revoked.get(user_id)
+        return revoked_at is not None and issued_at < revoked_at
+
+    def needs_sync(self, interval):
+        return time.monotonic() - self._last_sync >= interval
+
+    def sync(self, fetch_since, overlap=30):
+        """Charge les révocations enregistrées depuis la dernière synchronisation.
+
+        fetch_since(epoch) -> [(user_id, revoked_at_epoch)]. Les fenêtres se
+        chevauchent de `overlap` secondes (transactions validées en retard, dérive
+        d'horloge entre réplicas); add() est idempotent. Un seul thread
+        synchronise, les autres continuent avec l'état courant.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            started = time.time()
+            for user_id, revoked_at in fetch_since(self._synced_until - overlap):
+                self.add(user_id, revoked_at)
+            self._synced_until = started
+            horizon = started - self.ttl
+            for user_id in [u for u, t in self._revoked.items() if t < horizon]:
+                del self._revoked[user_id]
+            self._last_sync = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+class TokenService:
+    """Émission / vérification des jetons et gestion des révocations"""
+
+    def __init__(self, app, db, user_model, refresh_model, revocation_model, ticket_model):
+        self.app = app
+        self.db = db
+        self.User = user_model
+        self.RefreshToken = refresh_model
+        self.TokenRevocation = revocation_model
+        self.StreamTicket = ticket_model
+        self.access_ttl = int(os.getenv('ACCESS_TOKEN_TTL', '900'))
+        self.refresh_ttl = int(os.getenv('REFRESH_TOKEN_TTL', str(24 * 3600)))
+        self.sync_interval = float(os.getenv('REVOCATION_SYNC_INTERVAL', '5'))
+        # Deux onglets qui rafraîchissent en même temps ne sont pas une réutilisation
+        self.rotation_grace = int(os.getenv('REFRESH_ROTATION_GRACE', '30'))
+        self.ticket_ttl = int(os.getenv('STREAM_TICKET_TTL', '30'))
+        self.revocations = RevocationSet(self.access_ttl)
+
+    @property
+    def secret(self):
+        return self.app.config['SECRET_KEY']
+
+    # ----- Jetons d'accès -----
+
+    def issue_access(self, user):
+        now = time.time()
+        payload = {
+            'type': 'access',
+            'user_id': user.id,
+            'role': user.role,
+            'actif': bool(user.actif),
+            'username': user.username,
+            'email': user.email,
+            'iat': now,
+            'exp': int(now + self.access_ttl)
+        }
+        return jwt.encode(payload, self.secret, algorithm='HS256')
+
+    def decode_access(self, token):
+        """Claims du jeton d'accès; TokenError s'il est invalide ou révoqué"""
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=['HS256'])
+        except jwt.PyJWTError as e:
+            raise TokenError(str(e))
+        if 'user_id' not in claims:
+            raise TokenError('user_id manquant')
+
+        if self.revocations.needs_sync(self.sync_interval):
+            self.sync_revocations()
+        if self.revocations.is_revoked(claims['user_id'], claims.get('iat', 0)):
+            raise TokenError('jeton révoqué')
+        return claims
+
+    # ----- Jetons de rafraîchissement -----
+
+    def issue_refresh(self, user):
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        self.db.session.add(self.RefreshToken(
+            user_id=user.id,
+            token_hash=hash_refresh_token(token),
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.refresh_ttl)
+        ))
+        return token
+
+    def issue_pair(self, user):
+        """Jeton d'accès + jeton de rafraîchissement (commit inclus)"""
+        # Ménage des jetons expirés de cet utilisateur (index user_id)
+        self.RefreshToken.query.filter(
+            self.RefreshToken.user_id == user.id, self.RefreshToken.expires_at < datetime.utcnow()
+        ).delete(synchronize_session=False)
+        refresh_token = self.issue_refresh(user)
+        self.db.session.commit()
+        return {
+            'token': self.issue_access(user),
+            'refresh_token': refresh_token,
+            'expires_in': self.access_ttl
+        }
+
+    def rotate(self, refresh_token):
+        """Consomme un jeton de rafraîchissement et émet une nouvelle paire"""
+        token_hash = hash_refresh_token(refresh_token or '')
+        row = self.RefreshToken.query.filter_by(token_hash=token_hash).first()
+        if row is None:
+            raise TokenError('jeton de rafraîchissement inconnu')
+
+        now = datetime.utcnow()
+        if row.revoked_at is not None and now - row.revoked_at < timedelta(seconds=self.rotation_grace):
+            raise TokenError('jeton de rafraîchissement déjà utilisé')
+        if row.revoked_at is not None:
+            # Réutilisation d'un jeton déjà consommé: vol probable, on coupe tout
+            logger.warning(f"Réutilisation d'un jeton de rafraîchissement (user_id={row.user_id})")
+            self.revoke_refresh_tokens(row.user_id, now)
+            self.db.session.commit()
+            raise TokenError('jeton de rafraîchissement révoqué')
+        if row.expires_at < now:
+            raise TokenError('jeton de rafraîchissement expiré')
+
+        user = self.db.session.get(self.User, row.user_id)
+        if user is None or not user.actif:
+            row.revoked_at = now
+            self.db.session.commit()
+            raise TokenError('compte supprimé ou désactivé')
+
+        # Consommation atomique: de deux rotations concurrentes, une seule passe
+        consumed = self.RefreshToken.query.filter(
+            self.RefreshToken.token_hash == token_hash, self.RefreshToken.revoked_at.is_(None)
+        ).update({'revoked_at': now}, synchronize_session=False)
+        if consumed != 1:
+            self.db.session.rollback()
+            raise TokenError('jeton de rafraîchissement déjà utilisé')
+        return self.issue_pair(user)
+
+    def revoke_refresh(self, refresh_token):
+        """Déconnexion: révoque un jeton de rafraîchissement"""
+        row = self.RefreshToken.query.filter_by(token_hash=hash_refresh_token(refresh_token or '')).first()
+        if row is not None and row.revoked_at is None:
+            row.revoked_at = datetime.utcnow()
+            self.db.session.commit()
+
+    def revoke_refresh_tokens(self, user_id, when):
+        self.RefreshToken.query.filter_by(user_id=user_id, revoked_at=None).update(
+            {'revoked_at': when}, synchronize_session=False
+        )
+
+    # ----- Tickets de flux -----
+
+    def issue_ticket(self, claims):
+        """Ticket à usage unique pour ouvrir un flux SSE, valable jusqu'à l'expiration du jeton d'accès"""
+        ticket = secrets.token_urlsafe(24)
+        now = datetime.utcnow()
+        StreamTicket = self.StreamTicket
+        StreamTicket.query.filter(
+            StreamTicket.user_id == claims['user_id'], StreamTicket.expires_at < now
+        ).delete(synchronize_session=False)
+        self.db.session.add(StreamTicket(
+            ticket_hash=hash_refresh_token(ticket),
+            user_id=claims['user_id'],
+            token_iat=claims.get('iat', 0),
+            token_exp=claims['exp'],
+            expires_at=now + timedelta(seconds=self.ticket_ttl)
+        ))
+        self.db.session.commit()
+        return ticket
+
+    def redeem_ticket(self, ticket):
+        """Consomme un ticket: {'user_id', 'exp'} du jeton d'origine; TokenError s'il est inconnu, expiré ou déjà utilisé"""
+        StreamTicket = self.StreamTicket
+        ticket_hash = hash_refresh_token(ticket or '')
+        row = self.db.session.query(
+            StreamTicket.user_id, StreamTicket.token_iat, StreamTicket.token_exp, StreamTicket.expires_at
+        ).filter(StreamTicket.ticket_hash == ticket_hash).first()
+        # Seule la requête qui supprime la ligne ouvre le flux
+        deleted = StreamTicket.query.filter(StreamTicket.ticket_hash == ticket_hash).delete(synchronize_session=False)
+        self.db.session.commit()
+        if row is None or deleted != 1:
+            raise TokenError('ticket inconnu ou déjà utilisé')
+        if row.expires_at < datetime.utcnow() or row.token_exp < time.time():
+            raise TokenError('ticket expiré')
+        if self.revocations.needs_sync(self.sync_interval):
+            self.sync_revocations()
+        if self.revocations.is_revoked(row.user_id, row.token_iat):
+            raise TokenError('jeton révoqué')
+        return {'user_id': row.user_id, 'exp': row.token_exp}
+
+    # ----- Révocations -----
+
+    def revoke_user(self, user_id):
+        """Invalide tous les jetons d'un utilisateur (à committer par l'appelant)"""
+        now = datetime.utcnow()
+        self.db.session.add(self.TokenRevocation(user_id=user_id, revoked_at=now))
+        self.revoke_refresh_tokens(user_id, now)
+        # Les lignes plus anciennes qu'un jeton d'accès ne servent plus
+        self.TokenRevocation.query.filter(
+            self.TokenRevocation.revoked_at < now - timedelta(seconds=self.access_ttl * 2)
+        ).delete(synchronize_session=False)
+        self.revocations.add(user_id, time.time())
+
+    def sync_revocations(self):
+        TokenRevocation = self.TokenRevocation
+
+        def fetch_since(since):
+            since = datetime.utcfromtimestamp(since)
+            rows = self.db.session.query(TokenRevocation.user_id, TokenRevocation.revoked_at).filter(
+                TokenRevocation.revoked_at >= since
+            ).all()
+            # revoked_at est un datetime UTC naïf
+            return [(user_id, revoked_at.replace(tzinfo=timezone.utc).timestamp()) for user_id, revoked_at in rows]
+
+        try:
+            self.revocations.sync(fetch_since)
+        except Exception as e:
+            # Base indisponible: on garde l'état courant et on réessaiera
+            self.db.session.rollback()
+            logger.error(f"Synchronisation des révocations impossible: {e}")
+
+    def describe(self):
+        return {
+            'access_ttl': self.access_ttl,
+            'refresh_ttl': self.refresh_ttl,
+            'sync_interval': self.sync_interval,
+            'revoked_users': len(self.revocations)
+        }
@@ -372,8 +372,22 @@ export function DocumentManager() {
                     <TableRow key={document.id_document}>
                       <TableCell className="font-medium">
                         <div className="flex items-center space-x-2">
-                          {getTypeIcon(document.type)}
+                          {document.thumbnail_url ? (
+                            <img
+                              src={document.thumbnail_url}
+                              alt=""
+                              loading="lazy"
+                              className="h-10 w-8 object-cover rounded border"
+                            />
+                          ) : (
+                            getTypeIcon(document.type)
+                          )}
                           <span>{document.titre}</span>
+                          {document.page_count && (
+                            <span className="text-xs text-muted-foreground">
+                              {document.page_count} p.
+                            </span>
+                          )}
                         </div>
                       </TableCell>
                       <TableCell>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
@@ -14,6 +14,7 @@ import {
   Search,
   Filter,
   Download,
+  Upload,
   Loader2
 } from 'lucide-react';
 import { AlertDialog, AlertDialogAction, AlertDialogCancel, AlertDialogContent, AlertDialogDescription, AlertDialogFooter, AlertDialogHeader, AlertDialogTitle, AlertDialogTrigger } from '@/components/ui/alert-dialog';
@@ -33,12 +34,23 @@ export function PaymentManagement() {
   const [students, setStudents] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [reconciling, setReconciling] = useState(false);
+  const [collected, setCollected] = useState<number | null>(null);
+  const statementInput = useRef<HTMLInputElement>(null);
 
   // Charger les données au montage du composant
   useEffect(() => {
     loadData();
   }, []);
 
+  // Totaux encaissés tenus par le serveur, rafraîchis à chaque changement de paiement
+  useEffect(() => {
+    if (payments.length === 0) return;
+    paymentService.getBalances().then(res => {
+      if (res.success && res.data) setCollected(res.data.summary.total_paye);
+    });
+  }, [payments]);
+
   const loadData = async () => {
     try {
       setLoading(true);
@@ -96,9 +108,9 @@ export function PaymentManagement() {
     return matchesSearch && matchesStatus && matchesMode;
   });
 
-  // Statistiques
+  // Statistiques (total: paiements encaissés, hors attente de vérification)
   const stats = {
-    total: payments.reduce((sum, p) => sum + p.montant, 0),
+    total: collected ?? payments.filter(p => p.statut !== 'en_attente').reduce((sum, p) => sum + p.montant, 0),
     pending: payments.filter(p => p.statut === 'en_attente').length,
     complete: payments.filter(p => p.statut === 'complet').length,
     partial: payments.filter(p => p.statut === 'par_tranche').length
@@ -282,6 +294,33 @@ export function PaymentManagement() {
     }
   };
 
+  // Rapprochement d'un relevé MVola: les paiements correspondants sont validés côté serveur
+  const handleStatementImport = async (event: React.ChangeEvent<HTMLInputElement>) => {
+    const file = event.target.files?.[0];
+    event.target.value = '';
+    if (!file) return;
+
+    setReconciling(true);
+    const response = await paymentService.reconcileMvolaStatement(file);
+    setReconciling(false);
+
+    if (response.success && response.data) {
+      const summary = response.data.summary;
+      toast({
+        title: "Relevé MVola rapproché",
+        description: `${summary.validated} paiement(s) validé(s), ${summary.ambiguous} ambigu(s), ` +
+                     `${summary.unmatched} sans correspondance, ${summary.invalid} ligne(s) invalide(s).`
+      });
+      loadData();
+    } else {
+      toast({
+        title: "Erreur",
+        description: response.error || 'Erreur lors du rapprochement du relevé MVola',
+        variant: "destructive"
+      });
+    }
+  };
+
   const handleExportPayments = async () => {
     try {
       const headerRow = new DocxTableRow({
@@ -471,6 +510,11 @@ export function PaymentManagement() {
               <Download className="h-4 w-4 mr-2" />
               Exporter DOCX
             </Button>
+            <input ref={statementInput} type="file" accept=".csv,text/csv" className="hidden" onChange={handleStatementImport} />
+            <Button variant="outline" disabled={reconciling} onClick={() => statementInput.current?.click()}>
+              {reconciling ? <Loader2 className="h-4 w-4 mr-2 animate-spin" /> : <Upload className="h-4 w-4 mr-2" />}
+              Relevé MVola
+            </Button>
           </div>
         </CardContent>
       </Card>
@@ -447,7 +447,7 @@
 //                 <h4 className="font-semibold">Prochaines étapes:</h4>
 //                 <ul className="text-sm text-muted-foreground space-y-1">
 //                   <li>• Conservez précieusement votre code d'authentification</li>
-//                   <li>• Connectez-vous avec votre email et ce code</li>
+//                   <li>• Une fois votre paiement validé, connectez-vous avec votre email et ce code</li>
 //                   <li>• Accédez à vos cours et documents de formation</li>
 //                   {paymentData.tranche_restante > 0 && (
 //                     <li>• Soldez le montant restant pour accéder à tous les contenus</li>
@@ -484,6 +484,7 @@ import { StepIndicator } from '@/components/ui/step-indicator';
 import { Loader2, GraduationCap, CreditCard, Banknote, ArrowLeft, CheckCircle, User, Receipt } from 'lucide-react';
 import { useToast } from '@/hooks/use-toast';
 import { useAuth } from '@/context/AuthContext';
+import { newIdempotencyKey } from '@/services/apiService';
 
 interface RegistrationFormProps {
   onSuccess: () => void;
@@ -602,8 +603,8 @@ export function RegistrationForm({ onSuccess, onBackToLogin }: RegistrationFormP
         email: studentData.email,
         telephone: studentData.telephone,
         notes: "Inscription publique",
-        code_auth: authCode,
-        actif: paymentData.mode_paiement === 'mvola' // Actif immédiatement pour MVola
+        code_auth: authCode
+        // Compte activé par le serveur à la validation du paiement
       };
       
       console.log('Envoi des données de l\'étudiant (public):', studentPayload);
@@ -639,22 +640,12 @@ export function RegistrationForm({ onSuccess, onBackToLogin }: RegistrationFormP
       
       // Enregistrer le paiement via API publique
       try {
-        // Déterminer le statut du paiement
-        let paymentStatus = 'en_attente';
-        if (paymentData.mode_paiement === 'mvola') {
-          paymentStatus = 'complet'; // MVola est considéré comme complet
-        } else if (paymentData.statut === 'complet') {
-          paymentStatus = 'en_attente'; // Espèces en attente de validation
-        } else {
-          paymentStatus = 'par_tranche'; // Paiement en tranches
-        }
-        
         // Préparer les données du paiement
         const paymentPayload = {
           mode_paiement: paymentData.mode_paiement,
           code_ref_mvola: paymentData.code_ref_mvola || '',
           montant: paymentData.montant,
-          statut: paymentStatus,
+          // Pas de statut: le serveur enregistre le paiement en attente de validation
           tranche_restante: paymentData.tranche_restante,
           id_etudiant: createdStudent.id,
           date_paiement: new Date().toISOString().split('T')[0]
@@ -668,6 +659,7 @@ export function RegistrationForm({ onSuccess, onBackToLogin }: RegistrationFormP
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            'Idempotency-Key': newIdempotencyKey(),
           },
           body: JSON.stringify(paymentPayload)
         });
@@ -692,8 +684,8 @@ export function RegistrationForm({ onSuccess, onBackToLogin }: RegistrationFormP
       setCurrentStep('confirmation');
       
       toast({
-        title: "Inscription réussie !",
-        description: `Votre code d'authentification vous a été envoyé par email. Code: ${authCode}`
+        title: "Inscription enregistrée",
+        description: `Code: ${authCode}. Votre compte sera actif après validation de votre paiement.`
       });
       
     } catch (err: any) {
@@ -985,9 +977,9 @@ export function RegistrationForm({ onSuccess, onBackToLogin }: RegistrationFormP
               </div>
               
               <div className="space-y-2">
-                <h3 className="text-xl font-semibold text-success">Inscription réussie !</h3>
+                <h3 className="text-xl font-semibold text-success">Inscription enregistrée</h3>
                 <p className="text-muted-foreground">
-                  Votre inscription a été traitée avec succès.
+                  Votre compte sera actif après validation de votre paiement.
                 </p>
               </div>
 
@@ -1001,20 +993,19 @@ export function RegistrationForm({ onSuccess, onBackToLogin }: RegistrationFormP
                 </p>
               </div>
 
-              {paymentData.mode_paiement === 'espece' && (
-                <Alert>
-                  <AlertDescription>
-                    Votre paiement en espèces est en attente de validation. 
-                    Présentez-vous au centre avec le montant exact pour activer votre compte.
-                  </AlertDescription>
-                </Alert>
-              )}
+              <Alert>
+                <AlertDescription>
+                  {paymentData.mode_paiement === 'espece'
+                    ? 'Votre paiement en espèces est en attente de validation. Présentez-vous au centre avec le montant exact pour activer votre compte.'
+                    : 'Votre paiement MVola est en attente de vérification. Votre compte sera activé dès que la transaction aura été validée.'}
+                </AlertDescription>
+              </Alert>
 
               <div className="space-y-3">
                 <h4 className="font-semibold">Prochaines étapes:</h4>
                 <ul className="text-sm text-muted-foreground space-y-1">
                   <li>• Conservez précieusement votre code d'authentification</li>
-                  <li>• Connectez-vous avec votre email et ce code</li>
+                  <li>• Une fois votre paiement validé, connectez-vous avec votre email et ce code</li>
                   <li>• Accédez à vos cours et documents de formation</li>
                   {paymentData.tranche_restante > 0 && (
                     <li>• Soldez le montant restant pour accéder à tous les contenus</li>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Progress } from '@/components/ui/progress';
@@ -11,7 +11,7 @@ import { Alert, AlertDescription } from '@/components/ui/alert';
 import { Clock, ArrowLeft, ArrowRight, Send, AlertTriangle, Loader2 } from 'lucide-react';
 import { useToast } from '@/hooks/use-toast';
 import { useAuth } from '@/context/AuthContext';
-import { quizService } from '@/services/apiService';
+import { quizService, newIdempotencyKey } from '@/services/apiService';
 import type { Quiz, Question } from '@/types';
 
 interface QuizTakerProps {
@@ -32,6 +32,8 @@ export function QuizTaker({ quizId, onExit }: QuizTakerProps) {
   const [quizStarted, setQuizStarted] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Soumission en cours: même clé et même temps pour chaque renvoi (réponse rejouée par le serveur)
+  const submission = useRef<{ key: string; timeSpent: number } | null>(null);
 
   useEffect(() => {
     loadQuizData();
@@ -139,22 +141,30 @@ export function QuizTaker({ quizId, onExit }: QuizTakerProps) {
     
     try {
       console.log('Début de la soumission du quiz...');
-      const timeSpent = quiz.duree * 60 - timeRemaining;
+      if (!submission.current) {
+        submission.current = { key: newIdempotencyKey(), timeSpent: quiz.duree * 60 - timeRemaining };
+      }
+      const timeSpent = submission.current.timeSpent;
       console.log('Temps passé:', timeSpent, 'secondes');
       console.log('Réponses à envoyer:', answers);
       
       const response = await quizService.submitQuiz(
         quizId,
         answers,
-        timeSpent
+        timeSpent,
+        submission.current.key
       );
       
       console.log('Réponse du serveur:', response);
       
       if (response.success) {
-        const scoreText = response.data?.score !== undefined 
+        let scoreText = response.data?.score !== undefined 
           ? `Votre score: ${response.data.score} / ${response.data.max_score || '?'}` 
           : 'Vos réponses ont été enregistrées avec succès.';
+        const rank = await quizService.getQuizRank(quizId, Number(session.user.id));
+        if (rank.success && rank.data) {
+          scoreText += ` - Rang ${rank.data.rang} / ${rank.data.total}`;
+        }
           
         toast({
           title: "Quiz soumis !",
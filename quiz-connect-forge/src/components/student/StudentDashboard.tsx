@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Badge } from '@/components/ui/badge';
@@ -22,10 +22,12 @@ import {
 } from 'lucide-react';
 import { useAuth } from '@/context/AuthContext';
 import { useToast } from '@/hooks/use-toast';
-import { documentService, quizService, paymentService, notificationService, authService } from '@/services/apiService';
+import { quizService, notificationService, paymentService, studentHomeService, subscribeToEvents, StudentBalance } from '@/services/apiService';
 import { QuizTaker } from './QuizTaker';
 import { PdfPreview } from '@/components/common/PdfPreview';
 
+const NOTIFICATION_POLL_MS = 60 * 1000;
+
 export function StudentDashboard() {
   const { session, logout } = useAuth();
   const { toast } = useToast();
@@ -38,6 +40,7 @@ export function StudentDashboard() {
   const [documents, setDocuments] = useState<any[]>([]);
   const [quiz, setQuiz] = useState<any[]>([]);
   const [payments, setPayments] = useState<any[]>([]);
+  const [balance, setBalance] = useState<StudentBalance | null>(null);
   const [notifications, setNotifications] = useState<any[]>([]);
   const [results, setResults] = useState<any[]>([]);
   const [previewDoc, setPreviewDoc] = useState<any | null>(null);
@@ -51,6 +54,54 @@ export function StudentDashboard() {
     loadStudentData();
   }, [session.user?.id_etudiant]);
 
+  // Notifications et paiements poussés par le serveur (SSE); polling léger si EventSource est indisponible
+  const notificationCursor = useRef(0);
+  useEffect(() => {
+    notificationCursor.current = notifications.reduce((max, n) => Math.max(max, n.id_notification), 0);
+  }, [notifications]);
+
+  const addNotifications = (fresh: any[]) => {
+    if (!fresh.length) return;
+    setNotifications(prev => [
+      ...fresh,
+      ...prev.filter(n => !fresh.some((f: any) => f.id_notification === n.id_notification))
+    ]);
+  };
+
+  useEffect(() => {
+    const studentId = session.user?.id_etudiant;
+    if (!studentId) return;
+
+    if (typeof window.EventSource !== 'undefined') {
+      return subscribeToEvents({
+        notification: (notification) => addNotifications([notification]),
+        payment: (payment) => {
+          setPayments(prev => [...prev.filter(p => p.id_paiement !== payment.id_paiement), payment]);
+          refreshBalance(studentId);
+        },
+        payment_deleted: ({ id_paiement }) => {
+          setPayments(prev => prev.filter(p => p.id_paiement !== id_paiement));
+          refreshBalance(studentId);
+        },
+        // Reprise impossible (redémarrage du serveur, déconnexion longue): rechargement complet
+        reset: () => loadStudentData()
+      });
+    }
+
+    const interval = window.setInterval(async () => {
+      const countRes = await notificationService.getUnreadCount(studentId);
+      if (!countRes.success || !countRes.data || countRes.data.latest_id <= notificationCursor.current) return;
+      const res = await notificationService.getStudentNotifications(studentId, notificationCursor.current);
+      addNotifications(res.success && res.data ? res.data : []);
+    }, NOTIFICATION_POLL_MS);
+    return () => window.clearInterval(interval);
+  }, [session.user?.id_etudiant]);
+
+  const refreshBalance = async (studentId: number) => {
+    const res = await paymentService.getStudentBalance(studentId);
+    if (res.success && res.data) setBalance(res.data);
+  };
+
   const loadStudentData = async () => {
     if (!session.user?.id_etudiant) return;
     
@@ -58,44 +109,29 @@ export function StudentDashboard() {
       setLoading(true);
       setError(null);
       
-      const [documentsRes, quizRes, paymentsRes, notificationsRes] = await Promise.all([
-        documentService.getAllDocuments(),
-        quizService.getAllQuiz(),
-        paymentService.getStudentPayments(session.user.id_etudiant),
-        notificationService.getStudentNotifications(session.user.id_etudiant)
-      ]);
-      
-      if (documentsRes.success && documentsRes.data) {
-        // Afficher tous les documents. L'UI gère la possibilité de téléchargement vs simple visualisation.
-        setDocuments(documentsRes.data);
-      }
-      
-      if (quizRes.success && quizRes.data) {
-        const now = new Date();
-        const available = quizRes.data.filter((q: any) => {
-          if (q.statut) return q.statut === 'actif';
-          const startOk = q.date_debut ? new Date(q.date_debut) <= now : true;
-          const endOk = q.date_fin ? now <= new Date(q.date_fin) : true;
-          return startOk && endOk;
-        });
-        setQuiz(available);
-      }
-      
-      if (paymentsRes.success && paymentsRes.data) {
-        setPayments(paymentsRes.data);
-      }
-      
-      if (notificationsRes.success && notificationsRes.data) {
-        setNotifications(notificationsRes.data);
-      }
-      
-      // Charger les résultats des quiz
-      const resultsRes = await authService.getStudentResults(session.user.id_etudiant);
-      if (resultsRes.success && resultsRes.data) {
-        setResults(resultsRes.data);
-      } else {
-        setResults([]);
+      // Une seule requête pour les cinq sections (sections inchangées servies depuis le cache)
+      const homeRes = await studentHomeService.getStudentHome(session.user.id_etudiant);
+      if (!homeRes.success || !homeRes.data) {
+        throw new Error(homeRes.error || 'Erreur lors du chargement des données');
       }
+      const home = homeRes.data;
+
+      // Afficher tous les documents. L'UI gère la possibilité de téléchargement vs simple visualisation.
+      setDocuments(home.documents || []);
+
+      const now = new Date();
+      const available = (home.quizzes || []).filter((q: any) => {
+        if (q.statut) return q.statut === 'actif';
+        const startOk = q.date_debut ? new Date(q.date_debut) <= now : true;
+        const endOk = q.date_fin ? now <= new Date(q.date_fin) : true;
+        return startOk && endOk;
+      });
+      setQuiz(available);
+
+      setPayments(home.payments || []);
+      setBalance(home.balance || null);
+      setNotifications(home.notifications || []);
+      setResults(home.results || []);
       
     } catch (err: any) {
       setError(err.message || 'Erreur lors du chargement des données');
@@ -116,13 +152,14 @@ export function StudentDashboard() {
   };
 
   // Calcul des statistiques
-  const totalPayments = payments.reduce((sum, p) => sum + p.montant, 0);
-  const remainingAmount = payments.reduce((sum, p) => sum + p.tranche_restante, 0);
+  // Solde tenu par le serveur (journal des paiements encaissés)
+  const totalPayments = balance?.total_paye ?? 0;
+  const remainingAmount = balance?.reste ?? 0;
   const averageScore = results.length > 0 
     ? Math.round(results.reduce((sum, r) => sum + r.score, 0) / results.length)
     : 0;
 
-  const paymentStatus = remainingAmount === 0 ? 'complet' : 'partiel';
+  const paymentStatus = !balance || balance.statut === 'solde' ? 'complet' : 'partiel';
   const unreadNotifications = notifications.filter(n => !n.lu).length;
 
   // Démarrage d'un quiz
@@ -1,6 +1,9 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import type { UserSession, Etudiant } from '../types';
-import { authService, studentService, paymentService } from '../services/apiService';
+import { authService, studentService, paymentService, storeAuthTokens, clearAuthTokens, ensureFreshToken } from '../services/apiService';
+
+// Vérification périodique de l'expiration du jeton d'accès
+const TOKEN_CHECK_INTERVAL_MS = 30 * 1000;
 
 interface AuthContextType {
   session: UserSession;
@@ -34,10 +37,8 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
           isAdmin: false,
           isAuthenticated: true
         });
-        // Stocker le token pour les futures requêtes
-        if (response.data.token) {
-          localStorage.setItem('auth-token', response.data.token);
-        }
+        // Stocker les jetons pour les futures requêtes
+        storeAuthTokens(response.data);
         localStorage.setItem('auth-session', JSON.stringify({
           userId: response.data.user.id_etudiant,
           isAdmin: false
@@ -68,10 +69,8 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
           isAdmin: true,
           isAuthenticated: true
         });
-        // Stocker le token pour les futures requêtes
-        if (response.data.token) {
-          localStorage.setItem('auth-token', response.data.token);
-        }
+        // Stocker les jetons pour les futures requêtes
+        storeAuthTokens(response.data);
         localStorage.setItem('auth-session', JSON.stringify({
           userId: 'admin',
           isAdmin: true
@@ -118,9 +117,22 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       isAuthenticated: false
     });
     localStorage.removeItem('auth-session');
-    localStorage.removeItem('auth-token');
+    authService.logout();
   };
 
+  // Rafraîchir le jeton d'accès avant expiration tant que la session est ouverte
+  useEffect(() => {
+    if (!session.isAuthenticated) {
+      return;
+    }
+    const interval = window.setInterval(async () => {
+      if (!(await ensureFreshToken())) {
+        logout();
+      }
+    }, TOKEN_CHECK_INTERVAL_MS);
+    return () => window.clearInterval(interval);
+  }, [session.isAuthenticated]);
+
   // Restaurer la session au chargement
   useEffect(() => {
     const restoreSession = async () => {
@@ -128,6 +140,11 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       const authToken = localStorage.getItem('auth-token');
       
       if (savedSession && authToken) {
+        if (!(await ensureFreshToken())) {
+          localStorage.removeItem('auth-session');
+          clearAuthTokens();
+          return;
+        }
         try {
           const { userId, isAdmin } = JSON.parse(savedSession);
           
@@ -143,11 +160,11 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
                 });
               } else {
                 localStorage.removeItem('auth-session');
-                localStorage.removeItem('auth-token');
+                clearAuthTokens();
               }
             } catch (e) {
               localStorage.removeItem('auth-session');
-              localStorage.removeItem('auth-token');
+              clearAuthTokens();
             }
           } else {
             // Validation étudiant avec vérification du token serveur
@@ -161,18 +178,18 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
                 });
               } else {
                 localStorage.removeItem('auth-session');
-                localStorage.removeItem('auth-token');
+                clearAuthTokens();
               }
             } catch (error) {
               console.error('Erreur lors de la vérification du token étudiant:', error);
               localStorage.removeItem('auth-session');
-              localStorage.removeItem('auth-token');
+              clearAuthTokens();
             }
           }
         } catch (error) {
           console.error('Erreur lors du parsing de la session:', error);
           localStorage.removeItem('auth-session');
-          localStorage.removeItem('auth-token');
+          clearAuthTokens();
         }
       }
     };
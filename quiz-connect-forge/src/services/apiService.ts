@@ -18,9 +18,17 @@ export interface ApiResponse<T> {
 export interface AuthResponse {
   user: any;
   token?: string;
+  refresh_token?: string;
+  expires_in?: number;
   isAdmin?: boolean;
 }
 
+export interface TokenPair {
+  token: string;
+  refresh_token: string;
+  expires_in: number;
+}
+
 export interface StudentResponse {
   message: string;
   auth_code: string;
@@ -31,6 +39,15 @@ export interface StudentResponse {
   };
 }
 
+// Clé d'idempotence d'une opération d'écriture: à réutiliser pour chaque renvoi de la même opération
+export const newIdempotencyKey = (): string => {
+  if (typeof crypto !== 'undefined' && 'randomUUID' in crypto) {
+    return crypto.randomUUID();
+  }
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+};
+
 // ============= AUTHENTIFICATION =============
 
 // Fonction utilitaire pour récupérer les en-têtes d'authentification
@@ -42,6 +59,66 @@ const getAuthHeaders = () => {
   };
 };
 
+// Jetons: accès courte durée + rafraîchissement (rotation à chaque appel)
+const REFRESH_MARGIN_MS = 120 * 1000;
+
+export const storeAuthTokens = (tokens: Partial<TokenPair>) => {
+  if (tokens.token) {
+    localStorage.setItem('auth-token', tokens.token);
+  }
+  if (tokens.refresh_token) {
+    localStorage.setItem('auth-refresh-token', tokens.refresh_token);
+  }
+  if (tokens.expires_in) {
+    localStorage.setItem('auth-token-expires-at', String(Date.now() + tokens.expires_in * 1000));
+  }
+};
+
+export const clearAuthTokens = () => {
+  localStorage.removeItem('auth-token');
+  localStorage.removeItem('auth-refresh-token');
+  localStorage.removeItem('auth-token-expires-at');
+};
+
+let refreshInFlight: Promise<boolean> | null = null;
+
+// Rafraîchit le jeton d'accès s'il expire bientôt; false si la session est perdue
+export const ensureFreshToken = async (): Promise<boolean> => {
+  const refreshToken = localStorage.getItem('auth-refresh-token');
+  const expiresAt = Number(localStorage.getItem('auth-token-expires-at') || 0);
+  if (!refreshToken || !expiresAt) {
+    // Ancien jeton sans rafraîchissement: conservé jusqu'à son expiration
+    return !!localStorage.getItem('auth-token');
+  }
+  if (expiresAt - Date.now() > REFRESH_MARGIN_MS) {
+    return true;
+  }
+  if (!refreshInFlight) {
+    refreshInFlight = (async () => {
+      try {
+        const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: refreshToken })
+        });
+        const result = await response.json();
+        if (response.ok && result.success && result.data) {
+          storeAuthTokens(result.data);
+          return true;
+        }
+        // Un autre onglet a pu rafraîchir entre-temps avec le même jeton
+        return localStorage.getItem('auth-refresh-token') !== refreshToken;
+      } catch (error) {
+        // Réseau indisponible: le jeton courant reste utilisable jusqu'à expiration
+        return Date.now() < expiresAt;
+      } finally {
+        refreshInFlight = null;
+      }
+    })();
+  }
+  return refreshInFlight;
+};
+
 // Vérifier la validité du token côté serveur
 async function verifyToken(): Promise<ApiResponse<AuthResponse>> {
   try {
@@ -131,6 +208,24 @@ return {
     }
   },
 
+  // Déconnexion: révoque le jeton de rafraîchissement côté serveur
+  async logout(): Promise<void> {
+    const refreshToken = localStorage.getItem('auth-refresh-token');
+    clearAuthTokens();
+    if (!refreshToken) {
+      return;
+    }
+    try {
+      await fetch(`${API_BASE_URL}/auth/logout`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken })
+      });
+    } catch (error) {
+      console.error('Erreur lors de la déconnexion:', error);
+    }
+  },
+
   // Vérifier la validité du token côté serveur
   async verifyToken(): Promise<ApiResponse<AuthResponse>> {
     try {
@@ -378,7 +473,7 @@ export const paymentService = {
   },
 
   // Ajouter un nouveau paiement
-  async addPayment(paymentData: any): Promise<ApiResponse<any>> {
+  async addPayment(paymentData: any, idempotencyKey: string = newIdempotencyKey()): Promise<ApiResponse<any>> {
     try {
       console.log('Envoi de la requête d\'ajout de paiement:', paymentData);
       
@@ -386,7 +481,8 @@ export const paymentService = {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          ...getAuthHeaders()
+          ...getAuthHeaders(),
+          'Idempotency-Key': idempotencyKey
         },
         body: JSON.stringify(paymentData)
       });
@@ -485,12 +581,105 @@ export const paymentService = {
     }
   },
 
+  // Traiter un lot de paiements (liste d'ids ou filtre), en une transaction côté serveur
+  async bulkPaymentAction(
+    action: 'validate' | 'partial' | 'reject',
+    selection: { ids: number[] } | { filter: { statut?: string; mode_paiement?: string; start?: string; end?: string } }
+  ): Promise<ApiResponse<any>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/admin/payments/bulk/${action}`, {
+        method: 'POST',
+        headers: getAuthHeaders(),
+        body: JSON.stringify(selection)
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Erreur lors du traitement en masse des paiements:', error);
+      return { success: false, error: 'Erreur lors du traitement en masse des paiements' };
+    }
+  },
+
+  // Totaux de la promotion et étudiants avec un reste dû (soldes calculés côté serveur)
+  async getBalances(statut?: 'solde' | 'partiel' | 'impaye'): Promise<ApiResponse<{
+    summary: {
+      total_du: number;
+      total_paye: number;
+      total_restant: number;
+      etudiants: { solde: number; partiel: number; impaye: number };
+      paiements_en_attente: number;
+    };
+    students: (StudentBalance & { username: string; email: string })[];
+  }>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/admin/balances${statut ? `?statut=${statut}` : ''}`, {
+        method: 'GET',
+        headers: getAuthHeaders()
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Erreur lors de la récupération des soldes:', error);
+      return { success: false, error: 'Erreur lors de la récupération des soldes' };
+    }
+  },
+
+  // Solde d'un étudiant
+  async getStudentBalance(studentId: number): Promise<ApiResponse<StudentBalance>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/student/${studentId}/balance`, {
+        method: 'GET',
+        headers: getAuthHeaders()
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Erreur lors de la récupération du solde:', error);
+      return { success: false, error: 'Erreur lors de la récupération du solde' };
+    }
+  },
+
+  // Rapprocher un relevé MVola (CSV opérateur) avec les paiements en attente
+  async reconcileMvolaStatement(file: File, dryRun = false): Promise<ApiResponse<any>> {
+    try {
+      const formData = new FormData();
+      formData.append('file', file);
+      const token = localStorage.getItem('auth-token');
+      const response = await fetch(`${API_BASE_URL}/admin/payments/mvola/reconcile${dryRun ? '?dry_run=true' : ''}`, {
+        method: 'POST',
+        headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+        body: formData
+      });
+
+      const data = await response.json();
+      if (!response.ok) {
+        return { success: false, error: data.error || `HTTP error! status: ${response.status}` };
+      }
+      return data;
+    } catch (error) {
+      console.error('Erreur lors du rapprochement du relevé MVola:', error);
+      return { success: false, error: 'Erreur lors du rapprochement du relevé MVola' };
+    }
+  },
+
   // Vérifier code MVola
   async verifyMvolaCode(code: string): Promise<ApiResponse<any>> {
     try {
       const response = await fetch(`${API_BASE_URL}/payments/verify-mvola`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: getAuthHeaders(),
         body: JSON.stringify({ code })
       });
       
@@ -632,6 +821,14 @@ export const documentService = {
 
 // ============= GESTION QUIZ =============
 
+export interface QuizRank {
+  rang: number;
+  id_etudiant: number;
+  etudiant?: string;
+  score: number;
+  temps_utilise: number | null;
+}
+
 export const quizService = {
   // Récupérer tous les quiz
   async getAllQuiz(): Promise<ApiResponse<any[]>> {
@@ -861,7 +1058,9 @@ export const quizService = {
   },
 
   // Soumettre les réponses
-  async submitQuiz(quizId: number, answersMap: Record<number, string>, tempsUtilise: number): Promise<ApiResponse<any>> {
+  // idempotencyKey: identique pour chaque renvoi de la même soumission (la réponse enregistrée est rejouée)
+  async submitQuiz(quizId: number, answersMap: Record<number, string>, tempsUtilise: number,
+                   idempotencyKey?: string): Promise<ApiResponse<any>> {
     try {
       const token = localStorage.getItem('auth-token');
       
@@ -877,7 +1076,8 @@ export const quizService = {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': token ? `Bearer ${token}` : ''
+          'Authorization': token ? `Bearer ${token}` : '',
+          ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {})
         },
         body: JSON.stringify({ 
           answers, 
@@ -914,6 +1114,44 @@ export const quizService = {
         message: error.message || 'Une erreur inattendue est survenue'
       };
     }
+  },
+
+  // Classement d'un quiz: meilleurs étudiants (score décroissant, puis temps croissant)
+  async getLeaderboard(quizId: number, limit = 10): Promise<ApiResponse<QuizRank[]> & { total?: number }> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/quizzes/${quizId}/leaderboard?limit=${limit}`, {
+        method: 'GET',
+        headers: getAuthHeaders()
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Erreur lors de la récupération du classement:', error);
+      return { success: false, error: 'Erreur lors de la récupération du classement' };
+    }
+  },
+
+  // Rang d'un étudiant sur un quiz (ex aequo: même rang)
+  async getQuizRank(quizId: number, studentId: number): Promise<ApiResponse<QuizRank & { total: number }>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/quizzes/${quizId}/rank/${studentId}`, {
+        method: 'GET',
+        headers: getAuthHeaders()
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Erreur lors de la récupération du rang:', error);
+      return { success: false, error: 'Erreur lors de la récupération du rang' };
+    }
   }
 };
 
@@ -932,15 +1170,24 @@ export const notificationService = {
     }
   },
 
-  // Récupérer les notifications d'un étudiant
-  async getStudentNotifications(studentId: number): Promise<ApiResponse<any[]>> {
+  // Récupérer les notifications d'un étudiant (since: seulement celles d'id supérieur)
+  async getStudentNotifications(studentId: number, since?: number): Promise<ApiResponse<any[]> & { cursor?: number; unread_count?: number }> {
     try {
-      const token = localStorage.getItem('auth-token');
-      const response = await fetch(`${API_BASE_URL}/student/${studentId}/notifications`, {
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': token ? `Bearer ${token}` : ''
-        }
+      const query = since ? `?since=${since}` : '';
+      const response = await fetch(`${API_BASE_URL}/student/${studentId}/notifications${query}`, {
+        headers: getAuthHeaders()
+      });
+      return await response.json();
+    } catch (error) {
+      return { success: false, error: 'Erreur lors de la récupération' };
+    }
+  },
+
+  // Nombre de non lues et id de la dernière notification (appel léger pour le polling)
+  async getUnreadCount(studentId: number): Promise<ApiResponse<{ unread_count: number; latest_id: number }>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/student/${studentId}/notifications/unread-count`, {
+        headers: getAuthHeaders()
       });
       return await response.json();
     } catch (error) {
@@ -973,9 +1220,130 @@ export const notificationService = {
     } catch (error) {
       return { success: false, error: 'Erreur lors du marquage' };
     }
+  },
+
+  // Tout marquer comme lu (jusqu'à la dernière notification affichée)
+  async markAllAsRead(upto?: number): Promise<ApiResponse<any>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/notifications/read-all`, {
+        method: 'PUT',
+        headers: getAuthHeaders(),
+        body: JSON.stringify(upto ? { upto } : {})
+      });
+      return await response.json();
+    } catch (error) {
+      return { success: false, error: 'Erreur lors du marquage' };
+    }
   }
 };
 
+// ============= ACCUEIL ÉTUDIANT =============
+
+export interface StudentBalance {
+  user_id: number;
+  total_du: number;
+  total_paye: number;
+  reste: number;
+  statut: 'solde' | 'partiel' | 'impaye';
+  date_maj: string | null;
+}
+
+export interface StudentHome {
+  documents: any[];
+  quizzes: any[];
+  payments: any[];
+  notifications: any[];
+  results: any[];
+  balance: StudentBalance;
+}
+
+// Dernières sections reçues et leurs versions, par étudiant
+const studentHomeCache: Record<number, { data: Partial<StudentHome>; versions: Record<string, string> }> = {};
+
+export const studentHomeService = {
+  // Les sections du tableau de bord en une requête; les sections inchangées ne sont pas renvoyées
+  async getStudentHome(studentId: number): Promise<ApiResponse<StudentHome>> {
+    try {
+      const cached = studentHomeCache[studentId];
+      const known = cached
+        ? Object.entries(cached.versions).map(([section, version]) => `${section}:${version}`).join(',')
+        : '';
+      const query = known ? `?known=${encodeURIComponent(known)}` : '';
+      const response = await fetch(`${API_BASE_URL}/student/${studentId}/home${query}`, {
+        headers: getAuthHeaders()
+      });
+      const result = await response.json();
+      if (!response.ok || !result.success) {
+        throw new Error(result.error || result.message || `HTTP ${response.status}`);
+      }
+      const data: Partial<StudentHome> = { ...(cached?.data || {}), ...result.data };
+      studentHomeCache[studentId] = { data, versions: result.versions };
+      return { success: true, data: data as StudentHome };
+    } catch (error: any) {
+      return { success: false, error: error.message || 'Erreur lors de la récupération de l\'accueil' };
+    }
+  }
+};
+
+// ============= ÉVÉNEMENTS POUSSÉS (SSE) =============
+
+export type PushEvent = 'notification' | 'payment' | 'payment_deleted' | 'reset';
+export type PushHandlers = Partial<Record<PushEvent, (data: any) => void>>;
+
+// Abonnement au flux /api/events (notifications, paiements); renvoie la fonction de désabonnement
+export const subscribeToEvents = (handlers: PushHandlers): (() => void) => {
+  let source: EventSource | null = null;
+  let lastEventId = '';
+  let closed = false;
+  let retryTimer: number | undefined;
+
+  const connect = async () => {
+    if (closed) return;
+    await ensureFreshToken();
+    if (!localStorage.getItem('auth-token') || closed) return;
+    // EventSource n'envoie pas d'en-tête Authorization: ticket à usage unique et point de reprise en paramètres
+    let ticket: string;
+    try {
+      const response = await fetch(`${API_BASE_URL}/events/ticket`, { method: 'POST', headers: getAuthHeaders() });
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      ticket = (await response.json()).data.ticket;
+    } catch {
+      retryTimer = window.setTimeout(connect, 5000);
+      return;
+    }
+    if (closed) return;
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) params.set('last_event_id', lastEventId);
+    source = new EventSource(`${API_BASE_URL}/events?${params}`);
+
+    (['notification', 'payment', 'payment_deleted'] as const).forEach(type => {
+      source!.addEventListener(type, (event: MessageEvent) => {
+        lastEventId = event.lastEventId || lastEventId;
+        handlers[type]?.(JSON.parse(event.data));
+      });
+    });
+    source.addEventListener('reset', () => handlers.reset?.({}));
+    // Jeton arrivé à expiration: reconnexion immédiate avec un jeton rafraîchi
+    source.addEventListener('reauth', () => {
+      source?.close();
+      connect();
+    });
+    // Erreur définitive (401, serveur arrêté): nouvelle tentative avec un jeton frais
+    source.onerror = () => {
+      if (source?.readyState === EventSource.CLOSED && !closed) {
+        retryTimer = window.setTimeout(connect, 5000);
+      }
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    window.clearTimeout(retryTimer);
+    source?.close();
+  };
+};
+
 // ============= UTILITAIRES EMAIL =============
 
 export const emailService = {
@@ -51,6 +51,8 @@ export interface Document {
   chemin: string;
   telechargeable: boolean;
   date_upload: string;
+  page_count?: number | null;
+  thumbnail_url?: string | null;
 }
 
 export interface Quiz {
@@ -84,6 +86,48 @@ export interface Result {
   statut: 'soumis' | 'non_soumis' | 'en_cours';
 }
 
+// Résultat enrichi (quiz + étudiant) de /admin/results
+export interface AdminResult extends Result {
+  quiz_titre: string;
+  etudiant: string;
+  email: string;
+  total_points: number;
+  pourcentage: number | null;
+}
+
+export interface ResultQuizSummary {
+  id_quiz: number;
+  quiz_titre: string;
+  total_points: number;
+  soumissions: number;
+  score_moyen: number | null;
+}
+
+// Page de résultats: next_cursor à renvoyer pour la page suivante (null en fin de liste),
+// summary fourni avec la première page
+export interface ResultPage extends ApiResponse<AdminResult[]> {
+  next_cursor?: string | null;
+  summary?: ResultQuizSummary[];
+}
+
+export interface ResultQuery {
+  quiz_id?: number;
+  student_id?: number;
+  sort?: 'date' | 'score';
+  order?: 'asc' | 'desc';
+  cursor?: string;
+  limit?: number;
+}
+
+const resultQueryString = (query: ResultQuery = {}) => {
+  const params = new URLSearchParams();
+  Object.entries(query).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') params.set(key, String(value));
+  });
+  const qs = params.toString();
+  return qs ? `?${qs}` : '';
+};
+
 export interface Notification {
   id_notification: number;
   titre: string;
@@ -129,7 +173,9 @@ class ApiClient {
       }
 
       const data = await response.json();
+      // Champs annexes (next_cursor, summary, ...) conservés à côté de data
       return {
+        ...data,
         success: true,
         data: data.data || data,
         message: data.message,
@@ -357,9 +403,9 @@ export const quizApi = {
     return ApiClient.post(`/quiz/${quizId}/submit`, { answers });
   },
 
-  // Récupérer les résultats d'un quiz
-  async getResults(quizId: number): Promise<ApiResponse<Result[]>> {
-    return ApiClient.get(`/admin/quiz/${quizId}/results`);
+  // Récupérer les résultats d'un quiz (paginés, voir resultsApi.getAll)
+  async getResults(quizId: number, query: Omit<ResultQuery, 'quiz_id'> = {}): Promise<ResultPage> {
+    return ApiClient.get(`/admin/quiz/${quizId}/results${resultQueryString(query)}`);
   },
 };
 
@@ -388,9 +434,9 @@ export const questionsApi = {
 
 // ============= SERVICES RÉSULTATS =============
 export const resultsApi = {
-  // Récupérer tous les résultats (admin)
-  async getAll(): Promise<ApiResponse<Result[]>> {
-    return ApiClient.get('/admin/results');
+  // Récupérer les résultats (admin), par pages: filtre quiz / étudiant, tri date ou score
+  async getAll(query: ResultQuery = {}): Promise<ResultPage> {
+    return ApiClient.get(`/admin/results${resultQueryString(query)}`);
   },
 
   // Récupérer les résultats d'un étudiant
@@ -456,35 +502,51 @@ export const emailApi = {
 };
 
 // ============= SERVICES STATISTIQUES =============
+// Période facultative (AAAA-MM-JJ, bornes incluses)
+export interface StatsPeriod {
+  start?: string;
+  end?: string;
+}
+
+const statsQuery = (period?: StatsPeriod) => {
+  const params = new URLSearchParams();
+  if (period?.start) params.set('start', period.start);
+  if (period?.end) params.set('end', period.end);
+  const query = params.toString();
+  return query ? `?${query}` : '';
+};
+
 export const statsApi = {
   // Récupérer les statistiques générales
-  async getGeneral(): Promise<ApiResponse<{
+  async getGeneral(period?: StatsPeriod): Promise<ApiResponse<{
     total_students: number;
     active_students: number;
+    new_students: number;
     total_revenue: number;
     pending_payments: number;
     completed_quizzes: number;
     average_score: number;
   }>> {
-    return ApiClient.get('/admin/stats/general');
+    return ApiClient.get(`/admin/stats/general${statsQuery(period)}`);
   },
 
   // Récupérer les statistiques de paiement
-  async getPayments(): Promise<ApiResponse<{
+  async getPayments(period?: StatsPeriod): Promise<ApiResponse<{
+    by_day: Array<{ date: string; amount: number; count: number }>;
     by_month: Array<{ month: string; amount: number; count: number }>;
     by_method: Array<{ method: string; amount: number; count: number }>;
     by_status: Array<{ status: string; count: number }>;
   }>> {
-    return ApiClient.get('/admin/stats/payments');
+    return ApiClient.get(`/admin/stats/payments${statsQuery(period)}`);
   },
 
   // Récupérer les statistiques des quiz
-  async getQuizzes(): Promise<ApiResponse<{
+  async getQuizzes(period?: StatsPeriod): Promise<ApiResponse<{
     completion_rate: number;
-    average_scores: Array<{ quiz_title: string; average: number }>;
+    average_scores: Array<{ quiz_id: number; quiz_title: string; average: number; count: number }>;
     participation: Array<{ date: string; count: number }>;
   }>> {
-    return ApiClient.get('/admin/stats/quizzes');
+    return ApiClient.get(`/admin/stats/quizzes${statsQuery(period)}`);
   },
 };
 
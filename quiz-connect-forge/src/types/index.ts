@@ -28,6 +28,8 @@ export interface Document {
   chemin: string;
   telechargeable: boolean;
   date_upload: string;
+  page_count?: number | null;
+  thumbnail_url?: string | null;
 }
 
 export interface Quiz {